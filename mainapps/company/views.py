@@ -13,6 +13,7 @@ from rest_framework.decorators import action
 class CompanyViewSet(BaseInventoryViewSet):
     serializer_class = CompanySerializer
     queryset=Company.objects.all()
+    CACHE_ENABLED = True
     # required_permission=UNIFIED_PERMISSION_DICT.get('company')
 
     @action(methods=['GET'], detail=True)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_type_linking_models', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant', models.CharField(max_length=400)),
+                ('prefix', models.CharField(max_length=200)),
+                ('period', models.CharField(blank=True, default='', max_length=16)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Sequence Counter',
+                'verbose_name_plural': 'Sequence Counters',
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'prefix', 'period'), name='sequence_counter_unique_scope')],
+            },
+        ),
+    ]
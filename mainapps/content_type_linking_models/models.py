@@ -249,3 +249,30 @@ class ContentTypeLink(models.Model):
         self.object_id_1 = _coerce_generic_object_id(self.object_id_1)
         self.object_id_2 = _coerce_generic_object_id(self.object_id_2)
         super().save(*args, **kwargs)
+
+
+class SequenceCounter(models.Model):
+    """
+    Last number handed out for one tenant, prefix and period.
+
+    Only ``subapps.services.sequence_allocator.SequenceAllocator`` writes to this table; the
+    period is empty for sequences that never reset.
+    """
+
+    tenant = models.CharField(max_length=400)
+    prefix = models.CharField(max_length=200)
+    period = models.CharField(max_length=16, blank=True, default="")
+    last_value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Sequence Counter"
+        verbose_name_plural = "Sequence Counters"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "prefix", "period"],
+                name="sequence_counter_unique_scope",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant}:{self.prefix}:{self.period} = {self.last_value}"
@@ -1,17 +1,64 @@
+from django.db import models
+from rest_framework import serializers
 
 from subapps.services.identity_directory import IdentityDirectory
 
+
+class UserDetailListSerializer(serializers.ListSerializer):
+    """List serializer that resolves every user referenced on the page before serializing rows."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        self.child.prefetch_user_details(instances)
+        return super().to_representation(instances)
+
+
 class UserDetailMixin:
     """Mixin to add user details to serializers"""
-    
+
+    # Attributes holding user IDs, or ``(canonical_field, legacy_field)`` pairs read through
+    # ``resolve_user_reference``, gathered by ``prefetch_user_details``.
+    user_reference_fields = ()
+
     def get_user_details(self, user_id):
         """Get user details from the local identity projection."""
         if not user_id:
             return None
-        return IdentityDirectory.get_minimal_user_data(user_id)
+        user_map = self._get_user_map()
+        if str(user_id) not in user_map:
+            instance = self.instance if not isinstance(self.instance, (list, tuple, models.QuerySet)) else None
+            ids = [user_id, *self._collect_user_ids([instance] if instance is not None else [])]
+            user_map.update(IdentityDirectory.get_many_minimal(ref for ref in ids if str(ref) not in user_map))
+        return user_map[str(user_id)]
+
+    def prefetch_user_details(self, instances):
+        user_map = self._get_user_map()
+        missing = [user_id for user_id in self._collect_user_ids(instances) if str(user_id) not in user_map]
+        if missing:
+            user_map.update(IdentityDirectory.get_many_minimal(missing))
+        return user_map
 
     def resolve_user_reference(self, obj, canonical_field, legacy_field):
         canonical_value = getattr(obj, canonical_field, None)
         if canonical_value not in (None, ""):
             return canonical_value
         return getattr(obj, legacy_field, None)
+
+    def _get_user_map(self):
+        user_map = self.context.get('identity_user_map')
+        if user_map is None:
+            user_map = self.context['identity_user_map'] = {}
+        return user_map
+
+    def _collect_user_ids(self, instances):
+        user_ids = []
+        for obj in instances:
+            for field in self.user_reference_fields:
+                if isinstance(field, tuple):
+                    user_id = self.resolve_user_reference(obj, *field)
+                else:
+                    user_id = getattr(obj, field, None)
+                if user_id:
+                    user_ids.append(user_id)
+        return user_ids
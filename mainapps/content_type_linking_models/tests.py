@@ -1,10 +1,18 @@
 import uuid
+from types import SimpleNamespace
 
 from django.contrib.contenttypes.models import ContentType
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from rest_framework import serializers
 
 from mainapps.company.models import Company
-from mainapps.content_type_linking_models.models import ContentTypeLink, _coerce_generic_object_id
+from mainapps.content_type_linking_models.models import ContentTypeLink, SequenceCounter, _coerce_generic_object_id
+from mainapps.content_type_linking_models.serializers import UserDetailListSerializer, UserDetailMixin
+from mainapps.identity.models import IdentityUser
+from subapps.kafka.consumers.identity import handle_identity_user_event
+from subapps.services.sequence_allocator import SequenceAllocator, highest_suffix
 
 
 class GenericObjectIdCompatibilityTests(TestCase):
@@ -35,3 +43,115 @@ class GenericObjectIdCompatibilityTests(TestCase):
         self.assertEqual(link.object_id_2, str(company.id))
         self.assertEqual(link.content_object_1, company_type)
         self.assertEqual(link.content_object_2, company)
+
+
+class SequenceAllocatorTests(TestCase):
+    def setUp(self):
+        SequenceAllocator.clear_cached_blocks()
+        self.addCleanup(SequenceAllocator.clear_cached_blocks)
+
+    def test_counter_is_seeded_once_and_advanced_per_scope(self):
+        seeds = []
+
+        def seed():
+            seeds.append(1)
+            return 41
+
+        with self.assertNumQueries(3):
+            self.assertEqual(SequenceAllocator.next_value(1, "PO", period="20260101", seed=seed), 42)
+        with self.assertNumQueries(1):
+            self.assertEqual(SequenceAllocator.next_value(1, "PO", period="20260101", seed=seed), 43)
+
+        self.assertEqual(seeds, [1])
+        self.assertEqual(SequenceAllocator.next_value(1, "PO", period="20260102"), 1)
+        self.assertEqual(SequenceAllocator.next_value(2, "PO", period="20260101"), 1)
+        self.assertEqual(list(SequenceAllocator.allocate(1, "PO", 3, period="20260101")), [44, 45, 46])
+
+    def test_blocks_are_served_in_process_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(SequenceAllocator.next_value(1, "SKU", block_size=5), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual([SequenceAllocator.next_value(1, "SKU", block_size=5) for _ in range(4)], [2, 3, 4, 5])
+        self.assertEqual(SequenceCounter.objects.get(tenant="1", prefix="SKU").last_value, 5)
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            SequenceAllocator.next_value(1, "SKU", block_size=5)
+            raise RuntimeError
+        # The rolled-back reservation is handed out again rather than served from a stale block.
+        self.assertEqual(SequenceAllocator.next_value(1, "SKU", block_size=5), 6)
+
+    def test_storing_a_new_period_drops_older_blocks_of_the_same_scope(self):
+        for period in ("20260101", "20260102"):
+            with self.captureOnCommitCallbacks(execute=True):
+                SequenceAllocator.next_value(1, "SO", period=period, block_size=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            SequenceAllocator.next_value(1, "PO", period="20260101", block_size=5)
+        # A block reserved for a period that has already rolled over is not kept.
+        SequenceAllocator._store_block((connection.alias, "1", "SO", "20260101"), 9, 10)
+
+        self.assertEqual(
+            sorted(key[2:] for key in SequenceAllocator._blocks),
+            [("PO", "20260101"), ("SO", "20260102")],
+        )
+
+    def test_highest_suffix_skips_values_without_a_number(self):
+        self.assertEqual(highest_suffix(["PO-1-20260101-0007", None, "legacy", "PO-1-20260101-0012"]), 12)
+        self.assertEqual(highest_suffix(["STORE_1_003"], separator="_"), 3)
+
+
+class _ActivitySerializer(UserDetailMixin, serializers.Serializer):
+    actor_details = serializers.SerializerMethodField()
+    approver_details = serializers.SerializerMethodField()
+
+    user_reference_fields = (('actor_user_id', 'actor'), 'approver_user_id')
+
+    class Meta:
+        list_serializer_class = UserDetailListSerializer
+
+    def get_actor_details(self, obj):
+        return self.get_user_details(self.resolve_user_reference(obj, 'actor_user_id', 'actor'))
+
+    def get_approver_details(self, obj):
+        return self.get_user_details(obj.approver_user_id)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class UserDetailPrefetchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        IdentityUser.objects.create(user_id=7, email="ada@example.com", full_name="Ada Lovelace")
+        IdentityUser.objects.create(user_id=8, email="alan@example.com", full_name="Alan Turing")
+
+    def _activity(self, actor_user_id=None, actor="", approver_user_id=None):
+        return SimpleNamespace(actor_user_id=actor_user_id, actor=actor, approver_user_id=approver_user_id)
+
+    def test_list_resolves_every_user_on_the_page_in_one_query(self):
+        rows = [
+            self._activity(actor_user_id=7, approver_user_id=8),
+            self._activity(actor="8", approver_user_id=7),
+            self._activity(actor_user_id=9),
+        ]
+
+        with self.assertNumQueries(1):
+            data = _ActivitySerializer(rows, many=True).data
+
+        self.assertEqual(
+            [(row["actor_details"]["full_name"], (row["approver_details"] or {}).get("email")) for row in data],
+            [("Ada Lovelace", "alan@example.com"), ("Alan Turing", "ada@example.com"), ("Unknown User", None)],
+        )
+        with self.assertNumQueries(0):
+            _ActivitySerializer(rows, many=True).data
+
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_identity_user_event(
+                {"payload": {"user_id": 9, "email": "grace@example.com", "full_name": "Grace Hopper"}}
+            )
+        with self.assertNumQueries(1):
+            data = _ActivitySerializer(rows, many=True).data
+        self.assertEqual(data[2]["actor_details"]["email"], "grace@example.com")
+
+    def test_single_object_resolves_all_of_its_users_together(self):
+        with self.assertNumQueries(1):
+            data = _ActivitySerializer(self._activity(actor_user_id=7, approver_user_id=8)).data
+
+        self.assertEqual(data["approver_details"]["full_name"], "Alan Turing")
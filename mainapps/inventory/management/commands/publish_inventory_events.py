@@ -1,7 +1,32 @@
-from django.core.management.base import BaseCommand
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 from mainapps.inventory.models import InventoryItem
-from subapps.kafka.producers.inventory import publish_inventory_availability_upserted
+
+
+def _init_worker():
+    # Never reuse the parent's librdkafka handle in a forked child.
+    from subapps.kafka import client
+
+    client._producer = None
+
+
+def _publish_chunk(inventory_item_ids):
+    from subapps.kafka.client import flush_producer
+    from subapps.kafka.producers.inventory import publish_inventory_availabilities_upserted
+
+    envelopes = publish_inventory_availabilities_upserted(inventory_item_ids=inventory_item_ids)
+    flush_producer()
+    return len(envelopes), len(inventory_item_ids) - len(envelopes)
 
 
 class Command(BaseCommand):
@@ -10,29 +35,131 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--profile-id", type=int, default=None)
         parser.add_argument("--inventory-item-id", default=None)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=1, help="Number of publisher processes.")
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="JSON file recording the last fully published item so an interrupted run can resume.",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint file.")
 
     def handle(self, *args, **options):
-        profile_id = options["profile_id"]
-        inventory_item_id = options["inventory_item_id"]
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+        if batch_size < 1 or workers < 1:
+            raise CommandError("--batch-size and --workers must be positive.")
+
+        queryset = InventoryItem.objects.all()
+        if options["profile_id"] is not None:
+            queryset = queryset.filter(profile_id=options["profile_id"])
+        if options["inventory_item_id"]:
+            queryset = queryset.filter(id=options["inventory_item_id"])
 
-        queryset = InventoryItem.objects.all().order_by("created_at")
-        if profile_id is not None:
-            queryset = queryset.filter(profile_id=profile_id)
-        if inventory_item_id:
-            queryset = queryset.filter(id=inventory_item_id)
+        checkpoint_path = options["checkpoint"]
+        checkpoint = self._load_checkpoint(checkpoint_path, options) if not options["restart"] else None
+        if checkpoint is not None:
+            created_at = parse_datetime(checkpoint["created_at"])
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=checkpoint["id"])
+            )
+            self.stdout.write(f"Resuming after inventory item {checkpoint['id']}.")
+
+        totals = {
+            "published": checkpoint["published"] if checkpoint else 0,
+            "skipped": checkpoint["skipped"] if checkpoint else 0,
+        }
+        remaining = queryset.count()
+        processed = 0
+        started = time.monotonic()
 
-        published_count = 0
-        skipped_count = 0
+        def record(chunk_result, last_key):
+            nonlocal processed
+            published, skipped = chunk_result
+            totals["published"] += published
+            totals["skipped"] += skipped
+            processed += published + skipped
+            if checkpoint_path:
+                self._save_checkpoint(checkpoint_path, options, last_key, totals)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"{processed}/{remaining} items ({processed / elapsed:.1f} items/s); "
+                f"published={totals['published']} skipped={totals['skipped']}"
+            )
 
-        for inventory_item in queryset.iterator():
-            envelope = publish_inventory_availability_upserted(inventory_item_id=inventory_item.id)
-            if envelope is None:
-                skipped_count += 1
-                continue
-            published_count += 1
+        chunks = self._iter_chunks(queryset, batch_size)
+        if workers == 1:
+            for inventory_item_ids, last_key in chunks:
+                record(_publish_chunk(inventory_item_ids), last_key)
+        else:
+            # Results are collected in submission order, so the checkpoint never skips an unfinished chunk.
+            in_flight = deque()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+            ) as executor:
+                for inventory_item_ids, last_key in chunks:
+                    # The fork pool starts its workers on the first submit; they must not inherit an open socket.
+                    connections.close_all()
+                    in_flight.append((executor.submit(_publish_chunk, inventory_item_ids), last_key))
+                    while len(in_flight) >= workers * 2:
+                        future, key = in_flight.popleft()
+                        record(future.result(), key)
+                while in_flight:
+                    future, key = in_flight.popleft()
+                    record(future.result(), key)
 
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
         self.stdout.write(
             self.style.SUCCESS(
-                f"Published {published_count} inventory availability events; skipped {skipped_count} unmapped items."
+                f"Published {totals['published']} inventory availability events; "
+                f"skipped {totals['skipped']} unmapped items."
             )
         )
+
+    def _iter_chunks(self, queryset, batch_size):
+        """Yield ``(ids, (created_at, id))`` pages using keyset pagination on ``created_at``/``id``."""
+        last_key = None
+        while True:
+            page = queryset
+            if last_key is not None:
+                page = page.filter(Q(created_at__gt=last_key[0]) | Q(created_at=last_key[0], id__gt=last_key[1]))
+            rows = list(page.order_by("created_at", "id").values_list("created_at", "id")[:batch_size])
+            if not rows:
+                return
+            last_key = rows[-1]
+            yield [inventory_item_id for _, inventory_item_id in rows], last_key
+
+    def _checkpoint_scope(self, options):
+        return {
+            "profile_id": options["profile_id"],
+            "inventory_item_id": options["inventory_item_id"],
+        }
+
+    def _load_checkpoint(self, path, options):
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            checkpoint = json.load(handle)
+        if checkpoint.get("scope") != self._checkpoint_scope(options):
+            raise CommandError(
+                f"Checkpoint {path} was written for different filters; pass --restart to discard it."
+            )
+        return checkpoint
+
+    def _save_checkpoint(self, path, options, last_key, totals):
+        created_at, inventory_item_id = last_key
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as handle:
+            json.dump(
+                {
+                    "scope": self._checkpoint_scope(options),
+                    "created_at": created_at.isoformat(),
+                    "id": str(inventory_item_id),
+                    **totals,
+                },
+                handle,
+            )
+        os.replace(temporary_path, path)
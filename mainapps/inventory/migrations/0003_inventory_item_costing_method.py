@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='costing_method',
+            field=models.CharField(choices=[('fifo', 'First In, First Out'), ('moving_average', 'Moving Average')], default='fifo', max_length=20, verbose_name='Costing Method'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:08
+
+import uuid
+
+from django.db import migrations, models
+
+
+def copy_legacy_inventory_ids(apps, schema_editor):
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    pending = []
+    for inventory_item in InventoryItem.objects.filter(metadata__has_key='legacy_inventory_id').only('id', 'metadata').iterator():
+        try:
+            inventory_item.legacy_inventory_id = uuid.UUID(str(inventory_item.metadata.get('legacy_inventory_id') or ''))
+        except (AttributeError, ValueError):
+            continue
+        pending.append(inventory_item)
+        if len(pending) >= 500:
+            InventoryItem.objects.bulk_update(pending, ['legacy_inventory_id'])
+            pending = []
+    if pending:
+        InventoryItem.objects.bulk_update(pending, ['legacy_inventory_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0001_initial'),
+        ('inventory', '0003_inventory_item_costing_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='legacy_inventory_id',
+            field=models.UUIDField(blank=True, editable=False, help_text='Indexed copy of metadata.legacy_inventory_id, kept in step on save.', null=True, verbose_name='Legacy Inventory ID'),
+        ),
+        migrations.RunPython(copy_legacy_inventory_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['profile_id', 'legacy_inventory_id'], name='inventory_i_profile_c596e4_idx'),
+        ),
+    ]
@@ -20,11 +20,11 @@ from mainapps.content_type_linking_models.models import (
     UUIDBaseModel,
     _sync_identity_fields,
 )
-from django.db import transaction
-from django.db.models import F
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 
+from subapps.services.sequence_allocator import SequenceAllocator, highest_suffix
+
 
 def _sync_profile_lookup_value(value):
     if value in (None, ""):
@@ -148,6 +148,11 @@ class InventoryItemStatus(models.TextChoices):
     ARCHIVED = 'archived', _('Archived')
     DISCONTINUED = 'discontinued', _('Discontinued')
 
+
+class CostingMethod(models.TextChoices):
+    FIFO = 'fifo', _('First In, First Out')
+    MOVING_AVERAGE = 'moving_average', _('Moving Average')
+
 class InventoryPolicy(ProfileMixin):
     """
     Central policy framework governing inventory operations.
@@ -478,6 +483,15 @@ class InventoryCategory(ProfileMixin, MPTTModel):
         return [{"name": 'Name'}, {'is_active': 'Active'}]
 
 
+def coerce_legacy_inventory_id(metadata):
+    if not isinstance(metadata, dict):
+        return None
+    try:
+        return uuid.UUID(str(metadata.get('legacy_inventory_id') or ''))
+    except ValueError:
+        return None
+
+
 class InventoryItem(TenantStampedUUIDModel):
     product_template_id = models.UUIDField(
         blank=True,
@@ -516,6 +530,12 @@ class InventoryItem(TenantStampedUUIDModel):
     track_serial = models.BooleanField(default=False, verbose_name=_("Track Serial"))
     track_expiry = models.BooleanField(default=False, verbose_name=_("Track Expiry"))
     allow_negative_stock = models.BooleanField(default=False, verbose_name=_("Allow Negative Stock"))
+    costing_method = models.CharField(
+        max_length=20,
+        choices=CostingMethod.choices,
+        default=CostingMethod.FIFO,
+        verbose_name=_("Costing Method"),
+    )
     reorder_point = models.DecimalField(max_digits=15, decimal_places=5, default=0)
     reorder_quantity = models.DecimalField(max_digits=15, decimal_places=5, default=0)
     minimum_stock_level = models.DecimalField(max_digits=15, decimal_places=5, default=0)
@@ -537,6 +557,13 @@ class InventoryItem(TenantStampedUUIDModel):
         verbose_name=_("Status"),
     )
     metadata = models.JSONField(default=dict, blank=True)
+    legacy_inventory_id = models.UUIDField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_("Legacy Inventory ID"),
+        help_text=_("Indexed copy of metadata.legacy_inventory_id, kept in step on save."),
+    )
 
     class Meta:
         ordering = ['name_snapshot']
@@ -545,6 +572,7 @@ class InventoryItem(TenantStampedUUIDModel):
             models.Index(fields=['inventory_category', 'inventory_type']),
             models.Index(fields=['sku_snapshot']),
             models.Index(fields=['barcode_snapshot']),
+            models.Index(fields=['profile_id', 'legacy_inventory_id']),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -561,28 +589,27 @@ class InventoryItem(TenantStampedUUIDModel):
     def __str__(self):
         return self.name_snapshot
 
+    def save(self, *args, **kwargs):
+        self.legacy_inventory_id = coerce_legacy_inventory_id(self.metadata)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'metadata' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'legacy_inventory_id'}
+        super().save(*args, **kwargs)
+
 
 class InventoryQuerySet(models.QuerySet):
     def active(self):
         return self.filter(active=True)
     
     def low_stock(self):
-        from subapps.services.inventory_read_model import get_inventory_ids_for_stock_filter
+        from subapps.services.inventory_read_model import filter_inventories_by_stock_status
 
-        inventory_list = list(self)
-        inventory_ids = get_inventory_ids_for_stock_filter(inventory_list, filter_name='low_stock')
-        if not inventory_ids:
-            return self.none()
-        return self.filter(id__in=inventory_ids)
+        return filter_inventories_by_stock_status(self, filter_name='low_stock')
     
     def needs_reorder(self):
-        from subapps.services.inventory_read_model import get_inventory_ids_for_stock_filter
+        from subapps.services.inventory_read_model import filter_inventories_by_stock_status
 
-        inventory_list = list(self)
-        inventory_ids = get_inventory_ids_for_stock_filter(inventory_list, filter_name='needs_reorder')
-        if not inventory_ids:
-            return self.none()
-        return self.filter(id__in=inventory_ids)
+        return filter_inventories_by_stock_status(self, filter_name='needs_reorder')
     
     def by_category(self, category):
         return self.filter(category=category)
@@ -702,28 +729,29 @@ class Inventory(InventoryProperty):
             
         ]    
     def generate_external_id(self):
-        """Atomically generate unique external ID in PROFILE_INITIALS-SEQ format"""
-        with transaction.atomic():
-            profile_value = self.profile_id if self.profile_id is not None else self.profile
-            last_inventory = Inventory.objects.filter(
-                models.Q(profile_id=profile_value) | models.Q(profile=str(profile_value))
-            ).order_by('-created_at').last()
-            number_in_category= Inventory.objects.filter(category=self.category).count()+1
-            if last_inventory:
-                last_reference=last_inventory.external_system_id.split('-')[-1]
-
-                last_reference=int(last_inventory.external_system_id.split('-')[-1])
-            else:
-                last_reference=0
-            last_reference+=1
-
-            initials = ''.join([word[0] for word in self.category.name.split() if word])[:3].upper()+'-'
-            initials+= ''.join([word[0] for word in self.inventory_type.split('_') if word])[:3].upper()
-            if len(initials) < 2:
-                initials = self.category.name[:3].upper()
-                
-            
-            return f"INV-{initials}-{profile_value}{number_in_category}-{last_reference:04d}"
+        """Generate a unique external ID in INV-INITIALS-PROFILE{CATEGORY_SEQ}-SEQ format"""
+        profile_value = self.profile_id if self.profile_id is not None else self.profile
+        number_in_category = SequenceAllocator.next_value(
+            profile_value,
+            f"INV-CATEGORY-{self.category_id}",
+            seed=lambda: Inventory.objects.filter(category=self.category).count(),
+        )
+        last_reference = SequenceAllocator.next_value(
+            profile_value,
+            "INV",
+            seed=lambda: highest_suffix(
+                Inventory.objects.filter(
+                    models.Q(profile_id=profile_value) | models.Q(profile=str(profile_value))
+                ).values_list('external_system_id', flat=True)
+            ),
+        )
+
+        initials = ''.join([word[0] for word in self.category.name.split() if word])[:3].upper()+'-'
+        initials+= ''.join([word[0] for word in self.inventory_type.split('_') if word])[:3].upper()
+        if len(initials) < 2:
+            initials = self.category.name[:3].upper()
+
+        return f"INV-{initials}-{profile_value}{number_in_category}-{last_reference:04d}"
 
     def save(self, *args, **kwargs):
         _sync_identity_fields(self, canonical_field='officer_in_charge_user_id', legacy_field='officer_in_charge')
@@ -29,6 +29,8 @@ class InventoryCategoryDetailSerializer(UserDetailMixin, serializers.ModelSerial
     modified_by_details = serializers.SerializerMethodField()
     parent_name= serializers.SerializerMethodField()
     
+    user_reference_fields = (('created_by_user_id', 'created_by'), ('updated_by_user_id', 'modified_by'))
+
     class Meta:
         model = InventoryCategory
         fields = '__all__'
@@ -85,6 +87,12 @@ class InventoryDetailSerializer(UserDetailMixin, serializers.ModelSerializer):
     # Stock analytics
     stock_analytics = serializers.SerializerMethodField()
     
+    user_reference_fields = (
+        ('officer_in_charge_user_id', 'officer_in_charge'),
+        ('created_by_user_id', 'created_by'),
+        ('updated_by_user_id', 'modified_by'),
+    )
+
     class Meta:
         model = Inventory
         fields = '__all__'
@@ -1,13 +1,29 @@
+import json
+import os
+import tempfile
 import uuid
 from decimal import Decimal
+from io import StringIO
 from unittest.mock import MagicMock, PropertyMock, patch
 
-from django.db import IntegrityError, transaction
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
 from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
 
 from mainapps.inventory.models import Inventory, InventoryCategory, InventoryItem
-from subapps.kafka.producers.inventory import _resolve_catalog_variant
-from subapps.services.inventory_read_model import get_inventory_summary_map, get_low_stock_rows
+from mainapps.projections.models import CatalogProductProjection, CatalogVariantProjection
+from mainapps.stock.models import StockLocation
+from subapps.kafka.producers.inventory import _resolve_catalog_variants, build_availability_snapshots
+from subapps.services.stock_domain import StockDomainService
+from subapps.services.inventory_read_model import (
+    annotate_inventory_item_stock_quantity,
+    annotate_inventory_stock_level,
+    filter_inventories_by_stock_status,
+    get_inventory_summary_map,
+    get_low_stock_rows,
+)
 
 
 class InventoryCategoryConstraintTests(TestCase):
@@ -55,9 +71,10 @@ class InventorySummaryCompatibilityTests(SimpleTestCase):
             name_snapshot=self.inventory.name,
             inventory_type=self.inventory.inventory_type,
             metadata={"legacy_inventory_id": str(self.inventory.id)},
+            legacy_inventory_id=self.inventory.id,
         )
 
-    def test_inventory_summary_map_uses_metadata_lookup_instead_of_bridge_id(self):
+    def test_inventory_summary_map_uses_indexed_legacy_lookup_instead_of_bridge_id(self):
         balance = MagicMock(
             inventory_item_id=self.inventory_item.id,
             quantity_on_hand=Decimal("5"),
@@ -95,12 +112,13 @@ class InventorySummaryCompatibilityTests(SimpleTestCase):
                             "subapps.services.inventory_read_model.InventoryItem.legacy_bridge_id",
                             side_effect=AssertionError("bridge lookup should not run"),
                             create=True,
+                        ), patch(
+                            "subapps.services.inventory_read_model.get_inventory_valuation_map",
+                            return_value={},
                         ):
                             summary_map = get_inventory_summary_map([self.inventory])
 
-        inventory_item_filter.assert_called_once_with(
-            metadata__legacy_inventory_id__in=[str(self.inventory.id)]
-        )
+        inventory_item_filter.assert_called_once_with(Q(profile_id=1, legacy_inventory_id=self.inventory.id))
         summary = summary_map[self.inventory.id]
         self.assertEqual(summary["current_stock_level"], Decimal("5"))
         self.assertEqual(summary["quantity_reserved"], Decimal("1"))
@@ -172,6 +190,7 @@ class InventorySummaryCompatibilityTests(SimpleTestCase):
 
     def test_catalog_variant_resolution_no_longer_uses_legacy_stock_items(self):
         class InventoryItemStub:
+            id = 1
             profile_id = 1
             product_variant_id = None
             barcode_snapshot = "barcode-123"
@@ -182,42 +201,16 @@ class InventorySummaryCompatibilityTests(SimpleTestCase):
             def legacy_stock_items(self):
                 raise AssertionError("legacy stock items should not be consulted")
 
-        variant_queryset = MagicMock()
-        barcode_filter = MagicMock()
-        barcode_filter.first.return_value = None
-        uuid_filter = MagicMock()
-        uuid_filter.first.return_value = None
-        sku_filter = MagicMock()
-        sku_filter.first.return_value = None
-
-        def filter_side_effect(*args, **kwargs):
-            if kwargs == {"profile_id": 1}:
-                return variant_queryset
-            if kwargs == {"variant_barcode": "barcode-123"}:
-                return barcode_filter
-            if kwargs == {"variant_barcode": "legacy-barcode"}:
-                return barcode_filter
-            if kwargs == {"variant_barcode": "sku-123"}:
-                return barcode_filter
-            if kwargs == {"variant_sku": "barcode-123"}:
-                return sku_filter
-            if kwargs == {"variant_sku": "legacy-barcode"}:
-                return sku_filter
-            if kwargs == {"variant_sku": "sku-123"}:
-                return sku_filter
-            raise AssertionError(f"Unexpected filter call: {kwargs}")
-
-        variant_queryset.filter.side_effect = filter_side_effect
-
         manager = MagicMock()
         manager.select_related.return_value = manager
-        manager.filter.side_effect = filter_side_effect
+        manager.filter.return_value = []
 
         with patch(
             "subapps.kafka.producers.inventory.CatalogVariantProjection.objects",
             manager,
         ):
-            self.assertIsNone(_resolve_catalog_variant(InventoryItemStub()))
+            self.assertEqual(_resolve_catalog_variants([InventoryItemStub()]), {})
+        manager.filter.assert_called_once()
 
     def test_low_stock_rows_no_longer_uses_external_system_id_as_sku(self):
         self.inventory.external_system_id = "INV-123"
@@ -234,3 +227,160 @@ class InventorySummaryCompatibilityTests(SimpleTestCase):
             rows = get_low_stock_rows([self.inventory])
 
         self.assertEqual(rows[0]["sku"], "")
+
+
+class AvailabilitySnapshotBatchTests(TestCase):
+    def setUp(self):
+        product = CatalogProductProjection.objects.create(profile_id=1, name="Gloves")
+        self.barcode_variant = CatalogVariantProjection.objects.create(
+            product=product,
+            profile_id=1,
+            display_name="Gloves M",
+            variant_barcode="BC-M",
+            variant_sku="GLOVE-M",
+        )
+        self.sku_variant = CatalogVariantProjection.objects.create(
+            product=product,
+            profile_id=1,
+            display_name="Gloves L",
+            variant_sku="GLOVE-L",
+        )
+        self.legacy_inventory = Inventory.objects.create(name="Gloves", profile_id=1, external_system_id="EXT-9")
+        self.by_barcode = InventoryItem.objects.create(
+            profile_id=1,
+            name_snapshot="Gloves M",
+            barcode_snapshot="BC-M",
+            metadata={"legacy_inventory_id": str(self.legacy_inventory.id)},
+        )
+        self.by_sku = InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves L", sku_snapshot="GLOVE-L")
+        self.unmapped = InventoryItem.objects.create(profile_id=1, name_snapshot="Loose")
+        location = StockLocation.objects.create(profile_id=1, name="Store")
+        for inventory_item, quantity in ((self.by_barcode, "5"), (self.by_sku, "2")):
+            StockDomainService.adjust_stock(
+                inventory_item=inventory_item,
+                stock_location=location,
+                quantity_change=Decimal(quantity),
+            )
+
+    def test_build_availability_snapshots_resolves_many_items_in_fixed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            snapshots = build_availability_snapshots([self.by_barcode.id, self.by_sku.id, self.unmapped.id])
+
+        self.assertLessEqual(len(queries), 8)
+        self.assertIsNone(snapshots[str(self.unmapped.id)])
+        barcode_snapshot = snapshots[str(self.by_barcode.id)]
+        self.assertEqual(barcode_snapshot["variant_id"], str(self.barcode_variant.variant_id))
+        self.assertEqual(barcode_snapshot["inventory_external_id"], "EXT-9")
+        self.assertEqual(barcode_snapshot["total_quantity"], Decimal("5"))
+        self.assertEqual(snapshots[str(self.by_sku.id)]["variant_id"], str(self.sku_variant.variant_id))
+        self.assertEqual(snapshots[str(self.by_sku.id)]["available_quantity"], Decimal("2"))
+
+        self.by_sku.refresh_from_db()
+        self.assertEqual(self.by_sku.product_variant_id, self.sku_variant.variant_id)
+
+
+class PublishInventoryEventsCommandTests(TestCase):
+    def setUp(self):
+        self.inventory_items = [
+            InventoryItem.objects.create(profile_id=7, name_snapshot=f"Item {index}") for index in range(5)
+        ]
+        self.checkpoint_path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+
+    @patch("subapps.kafka.client.flush_producer")
+    @patch("subapps.kafka.producers.inventory.publish_inventory_availabilities_upserted")
+    def test_command_publishes_in_keyset_chunks_and_resumes_from_checkpoint(self, publish, flush_producer):
+        ordered_ids = list(
+            InventoryItem.objects.filter(profile_id=7).order_by("created_at", "id").values_list("id", flat=True)
+        )
+        publish.side_effect = lambda inventory_item_ids: [{} for _ in inventory_item_ids]
+        first_chunk_key = InventoryItem.objects.get(id=ordered_ids[1])
+        with open(self.checkpoint_path, "w") as handle:
+            json.dump(
+                {
+                    "scope": {"profile_id": 7, "inventory_item_id": None},
+                    "created_at": first_chunk_key.created_at.isoformat(),
+                    "id": str(first_chunk_key.id),
+                    "published": 2,
+                    "skipped": 0,
+                },
+                handle,
+            )
+
+        output = StringIO()
+        call_command(
+            "publish_inventory_events",
+            profile_id=7,
+            batch_size=2,
+            checkpoint=self.checkpoint_path,
+            stdout=output,
+        )
+
+        self.assertEqual(
+            [call.kwargs["inventory_item_ids"] for call in publish.call_args_list],
+            [ordered_ids[2:4], ordered_ids[4:]],
+        )
+        self.assertEqual(flush_producer.call_count, 2)
+        self.assertIn("Published 5 inventory availability events", output.getvalue())
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+
+class StockLevelFilterTests(TestCase):
+    def setUp(self):
+        self.location = StockLocation.objects.create(profile_id=3, name="Store")
+        self.stocked = Inventory.objects.create(name="Stocked", profile_id=3, external_system_id="S", minimum_stock_level=2, re_order_point=10)
+        self.low = Inventory.objects.create(name="Low", profile_id=3, external_system_id="L", minimum_stock_level=5, re_order_point=8)
+        self.empty = Inventory.objects.create(name="Empty", profile_id=3, external_system_id="E", minimum_stock_level=0, re_order_point=1)
+        for inventory, quantity in ((self.stocked, "6"), (self.low, "4")):
+            inventory_item = InventoryItem.objects.create(
+                profile_id=3,
+                name_snapshot=inventory.name,
+                minimum_stock_level=Decimal("5"),
+                metadata={"legacy_inventory_id": str(inventory.id)},
+            )
+            StockDomainService.adjust_stock(
+                inventory_item=inventory_item,
+                stock_location=self.location,
+                quantity_change=Decimal(quantity),
+            )
+
+    def _names(self, queryset):
+        return set(queryset.values_list("name", flat=True))
+
+    def test_inventory_stock_filters_run_in_sql(self):
+        queryset = Inventory.objects.filter(profile_id=3)
+
+        self.assertEqual(self._names(filter_inventories_by_stock_status(queryset, filter_name="low_stock")), {"Low", "Empty"})
+        self.assertEqual(
+            self._names(filter_inventories_by_stock_status(queryset, filter_name="needs_reorder")),
+            {"Stocked", "Low", "Empty"},
+        )
+        self.assertEqual(self._names(filter_inventories_by_stock_status(queryset, filter_name="out_of_stock")), {"Empty"})
+        self.assertEqual(self._names(queryset.low_stock()), {"Low", "Empty"})
+
+    def test_inventory_stock_level_only_counts_the_inventory_tenant(self):
+        foreign_item = InventoryItem.objects.create(
+            profile_id=4,
+            name_snapshot="Foreign",
+            metadata={"legacy_inventory_id": str(self.empty.id)},
+        )
+        StockDomainService.adjust_stock(
+            inventory_item=foreign_item,
+            stock_location=StockLocation.objects.create(profile_id=4, name="Elsewhere"),
+            quantity_change=Decimal("9"),
+        )
+
+        levels = dict(annotate_inventory_stock_level(Inventory.objects.filter(profile_id=3)).values_list("name", "stock_level"))
+        self.assertEqual(levels, {"Stocked": Decimal("6"), "Low": Decimal("4"), "Empty": Decimal("0")})
+
+    def test_inventory_item_quantity_annotation(self):
+        InventoryItem.objects.create(profile_id=3, name_snapshot="Unstocked")
+        annotated = annotate_inventory_item_stock_quantity(InventoryItem.objects.filter(profile_id=3))
+
+        self.assertEqual(
+            set(annotated.filter(stock_quantity__lte=0).values_list("name_snapshot", flat=True)),
+            {"Unstocked"},
+        )
+        self.assertEqual(
+            set(annotated.filter(stock_quantity__lte=F("minimum_stock_level")).values_list("name_snapshot", flat=True)),
+            {"Low", "Unstocked"},
+        )
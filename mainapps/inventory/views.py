@@ -11,7 +11,7 @@ from decimal import Decimal
 from subapps.permissions.constants import UNIFIED_PERMISSION_DICT
 from subapps.permissions.microservice_permissions import BaseCachePermissionViewset, PermissionRequiredMixin
 from subapps.services.inventory_read_model import (
-    get_inventory_ids_for_stock_filter,
+    filter_inventories_by_stock_status,
     get_inventory_summary_map,
 )
 from subapps.services.stock_domain import StockDomainError, StockDomainService
@@ -140,15 +140,8 @@ class InventoryViewSet(BaseInventoryViewSet):
         
         # Additional filters
         stock_status = self.request.query_params.get('stock_status')
-        if stock_status == 'low_stock':
-            inventory_ids = get_inventory_ids_for_stock_filter(list(queryset), filter_name='low_stock')
-            queryset = queryset.filter(id__in=inventory_ids) if inventory_ids else queryset.none()
-        elif stock_status == 'out_of_stock':
-            inventory_ids = get_inventory_ids_for_stock_filter(list(queryset), filter_name='out_of_stock')
-            queryset = queryset.filter(id__in=inventory_ids) if inventory_ids else queryset.none()
-        elif stock_status == 'needs_reorder':
-            inventory_ids = get_inventory_ids_for_stock_filter(list(queryset), filter_name='needs_reorder')
-            queryset = queryset.filter(id__in=inventory_ids) if inventory_ids else queryset.none()
+        if stock_status in {'low_stock', 'out_of_stock', 'needs_reorder'}:
+            queryset = filter_inventories_by_stock_status(queryset, filter_name=stock_status)
         
         return queryset
     
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from mainapps.orders.models import PurchaseOrder, ReturnOrder, SalesOrder
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored subtotal, tax, discount and grand totals of orders from their line items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile-id", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        for model in (PurchaseOrder, SalesOrder, ReturnOrder):
+            queryset = model.objects.order_by("id")
+            if options["profile_id"] is not None:
+                queryset = queryset.filter(profile_id=options["profile_id"])
+
+            refreshed = 0
+            last_id = None
+            while True:
+                page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+                orders = list(page[:batch_size])
+                if not orders:
+                    break
+                last_id = orders[-1].id
+                with transaction.atomic():
+                    for order in orders:
+                        order.refresh_totals()
+                refreshed += len(orders)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"Backfilled totals for {refreshed} {model._meta.verbose_name_plural}.")
+            )
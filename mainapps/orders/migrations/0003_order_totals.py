@@ -0,0 +1,129 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:44
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+TOTAL_FIELDS = ('subtotal', 'tax_total', 'discount_total', 'grand_total')
+LINE_AMOUNT_FIELD = models.DecimalField(max_digits=30, decimal_places=10)
+
+
+def _rated_line_totals():
+    subtotal = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=LINE_AMOUNT_FIELD)
+    tax = ExpressionWrapper(subtotal * F('tax_rate') * Value(Decimal('0.01')), output_field=LINE_AMOUNT_FIELD)
+    discount = ExpressionWrapper(subtotal * F('discount_rate') * Value(Decimal('0.01')), output_field=LINE_AMOUNT_FIELD)
+    return {
+        'subtotal': subtotal,
+        'tax_total': tax,
+        'discount_total': discount,
+        'grand_total': Round(subtotal + tax - discount, 2, output_field=LINE_AMOUNT_FIELD),
+    }
+
+
+def _return_line_totals():
+    subtotal = ExpressionWrapper(F('quantity_returned') * F('unit_price'), output_field=LINE_AMOUNT_FIELD)
+    return {
+        'subtotal': subtotal,
+        'tax_total': Value(Decimal('0'), output_field=LINE_AMOUNT_FIELD),
+        'discount_total': F('discount'),
+        'grand_total': ExpressionWrapper(subtotal - F('discount'), output_field=LINE_AMOUNT_FIELD),
+    }
+
+
+def backfill_order_totals(apps, schema_editor):
+    """Store the totals of existing orders as ``refresh_totals`` computes them, one grouped query per model."""
+    for order_name, line_name, order_attname, expressions in (
+        ('PurchaseOrder', 'PurchaseOrderLineItem', 'purchase_order_id', _rated_line_totals()),
+        ('SalesOrder', 'SalesOrderLineItem', 'sales_order_id', _rated_line_totals()),
+        ('ReturnOrder', 'ReturnOrderLineItem', 'return_order_id', _return_line_totals()),
+    ):
+        order_model = apps.get_model('orders', order_name)
+        line_model = apps.get_model('orders', line_name)
+        totals = (
+            line_model.objects.order_by()
+            .values(order_attname)
+            .annotate(
+                **{
+                    field: Coalesce(Round(Sum(expression), 2), Value(Decimal('0')), output_field=LINE_AMOUNT_FIELD)
+                    for field, expression in expressions.items()
+                }
+            )
+        )
+        order_model.objects.bulk_update(
+            [order_model(pk=row[order_attname], **{field: row[field] for field in TOTAL_FIELDS}) for row in totals],
+            TOTAL_FIELDS,
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Discount Total'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='grand_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Grand Total'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Subtotal'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='tax_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Tax Total'),
+        ),
+        migrations.AddField(
+            model_name='returnorder',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Discount Total'),
+        ),
+        migrations.AddField(
+            model_name='returnorder',
+            name='grand_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Grand Total'),
+        ),
+        migrations.AddField(
+            model_name='returnorder',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Subtotal'),
+        ),
+        migrations.AddField(
+            model_name='returnorder',
+            name='tax_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Tax Total'),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Discount Total'),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='grand_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Grand Total'),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Subtotal'),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='tax_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=20, verbose_name='Tax Total'),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
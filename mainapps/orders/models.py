@@ -5,10 +5,12 @@ import sys
 from datetime import datetime
 from decimal import Decimal
 import uuid
+from django.core import checks
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import IntegrityError, models, transaction
-from django.db.models import F, Q
+from django.db.models import ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Round
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.fields import GenericForeignKey,GenericRelation
@@ -19,6 +21,7 @@ from mptt.models import TreeForeignKey
 from django.utils import timezone
 from mainapps.company.models import  Company, CompanyAddress, Contact 
 from mainapps.inventory.models import InventoryMixin 
+from subapps.services.sequence_allocator import SequenceAllocator, highest_suffix
 from subapps.utils.statuses import *
 from decimal import Decimal, ROUND_HALF_UP
 
@@ -116,6 +119,31 @@ class PurchaseOrderLineItem(UUIDBaseModel):
         return max(Decimal(str(self.quantity)) - Decimal(str(self.quantity_received)), Decimal("0"))
 
 
+_LINE_AMOUNT_FIELD = models.DecimalField(max_digits=30, decimal_places=10)
+
+
+def _rated_line_totals(quantity_field):
+    """Line total expressions for lines priced with percentage tax and discount rates."""
+    subtotal = ExpressionWrapper(F(quantity_field) * F('unit_price'), output_field=_LINE_AMOUNT_FIELD)
+    tax = ExpressionWrapper(subtotal * F('tax_rate') * Value(Decimal('0.01')), output_field=_LINE_AMOUNT_FIELD)
+    discount = ExpressionWrapper(subtotal * F('discount_rate') * Value(Decimal('0.01')), output_field=_LINE_AMOUNT_FIELD)
+    return {
+        'subtotal': subtotal,
+        'tax_total': tax,
+        'discount_total': discount,
+        # Each line's total_price is rounded to cents before the order sums them.
+        'grand_total': Round(subtotal + tax - discount, 2, output_field=_LINE_AMOUNT_FIELD),
+    }
+
+
+def line_total_aggregates(expressions):
+    """Aggregates for the stored order totals: each per-line expression summed and rounded to cents."""
+    return {
+        field: Coalesce(Round(Sum(expression), 2), Value(Decimal('0')), output_field=_LINE_AMOUNT_FIELD)
+        for field, expression in expressions.items()
+    }
+
+
 class TotalPriceMixin(UUIDBaseModel):
 
     """Mixin which provides 'total_price' field for an order."""
@@ -133,6 +161,50 @@ class TotalPriceMixin(UUIDBaseModel):
         null=True,
         verbose_name=_('Order Currency'),
     )
+    subtotal = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, editable=False, verbose_name=_('Subtotal')
+    )
+    tax_total = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, editable=False, verbose_name=_('Tax Total')
+    )
+    discount_total = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, editable=False, verbose_name=_('Discount Total')
+    )
+    grand_total = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, editable=False, verbose_name=_('Grand Total')
+    )
+
+    # Concrete orders define ``line_total_expressions()``: per-line expressions, keyed by total
+    # field, that ``refresh_totals`` sums over ``line_items``. The model check enforces it.
+
+    @classmethod
+    def check(cls, **kwargs):
+        errors = super().check(**kwargs)
+        if not callable(getattr(cls, 'line_total_expressions', None)):
+            errors.append(
+                checks.Error(
+                    f"{cls.__name__} must define line_total_expressions() for refresh_totals().",
+                    obj=cls,
+                    id='orders.E001',
+                )
+            )
+        return errors
+
+    @transaction.atomic
+    def refresh_totals(self):
+        """
+        Recompute the stored totals from the line items in one aggregate query and save them.
+
+        The order row is locked first, so concurrent refreshes run one after another and the
+        last one sums every committed line.
+        """
+        list(type(self).objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True))
+        totals = self.line_items.order_by().aggregate(**line_total_aggregates(self.line_total_expressions()))
+        type(self).objects.filter(pk=self.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(self, field, Decimal(value).quantize(Decimal('0.00')))
+        return totals
+
 
 class Order(ProfileMixin):
     """
@@ -234,28 +306,19 @@ class Order(ProfileMixin):
     
     
     def generate_reference(self, prefix:str,instance:models.Model):
-        """Atomically generate unique PO reference in PREFIX-YYYYMMDD-SEQ format"""
-        with transaction.atomic():
-            profile = self.profile_id if getattr(self, 'profile_id', None) is not None else self.profile
-            order = instance.objects.filter(
-                Q(profile_id=profile) | Q(profile=str(profile))
-            ).order_by('-created_at').first()
-
-            sequence=0
-            if order:
-                sequence = int(order.reference.split('-')[-1])
-            sequence +=1
-            date_str = timezone.now().strftime("%Y%m%d")
-            
-            
-            components = [
-                prefix.upper(),
-                str(profile),
-                date_str, 
-                f"{sequence:04d}"
-            ]
-            
-            return '-'.join(components)
+        """Generate a unique order reference in PREFIX-PROFILE-YYYYMMDD-SEQ format"""
+        profile = self.profile_id if getattr(self, 'profile_id', None) is not None else self.profile
+        date_str = SequenceAllocator.daily_period()
+        stem = '-'.join([prefix.upper(), str(profile), date_str])
+        sequence = SequenceAllocator.next_value(
+            profile,
+            prefix.upper(),
+            period=date_str,
+            seed=lambda: highest_suffix(
+                instance.objects.filter(reference__startswith=f"{stem}-").values_list('reference', flat=True)
+            ),
+        )
+        return f"{stem}-{sequence:04d}"
 
     def save(self, *args, **kwargs):
         _sync_identity_fields(self, canonical_field='responsible_user_id', legacy_field='responsible')
@@ -369,9 +432,14 @@ class PurchaseOrder(TotalPriceMixin, Order):
         """Dynamic total from line items"""
         total = sum(Decimal(str(item.total_price)) for item in self.line_items.all())
         return total
+
+    @classmethod
+    def line_total_expressions(cls):
+        return _rated_line_totals('quantity')
+
     @property
     def total_price(self):
-        return self.calculate_total()
+        return self.grand_total
     def save(self, *args, **kwargs):
         _sync_identity_fields(self, canonical_field='received_by_user_id', legacy_field='received_by')
         _sync_identity_fields(self, canonical_field='approved_by_user_id', legacy_field='approved_by')
@@ -406,9 +474,18 @@ class GoodsReceipt(ProfileMixin):
 
     def save(self, *args, **kwargs):
         if not self.reference:
-            timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
             profile_value = self.profile_id if getattr(self, 'profile_id', None) is not None else self.profile
-            self.reference = f"GR-{profile_value}-{timestamp}"
+            date_str = SequenceAllocator.daily_period()
+            stem = f"GR-{profile_value}-{date_str}"
+            sequence = SequenceAllocator.next_value(
+                profile_value,
+                "GR",
+                period=date_str,
+                seed=lambda: highest_suffix(
+                    GoodsReceipt.objects.filter(reference__startswith=f"{stem}-").values_list('reference', flat=True)
+                ),
+            )
+            self.reference = f"{stem}-{sequence:04d}"
         super().save(*args, **kwargs)
 
 
@@ -514,9 +591,13 @@ class SalesOrder(TotalPriceMixin, Order):
     def calculate_total(self):
         return sum(Decimal(str(item.total_price)) for item in self.line_items.all())
 
+    @classmethod
+    def line_total_expressions(cls):
+        return _rated_line_totals('quantity')
+
     @property
     def total_price(self):
-        return self.calculate_total()
+        return self.grand_total
 
     def save(self, *args, **kwargs):
         _sync_identity_fields(self, canonical_field='shipped_by_user_id', legacy_field='shipped_by')
@@ -693,13 +774,15 @@ class SalesOrderShipment(InventoryMixin):
     def save(self, *args, **kwargs):
         _sync_identity_fields(self, canonical_field='checked_by_user_id', legacy_field='checked_by')
         if self.order_id and not self.reference:
-            shipment_count = (
-                SalesOrderShipment.objects.filter(order=self.order)
-                .exclude(pk=self.pk)
-                .count()
-                + 1
+            stem = f"SHIP-{self.order.reference}"
+            shipment_number = SequenceAllocator.next_value(
+                self.order.profile_id if self.order.profile_id is not None else self.order.profile,
+                stem,
+                seed=lambda: highest_suffix(
+                    SalesOrderShipment.objects.filter(order=self.order).values_list('reference', flat=True)
+                ),
             )
-            self.reference = f"SHIP-{self.order.reference}-{shipment_count:03d}"
+            self.reference = f"{stem}-{shipment_number:03d}"
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -833,6 +916,21 @@ class ReturnOrder(TotalPriceMixin, Order):
         if not self.reference:
             self.reference = self.generate_reference("RO",ReturnOrder)
         return super().save(*args, **kwargs)
+
+    @classmethod
+    def line_total_expressions(cls):
+        # Return lines carry a discount amount and, like ReturnOrderLineItem.total_price, no tax.
+        subtotal = ExpressionWrapper(F('quantity_returned') * F('unit_price'), output_field=_LINE_AMOUNT_FIELD)
+        return {
+            'subtotal': subtotal,
+            'tax_total': Value(Decimal('0'), output_field=_LINE_AMOUNT_FIELD),
+            'discount_total': F('discount'),
+            'grand_total': ExpressionWrapper(subtotal - F('discount'), output_field=_LINE_AMOUNT_FIELD),
+        }
+
+    @property
+    def total_price(self):
+        return self.grand_total
     
    
 class ReturnOrderLineItem(UUIDBaseModel):
@@ -3,7 +3,7 @@
 from rest_framework import serializers
 from django.db.models import Count, Sum, Avg, F
 from decimal import Decimal
-from mainapps.content_type_linking_models.serializers import UserDetailMixin
+from mainapps.content_type_linking_models.serializers import UserDetailListSerializer, UserDetailMixin
 from mainapps.stock.models import StockItem
 from mainapps.inventory.models import Inventory, InventoryItem
 from mainapps.orders.models import (
@@ -99,7 +99,10 @@ class SalesOrderShipmentSerializer(UserDetailMixin, serializers.ModelSerializer)
     lines = SalesOrderShipmentLineSerializer(many=True, read_only=True)
     checked_by_details = serializers.SerializerMethodField()
 
+    user_reference_fields = (('checked_by_user_id', 'checked_by'),)
+
     class Meta:
+        list_serializer_class = UserDetailListSerializer
         model = SalesOrderShipment
         fields = [
             'id',
@@ -190,6 +193,8 @@ class SalesOrderDetailSerializer(UserDetailMixin, serializers.ModelSerializer):
     shipped_by_details = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
 
+    user_reference_fields = (('responsible_user_id', 'responsible'), ('shipped_by_user_id', 'shipped_by'))
+
     class Meta:
         model = SalesOrder
         fields = '__all__'
@@ -336,6 +341,8 @@ class PurchaseOrderDetailSerializer(UserDetailMixin, serializers.ModelSerializer
     total_price = serializers.SerializerMethodField()
     order_analytics = serializers.SerializerMethodField()
 
+    user_reference_fields = ('responsible', 'received_by')
+
     class Meta:
         model = PurchaseOrder
         fields = '__all__'
@@ -519,7 +526,7 @@ class ReturnOrderListSerializer(serializers.ModelSerializer):
         return obj.line_items.count()
 
     def get_total_price(self, obj):
-        return str(sum((line.total_price for line in obj.line_items.all()), Decimal('0.00')))
+        return str(obj.grand_total)
 
 
 class ReturnOrderDetailSerializer(UserDetailMixin, serializers.ModelSerializer):
@@ -528,6 +535,8 @@ class ReturnOrderDetailSerializer(UserDetailMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='purchase_order.supplier.name', read_only=True)
     responsible_details = serializers.SerializerMethodField()
 
+    user_reference_fields = (('responsible_user_id', 'responsible'),)
+
     class Meta:
         model = ReturnOrder
         fields = '__all__'
@@ -1,12 +1,32 @@
 import uuid
+from io import StringIO
+from datetime import timedelta
 from decimal import Decimal
 from unittest.mock import patch
 
-from django.test import SimpleTestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
+from mainapps.company.models import Company
 from mainapps.inventory.models import Inventory, InventoryItem
-from mainapps.orders.models import PurchaseOrder, PurchaseOrderLineItem, SalesOrder, SalesOrderLineItem
+from mainapps.orders.models import (
+    PurchaseOrder,
+    PurchaseOrderLineItem,
+    PurchaseOrderStatus,
+    ReturnOrder,
+    ReturnOrderLineItem,
+    SalesOrder,
+    SalesOrderLineItem,
+)
+from mainapps.orders.views import LineItemsViewset
 from mainapps.stock.models import StockItem
+from subapps.services.purchase_order_analytics import (
+    build_purchase_order_analytics,
+    get_cached_purchase_order_analytics,
+)
 
 
 class OrderLineItemLegacyBridgeTests(SimpleTestCase):
@@ -96,3 +116,161 @@ class OrderLineItemLegacyBridgeTests(SimpleTestCase):
 
         self.assertEqual(purchase_line.inventory_item_id, self.bridge_inventory_item.id)
         self.assertEqual(sales_line.inventory_item_id, self.bridge_inventory_item.id)
+
+
+class PurchaseOrderAnalyticsTests(TestCase):
+    def setUp(self):
+        self.acme = Company.objects.create(name="Acme Supplies", profile="1", profile_id=1)
+        self.globex = Company.objects.create(name="Globex", profile="1", profile_id=1)
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves")
+        today = timezone.now().date()
+        self.completed = self._order(
+            self.acme,
+            [(2, "10.00", "10", "0"), (1, "5.00", "0", "20")],
+            status=PurchaseOrderStatus.COMPLETED,
+            issue_date=timezone.now() - timedelta(days=6),
+            delivery_date=today,
+            received_date=today - timedelta(days=2),
+            complete_date=timezone.now(),
+        )
+        self._order(self.globex, [(3, "1.50", "0", "0")], status=PurchaseOrderStatus.PENDING)
+        self._order(self.globex, [], status=PurchaseOrderStatus.CANCELLED)
+        self._order(self.acme, [(1, "99.00", "0", "0")], profile_id=2)
+
+    def _order(self, supplier, lines, profile_id=1, **fields):
+        purchase_order = PurchaseOrder.objects.create(profile_id=profile_id, supplier=supplier, **fields)
+        for quantity, unit_price, tax_rate, discount_rate in lines:
+            PurchaseOrderLineItem.objects.create(
+                purchase_order=purchase_order,
+                inventory_item=self.inventory_item,
+                quantity=quantity,
+                unit_price=Decimal(unit_price),
+                tax_rate=Decimal(tax_rate),
+                discount_rate=Decimal(discount_rate),
+            )
+        purchase_order.refresh_totals()
+        return purchase_order
+
+    def test_analytics_come_from_grouped_aggregates(self):
+        purchase_orders = PurchaseOrder.objects.filter(profile_id=1)
+        with CaptureQueriesContext(connection) as queries:
+            analytics = build_purchase_order_analytics(purchase_orders)
+
+        self.assertLessEqual(len(queries), 10)
+        self.assertEqual(analytics["total_purchase_orders"], 3)
+        self.assertEqual(analytics["status_distribution"]["completed"], 1)
+        self.assertEqual(analytics["cancelled_orders"], 1)
+        # 2 x 10.00 + 10% tax, then 1 x 5.00 less 20%, then 3 x 1.50.
+        self.assertEqual(analytics["total_order_value"], Decimal("30.50"))
+        self.assertEqual(analytics["average_order_value"], Decimal("15.25"))
+        self.assertEqual(analytics["monthly_trends"][0]["month"], timezone.now().strftime("%Y-%m"))
+        self.assertEqual(analytics["monthly_trends"][0]["count"], 3)
+        self.assertEqual(analytics["monthly_trends"][0]["total_value"], Decimal("30.50"))
+        self.assertEqual(len(analytics["weekly_trends"]), 8)
+        self.assertEqual(sum(week["count"] for week in analytics["weekly_trends"]), 3)
+
+        suppliers = analytics["supplier_performance"]
+        self.assertEqual([supplier["supplier__name"] for supplier in suppliers], ["Acme Supplies", "Globex"])
+        self.assertEqual(suppliers[0]["total_value"], Decimal("26.00"))
+        self.assertEqual(suppliers[0]["avg_delivery_time"], timedelta(days=6))
+        self.assertEqual(suppliers[0]["on_time_deliveries"], 1)
+        self.assertEqual(analytics["top_suppliers_by_value"][1]["order_count"], 2)
+        self.assertEqual(analytics["average_delivery_time"], 4)
+        self.assertEqual(analytics["on_time_delivery_rate"], 100.0)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cached_analytics_are_refreshed_when_an_order_changes(self):
+        def analytics():
+            return get_cached_purchase_order_analytics(
+                PurchaseOrder.objects.filter(profile_id=1), profile_id=1, filters={}
+            )
+
+        self.assertEqual(analytics()["pending_orders"], 1)
+        with self.assertNumQueries(2):
+            analytics()
+
+        self.completed.status = PurchaseOrderStatus.PENDING
+        self.completed.save()
+        self.assertEqual(analytics()["pending_orders"], 2)
+
+
+class OrderTotalsTests(TestCase):
+    def setUp(self):
+        self.supplier = Company.objects.create(name="Acme Supplies", profile="1", profile_id=1)
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves")
+        self.purchase_order = PurchaseOrder.objects.create(profile_id=1, supplier=self.supplier)
+        self.first_line = self._line("2", "10.00", "10", "0")
+        self.second_line = self._line("1", "5.00", "0", "20")
+
+    def _line(self, quantity, unit_price, tax_rate, discount_rate):
+        return PurchaseOrderLineItem.objects.create(
+            purchase_order=self.purchase_order,
+            inventory_item=self.inventory_item,
+            quantity=Decimal(quantity),
+            unit_price=Decimal(unit_price),
+            tax_rate=Decimal(tax_rate),
+            discount_rate=Decimal(discount_rate),
+        )
+
+    def test_refresh_totals_persists_one_aggregate_over_the_lines(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.purchase_order.refresh_totals()
+
+        statements = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        # The order lock, the aggregate over the lines and the update.
+        self.assertEqual(len(statements), 3)
+
+        stored = PurchaseOrder.objects.get(pk=self.purchase_order.pk)
+        self.assertEqual(stored.subtotal, Decimal("25.00"))
+        self.assertEqual(stored.tax_total, Decimal("2.00"))
+        self.assertEqual(stored.discount_total, Decimal("1.00"))
+        self.assertEqual(stored.grand_total, Decimal("26.00"))
+        self.assertEqual(stored.total_price, stored.calculate_total())
+        self.assertEqual(
+            PurchaseOrder.objects.filter(grand_total__gte=Decimal("26.00")).get().pk, self.purchase_order.pk
+        )
+
+    def test_line_item_viewset_keeps_the_order_totals_current(self):
+        viewset = LineItemsViewset()
+        viewset.perform_destroy(self.second_line)
+        self.assertEqual(PurchaseOrder.objects.get(pk=self.purchase_order.pk).grand_total, Decimal("22.00"))
+
+        viewset.perform_destroy(self.first_line)
+        self.assertEqual(PurchaseOrder.objects.get(pk=self.purchase_order.pk).grand_total, Decimal("0.00"))
+
+    def test_backfill_command_recomputes_every_order_type(self):
+        self.purchase_order.status = PurchaseOrderStatus.RECEIVED
+        self.purchase_order.save()
+        self.first_line.quantity_received = Decimal("2")
+        self.first_line.save()
+        return_order = ReturnOrder.objects.create(profile_id=1, purchase_order=self.purchase_order)
+        ReturnOrderLineItem.objects.create(
+            return_order=return_order,
+            original_line_item=self.first_line,
+            quantity_returned=Decimal("2"),
+            unit_price=Decimal("10.00"),
+            discount=Decimal("1.50"),
+        )
+        sales_order = SalesOrder.objects.create(profile_id=1)
+
+        call_command("backfill_order_totals", "--profile-id", "1", "--batch-size", "1", stdout=StringIO())
+
+        self.assertEqual(PurchaseOrder.objects.get(pk=self.purchase_order.pk).grand_total, Decimal("26.00"))
+        return_order = ReturnOrder.objects.get(pk=return_order.pk)
+        self.assertEqual(return_order.subtotal, Decimal("20.00"))
+        self.assertEqual(return_order.discount_total, Decimal("1.50"))
+        self.assertEqual(return_order.grand_total, Decimal("18.50"))
+        self.assertEqual(SalesOrder.objects.get(pk=sales_order.pk).grand_total, Decimal("0.00"))
+
+
+class OrderReferenceTests(TestCase):
+    def test_references_continue_from_existing_orders_of_the_day(self):
+        supplier = Company.objects.create(name="Acme Supplies", profile="1", profile_id=1)
+        stem = f"PO-1-{timezone.now():%Y%m%d}"
+        PurchaseOrder.objects.create(profile_id=1, supplier=supplier, reference=f"{stem}-0041")
+
+        references = [PurchaseOrder.objects.create(profile_id=1, supplier=supplier).reference for _ in range(2)]
+        other_tenant = PurchaseOrder.objects.create(profile_id=2, supplier=supplier).reference
+
+        self.assertEqual(references, [f"{stem}-0042", f"{stem}-0043"])
+        self.assertEqual(other_tenant, f"PO-2-{timezone.now():%Y%m%d}-0001")
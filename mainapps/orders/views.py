@@ -3,7 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Sum, Count, Avg, F, Case, When, Value, IntegerField, DecimalField
+from django.db.models import Q, Sum, F
 from django.db import transaction
 from django.http import HttpResponse
 from django.utils import timezone
@@ -41,10 +41,21 @@ from mainapps.stock.models import (
     StockSerial,
 )
 from subapps.permissions.constants import PURCHASE_ORDER_PERMISSIONS, UNIFIED_PERMISSION_DICT
-from subapps.permissions.microservice_permissions import BaseCachePermissionViewset, HasModelRequestPermission, PermissionRequiredMixin
+from subapps.permissions.microservice_permissions import (
+    BaseCachePermissionViewset,
+    HasModelRequestPermission,
+    PermissionRequiredMixin,
+    cache_response,
+)
 from subapps.services.emails.email_services import EmailService
 from subapps.services.pdf.pdf_service import PDFService
+from subapps.services.purchase_order_analytics import (
+    build_purchase_order_analytics,
+    get_cached_purchase_order_analytics,
+    get_purchase_order_value,
+)
 from subapps.services.identity_directory import IdentityDirectory
+from subapps.services.response_cache import PURCHASE_ORDER_CACHE_SCOPE, invalidate_cached_responses_on_commit
 from subapps.services.stock_domain import StockDomainError, StockDomainService
 from subapps.utils.request_context import (
     get_request_profile_id,
@@ -67,11 +78,19 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
     required_permission = UNIFIED_PERMISSION_DICT.get('purchase_order')
 
     queryset = PurchaseOrder.objects.select_related('supplier', 'contact', 'address').prefetch_related('line_items')
+    CACHE_ENABLED = True
     # permission_classes = [IsAuthenticated, HasModelRequestPermission]
     
-    filterset_fields = ['status', 'supplier', 'issue_date', 'delivery_date']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {
+        'status': ['exact'],
+        'supplier': ['exact'],
+        'issue_date': ['exact'],
+        'delivery_date': ['exact'],
+        'grand_total': ['exact', 'gte', 'lte'],
+    }
     search_fields = ['reference', 'description', 'supplier_reference', 'supplier__name']
-    ordering_fields = ['reference', 'issue_date', 'delivery_date', 'created_at']
+    ordering_fields = ['reference', 'issue_date', 'delivery_date', 'created_at', 'grand_total']
     ordering = ['-created_at']
     
     def get_serializer_class(self):
@@ -180,6 +199,7 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
             line_item = serializer.save(purchase_order=purchase_order)
             
             # Recalculate order total
+            purchase_order.refresh_totals()
             
             # Log activity
             # self._log_activity('ADD_LINE_ITEM', purchase_order, {
@@ -234,6 +254,7 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
             serializer.save()
             
             # Recalculate order total
+            purchase_order.refresh_totals()
             
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -268,6 +289,7 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
         line_item.delete()
         
         # Recalculate order total
+        purchase_order.refresh_totals()
         
         # Log activity
         self._log_activity('REMOVE_LINE_ITEM', purchase_order, {
@@ -418,6 +440,7 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
         current_user = IdentityDirectory.get_current_user(request) or {}
         current_user_id = get_request_user_id(request, as_str=False)
         profile_id = get_request_profile_id(request, required=True, as_str=False)
+        bulk_mode = str(request.data.get('mode') or request.query_params.get('mode') or '').lower() == 'bulk'
         
         try:
             with transaction.atomic():
@@ -427,41 +450,51 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
                     notes=request.data.get('notes', ''),
                 )
                 received_count = 0
-                
-                for item_data in received_items:
-                    line_item_id = item_data['line_item_id']
-                    quantity_received = item_data['quantity_received']
-                    location_id = item_data['location_id']
-                    
-                    # Get line item
-                    try:
-                        line_item = purchase_order.line_items.get(id=line_item_id)
-                    except PurchaseOrderLineItem.DoesNotExist:
-                        raise ValueError(f"Line item {line_item_id} not found")
-                    stock_location = scope_queryset_by_identity(
-                        StockLocation.objects.filter(id=location_id),
-                        canonical_field='profile_id',
-                        legacy_field='profile',
-                        value=profile_id,
-                    ).first()
-                    if stock_location is None:
-                        raise ValueError(f"Stock location {location_id} not found")
 
-                    StockDomainService.receive_purchase_line(
+                if bulk_mode:
+                    received_count = self._receive_items_bulk(
                         purchase_order=purchase_order,
-                        line_item=line_item,
-                        stock_location=stock_location,
-                        quantity_received=quantity_received,
-                        actor_user_id=current_user_id,
+                        received_items=received_items,
                         goods_receipt=goods_receipt,
-                        lot_number=item_data.get('lot_number', ''),
-                        manufactured_date=item_data.get('manufactured_date'),
-                        expiry_date=item_data.get('expiry_date'),
-                        serial_numbers=item_data.get('serial_numbers'),
-                        notes=item_data.get('notes') or request.data.get('notes', ''),
+                        profile_id=profile_id,
+                        actor_user_id=current_user_id,
+                        notes=request.data.get('notes', ''),
                     )
-                    
-                    received_count += 1
+                else:
+                    for item_data in received_items:
+                        line_item_id = item_data['line_item_id']
+                        quantity_received = item_data['quantity_received']
+                        location_id = item_data['location_id']
+
+                        # Get line item
+                        try:
+                            line_item = purchase_order.line_items.get(id=line_item_id)
+                        except PurchaseOrderLineItem.DoesNotExist:
+                            raise ValueError(f"Line item {line_item_id} not found")
+                        stock_location = scope_queryset_by_identity(
+                            StockLocation.objects.filter(id=location_id),
+                            canonical_field='profile_id',
+                            legacy_field='profile',
+                            value=profile_id,
+                        ).first()
+                        if stock_location is None:
+                            raise ValueError(f"Stock location {location_id} not found")
+
+                        StockDomainService.receive_purchase_line(
+                            purchase_order=purchase_order,
+                            line_item=line_item,
+                            stock_location=stock_location,
+                            quantity_received=quantity_received,
+                            actor_user_id=current_user_id,
+                            goods_receipt=goods_receipt,
+                            lot_number=item_data.get('lot_number', ''),
+                            manufactured_date=item_data.get('manufactured_date'),
+                            expiry_date=item_data.get('expiry_date'),
+                            serial_numbers=item_data.get('serial_numbers'),
+                            notes=item_data.get('notes') or request.data.get('notes', ''),
+                        )
+
+                        received_count += 1
                 
                 # Update order status if not already received
                 if purchase_order.status == PurchaseOrderStatus.ISSUED:
@@ -497,6 +530,53 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    def _receive_items_bulk(self, *, purchase_order, received_items, goods_receipt, profile_id, actor_user_id, notes=''):
+        """Resolve all line items and locations up front and receive them in one stock-domain call."""
+        line_items = {
+            str(line_item.id): line_item
+            for line_item in purchase_order.line_items.select_related(
+                'inventory_item',
+                'stock_item__inventory',
+            ).filter(id__in=[item_data['line_item_id'] for item_data in received_items])
+        }
+        stock_locations = {
+            str(stock_location.id): stock_location
+            for stock_location in scope_queryset_by_identity(
+                StockLocation.objects.filter(id__in=[item_data['location_id'] for item_data in received_items]),
+                canonical_field='profile_id',
+                legacy_field='profile',
+                value=profile_id,
+            )
+        }
+
+        lines = []
+        for item_data in received_items:
+            line_item = line_items.get(str(item_data['line_item_id']))
+            if line_item is None:
+                raise ValueError(f"Line item {item_data['line_item_id']} not found")
+            stock_location = stock_locations.get(str(item_data['location_id']))
+            if stock_location is None:
+                raise ValueError(f"Stock location {item_data['location_id']} not found")
+            lines.append({
+                'line_item': line_item,
+                'stock_location': stock_location,
+                'quantity_received': item_data['quantity_received'],
+                'lot_number': item_data.get('lot_number', ''),
+                'manufactured_date': item_data.get('manufactured_date'),
+                'expiry_date': item_data.get('expiry_date'),
+                'serial_numbers': item_data.get('serial_numbers'),
+                'notes': item_data.get('notes') or notes,
+            })
+
+        StockDomainService.receive_purchase_lines_bulk(
+            purchase_order=purchase_order,
+            lines=lines,
+            actor_user_id=actor_user_id,
+            goods_receipt=goods_receipt,
+            notes=notes,
+        )
+        return len(lines)
+
     @action(detail=True, methods=['put', 'patch'])
     def complete(self, request, pk=None):
         """Mark purchase order as complete and finalize stock"""
@@ -634,6 +714,7 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
                         discount=line_item.discount,
                         return_reason=item.get('reason', '')
                     )
+                return_order.refresh_totals()
                 
                 # Send notifications if requested
                 try:
@@ -667,76 +748,21 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
     def analytics(self, request):
         """Get comprehensive purchase order analytics"""
         queryset = self.get_queryset()
-        
-        # Basic metrics
-        total_orders = queryset.count()
-        
-        # Status distribution
-        status_counts = queryset.aggregate(
-            pending=Count(Case(When(status=PurchaseOrderStatus.PENDING, then=1))),
-            approved=Count(Case(When(status=PurchaseOrderStatus.APPROVED, then=1))),
-            issued=Count(Case(When(status=PurchaseOrderStatus.ISSUED, then=1))),
-            received=Count(Case(When(status=PurchaseOrderStatus.RECEIVED, then=1))),
-            completed=Count(Case(When(status=PurchaseOrderStatus.COMPLETED, then=1))),
-            cancelled=Count(Case(When(status=PurchaseOrderStatus.CANCELLED, then=1)))
-        )
-        
-        # Financial metrics
-        # Annotate each PO with its calculated total price from its line items
-        annotated_queryset = queryset.annotate(
-            calculated_total=Sum(
-                F('line_items__quantity') * F('line_items__unit_price'),
-                output_field=DecimalField()
+        profile_id = get_request_profile_id(request, as_str=False)
+        if profile_id:
+            analytics_data = get_cached_purchase_order_analytics(
+                queryset,
+                profile_id=profile_id,
+                filters=request.query_params.dict(),
             )
-        )
-
-        # Aggregate the annotated values
-        financial_metrics = annotated_queryset.aggregate(
-            total_value=Sum('calculated_total', default=Decimal('0')),
-            average_value=Avg('calculated_total', default=Decimal('0'))
-        )
+        else:
+            analytics_data = build_purchase_order_analytics(queryset)
 
-        total_value = financial_metrics['total_value'] or Decimal('0')
-        average_value = financial_metrics['average_value'] or Decimal('0')
-        
-        # Time-based analytics
-        monthly_trends = self._get_monthly_trends(queryset)
-        weekly_trends = self._get_weekly_trends(queryset)
-        
-        # Supplier analytics
-        supplier_performance = self._get_supplier_performance(queryset,)
-        top_suppliers = self._get_top_suppliers_by_value(queryset)
-        
-        # Performance metrics
-        performance_metrics = self._get_performance_metrics(queryset)
-        
-        analytics_data = {
-            'total_purchase_orders': total_orders,
-            'pending_orders': status_counts['pending'],
-            'approved_orders': status_counts['approved'],
-            'issued_orders': status_counts['issued'],
-            'received_orders': status_counts['received'],
-            'completed_orders': status_counts['completed'],
-            'cancelled_orders': status_counts['cancelled'],
-            
-            'total_order_value': total_value,
-            'average_order_value': average_value,
-            
-            'monthly_trends': monthly_trends,
-            'weekly_trends': weekly_trends,
-            
-            'supplier_performance': supplier_performance,
-            'top_suppliers_by_value': top_suppliers,
-            
-            'status_distribution': status_counts,
-            
-            **performance_metrics
-        }
-        
         serializer = PurchaseOrderAnalyticsSerializer(analytics_data)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response
     def dashboard_summary(self, request):
         """Get dashboard summary for purchase orders"""
         queryset = self.get_queryset()
@@ -755,203 +781,13 @@ class PurchaseOrderViewSet(BaseCachePermissionViewset):
             ).count(),
             'orders_this_week': queryset.filter(created_at__gte=week_ago).count(),
             'orders_this_month': queryset.filter(created_at__gte=month_ago).count(),
-            'total_value_this_month': sum(obj.total_price for obj in queryset.filter(created_at__gte=month_ago))
+            'total_value_this_month': get_purchase_order_value(queryset.filter(created_at__gte=month_ago))
         }
         
         return Response(summary)
     
     # ==================== HELPER METHODS ====================
     
-    def _get_monthly_trends(self, queryset):
-        """Get monthly trends for the last 12 months"""
-        trends = []
-        for i in range(12):
-            month_start = timezone.now().replace(day=1) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=30)
-            
-            # month_data = queryset.filter(
-            #     created_at__gte=month_start,
-            #     created_at__lt=month_end
-            # ).aggregate(
-            #     count=Count('id'),
-            #     total_value=Sum('total_price')
-            # )
-            
-            qs = queryset.filter(
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            )
-            month_data = {
-                "count": qs.count(),
-                "total_value": sum(obj.total_price for obj in qs)
-            }
-            trends.append({
-                'month': month_start.strftime('%Y-%m'),
-                'count': month_data['count'],
-                'total_value': month_data.get('total_value', 0)
-            })
-        
-        return trends
-    
-    def _get_weekly_trends(self, queryset):
-        """Get weekly trends for the last 8 weeks"""
-        trends = []
-        for i in range(8):
-            week_start = timezone.now().date() - timedelta(days=7*i)
-            week_end = week_start + timedelta(days=7)
-            
-            qs = queryset.filter(
-                created_at__date__gte=week_start,
-                created_at__date__lt=week_end
-            )
-            
-            trends.append({
-                'week': week_start.strftime('%Y-W%U'),
-                'count': qs.count(),
-                'total_value': sum(obj.total_price for obj in qs)
-            })
-        
-        return trends
-    
-    def _get_supplier_performance(self, queryset, month_start=None, month_end=None):
-        """Get supplier performance metrics (Python-side aggregation)."""
-        if month_start and month_end:
-            qs = queryset.filter(
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).prefetch_related("line_items", "supplier")
-        else:
-            qs = queryset.prefetch_related("line_items", "supplier")
-        data = {}
-
-        for order in qs:
-            supplier = order.supplier.name
-
-            if supplier not in data:
-                data[supplier] = {
-                    "supplier__name": supplier,
-                    "order_count": 0,
-                    "total_value": Decimal("0"),
-                    "avg_delivery_time": [],
-                    "on_time_deliveries": 0,
-                }
-
-            d = data[supplier]
-
-            # count orders
-            d["order_count"] += 1
-
-            # sum using your @property total_price
-            d["total_value"] += order.total_price
-
-            # delivery time calculation
-            if order.delivery_date and order.issue_date:
-                d["avg_delivery_time"].append(order.delivery_date - order.issue_date)
-
-            # on-time deliveries
-            if order.received_date and order.delivery_date and order.received_date <= order.delivery_date:
-                d["on_time_deliveries"] += 1
-
-        # finalize averages
-        for supplier, d in data.items():
-            if d["avg_delivery_time"]:
-                d["avg_delivery_time"] = sum(d["avg_delivery_time"], timedelta(0)) / len(d["avg_delivery_time"])
-            else:
-                d["avg_delivery_time"] = timedelta(0)
-
-        # convert dict to list and sort
-        supplier_performance = sorted(
-            data.values(),
-            key=lambda x: x["total_value"],
-            reverse=True
-        )[:10]
-
-        return supplier_performance
-
-
-    def _get_top_suppliers_by_value(self, queryset, month_start=None, month_end=None):
-        """Get top suppliers by total order value (Python-side aggregation)."""
-
-        qs = queryset
-        if month_start and month_end:
-            qs = qs.filter(created_at__gte=month_start, created_at__lt=month_end)
-
-        qs = qs.prefetch_related("line_items", "supplier")
-
-        data = {}
-
-        for order in qs:
-            supplier_id = order.supplier.id
-            supplier_name = order.supplier.name
-
-            if supplier_id not in data:
-                data[supplier_id] = {
-                    "supplier__id": supplier_id,
-                    "supplier__name": supplier_name,
-                    "order_count": 0,
-                    "total_value": Decimal("0"),
-                }
-
-            d = data[supplier_id]
-
-            # count orders
-            d["order_count"] += 1
-
-            # add total value using your @property
-            d["total_value"] += order.total_price
-
-        # convert dict to list and sort by total_value
-        top_suppliers = sorted(
-            data.values(),
-            key=lambda x: x["total_value"],
-            reverse=True
-        )[:5]
-
-        return top_suppliers
-
-    def _get_performance_metrics(self, queryset):
-        """Calculate performance metrics (Python-side for total_price)."""
-
-        completed_orders = queryset.filter(status=PurchaseOrderStatus.COMPLETED).prefetch_related("line_items")
-
-        # Average processing time (from creation to completion)
-        processing_deltas = [
-            (o.complete_date - o.created_at)
-            for o in completed_orders
-            if o.complete_date and o.created_at
-        ]
-        avg_processing_time = sum(processing_deltas, timedelta(0)) / len(processing_deltas) if processing_deltas else timedelta(0)
-
-        # Average delivery time (from issue to delivery)
-        delivery_deltas = [
-            (o.received_date - o.issue_date)
-            for o in completed_orders
-            if o.received_date and o.issue_date
-        ]
-        avg_delivery_time = sum(delivery_deltas, timedelta(0)) / len(delivery_deltas) if delivery_deltas else timedelta(0)
-
-        # On-time delivery rate
-        total_delivered = sum(1 for o in completed_orders if o.received_date and o.delivery_date)
-        on_time_delivered = sum(1 for o in completed_orders if o.received_date and o.delivery_date and o.received_date <= o.delivery_date)
-        on_time_rate = (on_time_delivered / total_delivered * 100) if total_delivered > 0 else 0
-
-        # Financial metrics (Python side using your @property)
-        all_orders = queryset.prefetch_related("line_items")
-        total_value = sum(o.total_price for o in all_orders)
-        order_count = all_orders.count()
-
-        avg_cost_per_order = (total_value / order_count) if order_count > 0 else Decimal("0.00")
-
-        total_savings = Decimal("0.00")  # still placeholder until you define business logic
-
-        return {
-            "average_processing_time": avg_processing_time.days if avg_processing_time else 0,
-            "average_delivery_time": avg_delivery_time.days if avg_delivery_time else 0,
-            "on_time_delivery_rate": round(on_time_rate, 2),
-            "total_savings": total_savings,
-            "cost_per_order": avg_cost_per_order,
-        }
-
     def _log_activity(self, action, instance, details):
         """Log user activity for audit trail"""
         try:
@@ -1144,9 +980,17 @@ class SalesOrderViewSet(BaseCachePermissionViewset):
         'shipments__lines__stock_serial',
         'shipments__lines__reservation',
     )
-    filterset_fields = ['status', 'customer', 'issue_date', 'shipment_date', 'delivery_date']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {
+        'status': ['exact'],
+        'customer': ['exact'],
+        'issue_date': ['exact'],
+        'shipment_date': ['exact'],
+        'delivery_date': ['exact'],
+        'grand_total': ['exact', 'gte', 'lte'],
+    }
     search_fields = ['reference', 'description', 'customer_reference', 'customer__name']
-    ordering_fields = ['reference', 'issue_date', 'delivery_date', 'created_at']
+    ordering_fields = ['reference', 'issue_date', 'delivery_date', 'created_at', 'grand_total']
     ordering = ['-created_at']
 
     def get_queryset(self):
@@ -1217,6 +1061,7 @@ class SalesOrderViewSet(BaseCachePermissionViewset):
         serializer = SalesOrderLineItemCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         line_item = serializer.save(sales_order=sales_order)
+        sales_order.refresh_totals()
         self._log_activity('ADD_LINE_ITEM', sales_order, {'line_item_id': str(line_item.id)})
         return Response(SalesOrderLineItemSerializer(line_item).data, status=status.HTTP_201_CREATED)
 
@@ -1241,6 +1086,7 @@ class SalesOrderViewSet(BaseCachePermissionViewset):
         serializer = SalesOrderLineItemCreateSerializer(line_item, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         line_item = serializer.save()
+        sales_order.refresh_totals()
         self._log_activity('UPDATE_LINE_ITEM', sales_order, {'line_item_id': str(line_item.id)})
         return Response(SalesOrderLineItemSerializer(line_item).data)
 
@@ -1269,6 +1115,7 @@ class SalesOrderViewSet(BaseCachePermissionViewset):
             )
 
         line_item.delete()
+        sales_order.refresh_totals()
         self._log_activity('REMOVE_LINE_ITEM', sales_order, {'line_item_id': str(line_item_id)})
         return Response({'message': 'Line item removed successfully'})
 
@@ -1289,64 +1136,108 @@ class SalesOrderViewSet(BaseCachePermissionViewset):
 
         try:
             with transaction.atomic():
-                reservations = []
-                for item in payload['reservation_items']:
-                    line_item = sales_order.line_items.select_related('inventory').get(id=item['line_item_id'])
+                reservation_items = payload['reservation_items']
+                line_items = {
+                    str(line_item.id): line_item
+                    for line_item in sales_order.line_items.select_related('inventory', 'inventory_item').filter(
+                        id__in=[item['line_item_id'] for item in reservation_items]
+                    )
+                }
+                stock_locations = {
+                    str(stock_location.id): stock_location
+                    for stock_location in scope_queryset_by_identity(
+                        StockLocation.objects.filter(id__in=[item['location_id'] for item in reservation_items]),
+                        canonical_field='profile_id',
+                        legacy_field='profile',
+                        value=profile_id,
+                    )
+                }
+                stock_lots = {
+                    str(stock_lot.id): stock_lot
+                    for stock_lot in StockLot.objects.filter(
+                        profile_id=profile_id,
+                        id__in=[item['stock_lot_id'] for item in reservation_items if item.get('stock_lot_id')],
+                    )
+                }
+                stock_serials = {
+                    str(stock_serial.id): stock_serial
+                    for stock_serial in StockSerial.objects.filter(
+                        profile_id=profile_id,
+                        id__in=[item['stock_serial_id'] for item in reservation_items if item.get('stock_serial_id')],
+                    )
+                }
+
+                lines = []
+                reserved_by_line = {}
+                for item in reservation_items:
+                    line_item = line_items.get(str(item['line_item_id']))
+                    if line_item is None:
+                        raise SalesOrderLineItem.DoesNotExist
+                    reservable_quantity = line_item.reservable_quantity - reserved_by_line.get(line_item.id, Decimal('0'))
                     default_reserve_quantity = (
                         Decimal('1')
                         if item.get('stock_serial_id') or item.get('serial_number')
-                        else line_item.reservable_quantity
+                        else reservable_quantity
                     )
                     reserve_quantity = Decimal(str(item.get('quantity', default_reserve_quantity)))
                     if reserve_quantity <= 0:
                         raise ValueError("Reservation quantity must be greater than zero")
-                    if reserve_quantity > line_item.reservable_quantity:
+                    if reserve_quantity > reservable_quantity:
                         raise ValueError(
-                            f"Cannot reserve {reserve_quantity}; only {line_item.reservable_quantity} remains reservable"
+                            f"Cannot reserve {reserve_quantity}; only {reservable_quantity} remains reservable"
                         )
 
-                    stock_location = scope_queryset_by_identity(
-                        StockLocation.objects.filter(id=item['location_id']),
-                        canonical_field='profile_id',
-                        legacy_field='profile',
-                        value=profile_id,
-                    ).first()
+                    stock_location = stock_locations.get(str(item['location_id']))
                     if stock_location is None:
                         raise ValueError(f"Stock location {item['location_id']} not found")
 
                     stock_lot = None
                     stock_lot_id = item.get('stock_lot_id')
                     if stock_lot_id:
-                        stock_lot = StockLot.objects.filter(profile_id=profile_id, id=stock_lot_id).first()
+                        stock_lot = stock_lots.get(str(stock_lot_id))
                         if stock_lot is None:
                             raise ValueError(f"Stock lot {stock_lot_id} not found")
 
                     stock_serial = None
                     stock_serial_id = item.get('stock_serial_id')
                     if stock_serial_id:
-                        stock_serial = StockSerial.objects.filter(profile_id=profile_id, id=stock_serial_id).first()
+                        stock_serial = stock_serials.get(str(stock_serial_id))
                         if stock_serial is None:
                             raise ValueError(f"Stock serial {stock_serial_id} not found")
 
-                    reservation_result = StockDomainService.reserve_stock(
-                        inventory=line_item.inventory,
-                        inventory_item=line_item.inventory_item,
-                        stock_location=stock_location,
-                        quantity=reserve_quantity,
-                        external_order_type='sales_order_line',
-                        external_order_id=str(sales_order.id),
-                        external_order_line_id=str(line_item.id),
-                        actor_user_id=current_user_id,
-                        stock_lot=stock_lot,
-                        stock_serial=stock_serial,
-                        serial_number=item.get('serial_number', ''),
-                        expires_at=payload.get('expires_at'),
-                        notes=item.get('notes') or payload.get('notes', '') or f"Reserved for sales order {sales_order.reference}",
-                    )
-                    line_item.reserved_quantity = Decimal(str(line_item.reserved_quantity)) + reserve_quantity
+                    reserved_by_line[line_item.id] = reserved_by_line.get(line_item.id, Decimal('0')) + reserve_quantity
+                    lines.append({
+                        'inventory': line_item.inventory,
+                        'inventory_item': line_item.inventory_item,
+                        'stock_location': stock_location,
+                        'quantity': reserve_quantity,
+                        'external_order_type': 'sales_order_line',
+                        'external_order_id': str(sales_order.id),
+                        'external_order_line_id': str(line_item.id),
+                        'stock_lot': stock_lot,
+                        'stock_serial': stock_serial,
+                        'serial_number': item.get('serial_number', ''),
+                        'notes': item.get('notes') or payload.get('notes', '') or f"Reserved for sales order {sales_order.reference}",
+                    })
+
+                batch_result = StockDomainService.reserve_stock_batch(
+                    lines=lines,
+                    actor_user_id=current_user_id,
+                    expires_at=payload.get('expires_at'),
+                )
+                reservations = [str(reservation.id) for reservation in batch_result['reservations']]
+
+                updated_line_items = []
+                for line_item_id, reserved_quantity in reserved_by_line.items():
+                    line_item = line_items[str(line_item_id)]
+                    line_item.reserved_quantity = Decimal(str(line_item.reserved_quantity)) + reserved_quantity
                     line_item.updated_by_user_id = current_user_id
-                    line_item.save()
-                    reservations.append(str(reservation_result['reservation'].id))
+                    line_item.updated_at = timezone.now()
+                    updated_line_items.append(line_item)
+                SalesOrderLineItem.objects.bulk_update(
+                    updated_line_items,
+                    ['reserved_quantity', 'updated_by_user_id', 'updated_at'],
+                )
 
                 if sales_order.status == SalesOrderStatus.PENDING:
                     sales_order.status = SalesOrderStatus.IN_PROGRESS
@@ -1755,9 +1646,14 @@ class ReturnOrderViewSet(BaseCachePermissionViewset):
         'line_items__original_line_item__inventory_item',
         'line_items__original_line_item__stock_item',
     )
-    filterset_fields = ['status', 'purchase_order']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {
+        'status': ['exact'],
+        'purchase_order': ['exact'],
+        'grand_total': ['exact', 'gte', 'lte'],
+    }
     search_fields = ['reference', 'purchase_order__reference']
-    ordering_fields = ['reference', 'created_at', 'issue_date', 'complete_date']
+    ordering_fields = ['reference', 'created_at', 'issue_date', 'complete_date', 'grand_total']
     ordering = ['-created_at']
     http_method_names = ['get', 'post', 'head', 'options']
 
@@ -1971,4 +1867,26 @@ class LineItemsViewset(HasModelRequestPermission,viewsets.ModelViewSet):
     queryset=PurchaseOrderLineItem.objects.all()
     serializer_class=PurchaseOrderLineItemSerializer
 
+    def perform_create(self, serializer):
+        line_item = serializer.save()
+        self._order_changed(line_item.purchase_order)
+
+    def perform_update(self, serializer):
+        previous_order_id = serializer.instance.purchase_order_id
+        line_item = serializer.save()
+        self._order_changed(line_item.purchase_order)
+        if previous_order_id != line_item.purchase_order_id:
+            self._order_changed(PurchaseOrder.objects.get(pk=previous_order_id))
+
+    def perform_destroy(self, instance):
+        purchase_order = instance.purchase_order
+        instance.delete()
+        self._order_changed(purchase_order)
+
+    def _order_changed(self, purchase_order):
+        purchase_order.refresh_totals()
+        invalidate_cached_responses_on_commit(
+            PURCHASE_ORDER_CACHE_SCOPE, purchase_order.profile_id, [purchase_order.id]
+        )
+
     
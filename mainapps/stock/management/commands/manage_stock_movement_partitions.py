@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from subapps.services.stock_movement_partitions import (
+    StockMovementPartitionError,
+    archive_partition,
+    backfill_default_partition,
+    detach_partition,
+    ensure_future_partitions,
+    partitions_older_than,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly StockMovement partitions, backfill history from the default partition "
+        "and detach or archive expired ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3)
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=None,
+            help="Keep this many whole months before the current one attached; older partitions are detached.",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=None,
+            help="Write detached partitions to <dir>/<partition>.csv.gz and drop them.",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Move history left in the default partition into monthly partitions, one month per transaction.",
+        )
+        parser.add_argument(
+            "--backfill-months",
+            type=int,
+            default=None,
+            help="Stop the backfill after this many months.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["months_ahead"] < 0:
+            raise CommandError("--months-ahead must not be negative.")
+        if options["retain_months"] is not None and options["retain_months"] < 1:
+            raise CommandError("--retain-months must be positive.")
+        if options["archive_dir"] and options["retain_months"] is None:
+            raise CommandError("--archive-dir requires --retain-months.")
+        if options["backfill_months"] is not None and options["backfill_months"] < 1:
+            raise CommandError("--backfill-months must be positive.")
+
+        try:
+            self._handle(options)
+        except StockMovementPartitionError as exc:
+            raise CommandError(str(exc))
+
+    def _handle(self, options):
+        dry_run = options["dry_run"]
+        if dry_run:
+            self.stdout.write(f"Would ensure partitions {options['months_ahead']} months ahead.")
+        else:
+            for name in ensure_future_partitions(months_ahead=options["months_ahead"]):
+                self.stdout.write(f"Created partition {name}")
+
+        if options["backfill"]:
+            if dry_run:
+                self.stdout.write("Would move default-partition rows into monthly partitions.")
+            else:
+                for name in backfill_default_partition(max_months=options["backfill_months"]):
+                    self.stdout.write(f"Backfilled partition {name}")
+
+        if options["retain_months"] is None:
+            return
+
+        expired = partitions_older_than(retain_months=options["retain_months"])
+        for name, _ in expired:
+            if dry_run:
+                action = "archive" if options["archive_dir"] else "detach"
+                self.stdout.write(f"Would {action} partition {name}")
+            elif options["archive_dir"]:
+                self.stdout.write(f"Archived partition {name} to {archive_partition(name, options['archive_dir'])}")
+            else:
+                detach_partition(name)
+                self.stdout.write(f"Detached partition {name}")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(expired)} expired partitions processed."))
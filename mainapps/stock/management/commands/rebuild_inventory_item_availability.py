@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapps.inventory.models import InventoryItem
+from subapps.services.inventory_availability import rebuild_inventory_item_availability
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the per-item InventoryItemAvailability rollup from stock balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile-id", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Report drifted rollup rows without rewriting them; exits non-zero when drift is found.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        queryset = InventoryItem.objects.order_by("id")
+        if options["profile_id"] is not None:
+            queryset = queryset.filter(profile_id=options["profile_id"])
+
+        checked = 0
+        drifted = []
+        last_id = None
+        while True:
+            page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+            inventory_item_ids = list(page.values_list("id", flat=True)[:batch_size])
+            if not inventory_item_ids:
+                break
+            last_id = inventory_item_ids[-1]
+            checked += len(inventory_item_ids)
+            drifted.extend(
+                rebuild_inventory_item_availability(inventory_item_ids, verify_only=options["verify"])
+            )
+
+        if options["verify"]:
+            for inventory_item_id in drifted[:50]:
+                self.stdout.write(f"Drifted rollup for inventory item {inventory_item_id}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} of {checked} inventory item rollups are out of date.")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} inventory item rollups match stock balances."))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} inventory items; rebuilt {len(drifted)} rollup rows.")
+        )
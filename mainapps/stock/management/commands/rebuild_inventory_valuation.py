@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapps.inventory.models import InventoryItem
+from subapps.services.inventory_availability import refresh_inventory_item_availability
+from subapps.services.inventory_costing import rebuild_inventory_valuation
+from subapps.services.stock_domain import StockDomainService
+
+
+class Command(BaseCommand):
+    help = "Reset inventory cost layers to opening layers priced from current stock balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile-id", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        queryset = InventoryItem.objects.order_by("id")
+        if options["profile_id"] is not None:
+            queryset = queryset.filter(profile_id=options["profile_id"])
+
+        rebuilt = 0
+        last_id = None
+        while True:
+            page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+            inventory_items = list(page[:batch_size])
+            if not inventory_items:
+                break
+            last_id = inventory_items[-1].id
+            for inventory_item in inventory_items:
+                rebuild_inventory_valuation(inventory_item, StockDomainService._opening_unit_cost)
+            refresh_inventory_item_availability([inventory_item.id for inventory_item in inventory_items])
+            rebuilt += len(inventory_items)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt valuation for {rebuilt} inventory items."))
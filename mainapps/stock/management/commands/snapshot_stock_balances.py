@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from mainapps.stock.models import StockBalance
+from subapps.services.stock_balance_history import take_stock_balance_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write end-of-day StockBalanceSnapshot rows reconstructed from balances and the movement ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", default=None, help="Snapshot date (YYYY-MM-DD); defaults to yesterday (UTC).")
+        parser.add_argument("--days", type=int, default=1, help="Number of days ending at --date to (re)write.")
+        parser.add_argument("--profile-id", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            snapshot_date = parse_date(options["date"])
+            if snapshot_date is None:
+                raise CommandError("--date must be formatted as YYYY-MM-DD.")
+        else:
+            snapshot_date = timezone.now().date() - timedelta(days=1)
+        if options["days"] < 1:
+            raise CommandError("--days must be positive.")
+
+        if options["profile_id"] is not None:
+            profile_ids = [options["profile_id"]]
+        else:
+            profile_ids = list(
+                StockBalance.objects.order_by("profile_id").values_list("profile_id", flat=True).distinct()
+            )
+
+        # Oldest first, so each day builds on the snapshot written just before it.
+        days = [snapshot_date - timedelta(days=offset) for offset in range(options["days"] - 1, -1, -1)]
+        total = 0
+        for profile_id in profile_ids:
+            for day in days:
+                written = take_stock_balance_snapshot(profile_id, day)
+                total += written
+                self.stdout.write(f"profile={profile_id} date={day.isoformat()} rows={written}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {total} snapshot rows for {len(profile_ids)} profiles over {len(days)} days.")
+        )
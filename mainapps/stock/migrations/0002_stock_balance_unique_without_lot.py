@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:10
+
+from django.db import migrations, models
+
+
+def merge_duplicate_lotless_balances(apps, schema_editor):
+    StockBalance = apps.get_model('stock', 'StockBalance')
+    duplicate_keys = (
+        StockBalance.objects.filter(stock_lot__isnull=True)
+        .values('inventory_item_id', 'stock_location_id')
+        .annotate(row_count=models.Count('id'))
+        .filter(row_count__gt=1)
+    )
+    for key in duplicate_keys:
+        balances = list(
+            StockBalance.objects.filter(
+                stock_lot__isnull=True,
+                inventory_item_id=key['inventory_item_id'],
+                stock_location_id=key['stock_location_id'],
+            ).order_by('created_at', 'id')
+        )
+        keeper, duplicates = balances[0], balances[1:]
+        for balance in duplicates:
+            keeper.quantity_on_hand += balance.quantity_on_hand
+            keeper.quantity_reserved += balance.quantity_reserved
+        keeper.quantity_available = keeper.quantity_on_hand - keeper.quantity_reserved
+        keeper.save(update_fields=['quantity_on_hand', 'quantity_reserved', 'quantity_available'])
+        StockBalance.objects.filter(id__in=[balance.id for balance in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+        ('stock', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lotless_balances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('stock_lot__isnull', True)), fields=('inventory_item', 'stock_location'), name='unique_stock_balance_item_location_no_lot'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+        ('stock', '0002_stock_balance_unique_without_lot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryItemAvailability',
+            fields=[
+                ('inventory_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability', serialize=False, to='inventory.inventoryitem')),
+                ('profile_id', models.BigIntegerField(db_index=True)),
+                ('quantity_on_hand', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('quantity_reserved', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('quantity_available', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('total_stock_value', models.DecimalField(decimal_places=5, default=0, max_digits=20)),
+                ('lot_count', models.PositiveIntegerField(default=0)),
+                ('location_count', models.PositiveIntegerField(default=0)),
+                ('earliest_expiry_date', models.DateField(blank=True, null=True)),
+                ('last_movement_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile_id', 'quantity_on_hand'], name='stock_inven_profile_819a6e_idx'), models.Index(fields=['profile_id', 'quantity_available'], name='stock_inven_profile_3d498d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+        ('stock', '0003_inventory_item_availability'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['profile_id', 'occurred_at', 'id'], name='stock_stock_profile_d40aca_idx'),
+        ),
+    ]
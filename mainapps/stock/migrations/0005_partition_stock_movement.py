@@ -0,0 +1,156 @@
+from datetime import date, datetime, time, timezone
+
+from django.db import migrations, transaction
+
+TABLE = "stock_stockmovement"
+DEFAULT_PARTITION = f"{TABLE}_default"
+BOUND_CHECK = f"{TABLE}_before_partitions"
+PARTITION_KEY_INDEX = f"{TABLE}_id_occurred_at_uniq"
+OCCURRED_AT_INDEX = f"{TABLE}_default_occurred_at"
+MONTHS_AHEAD = 3
+
+
+def _add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _bound(month):
+    return datetime.combine(month, time.min, tzinfo=timezone.utc).isoformat()
+
+
+def _renamed(name):
+    return f"{name[:55]}_default"
+
+
+def partition_stock_movements(apps, schema_editor):
+    """
+    Turn the movement ledger into a table range-partitioned by month on occurred_at (PostgreSQL only).
+
+    No rows are copied. The existing table becomes the DEFAULT partition and keeps its
+    history; new months get their own partitions, and
+    ``manage_stock_movement_partitions --backfill`` later moves the history into monthly
+    partitions one month per transaction. The only full-table reads, validating the
+    bound check and building the (id, occurred_at) and, if missing, occurred_at indexes,
+    run without blocking writes; the swap itself takes a short exclusive lock.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        if cursor.fetchone() is not None:
+            return
+        cursor.execute(f'SELECT MAX(occurred_at) FROM "{TABLE}"')
+        newest = cursor.fetchone()[0]
+
+    today = datetime.now(timezone.utc).date()
+    current_month = date(today.year, today.month, 1)
+    if newest is None:
+        first_month = current_month
+    else:
+        # The newest month's rows stay in the default partition until they are backfilled.
+        latest = max(newest.date(), today)
+        first_month = _add_months(date(latest.year, latest.month, 1), 1)
+    last_month = _add_months(current_month, MONTHS_AHEAD)
+
+    # A validated check lets PostgreSQL attach partitions for later months without scanning the history.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{BOUND_CHECK}" CHECK (occurred_at < %s) NOT VALID',
+            [_bound(first_month)],
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" VALIDATE CONSTRAINT "{BOUND_CHECK}"')
+        # A partitioned table's unique constraints must include the partition key.
+        cursor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY "{PARTITION_KEY_INDEX}" ON "{TABLE}" (id, occurred_at)')
+        # The backfill moves history out of the default partition a month at a time by occurred_at.
+        cursor.execute(
+            """
+            SELECT 1 FROM pg_index
+            JOIN pg_attribute ON pg_attribute.attrelid = pg_index.indrelid AND pg_attribute.attnum = pg_index.indkey[0]
+            WHERE pg_index.indrelid = to_regclass(%s) AND pg_attribute.attname = 'occurred_at'
+            """,
+            [TABLE],
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f'CREATE INDEX CONCURRENTLY "{OCCURRED_AT_INDEX}" ON "{TABLE}" (occurred_at)')
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE tablename = %s
+              AND indexname NOT IN (%s, %s)
+              AND indexname NOT IN (
+                  SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')
+              )
+            """,
+            [TABLE, PARTITION_KEY_INDEX, OCCURRED_AT_INDEX, TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')",
+            [TABLE],
+        )
+        unique_constraints = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'", [TABLE]
+        )
+        identity = cursor.fetchone()[0]
+
+        # A partition cannot carry its own identity column, so the parent takes it over and carries on numbering.
+        if identity:
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM "{TABLE}"')
+            next_id = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id DROP IDENTITY')
+
+        # Index names are schema-wide; the parent takes over the original ones.
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{DEFAULT_PARTITION}"')
+        for name in unique_constraints:
+            cursor.execute(f'ALTER TABLE "{DEFAULT_PARTITION}" RENAME CONSTRAINT "{name}" TO "{_renamed(name)}"')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{_renamed(name)}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{DEFAULT_PARTITION}" INCLUDING DEFAULTS) PARTITION BY RANGE (occurred_at)'
+        )
+        if identity:
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})'
+            )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, occurred_at)')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+        # The history already carries matching indexes and foreign keys, so attaching reuses them.
+        cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+        month = first_month
+        while month <= last_month:
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_p{month.year:04d}{month.month:02d}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')"
+            )
+            month = _add_months(month, 1)
+        cursor.execute(f'ALTER TABLE "{DEFAULT_PARTITION}" DROP CONSTRAINT "{BOUND_CHECK}"')
+
+
+class Migration(migrations.Migration):
+
+    # Validating the bound check and building the index concurrently must run outside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('stock', '0004_stock_movement_ledger_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_stock_movements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+        ('stock', '0005_partition_stock_movement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile_id', models.BigIntegerField()),
+                ('snapshot_date', models.DateField()),
+                ('quantity_on_hand', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='inventory.inventoryitem')),
+                ('stock_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='stock.stocklocation')),
+                ('stock_lot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='balance_snapshots', to='stock.stocklot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile_id', 'snapshot_date'], name='stock_stock_profile_a786dc_idx'), models.Index(fields=['inventory_item', 'stock_location', 'snapshot_date'], name='stock_stock_invento_f815cd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('snapshot_date', 'inventory_item', 'stock_location', 'stock_lot'), name='unique_stock_balance_snapshot_item_location_lot'), models.UniqueConstraint(condition=models.Q(('stock_lot__isnull', True)), fields=('snapshot_date', 'inventory_item', 'stock_location'), name='unique_stock_balance_snapshot_item_location_no_lot')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0006_stock_balance_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReconciliationCheckpoint',
+            fields=[
+                ('profile_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('checked_through', models.DateTimeField()),
+                ('checked_keys', models.PositiveIntegerField(default=0)),
+                ('drift_count', models.PositiveIntegerField(default=0)),
+                ('repaired_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import FirstValue
+
+
+def seed_unit_costs_from_ledger(apps, schema_editor):
+    """
+    Seed the last known cost of every item, per location and overall, from its costed movements.
+
+    One grouped query returns the latest cost for each (item, from, to) location pair; the
+    latest of those touching a location is its cost, and the latest of all is the item's.
+    """
+    StockMovement = apps.get_model('stock', 'StockMovement')
+    StockUnitCost = apps.get_model('stock', 'StockUnitCost')
+
+    def latest(field_name):
+        return Window(
+            FirstValue(field_name),
+            partition_by=[F('inventory_item_id'), F('from_location_id'), F('to_location_id')],
+            order_by=[F('occurred_at').desc(), F('created_at').desc()],
+        )
+
+    pairs = (
+        StockMovement.objects.filter(unit_cost__isnull=False)
+        .annotate(latest_cost=latest('unit_cost'), latest_at=latest('occurred_at'), latest_created=latest('created_at'))
+        .order_by()
+        .values_list(
+            'profile_id', 'inventory_item_id', 'from_location_id', 'to_location_id',
+            'latest_at', 'latest_created', 'latest_cost',
+        )
+        .distinct()
+    )
+    costs = {}
+    for profile_id, inventory_item_id, from_location_id, to_location_id, occurred_at, created_at, unit_cost in pairs:
+        for stock_location_id in {from_location_id, to_location_id, None}:
+            key = (inventory_item_id, stock_location_id)
+            if key not in costs or (occurred_at, created_at) > costs[key][1]:
+                costs[key] = (profile_id, (occurred_at, created_at), unit_cost)
+    StockUnitCost.objects.bulk_create(
+        [
+            StockUnitCost(
+                profile_id=profile_id,
+                inventory_item_id=inventory_item_id,
+                stock_location_id=stock_location_id,
+                unit_cost=unit_cost,
+            )
+            for (inventory_item_id, stock_location_id), (profile_id, _, unit_cost) in costs.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+        ('stock', '0007_stock_reconciliation_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockUnitCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile_id', models.BigIntegerField(db_index=True)),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=5, max_digits=15, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unit_costs', to='inventory.inventoryitem')),
+                ('stock_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='unit_costs', to='stock.stocklocation')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('inventory_item', 'stock_location'), name='unique_stock_unit_cost_item_location'), models.UniqueConstraint(condition=models.Q(('stock_location__isnull', True)), fields=('inventory_item',), name='unique_stock_unit_cost_item_no_location')],
+            },
+        ),
+        migrations.RunPython(seed_unit_costs_from_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:35
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_inventory_item_costing_method'),
+        ('stock', '0008_stock_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryItemValuation',
+            fields=[
+                ('inventory_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valuation', serialize=False, to='inventory.inventoryitem')),
+                ('profile_id', models.BigIntegerField(db_index=True)),
+                ('costing_method', models.CharField(max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('total_value', models.DecimalField(decimal_places=5, default=0, max_digits=20)),
+                ('average_unit_cost', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockCostLayer',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Unique identifier for the model instance.', primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile_id', models.BigIntegerField(db_index=True, help_text='Identity service CompanyProfile ID.', verbose_name='Profile ID')),
+                ('created_by_user_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='Created By User ID')),
+                ('updated_by_user_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='Updated By User ID')),
+                ('created_by_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Created By Name')),
+                ('updated_by_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Updated By Name')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when this model instance was created.', verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Timestamp when this model instance was last updated.', verbose_name='Updated At')),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('original_quantity', models.DecimalField(decimal_places=5, max_digits=15)),
+                ('remaining_quantity', models.DecimalField(decimal_places=5, max_digits=15)),
+                ('unit_cost', models.DecimalField(decimal_places=5, max_digits=15)),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.inventoryitem')),
+                ('source_movement', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='stock.stockmovement')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('remaining_quantity__gt', 0)), fields=['inventory_item', 'received_at'], name='stock_cost_layer_open_idx')],
+            },
+        ),
+    ]
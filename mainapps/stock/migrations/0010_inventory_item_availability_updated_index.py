@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_inventory_item_costing_method'),
+        ('stock', '0009_stock_cost_layers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitemavailability',
+            index=models.Index(fields=['profile_id', 'updated_at'], name='stock_inven_profile_0ad2b1_idx'),
+        ),
+    ]
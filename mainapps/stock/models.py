@@ -9,6 +9,7 @@ from django.core.validators import MinValueValidator
 from django.db import models
 from mptt.models import MPTTModel, TreeForeignKey
 from mainapps.content_type_linking_models.models import TenantStampedUUIDModel, _sync_identity_fields
+from subapps.services.sequence_allocator import SequenceAllocator, highest_suffix
 
 class StockStatus(models.TextChoices):
     OK = 'ok', _('OK')
@@ -176,20 +177,17 @@ class StockLocation(ProfileMixin, MPTTModel):
             base = self.location_type.name.upper().replace(' ', '_')
             profile_id = self.profile_id if self.profile_id is not None else self.profile
             
-            last_code = StockLocation.objects.filter(
-                models.Q(profile_id=profile_id) | models.Q(profile=str(profile_id)),
-                location_type=self.location_type,
-                code__startswith=f"{base}_{profile_id}_"
-            ).order_by('-code').values_list('code', flat=True).first()
-
-            sequence = 1
-            if last_code:
-                try:
-                    sequence = int(last_code.split('_')[-1]) + 1
-                except (ValueError, IndexError):
-                    pass
+            stem = f"{base}_{profile_id}_"
+            sequence = SequenceAllocator.next_value(
+                profile_id,
+                f"LOCATION-{base}",
+                seed=lambda: highest_suffix(
+                    StockLocation.objects.filter(code__startswith=stem).values_list('code', flat=True),
+                    separator='_',
+                ),
+            )
 
-            self.code = f"{base}_{profile_id}_{sequence:03d}"
+            self.code = f"{stem}{sequence:03d}"
 
         super().save(*args, **kwargs)
 
@@ -403,12 +401,13 @@ class StockItem(MPTTModel, InventoryMixin):
             company_id = self.inventory.profile
             inv_type = self.inventory.inventory_type[:4].upper()
             category_code = ''.join([word[0] for word in self.inventory.category.name.split() if word])[:4].upper()
-            last_item = StockItem.objects.filter(inventory=self.inventory).order_by('created_at').last()
-            if last_item:
-                count =int(last_item.sku.split('-')[-1])
-            else:
-                count=0
-            count+=1
+            count = SequenceAllocator.next_value(
+                company_id,
+                f"STO-{self.inventory_id}",
+                seed=lambda: highest_suffix(
+                    StockItem.objects.filter(inventory=self.inventory).values_list('sku', flat=True)
+                ),
+            )
 
             self.sku = f"STO-C{company_id}-{inv_type}-{category_code}-{count:04d}"
         super().save(*args, **kwargs)
@@ -497,9 +496,14 @@ class StockLot(TenantStampedUUIDModel):
             models.Index(fields=['expiry_date']),
         ]
 
+    @staticmethod
+    def receipt_lot_number(goods_receipt_line_id) -> str:
+        """Lot number assigned to a received lot that arrived without one."""
+        return f"LOT-{goods_receipt_line_id}"
+
     def save(self, *args, **kwargs):
         if not self.lot_number and self.goods_receipt_line_id:
-            self.lot_number = f"LOT-{self.goods_receipt_line_id}"
+            self.lot_number = self.receipt_lot_number(self.goods_receipt_line_id)
         if self.remaining_quantity > 0 and self.status == StockLotStatus.DEPLETED:
             self.status = StockLotStatus.OPEN
         elif self.remaining_quantity <= 0 and self.status == StockLotStatus.OPEN:
@@ -579,7 +583,12 @@ class StockBalance(TenantStampedUUIDModel):
             models.UniqueConstraint(
                 fields=['inventory_item', 'stock_location', 'stock_lot'],
                 name='unique_stock_balance_item_location_lot',
-            )
+            ),
+            models.UniqueConstraint(
+                fields=['inventory_item', 'stock_location'],
+                condition=models.Q(stock_lot__isnull=True),
+                name='unique_stock_balance_item_location_no_lot',
+            ),
         ]
 
     def save(self, *args, **kwargs):
@@ -587,6 +596,173 @@ class StockBalance(TenantStampedUUIDModel):
         super().save(*args, **kwargs)
 
 
+class StockUnitCost(models.Model):
+    """
+    Last known unit cost of an inventory item at a location, or across all locations when
+    ``stock_location`` is empty.
+    """
+
+    profile_id = models.BigIntegerField(db_index=True)
+    inventory_item = models.ForeignKey(
+        'inventory.InventoryItem',
+        on_delete=models.CASCADE,
+        related_name='unit_costs',
+    )
+    stock_location = models.ForeignKey(
+        StockLocation,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='unit_costs',
+    )
+    unit_cost = models.DecimalField(max_digits=15, decimal_places=5, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['inventory_item', 'stock_location'],
+                name='unique_stock_unit_cost_item_location',
+            ),
+            models.UniqueConstraint(
+                fields=['inventory_item'],
+                condition=models.Q(stock_location__isnull=True),
+                name='unique_stock_unit_cost_item_no_location',
+            ),
+        ]
+
+
+class InventoryItemAvailability(models.Model):
+    """Per-item rollup of stock balances, kept current by the stock domain service."""
+
+    inventory_item = models.OneToOneField(
+        'inventory.InventoryItem',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='availability',
+    )
+    profile_id = models.BigIntegerField(db_index=True)
+    quantity_on_hand = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+    quantity_reserved = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+    quantity_available = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+    total_stock_value = models.DecimalField(max_digits=20, decimal_places=5, default=0)
+    lot_count = models.PositiveIntegerField(default=0)
+    location_count = models.PositiveIntegerField(default=0)
+    earliest_expiry_date = models.DateField(null=True, blank=True)
+    last_movement_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['profile_id', 'quantity_on_hand']),
+            models.Index(fields=['profile_id', 'quantity_available']),
+            models.Index(fields=['profile_id', 'updated_at']),
+        ]
+
+
+class StockCostLayer(TenantStampedUUIDModel):
+    """A received quantity at one unit cost, consumed oldest first as stock leaves."""
+
+    inventory_item = models.ForeignKey(
+        'inventory.InventoryItem',
+        on_delete=models.CASCADE,
+        related_name='cost_layers',
+    )
+    # No database constraint: the partitioned movement table has no single-column unique key.
+    source_movement = models.ForeignKey(
+        'stock.StockMovement',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='+',
+    )
+    received_at = models.DateTimeField(default=timezone.now)
+    original_quantity = models.DecimalField(max_digits=15, decimal_places=5)
+    remaining_quantity = models.DecimalField(max_digits=15, decimal_places=5)
+    unit_cost = models.DecimalField(max_digits=15, decimal_places=5)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['inventory_item', 'received_at'],
+                condition=models.Q(remaining_quantity__gt=0),
+                name='stock_cost_layer_open_idx',
+            ),
+        ]
+
+
+class InventoryItemValuation(models.Model):
+    """Persisted stock valuation per inventory item, maintained as cost layers are pushed and consumed."""
+
+    inventory_item = models.OneToOneField(
+        'inventory.InventoryItem',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='valuation',
+    )
+    profile_id = models.BigIntegerField(db_index=True)
+    costing_method = models.CharField(max_length=20)
+    quantity = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+    total_value = models.DecimalField(max_digits=20, decimal_places=5, default=0)
+    average_unit_cost = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class StockBalanceSnapshot(models.Model):
+    """End-of-day (UTC) on-hand quantity per item, location and lot, written by ``snapshot_stock_balances``."""
+
+    profile_id = models.BigIntegerField()
+    snapshot_date = models.DateField()
+    inventory_item = models.ForeignKey(
+        'inventory.InventoryItem',
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots',
+    )
+    stock_location = models.ForeignKey(
+        StockLocation,
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots',
+    )
+    stock_lot = models.ForeignKey(
+        StockLot,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='balance_snapshots',
+    )
+    quantity_on_hand = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['profile_id', 'snapshot_date']),
+            models.Index(fields=['inventory_item', 'stock_location', 'snapshot_date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['snapshot_date', 'inventory_item', 'stock_location', 'stock_lot'],
+                name='unique_stock_balance_snapshot_item_location_lot',
+            ),
+            models.UniqueConstraint(
+                fields=['snapshot_date', 'inventory_item', 'stock_location'],
+                condition=models.Q(stock_lot__isnull=True),
+                name='unique_stock_balance_snapshot_item_location_no_lot',
+            ),
+        ]
+
+
+class StockReconciliationCheckpoint(models.Model):
+    """Per-tenant watermark of the last ledger-vs-balance reconciliation run."""
+
+    profile_id = models.BigIntegerField(primary_key=True)
+    checked_through = models.DateTimeField()
+    checked_keys = models.PositiveIntegerField(default=0)
+    drift_count = models.PositiveIntegerField(default=0)
+    repaired_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 class StockReservation(TenantStampedUUIDModel):
     inventory_item = models.ForeignKey(
         'inventory.InventoryItem',
@@ -755,6 +931,7 @@ class StockMovement(TenantStampedUUIDModel):
             models.Index(fields=['profile_id', 'inventory_item', 'occurred_at']),
             models.Index(fields=['profile_id', 'movement_type', 'occurred_at']),
             models.Index(fields=['profile_id', 'reference_type', 'reference_id']),
+            models.Index(fields=['profile_id', 'occurred_at', 'id']),
         ]
 
 class AuditMixin(models.Model):
@@ -1,8 +1,8 @@
 from rest_framework import serializers
-from django.db.models import Sum, Count
+from django.db.models import QuerySet, Sum, Count
 from decimal import Decimal
 
-from mainapps.content_type_linking_models.serializers import UserDetailMixin
+from mainapps.content_type_linking_models.serializers import UserDetailListSerializer, UserDetailMixin
 from mainapps.inventory.models import Inventory, InventoryItem
 from subapps.services.inventory_read_model import (
     get_inventory_item_summary_map,
@@ -14,7 +14,7 @@ from .models import (
 )
 from subapps.services.catalog_projection import CatalogProjectionLookup
 
-class ProductImageMixin:
+class CatalogVariantMixin:
     def _resolve_variant_lookup_value(self, obj):
         if isinstance(obj, dict):
             return (
@@ -30,17 +30,31 @@ class ProductImageMixin:
         product_variant_id = getattr(obj, 'product_variant_id', None)
         return str(product_variant_id) if product_variant_id else ''
 
+    def _get_variant_details(self, obj):
+        variant_lookup = self._resolve_variant_lookup_value(obj)
+        if not variant_lookup:
+            return None
+        variant_map = self.context.get('catalog_variant_map')
+        if variant_map is None:
+            variant_map = self.context['catalog_variant_map'] = {}
+        if variant_lookup not in variant_map:
+            # Resolve the whole page being serialized on its first miss.
+            page = getattr(self.parent, 'instance', None) if isinstance(self.parent, serializers.ListSerializer) else None
+            lookups = {variant_lookup}
+            if isinstance(page, (list, tuple, QuerySet)):
+                lookups.update(self._resolve_variant_lookup_value(item) for item in page)
+            lookups = [lookup for lookup in lookups if lookup and lookup not in variant_map]
+            variant_map.update(CatalogProjectionLookup.get_many(lookups))
+        return variant_map.get(variant_lookup)
+
+
+class ProductImageMixin(CatalogVariantMixin):
     def get_display_image(self, obj):
         request = self.context.get('request')
-        variant_lookup = self._resolve_variant_lookup_value(obj)
-        if not request or not variant_lookup:
+        if not request:
             return None
         try:
-            variant_details = CatalogProjectionLookup.get_variant_details_by_barcode(
-                barcode=variant_lookup,
-                request=request
-            )
-            
+            variant_details = self._get_variant_details(obj)
             if variant_details:
                 return variant_details.get('image') or variant_details.get('display_image')
         except Exception:
@@ -77,6 +91,8 @@ class StockLocationDetailSerializer(UserDetailMixin, serializers.ModelSerializer
     stock_summary = serializers.SerializerMethodField()
     parent_name=serializers.SerializerMethodField()
     
+    user_reference_fields = (('official_user_id', 'official'),)
+
     class Meta:
         model = StockLocation
         fields = '__all__'
@@ -91,22 +107,19 @@ class StockLocationDetailSerializer(UserDetailMixin, serializers.ModelSerializer
         """Get stock summary for this location"""
         return get_location_stock_summary(obj)
 
-class InventoryItemSummaryMixin:
+class InventoryItemSummaryMixin(CatalogVariantMixin):
     def _get_summary(self, obj):
-        summary_map = self.context.get('inventory_item_summary_map') or {}
-        return summary_map.get(obj.id) or get_inventory_item_summary_map([obj]).get(obj.id, {})
+        summary_map = self.context.get('inventory_item_summary_map')
+        if summary_map is None:
+            summary_map = self.context['inventory_item_summary_map'] = {}
+        if obj.id not in summary_map:
+            summary_map[obj.id] = get_inventory_item_summary_map([obj]).get(obj.id, {})
+        return summary_map[obj.id]
 
     def _get_variant_projection(self, obj):
-        request = self.context.get('request')
-        variant_lookup = getattr(obj, 'barcode_snapshot', '') or (
-            str(obj.product_variant_id) if getattr(obj, 'product_variant_id', None) else ''
-        )
-        if not request or not variant_lookup:
+        if not self.context.get('request'):
             return None
-        return CatalogProjectionLookup.get_variant_details_by_barcode(
-            barcode=variant_lookup,
-            request=request,
-        )
+        return self._get_variant_details(obj)
 
 
 class StockMovementListSerializer(UserDetailMixin, serializers.ModelSerializer):
@@ -117,7 +130,10 @@ class StockMovementListSerializer(UserDetailMixin, serializers.ModelSerializer):
     serial_number = serializers.CharField(source='stock_serial.serial_number', read_only=True)
     actor_details = serializers.SerializerMethodField()
 
+    user_reference_fields = ('actor_user_id',)
+
     class Meta:
+        list_serializer_class = UserDetailListSerializer
         model = StockMovement
         fields = [
             'id',
@@ -140,6 +156,16 @@ class StockMovementListSerializer(UserDetailMixin, serializers.ModelSerializer):
         return self.get_user_details(obj.actor_user_id)
 
 
+class StockMovementLedgerSerializer(StockMovementListSerializer):
+    class Meta(StockMovementListSerializer.Meta):
+        fields = StockMovementListSerializer.Meta.fields + [
+            'inventory_item',
+            'from_location',
+            'to_location',
+            'actor_user_id',
+        ]
+
+
 class StockItemListSerializer(ProductImageMixin, InventoryItemSummaryMixin, serializers.ModelSerializer):
     """Compatibility serializer that now exposes InventoryItem summaries."""
     name = serializers.CharField(source='name_snapshot', read_only=True)
@@ -248,6 +274,8 @@ class StockItemDetailSerializer(ProductImageMixin, InventoryItemSummaryMixin, Us
     current_pricing = serializers.SerializerMethodField()
     recent_movements = serializers.SerializerMethodField()
 
+    user_reference_fields = ('created_by_user_id', 'updated_by_user_id')
+
     class Meta:
         model = InventoryItem
         fields = [
@@ -266,6 +294,7 @@ class StockItemDetailSerializer(ProductImageMixin, InventoryItemSummaryMixin, Us
             'track_serial',
             'track_expiry',
             'allow_negative_stock',
+            'costing_method',
             'status',
             'quantity',
             'quantity_reserved',
@@ -383,7 +412,10 @@ class StockItemTrackingListSerializer(UserDetailMixin, serializers.ModelSerializ
     tracking_type_display = serializers.CharField(source='get_tracking_type_display', read_only=True)
     user_details = serializers.SerializerMethodField()
     
+    user_reference_fields = (('performed_by_user_id', 'user'),)
+
     class Meta:
+        list_serializer_class = UserDetailListSerializer
         model = StockItemTracking
         fields = ['id', 'tracking_type', 'tracking_type_display', 'date', 'notes', 'user_details', 'deltas']
     
@@ -1,24 +1,94 @@
+import json
+import os
+import tempfile
+import threading
 import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from importlib import import_module
+from io import StringIO
 from types import SimpleNamespace
-from unittest.mock import MagicMock, patch
-
-from django.test import SimpleTestCase
-
-from mainapps.inventory.models import Inventory, InventoryCategory, InventoryItem
-from mainapps.stock.models import StockItem
+from unittest import skipUnless
+from unittest.mock import MagicMock, call, patch
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from mainapps.inventory.models import CostingMethod, Inventory, InventoryCategory, InventoryItem
+from mainapps.kafka_reliability.models import KafkaOutboxEvent
+from mainapps.orders.models import GoodsReceipt, PurchaseOrder, PurchaseOrderLineItem, PurchaseOrderStatus
+from mainapps.projections.models import CatalogProductProjection, CatalogVariantProjection
+from mainapps.stock.models import (
+    InventoryItemAvailability,
+    InventoryItemValuation,
+    StockBalance,
+    StockBalanceSnapshot,
+    StockCostLayer,
+    StockItem,
+    StockLocation,
+    StockLot,
+    StockMovement,
+    StockMovementType,
+    StockReconciliationCheckpoint,
+    StockReservation,
+    StockUnitCost,
+)
+from mainapps.stock.serializers import StockItemListSerializer
 from mainapps.stock.views import (
+    StockItemViewSet,
+    StockLocationViewSet,
+    StockMovementViewSet,
     filter_inventory_items_for_legacy_inventory,
     filter_inventory_items_for_location,
     filter_inventory_items_for_purchase_order,
     filter_inventory_items_for_sales_order,
 )
+from subapps.kafka.consumers.catalog import handle_catalog_product_event, handle_catalog_variant_event
+from subapps.kafka.consumers.pos import handle_pos_order_event
+from subapps.kafka.producers.buffer import AVAILABILITY_UPSERTED, publish_inventory_events_on_commit
+from subapps.kafka.reliability import enqueue_outbox_event
+from subapps.services.catalog_projection import CatalogProjectionLookup
+from subapps.services.inventory_availability import _apply_changes, rebuild_inventory_item_availability
+from subapps.services.inventory_costing import apply_movement_costs, rebuild_inventory_valuation
 from subapps.services.inventory_read_model import (
+    get_cached_profile_stock_analytics,
     get_inventory_item_summary_map,
     get_location_stock_summary,
     get_profile_stock_analytics,
 )
-from subapps.services.stock_domain import StockDomainService
+from subapps.services.projection_cache import ProjectionCache
+from subapps.services.response_cache import (
+    INVENTORY_ITEM_CACHE_SCOPE,
+    STOCK_LOCATION_CACHE_SCOPE,
+    get_cache_versions,
+    get_response_cache_metrics,
+    invalidate_cached_responses,
+    invalidate_cached_responses_on_commit,
+    reset_response_cache_metrics,
+)
+from subapps.services.stock_balance_history import get_balance_as_of, take_stock_balance_snapshot
+from subapps.services.stock_domain import StockDomainError, StockDomainService
+from subapps.services.stock_reconciliation import reconcile_profile
+from subapps.services.stock_movement_partitions import (
+    DEFAULT_PARTITION,
+    PARENT_TABLE,
+    add_months,
+    archive_partition,
+    backfill_default_partition,
+    ensure_future_partitions,
+    list_partitions,
+    partition_name,
+    partitions_older_than,
+)
+from subapps.services.transaction_buffer import _SavepointMarker
 
 
 class StockItemLegacyBridgeTests(SimpleTestCase):
@@ -43,11 +113,6 @@ class StockItemLegacyBridgeTests(SimpleTestCase):
             safety_stock_level=0,
             expiration_threshold=30,
         )
-    def _mock_stock_item_queryset(self, *, last_item=None):
-        queryset = MagicMock()
-        queryset.order_by.return_value.last.return_value = last_item
-        return queryset
-
     def test_stock_item_does_not_auto_link_legacy_bridge_inventory_item(self):
         stock_item = StockItem(
             inventory=self.inventory,
@@ -55,7 +120,7 @@ class StockItemLegacyBridgeTests(SimpleTestCase):
             quantity=Decimal("5"),
         )
 
-        with patch("mainapps.stock.models.StockItem.objects.filter", return_value=self._mock_stock_item_queryset()):
+        with patch("mainapps.stock.models.SequenceAllocator.next_value", return_value=1):
             with patch("mainapps.stock.models.MPTTModel.save", autospec=True):
                 stock_item.save()
 
@@ -64,17 +129,35 @@ class StockItemLegacyBridgeTests(SimpleTestCase):
 
 
 class StockViewLegacyLookupTests(SimpleTestCase):
-    def test_filter_inventory_items_for_legacy_inventory_uses_metadata_lookup(self):
+    def test_filter_inventory_items_for_legacy_inventory_uses_indexed_column_within_tenant(self):
         queryset = MagicMock()
+        legacy_inventory_id = uuid.uuid4()
 
         with patch(
             "mainapps.stock.views.InventoryItem.legacy_bridge_id",
             side_effect=AssertionError("bridge lookup should not run"),
             create=True,
         ):
-            filter_inventory_items_for_legacy_inventory(queryset, "legacy-inventory-id")
+            filter_inventory_items_for_legacy_inventory(queryset, str(legacy_inventory_id), profile_id=3)
+            filter_inventory_items_for_legacy_inventory(
+                queryset, legacy_inventory_id, profile_id=3, prefix="inventory_item__"
+            )
+
+        self.assertEqual(
+            queryset.filter.call_args_list,
+            [
+                call(legacy_inventory_id=legacy_inventory_id, profile_id=3),
+                call(inventory_item__legacy_inventory_id=legacy_inventory_id, inventory_item__profile_id=3),
+            ],
+        )
 
-        queryset.filter.assert_called_once_with(metadata__legacy_inventory_id="legacy-inventory-id")
+    def test_filter_inventory_items_for_legacy_inventory_matches_nothing_for_a_malformed_id(self):
+        queryset = MagicMock()
+
+        self.assertEqual(
+            filter_inventory_items_for_legacy_inventory(queryset, "legacy-inventory-id"), queryset.none.return_value
+        )
+        queryset.filter.assert_not_called()
 
     def test_filter_inventory_items_for_location_uses_stock_balances_only(self):
         queryset = MagicMock()
@@ -107,6 +190,38 @@ class StockViewLegacyLookupTests(SimpleTestCase):
         filtered_queryset.distinct.assert_called_once_with()
 
 
+class StockItemViewSetSummaryTests(SimpleTestCase):
+    def _view(self, action):
+        view = StockItemViewSet()
+        view.action = action
+        view.request = SimpleNamespace(query_params={})
+        view.format_kwarg = None
+        return view
+
+    def test_list_summarizes_only_the_serialized_page_once(self):
+        page = [SimpleNamespace(id=uuid.uuid4()), SimpleNamespace(id=uuid.uuid4())]
+        view = self._view("list")
+
+        with patch(
+            "mainapps.stock.views.get_inventory_item_summary_map",
+            side_effect=lambda items: {item.id: {"quantity": Decimal("1")} for item in items},
+        ) as summary_map:
+            serializer = view.get_serializer(page, many=True)
+            view.get_serializer(page[0])
+
+        summary_map.assert_called_once_with(page)
+        self.assertEqual(set(serializer.context["inventory_item_summary_map"]), {item.id for item in page})
+
+    def test_non_summary_actions_do_not_build_summaries(self):
+        view = self._view("update_status")
+
+        with patch("mainapps.stock.views.get_inventory_item_summary_map") as summary_map:
+            context = view.get_serializer_context()
+
+        summary_map.assert_not_called()
+        self.assertNotIn("inventory_item_summary_map", context)
+
+
 class InventoryItemSummaryCompatibilityTests(SimpleTestCase):
     def test_inventory_item_summary_map_no_longer_uses_legacy_stock_item_fallback(self):
         inventory_item = InventoryItem(
@@ -162,34 +277,6 @@ class InventoryItemSummaryCompatibilityTests(SimpleTestCase):
         self.assertEqual(summary["expiring_soon_count"], 0)
         location.stock_items.all.assert_not_called()
 
-    def test_profile_stock_analytics_no_longer_uses_legacy_stock_items(self):
-        balances = MagicMock()
-        balances.__iter__.return_value = iter([])
-
-        balance_queryset = MagicMock()
-        balance_queryset.select_related.return_value = balances
-
-        with patch("subapps.services.inventory_read_model.StockBalance.objects.filter", return_value=balance_queryset):
-            with patch(
-                "mainapps.stock.models.StockItem.objects.filter",
-                side_effect=AssertionError("legacy stock analytics fallback should not run"),
-            ):
-                analytics = get_profile_stock_analytics(profile_id=1)
-
-        self.assertEqual(analytics["total_stock_items"], 0)
-        self.assertEqual(analytics["total_locations"], 0)
-        self.assertEqual(analytics["total_stock_value"], Decimal("0"))
-        self.assertEqual(analytics["location_distribution"], [])
-        self.assertEqual(
-            analytics["aging_analysis"],
-            {
-                "0-30_days": 0,
-                "31-90_days": 0,
-                "91-365_days": 0,
-                "over_1_year": 0,
-            },
-        )
-
 
 class StockDomainCompatibilityTests(SimpleTestCase):
     def setUp(self):
@@ -213,7 +300,7 @@ class StockDomainCompatibilityTests(SimpleTestCase):
             metadata={"legacy_inventory_id": str(self.inventory.id)},
         )
 
-    def test_ensure_inventory_item_uses_metadata_lookup_instead_of_bridge_id(self):
+    def test_ensure_inventory_item_uses_indexed_legacy_lookup_instead_of_bridge_id(self):
         filtered_queryset = MagicMock()
         filtered_queryset.order_by.return_value.first.return_value = self.inventory_item
 
@@ -236,9 +323,7 @@ class StockDomainCompatibilityTests(SimpleTestCase):
                             actor_user_id=1,
                         )
 
-        inventory_item_filter.assert_called_once_with(
-            metadata__legacy_inventory_id=str(self.inventory.id)
-        )
+        inventory_item_filter.assert_called_once_with(profile_id=1, legacy_inventory_id=self.inventory.id)
         self.assertEqual(resolved, self.inventory_item)
 
     def test_ensure_inventory_item_does_not_read_or_write_stock_item_bridge_field(self):
@@ -271,46 +356,41 @@ class StockDomainCompatibilityTests(SimpleTestCase):
 
         self.assertEqual(resolved, self.inventory_item)
 
-    def test_get_locked_balance_starts_from_zero_without_legacy_stock_seed(self):
-        stock_location = MagicMock()
+    def test_get_balance_starts_from_zero_without_legacy_stock_seed(self):
+        stock_location = SimpleNamespace(id=uuid.uuid4())
+        existing_balance = SimpleNamespace(
+            inventory_item_id=self.inventory_item.id,
+            stock_location_id=stock_location.id,
+            stock_lot_id=None,
+        )
         filtered_queryset = MagicMock()
-        filtered_queryset.first.return_value = None
-        select_for_update_queryset = MagicMock()
-        select_for_update_queryset.filter.return_value = filtered_queryset
+        filtered_queryset.order_by.return_value = [existing_balance]
 
-        created_balance = MagicMock()
-
-        with patch(
-            "subapps.services.stock_domain.StockBalance.objects.select_for_update",
-            return_value=select_for_update_queryset,
-        ):
+        with patch("subapps.services.stock_domain.StockBalance.objects.filter", return_value=filtered_queryset):
             with patch(
-                "subapps.services.stock_domain.StockBalance.objects.create",
-                return_value=created_balance,
-            ) as create_balance:
+                "subapps.services.stock_domain.StockBalance.objects.bulk_create",
+            ) as bulk_create_balances:
                 with patch(
                     "subapps.services.stock_domain.StockItem.objects.filter",
                     side_effect=AssertionError("legacy stock seed should not run"),
                 ):
-                    balance = StockDomainService._get_locked_balance(
+                    balance = StockDomainService._get_balance(
                         profile_id=1,
                         inventory_item=self.inventory_item,
                         stock_location=stock_location,
-                        legacy_inventory=self.inventory,
                         actor_user_id=7,
                     )
 
-        self.assertEqual(balance, created_balance)
-        create_balance.assert_called_once_with(
-            profile_id=1,
-            inventory_item=self.inventory_item,
-            stock_location=stock_location,
-            stock_lot=None,
-            quantity_on_hand=Decimal("0"),
-            quantity_reserved=Decimal("0"),
-            created_by_user_id=7,
-            updated_by_user_id=7,
-        )
+        self.assertEqual(balance, existing_balance)
+        (new_balances,), create_kwargs = bulk_create_balances.call_args
+        self.assertEqual(create_kwargs, {"ignore_conflicts": True})
+        self.assertEqual(len(new_balances), 1)
+        self.assertEqual(new_balances[0].profile_id, 1)
+        self.assertEqual(new_balances[0].stock_lot_id, None)
+        self.assertEqual(new_balances[0].quantity_on_hand, Decimal("0"))
+        self.assertEqual(new_balances[0].quantity_reserved, Decimal("0"))
+        self.assertEqual(new_balances[0].created_by_user_id, 7)
+        filtered_queryset.order_by.assert_called_once_with("id")
 
     def test_ensure_inventory_item_no_longer_uses_external_system_id_as_sku_snapshot(self):
         self.inventory.external_system_id = "INV-123"
@@ -430,3 +510,1471 @@ class StockDomainCompatibilityTests(SimpleTestCase):
             )
 
         self.assertEqual(resolved, variant)
+
+
+class BulkGoodsReceiptTests(TestCase):
+    def setUp(self):
+        self.location = StockLocation.objects.create(profile_id=1, name="Main Store")
+        self.plain_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gauze")
+        self.lot_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Amoxicillin", track_lot=True)
+        self.purchase_order = PurchaseOrder.objects.create(profile_id=1, status=PurchaseOrderStatus.ISSUED)
+        self.plain_line = PurchaseOrderLineItem.objects.create(
+            purchase_order=self.purchase_order,
+            inventory_item=self.plain_item,
+            quantity=10,
+            unit_price=Decimal("2.50"),
+        )
+        self.lot_line = PurchaseOrderLineItem.objects.create(
+            purchase_order=self.purchase_order,
+            inventory_item=self.lot_item,
+            quantity=5,
+            unit_price=Decimal("4.00"),
+        )
+        StockBalance.objects.create(
+            profile_id=1,
+            inventory_item=self.plain_item,
+            stock_location=self.location,
+            quantity_on_hand=Decimal("3"),
+        )
+
+    def test_receive_purchase_lines_bulk_writes_receipt_lots_balances_and_movements(self):
+        result = StockDomainService.receive_purchase_lines_bulk(
+            purchase_order=self.purchase_order,
+            lines=[
+                {"line_item": self.plain_line, "stock_location": self.location, "quantity_received": 4},
+                {"line_item": self.plain_line, "stock_location": self.location, "quantity_received": 6},
+                {"line_item": self.lot_line, "stock_location": self.location, "quantity_received": 2, "lot_number": ""},
+            ],
+            actor_user_id=9,
+        )
+
+        self.assertEqual(result["goods_receipt"].lines.count(), 3)
+        self.assertEqual(len(result["stock_lots"]), 3)
+        plain_balances = StockBalance.objects.filter(inventory_item=self.plain_item, stock_location=self.location)
+        self.assertEqual(sum(balance.quantity_on_hand for balance in plain_balances), Decimal("13"))
+        self.assertEqual(sum(balance.quantity_available for balance in plain_balances), Decimal("13"))
+
+        stock_lot = StockLot.objects.get(inventory_item=self.lot_item)
+        self.assertEqual(stock_lot.lot_number, self.lot_line.batch_number)
+        self.assertEqual(
+            StockBalance.objects.get(inventory_item=self.lot_item, stock_lot=stock_lot).quantity_on_hand,
+            Decimal("2"),
+        )
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type=StockMovementType.RECEIPT).count(),
+            3,
+        )
+
+        self.plain_line.refresh_from_db()
+        self.lot_line.refresh_from_db()
+        self.assertEqual(self.plain_line.quantity_received, Decimal("10"))
+        self.assertTrue(self.plain_line.fully_received)
+        self.assertEqual(self.lot_line.quantity_received, Decimal("2"))
+        self.assertFalse(self.lot_line.fully_received)
+
+    def test_receive_purchase_lines_bulk_validates_all_lines_before_writing(self):
+        with self.assertRaises(StockDomainError):
+            StockDomainService.receive_purchase_lines_bulk(
+                purchase_order=self.purchase_order,
+                lines=[
+                    {"line_item": self.lot_line, "stock_location": self.location, "quantity_received": 2},
+                    {"line_item": self.plain_line, "stock_location": self.location, "quantity_received": 8},
+                    {"line_item": self.plain_line, "stock_location": self.location, "quantity_received": 3},
+                ],
+                actor_user_id=9,
+            )
+
+        self.assertFalse(GoodsReceipt.objects.exists())
+        self.assertFalse(StockLot.objects.exists())
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_receive_purchase_line_goes_through_the_bulk_receipt(self):
+        self.lot_line.batch_number = ""
+
+        result = StockDomainService.receive_purchase_line(
+            purchase_order=self.purchase_order,
+            line_item=self.lot_line,
+            stock_location=self.location,
+            quantity_received=3,
+            actor_user_id=9,
+        )
+
+        goods_receipt_line = result["goods_receipt_line"]
+        self.assertEqual(result["stock_lot"].lot_number, StockLot.receipt_lot_number(goods_receipt_line.id))
+        self.assertEqual(goods_receipt_line.lot_number, result["stock_lot"].lot_number)
+        self.assertEqual(result["balance"].quantity_on_hand, Decimal("3"))
+        self.assertEqual(result["stock_serials"], [])
+
+    def test_receipts_and_transfers_maintain_last_known_unit_costs(self):
+        backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+        StockDomainService.receive_purchase_lines_bulk(
+            purchase_order=self.purchase_order,
+            lines=[{"line_item": self.plain_line, "stock_location": self.location, "quantity_received": 4}],
+            actor_user_id=9,
+        )
+        self.assertEqual(
+            dict(StockUnitCost.objects.filter(inventory_item=self.plain_item).values_list("stock_location_id", "unit_cost")),
+            {self.location.id: Decimal("2.50"), None: Decimal("2.50")},
+        )
+
+        StockUnitCost.objects.filter(stock_location=self.location).update(unit_cost=Decimal("3.10"))
+        StockDomainService.transfer_stock(
+            inventory_item=self.plain_item,
+            from_location=self.location,
+            to_location=backroom,
+            quantity=Decimal("2"),
+        )
+
+        transfer = StockMovement.objects.get(movement_type=StockMovementType.TRANSFER)
+        self.assertEqual(transfer.unit_cost, Decimal("3.10"))
+        self.assertEqual(
+            StockUnitCost.objects.get(inventory_item=self.plain_item, stock_location=backroom).unit_cost,
+            Decimal("3.10"),
+        )
+
+    def test_unit_cost_resolution_does_not_scan_the_ledger(self):
+        StockMovement.objects.create(
+            profile_id=1,
+            inventory_item=self.plain_item,
+            to_location=self.location,
+            movement_type=StockMovementType.RECEIPT,
+            quantity=Decimal("1"),
+            unit_cost=Decimal("1.75"),
+        )
+
+        with self.assertNumQueries(2):
+            unit_cost = StockDomainService._resolve_inventory_unit_cost(
+                inventory_item=self.plain_item,
+                stock_location=self.location,
+            )
+
+        self.assertIsNone(unit_cost)
+
+    def test_unit_cost_migration_seeds_last_costs_from_the_ledger(self):
+        backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+        now = timezone.now()
+        for days_ago, from_location, to_location, unit_cost in (
+            (3, None, self.location, "1.00"),
+            (2, None, self.location, "1.75"),
+            (1, self.location, backroom, "2.10"),
+            (0, None, backroom, None),
+        ):
+            StockMovement.objects.create(
+                profile_id=1,
+                inventory_item=self.plain_item,
+                from_location=from_location,
+                to_location=to_location,
+                movement_type=StockMovementType.RECEIPT if from_location is None else StockMovementType.TRANSFER,
+                quantity=Decimal("1"),
+                unit_cost=None if unit_cost is None else Decimal(unit_cost),
+                occurred_at=now - timedelta(days=days_ago),
+            )
+
+        with self.assertNumQueries(2):
+            import_module("mainapps.stock.migrations.0008_stock_unit_cost").seed_unit_costs_from_ledger(apps, None)
+
+        self.assertEqual(
+            dict(StockUnitCost.objects.filter(inventory_item=self.plain_item).values_list("stock_location_id", "unit_cost")),
+            {self.location.id: Decimal("2.10"), backroom.id: Decimal("2.10"), None: Decimal("2.10")},
+        )
+
+    def test_unit_costs_are_upserted_in_one_statement_per_key_kind(self):
+        other_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gauze")
+        StockDomainService._store_unit_costs(1, {(self.plain_item.id, self.location.id): Decimal("1.00")})
+
+        costs = {
+            (item.id, stock_location_id): Decimal("2.50")
+            for item in (self.plain_item, other_item)
+            for stock_location_id in (self.location.id, None)
+        }
+        with self.assertNumQueries(2):
+            StockDomainService._store_unit_costs(1, costs)
+        with self.assertNumQueries(2):
+            StockDomainService._store_unit_costs(1, costs)
+
+        self.assertEqual(StockUnitCost.objects.count(), 4)
+        self.assertEqual(set(StockUnitCost.objects.values_list("unit_cost", flat=True)), {Decimal("2.50")})
+
+
+class StockBalanceArithmeticTests(TestCase):
+    def setUp(self):
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Bandage")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        self.backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity_change=Decimal("10"),
+            actor_user_id=1,
+        )
+
+    def _balance(self, location):
+        return StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=location)
+
+    def test_reserve_transfer_and_fulfill_update_quantities_in_database(self):
+        reservation = StockDomainService.reserve_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity=Decimal("4"),
+            external_order_type="sales_order",
+            external_order_id="SO-1",
+        )["reservation"]
+        result = StockDomainService.transfer_stock(
+            inventory_item=self.inventory_item,
+            from_location=self.store,
+            to_location=self.backroom,
+            quantity=Decimal("5"),
+        )
+        StockDomainService.fulfill_reservation(reservation=reservation, quantity=Decimal("3"))
+        StockDomainService.release_reservation(reservation=reservation)
+
+        store_balance = self._balance(self.store)
+        self.assertEqual(result["source_balance"].quantity_available, Decimal("1"))
+        self.assertEqual(store_balance.quantity_on_hand, Decimal("2"))
+        self.assertEqual(store_balance.quantity_reserved, Decimal("0"))
+        self.assertEqual(store_balance.quantity_available, Decimal("2"))
+        self.assertEqual(self._balance(self.backroom).quantity_on_hand, Decimal("5"))
+
+    def test_get_balances_returns_keys_in_id_order_for_apply_balance_delta(self):
+        keys = [
+            (self.inventory_item.id, location.id, None) for location in (self.backroom, self.store)
+        ]
+
+        balances = StockDomainService._get_balances(profile_id=1, keys=keys + keys[:1])
+        self.assertEqual(StockBalance.objects.filter(inventory_item=self.inventory_item).count(), 2)
+        self.assertEqual([balance.id for balance in balances.values()], sorted(balance.id for balance in balances.values()))
+
+        for balance in balances.values():
+            StockDomainService._apply_balance_delta(balance, on_hand_delta=Decimal("4"))
+        with self.assertRaisesMessage(StockDomainError, "Insufficient stock"):
+            StockDomainService._apply_balance_delta(
+                balances[keys[0]],
+                on_hand_delta=Decimal("-5"),
+                guards=[("quantity_on_hand", Decimal("5"), "Insufficient stock")],
+            )
+        self.assertEqual(self._balance(self.backroom).quantity_on_hand, Decimal("4"))
+        self.assertEqual(self._balance(self.store).quantity_available, Decimal("14"))
+
+    def test_opposite_transfers_update_balances_in_the_same_id_order(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.backroom,
+            quantity_change=Decimal("10"),
+            actor_user_id=1,
+        )
+        updated_balance_ids = []
+        apply_balance_delta = StockDomainService._apply_balance_delta
+
+        def record_update(balance, **kwargs):
+            updated_balance_ids.append(balance.id)
+            return apply_balance_delta(balance, **kwargs)
+
+        with patch.object(StockDomainService, "_apply_balance_delta", side_effect=record_update):
+            for from_location, to_location in ((self.store, self.backroom), (self.backroom, self.store)):
+                StockDomainService.transfer_stock(
+                    inventory_item=self.inventory_item,
+                    from_location=from_location,
+                    to_location=to_location,
+                    quantity=Decimal("2"),
+                )
+
+        expected_order = sorted([self._balance(self.store).id, self._balance(self.backroom).id])
+        self.assertEqual(updated_balance_ids, expected_order * 2)
+        self.assertEqual(self._balance(self.store).quantity_on_hand, Decimal("10"))
+        self.assertEqual(self._balance(self.backroom).quantity_on_hand, Decimal("10"))
+
+    def test_issues_from_stale_lot_instances_both_reduce_remaining_quantity(self):
+        stock_lot = StockLot.objects.create(
+            profile_id=1, inventory_item=self.inventory_item, received_quantity=Decimal("6"), remaining_quantity=Decimal("6")
+        )
+        StockBalance.objects.create(
+            profile_id=1,
+            inventory_item=self.inventory_item,
+            stock_location=self.backroom,
+            stock_lot=stock_lot,
+            quantity_on_hand=Decimal("6"),
+            quantity_available=Decimal("6"),
+        )
+        first, second = StockLot.objects.get(id=stock_lot.id), StockLot.objects.get(id=stock_lot.id)
+
+        for lot, quantity in ((first, Decimal("2")), (second, Decimal("3"))):
+            StockDomainService.issue_stock(
+                inventory_item=self.inventory_item,
+                stock_location=self.backroom,
+                stock_lot=lot,
+                quantity=quantity,
+            )
+
+        stock_lot.refresh_from_db()
+        self.assertEqual(stock_lot.remaining_quantity, Decimal("1"))
+        self.assertEqual(second.remaining_quantity, Decimal("1"))
+
+    def test_guard_failure_leaves_balance_untouched(self):
+        StockDomainService.reserve_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity=Decimal("8"),
+            external_order_type="sales_order",
+            external_order_id="SO-2",
+        )
+
+        with self.assertRaisesMessage(StockDomainError, "Insufficient available stock to issue."):
+            StockDomainService.issue_stock(
+                inventory_item=self.inventory_item,
+                stock_location=self.store,
+                quantity=Decimal("3"),
+            )
+
+        balance = self._balance(self.store)
+        self.assertEqual(balance.quantity_on_hand, Decimal("10"))
+        self.assertEqual(balance.quantity_available, Decimal("2"))
+
+
+class ReserveStockBatchTests(TestCase):
+    def setUp(self):
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gauze")
+        self.other_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Tape")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        for inventory_item in (self.inventory_item, self.other_item):
+            StockDomainService.adjust_stock(
+                inventory_item=inventory_item,
+                stock_location=self.store,
+                quantity_change=Decimal("10"),
+                actor_user_id=1,
+            )
+
+    def _line(self, inventory_item, quantity, line_id):
+        return {
+            "inventory_item": inventory_item,
+            "stock_location": self.store,
+            "quantity": Decimal(quantity),
+            "external_order_type": "sales_order",
+            "external_order_id": "SO-9",
+            "external_order_line_id": line_id,
+        }
+
+    def test_pos_reservation_request_reserves_a_repeated_item_once(self):
+        item = {
+            "item_id": "POS-LINE-1",
+            "inventory_item_id": str(self.inventory_item.id),
+            "stock_location_id": str(self.store.id),
+            "requested_quantity": "3",
+        }
+
+        handle_pos_order_event(
+            {
+                "event_name": "pos.inventory.reservation.requested",
+                "payload": {"profile_id": 1, "order_id": "POS-1", "items": [item, dict(item)]},
+            }
+        )
+
+        reservations = StockReservation.objects.filter(external_order_type="pos_order_item", external_order_id="POS-1")
+        self.assertEqual(reservations.count(), 1)
+        balance = StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=self.store)
+        self.assertEqual(balance.quantity_reserved, Decimal("3"))
+
+    def test_reserve_stock_batch_coalesces_lines_per_balance(self):
+        result = StockDomainService.reserve_stock_batch(
+            lines=[
+                self._line(self.inventory_item, "3", "L1"),
+                self._line(self.inventory_item, "4", "L2"),
+                self._line(self.other_item, "2", "L3"),
+            ],
+            actor_user_id=1,
+        )
+
+        self.assertEqual(len(result["reservations"]), 3)
+        self.assertEqual(len(result["balances"]), 2)
+        balance = StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=self.store)
+        self.assertEqual(balance.quantity_reserved, Decimal("7"))
+        self.assertEqual(balance.quantity_available, Decimal("3"))
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type=StockMovementType.RESERVATION, reference_type="sales_order").count(),
+            3,
+        )
+
+    def test_reserve_stock_batch_rejects_combined_over_reservation(self):
+        with self.assertRaisesMessage(StockDomainError, "Insufficient available stock to reserve."):
+            StockDomainService.reserve_stock_batch(
+                lines=[
+                    self._line(self.other_item, "1", "L1"),
+                    self._line(self.inventory_item, "6", "L2"),
+                    self._line(self.inventory_item, "6", "L3"),
+                ],
+            )
+
+        balance = StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=self.store)
+        self.assertEqual(balance.quantity_reserved, Decimal("0"))
+        self.assertFalse(StockMovement.objects.filter(movement_type=StockMovementType.RESERVATION).exists())
+
+
+class InventoryItemAvailabilityTests(TestCase):
+    def setUp(self):
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Syringe")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        self.backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+
+    def test_stock_mutations_keep_rollup_in_step_with_balances(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity_change=Decimal("9"),
+        )
+        StockDomainService.transfer_stock(
+            inventory_item=self.inventory_item,
+            from_location=self.store,
+            to_location=self.backroom,
+            quantity=Decimal("4"),
+        )
+        StockDomainService.reserve_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity=Decimal("2"),
+            external_order_type="sales_order",
+            external_order_id="SO-4",
+        )
+
+        rollup = InventoryItemAvailability.objects.get(inventory_item=self.inventory_item)
+        self.assertEqual(rollup.quantity_on_hand, Decimal("9"))
+        self.assertEqual(rollup.quantity_reserved, Decimal("2"))
+        self.assertEqual(rollup.quantity_available, Decimal("7"))
+        self.assertEqual(rollup.location_count, 2)
+        self.assertIsNotNone(rollup.last_movement_at)
+
+        call_command("rebuild_inventory_item_availability", verify=True, stdout=StringIO())
+
+    def test_transfer_refreshes_rollup(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity_change=Decimal("10"),
+        )
+        StockDomainService.transfer_stock(
+            inventory_item=self.inventory_item,
+            from_location=self.store,
+            to_location=self.backroom,
+            quantity=Decimal("4"),
+        )
+
+        rollup = InventoryItemAvailability.objects.get(inventory_item=self.inventory_item)
+        self.assertEqual(rollup.location_count, 2)
+        self.assertEqual(
+            rollup.last_movement_at,
+            StockMovement.objects.get(movement_type=StockMovementType.TRANSFER).occurred_at,
+        )
+        self.assertEqual(rebuild_inventory_item_availability([self.inventory_item.id], verify_only=True), [])
+
+    def test_in_stock_mutations_apply_deltas_without_reaggregating(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity_change=Decimal("6"),
+        )
+
+        with patch(
+            "subapps.services.inventory_availability._aggregate_balances",
+            side_effect=AssertionError("in-stock balances should not be re-aggregated"),
+        ):
+            reservation = StockDomainService.reserve_stock(
+                inventory_item=self.inventory_item,
+                stock_location=self.store,
+                quantity=Decimal("2"),
+                external_order_type="sales_order",
+                external_order_id="SO-5",
+            )["reservation"]
+            StockDomainService.fulfill_reservation(reservation=reservation, quantity=Decimal("1"))
+            StockDomainService.adjust_stock(
+                inventory_item=self.inventory_item,
+                stock_location=self.store,
+                quantity_change=Decimal("3"),
+            )
+
+        rollup = InventoryItemAvailability.objects.get(inventory_item=self.inventory_item)
+        self.assertEqual(rollup.quantity_on_hand, Decimal("8"))
+        self.assertEqual(rollup.quantity_reserved, Decimal("1"))
+        self.assertEqual(rollup.quantity_available, Decimal("7"))
+        self.assertEqual(rebuild_inventory_item_availability([self.inventory_item.id], verify_only=True), [])
+
+    def test_batch_changes_update_every_rollup_in_one_statement(self):
+        inventory_items = [self.inventory_item] + [
+            InventoryItem.objects.create(profile_id=1, name_snapshot=f"Item {index}") for index in range(3)
+        ]
+        for inventory_item in inventory_items:
+            StockDomainService.adjust_stock(
+                inventory_item=inventory_item, stock_location=self.store, quantity_change=Decimal("5")
+            )
+        StockBalance.objects.update(
+            quantity_on_hand=F("quantity_on_hand") + 2, quantity_available=F("quantity_available") + 2
+        )
+        occurred_at = timezone.now()
+        changes = {
+            inventory_item.id: {"on_hand": Decimal("2"), "reserved": Decimal("0"), "reaggregate": index % 2 == 0}
+            for index, inventory_item in enumerate(inventory_items)
+        }
+
+        # Lock, one delta UPDATE, one re-aggregation SELECT and one bulk_update.
+        with self.assertNumQueries(4):
+            _apply_changes(changes, {inventory_item.id: occurred_at for inventory_item in inventory_items})
+
+        for rollup in InventoryItemAvailability.objects.filter(inventory_item__in=inventory_items):
+            self.assertEqual(rollup.quantity_on_hand, Decimal("7"))
+            self.assertEqual(rollup.quantity_available, Decimal("7"))
+            self.assertEqual(rollup.last_movement_at, occurred_at)
+
+    def test_clamped_release_reaggregates_the_rollup(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity_change=Decimal("5"),
+        )
+        reservation = StockDomainService.reserve_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity=Decimal("3"),
+            external_order_type="sales_order",
+            external_order_id="SO-6",
+        )["reservation"]
+        # The balance holds less than the reservation claims, so the release is clamped at zero.
+        for model in (StockBalance, InventoryItemAvailability):
+            model.objects.filter(inventory_item=self.inventory_item).update(
+                quantity_reserved=Decimal("1"), quantity_available=Decimal("4")
+            )
+
+        StockDomainService.release_reservation(reservation=reservation)
+
+        rollup = InventoryItemAvailability.objects.get(inventory_item=self.inventory_item)
+        self.assertEqual(rollup.quantity_reserved, Decimal("0"))
+        self.assertEqual(rollup.quantity_available, Decimal("5"))
+
+    def test_rebuild_command_repairs_drifted_rollup(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity_change=Decimal("3"),
+        )
+        InventoryItemAvailability.objects.filter(inventory_item=self.inventory_item).update(quantity_on_hand=0)
+
+        with self.assertRaisesMessage(CommandError, "1 of 1 inventory item rollups are out of date."):
+            call_command("rebuild_inventory_item_availability", verify=True, stdout=StringIO())
+        call_command("rebuild_inventory_item_availability", stdout=StringIO())
+
+        self.assertEqual(
+            InventoryItemAvailability.objects.get(inventory_item=self.inventory_item).quantity_on_hand,
+            Decimal("3"),
+        )
+
+
+class InventoryEventBufferTests(TestCase):
+    def setUp(self):
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Swab")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+
+    @patch("subapps.kafka.producers.buffer.publish_inventory_reservations_upserted")
+    @patch("subapps.kafka.producers.buffer.publish_inventory_availabilities_upserted")
+    def test_availability_events_are_coalesced_per_transaction(self, publish_availabilities, publish_reservations):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for _ in range(3):
+                    StockDomainService.adjust_stock(
+                        inventory_item=self.inventory_item,
+                        stock_location=self.store,
+                        quantity_change=Decimal("2"),
+                    )
+                reservation = StockDomainService.reserve_stock(
+                    inventory_item=self.inventory_item,
+                    stock_location=self.store,
+                    quantity=Decimal("1"),
+                    external_order_type="sales_order",
+                    external_order_id="SO-3",
+                )["reservation"]
+
+        # One flush each for the event buffer, the response cache invalidations and the rollup changes.
+        flushes = [callback for callback in callbacks if not isinstance(callback, _SavepointMarker)]
+        self.assertEqual(len(flushes), 3)
+        publish_availabilities.assert_called_once_with(inventory_item_ids=[self.inventory_item.id])
+        publish_reservations.assert_called_once_with(reservation_ids=[reservation.id])
+
+    @patch("subapps.kafka.producers.buffer.publish_inventory_availabilities_upserted")
+    def test_events_buffered_in_a_rolled_back_savepoint_are_dropped(self, publish_availabilities):
+        kept_id, dropped_id, later_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                publish_inventory_events_on_commit(AVAILABILITY_UPSERTED, [kept_id])
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    publish_inventory_events_on_commit(AVAILABILITY_UPSERTED, [dropped_id])
+                    raise RuntimeError
+                with transaction.atomic():
+                    publish_inventory_events_on_commit(AVAILABILITY_UPSERTED, [later_id])
+
+        publish_availabilities.assert_called_once_with(inventory_item_ids=[kept_id, later_id])
+
+    def test_outbox_debounce_replaces_pending_payload_for_same_key(self):
+        for quantity in (1, 2):
+            enqueue_outbox_event(
+                topic="inventory.availability",
+                event_name="inventory.availability.upserted",
+                envelope={"event_id": str(uuid.uuid4()), "payload": {"available_quantity": quantity}},
+                key="variant-1",
+                debounce_seconds=30,
+            )
+
+        event = KafkaOutboxEvent.objects.get()
+        self.assertEqual(event.message_json["payload"], {"available_quantity": 2})
+        self.assertEqual(event.message_json["event_id"], event.event_id)
+
+
+class StockMovementLedgerTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gauze")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        started = timezone.now()
+        self.movements = [
+            StockMovement.objects.create(
+                profile_id=1,
+                inventory_item=self.inventory_item,
+                to_location=self.store,
+                movement_type=StockMovementType.RECEIPT if index % 2 else StockMovementType.ADJUSTMENT,
+                quantity=Decimal(index + 1),
+                reference_type="purchase_order",
+                reference_id=f"PO-{index}",
+                occurred_at=started - timedelta(minutes=index // 2),
+            )
+            for index in range(5)
+        ]
+        StockMovement.objects.create(
+            profile_id=2,
+            inventory_item=InventoryItem.objects.create(profile_id=2, name_snapshot="Other"),
+            movement_type=StockMovementType.RECEIPT,
+            quantity=Decimal("1"),
+        )
+
+    def _get(self, action, params):
+        request = self.factory.get("/stock/movements/", params)
+        force_authenticate(
+            request,
+            user=SimpleNamespace(id=1, is_authenticated=True),
+            token={"profile_id": 1, "permissions": ["view_stock_item_history"]},
+        )
+        return StockMovementViewSet.as_view({"get": action})(request)
+
+    def test_cursor_pages_walk_the_ledger_without_gaps_or_repeats(self):
+        seen = []
+        params = {"page_size": 2}
+        while True:
+            response = self._get("list", params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["id"] for row in response.data["results"])
+            if not response.data["next"]:
+                break
+            params = {"page_size": 2, "cursor": response.data["next"].split("cursor=")[1].split("&")[0]}
+
+        expected = sorted(self.movements, key=lambda movement: (movement.occurred_at, movement.id), reverse=True)
+        self.assertEqual(seen, [str(movement.id) for movement in expected])
+
+    def test_list_filters_by_movement_type_and_reference(self):
+        response = self._get("list", {"movement_type": StockMovementType.RECEIPT, "reference_id": "PO-3"})
+
+        self.assertEqual([row["id"] for row in response.data["results"]], [str(self.movements[3].id)])
+
+    def test_export_streams_ndjson_and_csv_in_ledger_order(self):
+        response = self._get("export", {"location": str(self.store.id)})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        first = json.loads(lines[0])
+        self.assertEqual(first["reference_id"], "PO-4")
+        self.assertEqual(Decimal(first["quantity"]), Decimal("5"))
+
+        response = self._get("export", {"file_format": "csv", "movement_type": StockMovementType.ADJUSTMENT})
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(rows[0].split(",")[:2], ["id", "occurred_at"])
+        self.assertEqual(len(rows), 4)
+
+
+class StockBalanceHistoryTests(TestCase):
+    def setUp(self):
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Insulin")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        self.fridge = StockLocation.objects.create(profile_id=1, name="Fridge")
+        today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.day_one = today - timedelta(days=3)
+        self.day_two = today - timedelta(days=2)
+
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item, stock_location=self.store, quantity_change=Decimal("10")
+        )
+        StockMovement.objects.update(occurred_at=self.day_one)
+        StockDomainService.transfer_stock(
+            inventory_item=self.inventory_item, from_location=self.store, to_location=self.fridge, quantity=Decimal("4")
+        )
+        StockMovement.objects.filter(movement_type=StockMovementType.TRANSFER).update(occurred_at=self.day_two)
+        StockDomainService.reserve_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity=Decimal("2"),
+            external_order_type="sales_order",
+            external_order_id="SO-9",
+        )
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item, stock_location=self.store, quantity_change=Decimal("-1")
+        )
+
+    def assertBalances(self):
+        end_of_day_one = self.day_one.replace(hour=23)
+        self.assertEqual(get_balance_as_of(self.inventory_item, self.store, end_of_day_one), Decimal("10"))
+        self.assertEqual(get_balance_as_of(self.inventory_item, self.fridge, end_of_day_one), Decimal("0"))
+        self.assertEqual(get_balance_as_of(self.inventory_item, self.store, self.day_two), Decimal("6"))
+        self.assertEqual(get_balance_as_of(self.inventory_item, self.fridge, self.day_two), Decimal("4"))
+        self.assertEqual(get_balance_as_of(self.inventory_item, self.store, timezone.now()), Decimal("5"))
+
+    def test_balance_as_of_rewinds_live_balances_without_snapshots(self):
+        self.assertBalances()
+
+    def test_snapshot_job_writes_daily_rows_that_as_of_replays_from(self):
+        call_command(
+            "snapshot_stock_balances",
+            date=self.day_two.date().isoformat(),
+            days=2,
+            stdout=StringIO(),
+        )
+
+        snapshots = {
+            (row.snapshot_date, row.stock_location_id): row.quantity_on_hand
+            for row in StockBalanceSnapshot.objects.all()
+        }
+        self.assertEqual(
+            snapshots,
+            {
+                (self.day_one.date(), self.store.id): Decimal("10"),
+                (self.day_two.date(), self.store.id): Decimal("6"),
+                (self.day_two.date(), self.fridge.id): Decimal("4"),
+            },
+        )
+        StockBalance.objects.update(quantity_on_hand=Decimal("999"))
+        self.assertEqual(get_balance_as_of(self.inventory_item, self.store, self.day_two), Decimal("6"))
+        StockBalance.objects.filter(stock_location=self.store).update(quantity_on_hand=Decimal("5"))
+        StockBalance.objects.filter(stock_location=self.fridge).update(quantity_on_hand=Decimal("4"))
+        self.assertBalances()
+
+
+class StockReconciliationTests(TestCase):
+    def setUp(self):
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Bandage")
+        self.other_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Tape")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        self.backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item, stock_location=self.store, quantity_change=Decimal("10")
+        )
+        StockDomainService.transfer_stock(
+            inventory_item=self.inventory_item, from_location=self.store, to_location=self.backroom, quantity=Decimal("3")
+        )
+        reservation = StockDomainService.reserve_stock(
+            inventory_item=self.inventory_item,
+            stock_location=self.store,
+            quantity=Decimal("4"),
+            external_order_type="sales_order",
+            external_order_id="SO-1",
+        )["reservation"]
+        StockDomainService.fulfill_reservation(reservation=reservation, quantity=Decimal("1"))
+        StockDomainService.adjust_stock(
+            inventory_item=self.other_item, stock_location=self.store, quantity_change=Decimal("2")
+        )
+
+    def test_ledger_matches_balances_written_by_the_domain_service(self):
+        report = reconcile_profile(1, full=True)
+
+        self.assertEqual(report["drift"], [])
+        self.assertEqual(report["checked"], 3)
+
+    def test_command_reports_and_repairs_drift(self):
+        StockBalance.objects.filter(inventory_item=self.inventory_item, stock_location=self.store).update(
+            quantity_on_hand=Decimal("0"), quantity_reserved=Decimal("0")
+        )
+
+        with self.assertRaisesMessage(CommandError, "1 of 3 stock balances drifted from the ledger."):
+            call_command("reconcile_stock_balances", stdout=StringIO())
+        call_command("reconcile_stock_balances", repair=True, stdout=StringIO())
+
+        balance = StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=self.store)
+        self.assertEqual(balance.quantity_on_hand, Decimal("6"))
+        self.assertEqual(balance.quantity_reserved, Decimal("3"))
+        self.assertEqual(balance.quantity_available, Decimal("3"))
+        self.assertEqual(
+            InventoryItemAvailability.objects.get(inventory_item=self.inventory_item).quantity_on_hand,
+            Decimal("9"),
+        )
+
+    def test_incremental_runs_only_recheck_recently_changed_keys(self):
+        reconcile_profile(1)
+        StockReconciliationCheckpoint.objects.update(checked_through=timezone.now() + timedelta(hours=1))
+        StockDomainService.adjust_stock(
+            inventory_item=self.other_item,
+            stock_location=self.store,
+            quantity_change=Decimal("1"),
+        )
+        StockMovement.objects.filter(inventory_item=self.other_item).update(
+            occurred_at=timezone.now() + timedelta(hours=2)
+        )
+
+        report = reconcile_profile(1)
+
+        self.assertEqual(report["checked"], 1)
+        self.assertEqual(report["drift"], [])
+
+    def _archive_ledger_before(self, retained_from, *, snapshot):
+        StockMovement.objects.update(occurred_at=retained_from - timedelta(days=3))
+        StockBalance.objects.update(created_at=retained_from - timedelta(days=3))
+        if snapshot:
+            take_stock_balance_snapshot(1, retained_from.date() - timedelta(days=1))
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item, stock_location=self.store, quantity_change=Decimal("5")
+        )
+        StockMovement.objects.filter(occurred_at__lt=retained_from).delete()
+
+    def test_archived_ledger_replays_from_the_snapshot_before_the_oldest_partition(self):
+        retained_from = datetime.combine(timezone.now().date(), time.min, tzinfo=dt_timezone.utc)
+        self._archive_ledger_before(retained_from, snapshot=True)
+
+        with patch("subapps.services.stock_reconciliation.retained_ledger_start", return_value=retained_from):
+            report = reconcile_profile(1, full=True)
+            StockBalance.objects.filter(inventory_item=self.inventory_item, stock_location=self.store).update(
+                quantity_on_hand=Decimal("0")
+            )
+            call_command("reconcile_stock_balances", repair=True, stdout=StringIO())
+
+        self.assertEqual(report["drift"], [])
+        balance = StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=self.store)
+        self.assertEqual(balance.quantity_on_hand, Decimal("11"))
+        self.assertEqual(balance.quantity_reserved, Decimal("3"))
+
+    def test_repair_refuses_when_no_snapshot_covers_the_archived_ledger(self):
+        retained_from = datetime.combine(timezone.now().date(), time.min, tzinfo=dt_timezone.utc)
+        self._archive_ledger_before(retained_from, snapshot=False)
+
+        with patch("subapps.services.stock_reconciliation.retained_ledger_start", return_value=retained_from):
+            with self.assertRaisesMessage(CommandError, "no balance snapshot covers the movements archived"):
+                call_command("reconcile_stock_balances", repair=True, stdout=StringIO())
+
+        balance = StockBalance.objects.get(inventory_item=self.inventory_item, stock_location=self.store)
+        self.assertEqual(balance.quantity_on_hand, Decimal("11"))
+
+
+class InventoryCostingTests(TestCase):
+    def setUp(self):
+        self.location = StockLocation.objects.create(profile_id=1, name="Main Store")
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Saline")
+        self.purchase_order = PurchaseOrder.objects.create(profile_id=1, status=PurchaseOrderStatus.ISSUED)
+        self.lines = [
+            PurchaseOrderLineItem.objects.create(
+                purchase_order=self.purchase_order,
+                inventory_item=self.inventory_item,
+                quantity=10,
+                unit_price=unit_price,
+            )
+            for unit_price in (Decimal("2.00"), Decimal("3.00"))
+        ]
+
+    def _receive_and_issue(self):
+        stock_lots = StockDomainService.receive_purchase_lines_bulk(
+            purchase_order=self.purchase_order,
+            lines=[
+                {"line_item": line, "stock_location": self.location, "quantity_received": 10}
+                for line in self.lines
+            ],
+        )["stock_lots"]
+        # Issue from the newer lot first: valuation follows the layers, not the lot picked.
+        for stock_lot, quantity in ((stock_lots[1], Decimal("10")), (stock_lots[0], Decimal("5"))):
+            StockDomainService.issue_stock(
+                inventory_item=self.inventory_item,
+                stock_location=self.location,
+                stock_lot=stock_lot,
+                quantity=quantity,
+            )
+        return InventoryItemValuation.objects.get(inventory_item=self.inventory_item)
+
+    def test_fifo_issues_consume_the_oldest_layers_first(self):
+        valuation = self._receive_and_issue()
+
+        self.assertEqual(valuation.quantity, Decimal("5"))
+        self.assertEqual(valuation.total_value, Decimal("15"))
+        self.assertEqual(valuation.average_unit_cost, Decimal("3"))
+        self.assertEqual(
+            sorted(StockCostLayer.objects.filter(inventory_item=self.inventory_item).values_list("remaining_quantity", flat=True)),
+            [Decimal("0"), Decimal("5")],
+        )
+        summary = get_inventory_item_summary_map([self.inventory_item])[self.inventory_item.id]
+        self.assertEqual(summary["total_stock_value"], Decimal("15"))
+        self.assertEqual(
+            InventoryItemAvailability.objects.get(inventory_item=self.inventory_item).total_stock_value,
+            Decimal("15"),
+        )
+
+    def test_consuming_a_layer_stamps_its_updated_at(self):
+        stock_lot = StockDomainService.receive_purchase_lines_bulk(
+            purchase_order=self.purchase_order,
+            lines=[{"line_item": self.lines[0], "stock_location": self.location, "quantity_received": 10}],
+        )["stock_lots"][0]
+        layer = StockCostLayer.objects.get(inventory_item=self.inventory_item)
+        StockCostLayer.objects.filter(id=layer.id).update(updated_at=timezone.now() - timedelta(days=1))
+
+        StockDomainService.issue_stock(
+            inventory_item=self.inventory_item, stock_location=self.location, stock_lot=stock_lot, quantity=Decimal("4")
+        )
+
+        layer.refresh_from_db()
+        self.assertEqual(layer.remaining_quantity, Decimal("6"))
+        self.assertGreater(layer.updated_at, timezone.now() - timedelta(minutes=1))
+
+    def test_moving_average_issues_at_the_running_average_cost(self):
+        InventoryItem.objects.filter(id=self.inventory_item.id).update(costing_method=CostingMethod.MOVING_AVERAGE)
+        self.inventory_item.refresh_from_db()
+
+        valuation = self._receive_and_issue()
+        self.assertEqual(valuation.quantity, Decimal("5"))
+        self.assertEqual(valuation.total_value, Decimal("12.5"))
+        self.assertEqual(valuation.average_unit_cost, Decimal("2.5"))
+
+        StockDomainService.adjust_stock(
+            inventory_item=self.inventory_item, stock_location=self.location, quantity_change=Decimal("5")
+        )
+        valuation.refresh_from_db()
+        self.assertEqual(valuation.total_value, Decimal("25"))
+        self.assertEqual(get_profile_stock_analytics(profile_id=1)["total_stock_value"], Decimal("25"))
+
+    def test_first_costed_movement_opens_layers_for_stock_held_before_valuation(self):
+        StockBalance.objects.create(
+            profile_id=1,
+            inventory_item=self.inventory_item,
+            stock_location=self.location,
+            quantity_on_hand=Decimal("4"),
+        )
+        StockUnitCost.objects.create(
+            profile_id=1, inventory_item=self.inventory_item, stock_location=self.location, unit_cost=Decimal("1.50")
+        )
+
+        StockDomainService.receive_purchase_lines_bulk(
+            purchase_order=self.purchase_order,
+            lines=[{"line_item": self.lines[0], "stock_location": self.location, "quantity_received": 10}],
+        )
+        StockDomainService.issue_stock(
+            inventory_item=self.inventory_item, stock_location=self.location, quantity=Decimal("3")
+        )
+
+        valuation = InventoryItemValuation.objects.get(inventory_item=self.inventory_item)
+        self.assertEqual(valuation.quantity, Decimal("11"))
+        # The opening layer is the oldest, so FIFO issues from it at 1.50 before the receipt at 2.00.
+        self.assertEqual(valuation.total_value, Decimal("21.5"))
+
+    def test_costing_a_receipt_batch_takes_the_same_queries_for_any_number_of_items(self):
+        def receive(count):
+            movements = []
+            for index in range(count):
+                inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot=f"Swab {count}-{index}")
+                StockBalance.objects.create(
+                    profile_id=1,
+                    inventory_item=inventory_item,
+                    stock_location=self.location,
+                    quantity_on_hand=Decimal("4"),
+                )
+                movements.append(
+                    StockMovement.objects.create(
+                        profile_id=1,
+                        inventory_item=inventory_item,
+                        to_location=self.location,
+                        movement_type=StockMovementType.RECEIPT,
+                        quantity=Decimal("2"),
+                        unit_cost=Decimal("3"),
+                    )
+                )
+            with CaptureQueriesContext(connection) as queries:
+                apply_movement_costs(movements, lambda inventory_item, stock_lot, stock_location: Decimal("1"))
+            return len(queries), movements
+
+        few, _ = receive(2)
+        many, movements = receive(6)
+
+        self.assertEqual(few, many)
+        valuation = InventoryItemValuation.objects.get(inventory_item=movements[0].inventory_item)
+        # Two held at 1 open the valuation ahead of the two received at 3.
+        self.assertEqual((valuation.quantity, valuation.total_value), (Decimal("4"), Decimal("8")))
+        self.assertEqual(
+            sorted(
+                StockCostLayer.objects.filter(inventory_item=movements[0].inventory_item).values_list(
+                    "source_movement_id", "unit_cost"
+                ),
+                key=lambda row: row[1],
+            ),
+            [(None, Decimal("1")), (movements[0].id, Decimal("3"))],
+        )
+
+    def test_rebuild_command_opens_layers_from_current_balances(self):
+        StockBalance.objects.create(
+            profile_id=1,
+            inventory_item=self.inventory_item,
+            stock_location=self.location,
+            quantity_on_hand=Decimal("4"),
+        )
+        StockUnitCost.objects.create(profile_id=1, inventory_item=self.inventory_item, unit_cost=Decimal("1.25"))
+
+        call_command("rebuild_inventory_valuation", profile_id=1, stdout=StringIO())
+
+        valuation = InventoryItemValuation.objects.get(inventory_item=self.inventory_item)
+        self.assertEqual(valuation.total_value, Decimal("5"))
+        self.assertEqual(get_location_stock_summary(self.location)["total_value"], Decimal("5"))
+
+
+class ProfileStockAnalyticsTests(TestCase):
+    def setUp(self):
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        self.backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+        self.lot_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Iodine", track_lot=True)
+        self.valued_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Swabs")
+        stock_lot = StockLot.objects.create(profile_id=1, inventory_item=self.lot_item, unit_cost=Decimal("2"))
+        StockLot.objects.filter(id=stock_lot.id).update(created_at=timezone.now() - timedelta(days=100))
+        StockBalance.objects.create(
+            profile_id=1,
+            inventory_item=self.lot_item,
+            stock_location=self.store,
+            stock_lot=stock_lot,
+            quantity_on_hand=Decimal("5"),
+        )
+        StockBalance.objects.create(
+            profile_id=1,
+            inventory_item=self.valued_item,
+            stock_location=self.backroom,
+            quantity_on_hand=Decimal("3"),
+        )
+        InventoryItemValuation.objects.create(
+            inventory_item=self.valued_item,
+            profile_id=1,
+            costing_method=CostingMethod.FIFO,
+            quantity=Decimal("3"),
+            total_value=Decimal("12"),
+            average_unit_cost=Decimal("4"),
+        )
+
+    def test_analytics_are_aggregated_by_location_value_and_age(self):
+        with patch(
+            "mainapps.stock.models.StockItem.objects.filter",
+            side_effect=AssertionError("legacy stock analytics fallback should not run"),
+        ):
+            analytics = get_profile_stock_analytics(profile_id=1)
+
+        self.assertEqual(analytics["total_stock_items"], 2)
+        self.assertEqual(analytics["total_locations"], 2)
+        self.assertEqual(analytics["total_stock_value"], Decimal("22"))
+        self.assertEqual(
+            analytics["location_distribution"],
+            [
+                {"location_name": "Store", "item_count": 1, "total_quantity": Decimal("5"), "total_value": Decimal("10")},
+                {"location_name": "Backroom", "item_count": 1, "total_quantity": Decimal("3"), "total_value": Decimal("12")},
+            ],
+        )
+        self.assertEqual(
+            analytics["aging_analysis"],
+            {"0-30_days": 1, "31-90_days": 0, "91-365_days": 1, "over_1_year": 0},
+        )
+        self.assertEqual(get_profile_stock_analytics(profile_id=2)["total_stock_value"], Decimal("0"))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cached_analytics_are_reused_until_stock_changes(self):
+        StockDomainService.adjust_stock(
+            inventory_item=self.valued_item, stock_location=self.backroom, quantity_change=Decimal("1")
+        )
+        first = get_cached_profile_stock_analytics(profile_id=1)
+        with self.assertNumQueries(2):
+            self.assertEqual(get_cached_profile_stock_analytics(profile_id=1), first)
+
+        StockDomainService.adjust_stock(
+            inventory_item=self.valued_item, stock_location=self.backroom, quantity_change=Decimal("3")
+        )
+        self.assertEqual(
+            get_cached_profile_stock_analytics(profile_id=1)["location_distribution"][0],
+            {"location_name": "Backroom", "item_count": 1, "total_quantity": Decimal("7"), "total_value": Decimal("28")},
+        )
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cached_analytics_follow_valuation_rebuilds_and_location_renames(self):
+        get_cached_profile_stock_analytics(profile_id=1)
+
+        rebuild_inventory_valuation(self.valued_item, lambda inventory_item, stock_lot, stock_location: Decimal("5"))
+        self.assertEqual(get_cached_profile_stock_analytics(profile_id=1)["total_stock_value"], Decimal("25"))
+
+        StockLocation.objects.filter(id=self.backroom.id).update(name="Cold Room")
+        # The location views invalidate their scope on every write.
+        invalidate_cached_responses(STOCK_LOCATION_CACHE_SCOPE, 1)
+        self.assertEqual(
+            get_cached_profile_stock_analytics(profile_id=1)["location_distribution"][1]["location_name"], "Cold Room"
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_response_cache_metrics()
+        self.factory = APIRequestFactory()
+        self.inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gauze")
+        self.store = StockLocation.objects.create(profile_id=1, name="Store")
+        self.backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+
+    def _get(self, action, profile_id=1, **kwargs):
+        request = self.factory.get("/stock/locations/")
+        force_authenticate(
+            request,
+            user=SimpleNamespace(id=1, is_authenticated=True),
+            token={"profile_id": profile_id, "owner_id": 1},
+        )
+        return StockLocationViewSet.as_view({"get": action})(request, **kwargs)
+
+    def test_list_is_cached_per_tenant_until_stock_moves(self):
+        self.assertEqual(self._get("list")["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get("list")["X-Cache"], "HIT")
+
+        invalidate_cached_responses(STOCK_LOCATION_CACHE_SCOPE, 2)
+        self.assertEqual(self._get("list")["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockDomainService.adjust_stock(
+                inventory_item=self.inventory_item, stock_location=self.store, quantity_change=Decimal("2")
+            )
+        self.assertEqual(self._get("list")["X-Cache"], "MISS")
+        self.assertEqual(
+            get_response_cache_metrics()[STOCK_LOCATION_CACHE_SCOPE],
+            {"hits": 2, "misses": 2, "hit_rate": 0.5},
+        )
+
+    def test_retrieve_is_only_evicted_for_the_locations_written(self):
+        for location in (self.store, self.backroom):
+            self.assertEqual(self._get("retrieve", pk=str(location.id))["X-Cache"], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockDomainService.adjust_stock(
+                inventory_item=self.inventory_item, stock_location=self.store, quantity_change=Decimal("2")
+            )
+
+        self.assertEqual(self._get("retrieve", pk=str(self.store.id))["X-Cache"], "MISS")
+        self.assertEqual(self._get("retrieve", pk=str(self.backroom.id))["X-Cache"], "HIT")
+
+    def test_rolled_back_invalidations_are_not_applied_by_the_next_transaction(self):
+        location_version = get_cache_versions(STOCK_LOCATION_CACHE_SCOPE, 1)
+        item_version = get_cache_versions(INVENTORY_ITEM_CACHE_SCOPE, 1)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                invalidate_cached_responses_on_commit(STOCK_LOCATION_CACHE_SCOPE, 1)
+                raise RuntimeError
+            with transaction.atomic():
+                invalidate_cached_responses_on_commit(INVENTORY_ITEM_CACHE_SCOPE, 1)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(get_cache_versions(STOCK_LOCATION_CACHE_SCOPE, 1), location_version)
+        self.assertNotEqual(get_cache_versions(INVENTORY_ITEM_CACHE_SCOPE, 1), item_version)
+
+    @patch("subapps.services.response_cache.METRICS_LOG_INTERVAL", 2)
+    def test_hit_rates_are_logged_every_interval(self):
+        with self.assertLogs("subapps.services.response_cache", level="INFO") as logs:
+            for _ in range(3):
+                self._get("list")
+
+        self.assertEqual(logs.output, [
+            f"INFO:subapps.services.response_cache:Response cache {STOCK_LOCATION_CACHE_SCOPE}: "
+            "1 hits, 1 misses, hit rate 0.5."
+        ])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProjectionCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.projection_cache = ProjectionCache("test_projection_")
+
+    def test_a_reader_that_loaded_before_an_eviction_does_not_repopulate_the_entry(self):
+        rows = {"a": "old"}
+
+        def stale_load(lookups):
+            loaded = {lookup: rows[lookup] for lookup in lookups}
+            # The writer commits and evicts while this reader still holds the old row.
+            rows["a"] = "new"
+            self.projection_cache._evict(["a"])
+            return loaded
+
+        self.assertEqual(self.projection_cache.get_many(["a"], stale_load), {"a": "old"})
+        self.assertEqual(self.projection_cache.get_many(["a"], lambda lookups: dict(rows)), {"a": "new"})
+        self.assertEqual(self.projection_cache.get_many(["a"], lambda lookups: {}), {"a": "new"})
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogVariantBatchLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CatalogProjectionLookup.clear_local_cache()
+        self.addCleanup(CatalogProjectionLookup.clear_local_cache)
+        product = CatalogProductProjection.objects.create(profile_id=1, name="Gloves")
+        self.by_barcode = CatalogVariantProjection.objects.create(
+            product=product, profile_id=1, display_name="Gloves M", variant_barcode="111", image_url="https://img/m"
+        )
+        self.by_id = CatalogVariantProjection.objects.create(
+            product=product, profile_id=1, display_name="Gloves L", image_url="https://img/l"
+        )
+
+    def test_get_many_resolves_barcodes_and_variant_ids_in_one_query(self):
+        lookups = ["111", str(self.by_id.variant_id), "unknown"]
+        with self.assertNumQueries(1):
+            variants = CatalogProjectionLookup.get_many(lookups)
+
+        self.assertEqual(variants["111"]["id"], str(self.by_barcode.variant_id))
+        self.assertEqual(variants[str(self.by_id.variant_id)]["display_name"], "Gloves L")
+        self.assertIsNone(variants["unknown"])
+        with self.assertNumQueries(0):
+            self.assertEqual(CatalogProjectionLookup.get_many(lookups), variants)
+
+        CatalogProjectionLookup.clear_local_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(CatalogProjectionLookup.get_many(lookups), variants)
+
+    def test_catalog_events_evict_the_variants_they_change(self):
+        lookups = ["111", "222", str(self.by_id.variant_id)]
+        CatalogProjectionLookup.get_many(lookups)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_catalog_variant_event(
+                {
+                    "payload": {
+                        "variant_id": str(uuid.uuid4()),
+                        "product_id": str(self.by_id.product_id),
+                        "profile_id": 1,
+                        "display_name": "Gloves S",
+                        "variant_barcode": "222",
+                    }
+                }
+            )
+        with self.assertNumQueries(1):
+            self.assertEqual(CatalogProjectionLookup.get_many(lookups)["222"]["display_name"], "Gloves S")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_catalog_product_event(
+                {"payload": {"product_id": str(self.by_id.product_id), "profile_id": 1, "name": "Nitrile Gloves"}}
+            )
+        variants = CatalogProjectionLookup.get_many(lookups)
+        self.assertEqual(
+            {variant["product_details"]["name"] for variant in variants.values()},
+            {"Nitrile Gloves"},
+        )
+
+    def test_list_serializer_resolves_the_page_once(self):
+        items = [
+            InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves M", barcode_snapshot="111"),
+            InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves L", product_variant_id=self.by_id.variant_id),
+        ]
+        context = {"request": SimpleNamespace(), "inventory_item_summary_map": {item.id: {} for item in items}}
+
+        with patch(
+            "mainapps.stock.serializers.CatalogProjectionLookup.get_many", wraps=CatalogProjectionLookup.get_many
+        ) as get_many:
+            data = StockItemListSerializer(items, many=True, context=context).data
+
+        get_many.assert_called_once()
+        self.assertEqual([row["display_image"] for row in data], ["https://img/m", "https://img/l"])
+        self.assertEqual(set(context["catalog_variant_map"]), {"111", str(self.by_id.variant_id)})
+
+
+class StockMovementPartitionTests(TestCase):
+    def test_month_arithmetic_and_partition_names(self):
+        self.assertEqual(add_months(date(2026, 11, 1), 2), date(2027, 1, 1))
+        self.assertEqual(add_months(date(2026, 1, 1), -1), date(2025, 12, 1))
+        self.assertEqual(partition_name(date(2026, 3, 1)), "stock_stockmovement_p202603")
+
+    @skipUnless(connection.vendor != "postgresql", "Only unpartitioned backends reject partition maintenance.")
+    def test_command_refuses_unpartitioned_table(self):
+        with self.assertRaisesMessage(CommandError, "is not a partitioned PostgreSQL table"):
+            call_command("manage_stock_movement_partitions", stdout=StringIO())
+
+    @skipUnless(connection.vendor == "postgresql", "Declarative partitioning is PostgreSQL only.")
+    def test_future_partitions_absorb_default_rows_and_old_ones_archive(self):
+        inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves")
+        today = timezone.now().date()
+        far_future = add_months(date(today.year, today.month, 1), 12)
+        movement = StockMovement.objects.create(
+            profile_id=1,
+            inventory_item=inventory_item,
+            movement_type=StockMovementType.RECEIPT,
+            quantity=Decimal("1"),
+            occurred_at=timezone.now().replace(year=far_future.year, month=far_future.month, day=15),
+        )
+
+        created = ensure_future_partitions(months_ahead=12)
+
+        self.assertIn(partition_name(far_future), created)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM "{partition_name(far_future)}"')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [movement.id])
+
+        oldest_name, _ = list_partitions()[0]
+        expired = partitions_older_than(retain_months=0, today=add_months(far_future, 1))
+        self.assertIn(oldest_name, [name for name, _ in expired])
+        with tempfile.TemporaryDirectory() as directory:
+            path = archive_partition(oldest_name, directory)
+            self.assertTrue(os.path.exists(path))
+        self.assertNotIn(oldest_name, [name for name, _ in list_partitions()])
+
+    @skipUnless(connection.vendor == "postgresql", "Declarative partitioning is PostgreSQL only.")
+    def test_backfill_moves_history_out_of_the_default_partition(self):
+        inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gloves")
+        past_month = add_months(list_partitions()[0][1], -2)
+        movement = StockMovement.objects.create(
+            profile_id=1,
+            inventory_item=inventory_item,
+            movement_type=StockMovementType.RECEIPT,
+            quantity=Decimal("1"),
+            occurred_at=timezone.now().replace(year=past_month.year, month=past_month.month, day=15),
+        )
+
+        self.assertEqual(backfill_default_partition(), [partition_name(past_month)])
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM "{partition_name(past_month)}"')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [movement.id])
+            # The checks that let the attach skip scanning both tables are dropped once it is attached.
+            name = partition_name(past_month)
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conname IN (%s, %s)",
+                [f"{DEFAULT_PARTITION}_excludes_{name[len(PARENT_TABLE) + 1:]}", f"{name}_bounds"],
+            )
+            self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(backfill_default_partition(), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "Concurrent balance creation needs row-level locking.")
+class ConcurrentBalanceCreationTests(TransactionTestCase):
+    thread_count = 24
+    location_count = 4
+
+    def test_parallel_first_receipts_into_fresh_locations_create_one_balance_each(self):
+        inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Saline")
+        locations = [
+            StockLocation.objects.create(profile_id=1, name=f"Bay {index}")
+            for index in range(self.location_count)
+        ]
+        barrier = threading.Barrier(self.thread_count)
+        errors = []
+
+        def receive(location):
+            try:
+                barrier.wait()
+                StockDomainService.adjust_stock(
+                    inventory_item=inventory_item,
+                    stock_location=location,
+                    quantity_change=Decimal("1"),
+                    actor_user_id=1,
+                    reason="Concurrent receipt",
+                )
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=receive, args=(locations[index % self.location_count],))
+            for index in range(self.thread_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for location in locations:
+            balance = StockBalance.objects.get(inventory_item=inventory_item, stock_location=location)
+            self.assertEqual(
+                balance.quantity_on_hand,
+                Decimal(self.thread_count // self.location_count),
+            )
+        # Every receipt changed a different balance of the same item; none may drop out of the rollup.
+        self.assertEqual(
+            InventoryItemAvailability.objects.get(inventory_item=inventory_item).quantity_on_hand,
+            Decimal(self.thread_count),
+        )
+        self.assertEqual(rebuild_inventory_item_availability([inventory_item.id], verify_only=True), [])
+
+    def test_multi_line_first_receipts_in_opposite_line_order_do_not_deadlock(self):
+        inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Gauze")
+        keys = [
+            (inventory_item.id, StockLocation.objects.create(profile_id=1, name=f"Bay {index}").id, None)
+            for index in range(self.location_count)
+        ]
+        barrier = threading.Barrier(self.thread_count)
+        errors = []
+
+        def receive(line_keys):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    balances = StockDomainService._get_balances(profile_id=1, keys=line_keys, actor_user_id=1)
+                    for balance in balances.values():
+                        StockDomainService._apply_balance_delta(balance, on_hand_delta=Decimal("1"))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=receive, args=(keys if index % 2 else list(reversed(keys)),))
+            for index in range(self.thread_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(StockBalance.objects.filter(inventory_item=inventory_item).values_list("quantity_on_hand", flat=True)),
+            [Decimal(self.thread_count)] * self.location_count,
+        )
+
+    def test_opposite_direction_transfers_do_not_deadlock(self):
+        inventory_item = InventoryItem.objects.create(profile_id=1, name_snapshot="Syringe")
+        store = StockLocation.objects.create(profile_id=1, name="Store")
+        backroom = StockLocation.objects.create(profile_id=1, name="Backroom")
+        for location in (store, backroom):
+            StockDomainService.adjust_stock(
+                inventory_item=inventory_item,
+                stock_location=location,
+                quantity_change=Decimal(self.thread_count),
+                actor_user_id=1,
+            )
+        barrier = threading.Barrier(self.thread_count)
+        errors = []
+
+        def transfer(from_location, to_location):
+            try:
+                barrier.wait()
+                StockDomainService.transfer_stock(
+                    inventory_item=inventory_item,
+                    from_location=from_location,
+                    to_location=to_location,
+                    quantity=Decimal("1"),
+                    actor_user_id=1,
+                )
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=transfer, args=(store, backroom) if index % 2 else (backroom, store))
+            for index in range(self.thread_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for location in (store, backroom):
+            balance = StockBalance.objects.get(inventory_item=inventory_item, stock_location=location)
+            self.assertEqual(balance.quantity_on_hand, Decimal(self.thread_count))
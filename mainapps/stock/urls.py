@@ -7,6 +7,7 @@ router.register(r'location-types', ReadStockLocationType, basename='stock-locati
 router.register(r'locations', StockLocationViewSet, basename='stock-location')
 router.register(r'stock-items', StockItemViewSet, basename='stock-item')
 router.register(r'reservations', StockReservationViewSet, basename='stock-reservation')
+router.register(r'movements', StockMovementViewSet, basename='stock-movement')
 
 
 urlpatterns = [
@@ -1,9 +1,18 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import base64
+import csv
+import json
 import uuid
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
@@ -14,6 +23,7 @@ from mainapps.inventory.models import Inventory, InventoryItem
 from mainapps.projections.models import CatalogVariantProjection
 from mainapps.stock.serializers import (
     LowStockBalanceSerializer,
+    StockMovementLedgerSerializer,
     StockMovementListSerializer,
     StockItemDetailSerializer,
     StockItemListSerializer,
@@ -36,18 +46,32 @@ from mainapps.stock.models import (
 )
 
 from subapps.permissions.constants import UNIFIED_PERMISSION_DICT
-from subapps.permissions.microservice_permissions import BaseCachePermissionViewset, CachingMixin, PermissionRequiredMixin
+from subapps.permissions.microservice_permissions import (
+    BaseCachePermissionViewset,
+    CachingMixin,
+    PermissionRequiredMixin,
+    cache_response,
+)
 from subapps.services.inventory_read_model import (
+    annotate_inventory_item_stock_quantity,
+    get_cached_profile_stock_analytics,
     get_inventory_item_summary_map,
     get_low_stock_rows,
-    get_profile_stock_analytics,
 )
 from subapps.services.stock_domain import StockDomainError, StockDomainService
 from subapps.utils.request_context import get_request_profile_id, get_request_user_id, scope_queryset_by_identity
 
 
-def filter_inventory_items_for_legacy_inventory(queryset, legacy_inventory_id):
-    return queryset.filter(metadata__legacy_inventory_id=str(legacy_inventory_id))
+def filter_inventory_items_for_legacy_inventory(queryset, legacy_inventory_id, *, profile_id=None, prefix=''):
+    """Filter on the indexed ``legacy_inventory_id``; ``prefix`` reaches it through a relation such as ``inventory_item__``."""
+    try:
+        legacy_inventory_id = uuid.UUID(str(legacy_inventory_id))
+    except ValueError:
+        return queryset.none()
+    lookups = {f'{prefix}legacy_inventory_id': legacy_inventory_id}
+    if profile_id:
+        lookups[f'{prefix}profile_id'] = profile_id
+    return queryset.filter(**lookups)
 
 
 def filter_inventory_items_for_location(queryset, location_id):
@@ -69,6 +93,7 @@ class StockLocationViewSet(BaseInventoryViewSet):
     required_permission = UNIFIED_PERMISSION_DICT.get('stock_location')
 
     queryset = StockLocation.objects.select_related('location_type', 'parent')
+    CACHE_ENABLED = True
     filterset_fields = ['structural', 'external', 'location_type', 'parent']
     search_fields = ['name', 'code', 'description']
     ordering_fields = ['name', 'code', 'created_at']
@@ -281,16 +306,40 @@ class StockItemViewSet(BaseInventoryViewSetMixin):
             return StockItemListSerializer
         return StockItemDetailSerializer
 
+    summary_actions = {'list', 'retrieve', 'expiring_soon', 'get_inventory_items'}
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
-        if self.action in {'list', 'retrieve', 'expiring_soon', 'get_inventory_items'}:
-            try:
-                context['inventory_item_summary_map'] = get_inventory_item_summary_map(list(self.get_queryset()))
-            except Exception:
-                context['inventory_item_summary_map'] = {}
+        if self.action in self.summary_actions:
+            context['inventory_item_summary_map'] = self._get_summary_cache()
         return context
 
+    def get_serializer(self, *args, **kwargs):
+        # Summaries are built after pagination/object lookup, for the rows actually serialized.
+        if args and self.action in self.summary_actions:
+            instances = list(args[0]) if kwargs.get('many') else [args[0]]
+            if kwargs.get('many'):
+                args = (instances, *args[1:])
+            self._prime_summary_cache(instances)
+        return super().get_serializer(*args, **kwargs)
+
+    def _get_summary_cache(self):
+        if not hasattr(self, '_inventory_item_summary_cache'):
+            self._inventory_item_summary_cache = {}
+        return self._inventory_item_summary_cache
+
+    def _prime_summary_cache(self, inventory_items):
+        summary_cache = self._get_summary_cache()
+        missing = [item for item in inventory_items if item.id not in summary_cache]
+        if not missing:
+            return summary_cache
+        try:
+            summary_cache.update(get_inventory_item_summary_map(missing))
+        except Exception:
+            pass
+        return summary_cache
+
     def get_queryset(self):
         queryset = super().get_queryset()
         inventory = self.request.query_params.get('inventory')
@@ -300,7 +349,9 @@ class StockItemViewSet(BaseInventoryViewSetMixin):
         product_variant = self.request.query_params.get('product_variant')
 
         if inventory:
-            queryset = filter_inventory_items_for_legacy_inventory(queryset, inventory)
+            queryset = filter_inventory_items_for_legacy_inventory(
+                queryset, inventory, profile_id=get_request_profile_id(self.request, as_str=False)
+            )
         if location:
             queryset = filter_inventory_items_for_location(queryset, location)
         if purchase_order:
@@ -323,16 +374,12 @@ class StockItemViewSet(BaseInventoryViewSetMixin):
             ).distinct()
 
         quantity_filter = self.request.query_params.get('quantity_filter')
-        if quantity_filter in {'zero', 'low'}:
-            summary_map = get_inventory_item_summary_map(list(queryset))
-            matching_ids = []
-            for item in queryset:
-                quantity = summary_map.get(item.id, {}).get('quantity', Decimal('0'))
-                if quantity_filter == 'zero' and quantity <= 0:
-                    matching_ids.append(item.id)
-                elif quantity_filter == 'low' and quantity <= Decimal(str(item.minimum_stock_level or 0)):
-                    matching_ids.append(item.id)
-            queryset = queryset.filter(id__in=matching_ids) if matching_ids else queryset.none()
+        if quantity_filter == 'zero':
+            queryset = annotate_inventory_item_stock_quantity(queryset).filter(stock_quantity__lte=0)
+        elif quantity_filter == 'low':
+            queryset = annotate_inventory_item_stock_quantity(queryset).filter(
+                stock_quantity__lte=F('minimum_stock_level')
+            )
 
         return queryset
 
@@ -503,11 +550,13 @@ class StockItemViewSet(BaseInventoryViewSetMixin):
                 {'error': 'Inventory not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        stock_items = filter_inventory_items_for_legacy_inventory(self.get_queryset(), inventory.id)
+        stock_items = list(
+            filter_inventory_items_for_legacy_inventory(self.get_queryset(), inventory.id, profile_id=profile_id)
+        )
         serializer = StockItemListSerializer(
             stock_items,
             many=True,
-            context={'request': request, 'inventory_item_summary_map': get_inventory_item_summary_map(stock_items)},
+            context={'request': request, 'inventory_item_summary_map': self._prime_summary_cache(stock_items)},
         )
         return Response(serializer.data)
 
@@ -529,11 +578,12 @@ class StockItemViewSet(BaseInventoryViewSetMixin):
     def analytics(self, request):
         """Get stock analytics"""
         profile_id = get_request_profile_id(request, required=True, as_str=False)
-        analytics_data = get_profile_stock_analytics(profile_id=profile_id)
+        analytics_data = get_cached_profile_stock_analytics(profile_id=profile_id)
         serializer = StockAnalyticsSerializer(analytics_data,context={'request': request})
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response
     def low_stock(self, request):
         """Get low stock inventory item rows for dashboard view."""
         profile_id = get_request_profile_id(request, required=True, as_str=False)
@@ -578,7 +628,9 @@ class StockReservationViewSet(BaseCachePermissionViewset):
 
         inventory_id = self.request.query_params.get('inventory')
         if inventory_id:
-            queryset = queryset.filter(inventory_item__metadata__legacy_inventory_id=str(inventory_id))
+            queryset = filter_inventory_items_for_legacy_inventory(
+                queryset, inventory_id, profile_id=profile_id, prefix='inventory_item__'
+            )
         inventory_item_id = self.request.query_params.get('inventory_item')
         if inventory_item_id:
             queryset = queryset.filter(inventory_item_id=inventory_item_id)
@@ -690,3 +742,159 @@ class StockReservationViewSet(BaseCachePermissionViewset):
         output = StockReservationSerializer(result['reservation'], context=self.get_serializer_context())
         return Response(output.data)
     
+
+
+class StockMovementCursorPagination(BasePagination):
+    """Keyset pagination over ``(occurred_at, id)``, newest first, so deep pages cost the same as the first."""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        queryset = queryset.order_by('-occurred_at', '-id')
+        if position is not None:
+            occurred_at, movement_id = position
+            queryset = queryset.filter(
+                Q(occurred_at__lt=occurred_at) | Q(occurred_at=occurred_at, id__lt=movement_id)
+            )
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_position = (page[-1].occurred_at, page[-1].id) if len(rows) > page_size else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, occurred_at, movement_id):
+        raw = f"{occurred_at.isoformat()}|{movement_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            occurred_at, movement_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            occurred_at = parse_datetime(occurred_at)
+            movement_id = uuid.UUID(movement_id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if occurred_at is None:
+            raise NotFound('Invalid cursor')
+        return occurred_at, movement_id
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(*self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class _EchoBuffer:
+    def write(self, value):
+        return value
+
+
+class StockMovementViewSet(PermissionRequiredMixin, viewsets.ReadOnlyModelViewSet):
+    """Append-only stock movement ledger with cursor pagination and streamed exports."""
+    required_permission = UNIFIED_PERMISSION_DICT.get('stock_movement')
+    queryset = StockMovement.objects.select_related('from_location', 'to_location', 'stock_lot', 'stock_serial')
+    serializer_class = StockMovementLedgerSerializer
+    pagination_class = StockMovementCursorPagination
+
+    export_chunk_size = 2000
+    export_fields = [
+        ('id', 'id'),
+        ('occurred_at', 'occurred_at'),
+        ('inventory_item_id', 'inventory_item_id'),
+        ('movement_type', 'movement_type'),
+        ('quantity', 'quantity'),
+        ('unit_cost', 'unit_cost'),
+        ('from_location_id', 'from_location_id'),
+        ('to_location_id', 'to_location_id'),
+        ('lot_number', 'stock_lot__lot_number'),
+        ('serial_number', 'stock_serial__serial_number'),
+        ('reference_type', 'reference_type'),
+        ('reference_id', 'reference_id'),
+        ('actor_user_id', 'actor_user_id'),
+        ('notes', 'notes'),
+    ]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        profile_id = get_request_profile_id(self.request, as_str=False)
+        if profile_id:
+            queryset = queryset.filter(profile_id=profile_id)
+
+        params = self.request.query_params
+        if params.get('inventory_item'):
+            queryset = queryset.filter(inventory_item_id=params['inventory_item'])
+        if params.get('inventory'):
+            queryset = filter_inventory_items_for_legacy_inventory(
+                queryset, params['inventory'], profile_id=profile_id, prefix='inventory_item__'
+            )
+        if params.get('location'):
+            queryset = queryset.filter(
+                Q(from_location_id=params['location']) | Q(to_location_id=params['location'])
+            )
+        if params.get('movement_type'):
+            queryset = queryset.filter(movement_type__in=params['movement_type'].split(','))
+        if params.get('reference_type'):
+            queryset = queryset.filter(reference_type=params['reference_type'])
+        if params.get('reference_id'):
+            queryset = queryset.filter(reference_id=params['reference_id'])
+        for param, lookup in (('occurred_after', 'occurred_at__gte'), ('occurred_before', 'occurred_at__lt')):
+            if params.get(param):
+                value = parse_datetime(params[param])
+                if value is None:
+                    raise ValidationError({param: 'Expected an ISO 8601 datetime.'})
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the filtered ledger, oldest first, as NDJSON (default) or CSV."""
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in {'ndjson', 'csv'}:
+            return Response({'error': 'file_format must be ndjson or csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = (
+            self.get_queryset()
+            .order_by('occurred_at', 'id')
+            .values_list(*[lookup for _, lookup in self.export_fields])
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+        columns = [name for name, _ in self.export_fields]
+        if file_format == 'csv':
+            content = self._iter_csv(columns, rows)
+            content_type = 'text/csv'
+        else:
+            content = self._iter_ndjson(columns, rows)
+            content_type = 'application/x-ndjson'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="stock-movements.{file_format}"'
+        return response
+
+    def _iter_ndjson(self, columns, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+    def _iter_csv(self, columns, rows):
+        writer = csv.writer(_EchoBuffer())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
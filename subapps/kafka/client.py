@@ -70,6 +70,7 @@ def publish_event(
     event_id: str | None = None,
     event_version: int = 1,
     use_outbox: bool | None = None,
+    debounce_seconds: float = 0,
 ) -> dict[str, Any]:
     kafka_settings = get_kafka_settings()
     envelope = {
@@ -90,6 +91,7 @@ def publish_event(
             envelope=envelope,
             key=key,
             headers=headers,
+            debounce_seconds=debounce_seconds,
         )
         if queued:
             return envelope
@@ -70,6 +70,7 @@ class KafkaSettings:
     outbox_batch_size: int
     outbox_poll_interval_seconds: float
     outbox_retry_delay_seconds: int
+    outbox_debounce_seconds: float
 
     @classmethod
     def from_env(cls) -> "KafkaSettings":
@@ -103,6 +104,7 @@ class KafkaSettings:
             outbox_batch_size=_parse_int(os.getenv("KAFKA_OUTBOX_BATCH_SIZE"), 100),
             outbox_poll_interval_seconds=_parse_float(os.getenv("KAFKA_OUTBOX_POLL_INTERVAL"), 2.0),
             outbox_retry_delay_seconds=_parse_int(os.getenv("KAFKA_OUTBOX_RETRY_DELAY_SECONDS"), 30),
+            outbox_debounce_seconds=_parse_float(os.getenv("KAFKA_OUTBOX_DEBOUNCE_SECONDS"), 0.0),
         )
 
     def _apply_security(self, config: dict[str, object]) -> dict[str, object]:
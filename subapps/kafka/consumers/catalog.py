@@ -2,10 +2,10 @@ from __future__ import annotations
 
 from typing import Any
 
-from django.core.cache import cache
 from django.db import transaction
 
 from mainapps.projections.models import CatalogProductProjection, CatalogVariantProjection
+from subapps.services.catalog_projection import CatalogProjectionLookup
 
 
 def _coerce_bool(value: Any, default: bool = True) -> bool:
@@ -37,11 +37,15 @@ def _upsert_product_projection(payload: dict[str, Any]) -> CatalogProductProject
     return product
 
 
-def _invalidate_variant_cache(*keys: str | None) -> None:
-    for key in keys:
-        if not key:
-            continue
-        cache.delete(f"product_variant_projection_{key}")
+def _invalidate_product_variants(product: CatalogProductProjection) -> None:
+    # Variant details embed their product, so a product change evicts every variant of it.
+    lookups = []
+    for variant_id, variant_barcode in CatalogVariantProjection.objects.filter(product=product).values_list(
+        "variant_id",
+        "variant_barcode",
+    ):
+        lookups.extend((str(variant_id), variant_barcode))
+    CatalogProjectionLookup.invalidate(*lookups)
 
 
 def handle_catalog_product_event(envelope: dict[str, Any], **_: Any) -> bool:
@@ -61,6 +65,7 @@ def handle_catalog_product_event(envelope: dict[str, Any], **_: Any) -> bool:
     if envelope.get("event_name") == "catalog.product.deleted":
         CatalogVariantProjection.objects.filter(product=product).update(is_active=False, pos_visible=False)
 
+    _invalidate_product_variants(product)
     return True
 
 
@@ -104,5 +109,7 @@ def handle_catalog_variant_event(envelope: dict[str, Any], **_: Any) -> bool:
             defaults=defaults,
         )
 
-    _invalidate_variant_cache(existing_barcode, payload.get("variant_barcode"), str(variant.variant_id))
+    if product_payload is not None:
+        _invalidate_product_variants(product)
+    CatalogProjectionLookup.invalidate(existing_barcode, payload.get("variant_barcode"), str(variant.variant_id))
     return True
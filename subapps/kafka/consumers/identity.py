@@ -6,6 +6,7 @@ from typing import Any
 from django.db import transaction
 
 from mainapps.identity.models import IdentityCompanyProfile, IdentityMembership, IdentityUser
+from subapps.services.identity_directory import IdentityDirectory
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +46,7 @@ def _upsert_user(payload: dict[str, Any]) -> IdentityUser:
         user_id=user_id,
         defaults=_user_defaults(payload),
     )
+    IdentityDirectory.invalidate_users(user_id)
     return user
 
 
@@ -66,10 +68,12 @@ def handle_identity_user_event(envelope: dict[str, Any], **_: Any) -> bool:
     if envelope.get("event_name") == "identity.user.deleted":
         defaults["is_active"] = False
 
+    user_id = _coerce_int(payload.get("user_id"), "user_id")
     IdentityUser.objects.update_or_create(
-        user_id=_coerce_int(payload.get("user_id"), "user_id"),
+        user_id=user_id,
         defaults=defaults,
     )
+    IdentityDirectory.invalidate_users(user_id)
     return True
 
 
@@ -48,79 +48,129 @@ def _iter_inventory_items(payload: dict[str, Any]) -> list[dict[str, Any]]:
     return [item for item in raw_items if isinstance(item, dict) and item.get("inventory_item_id")]
 
 
-def _resolve_item_context(profile_id: int, item_payload: dict[str, Any], *, quantity: Decimal):
-    inventory_item = InventoryItem.objects.filter(
-        id=item_payload["inventory_item_id"],
-        profile_id=profile_id,
-    ).first()
-    if inventory_item is None:
-        raise ValueError(f"Inventory item {item_payload.get('inventory_item_id')} was not found.")
-
-    stock_lot = None
-    stock_serial = None
-    stock_location = None
-
-    stock_serial_id = _as_str(item_payload.get("stock_serial_id"))
-    if stock_serial_id:
-        stock_serial = StockSerial.objects.select_related("stock_location", "stock_lot").filter(
-            id=stock_serial_id,
+def _resolve_item_contexts(profile_id: int, requests: list[tuple[dict[str, Any], Decimal]]):
+    """Resolve stock context for every basket line with one query per lookup, in request order."""
+    inventory_items = InventoryItem.objects.in_bulk(
+        [item_payload["inventory_item_id"] for item_payload, _ in requests]
+    )
+    inventory_items = {
+        str(item_id): inventory_item
+        for item_id, inventory_item in inventory_items.items()
+        if inventory_item.profile_id == profile_id
+    }
+
+    serial_ids = [_as_str(item_payload.get("stock_serial_id")) for item_payload, _ in requests]
+    serials = {
+        str(stock_serial.id): stock_serial
+        for stock_serial in StockSerial.objects.select_related("stock_location", "stock_lot").filter(
+            id__in=[serial_id for serial_id in serial_ids if serial_id],
+            profile_id=profile_id,
+        )
+    }
+    lot_ids = [_as_str(item_payload.get("stock_lot_id")) for item_payload, _ in requests]
+    lots = {
+        str(stock_lot.id): stock_lot
+        for stock_lot in StockLot.objects.filter(id__in=[lot_id for lot_id in lot_ids if lot_id], profile_id=profile_id)
+    }
+    location_ids = [_as_str(item_payload.get("stock_location_id")) for item_payload, _ in requests]
+    locations = {
+        str(stock_location.id): stock_location
+        for stock_location in StockLocation.objects.filter(
+            id__in=[location_id for location_id in location_ids if location_id],
             profile_id=profile_id,
-            inventory_item=inventory_item,
-        ).first()
-        if stock_serial is None:
-            raise ValueError(f"Stock serial {stock_serial_id} was not found for inventory item {inventory_item.id}.")
-        stock_location = stock_serial.stock_location
-        stock_lot = stock_serial.stock_lot
-    elif inventory_item.track_serial:
-        stock_serial = (
+        )
+    }
+
+    def _inventory_item_for(item_payload):
+        inventory_item = inventory_items.get(_as_str(item_payload["inventory_item_id"]))
+        if inventory_item is None:
+            raise ValueError(f"Inventory item {item_payload.get('inventory_item_id')} was not found.")
+        return inventory_item
+
+    auto_serial_item_ids = {
+        _inventory_item_for(item_payload).id
+        for item_payload, _ in requests
+        if not _as_str(item_payload.get("stock_serial_id")) and _inventory_item_for(item_payload).track_serial
+    }
+    available_serials: dict[Any, list[StockSerial]] = {}
+    if auto_serial_item_ids:
+        for stock_serial in (
             StockSerial.objects.select_related("stock_location", "stock_lot")
             .filter(
                 profile_id=profile_id,
-                inventory_item=inventory_item,
+                inventory_item_id__in=auto_serial_item_ids,
                 status=StockSerialStatus.AVAILABLE,
             )
             .order_by("created_at")
-            .first()
-        )
-        if stock_serial is None:
-            raise StockDomainError(f"No available serial found for inventory item {inventory_item.id}.")
-        stock_location = stock_serial.stock_location
-        stock_lot = stock_serial.stock_lot
-
-    stock_lot_id = _as_str(item_payload.get("stock_lot_id"))
-    if stock_lot is None and stock_lot_id:
-        stock_lot = StockLot.objects.filter(
-            id=stock_lot_id,
-            profile_id=profile_id,
-            inventory_item=inventory_item,
-        ).first()
-        if stock_lot is None:
-            raise ValueError(f"Stock lot {stock_lot_id} was not found for inventory item {inventory_item.id}.")
-
-    stock_location_id = _as_str(item_payload.get("stock_location_id"))
-    if stock_location is None and stock_location_id:
-        stock_location = StockLocation.objects.filter(id=stock_location_id, profile_id=profile_id).first()
-        if stock_location is None:
-            raise ValueError(f"Stock location {stock_location_id} was not found for profile {profile_id}.")
-
-    if stock_location is None:
-        balance = (
+        ):
+            available_serials.setdefault(stock_serial.inventory_item_id, []).append(stock_serial)
+
+    contexts = []
+    for item_payload, quantity in requests:
+        inventory_item = _inventory_item_for(item_payload)
+        stock_lot = None
+        stock_serial = None
+        stock_location = None
+
+        stock_serial_id = _as_str(item_payload.get("stock_serial_id"))
+        if stock_serial_id:
+            stock_serial = serials.get(stock_serial_id)
+            if stock_serial is None or stock_serial.inventory_item_id != inventory_item.id:
+                raise ValueError(f"Stock serial {stock_serial_id} was not found for inventory item {inventory_item.id}.")
+            stock_location = stock_serial.stock_location
+            stock_lot = stock_serial.stock_lot
+        elif inventory_item.track_serial:
+            candidates = available_serials.get(inventory_item.id) or []
+            if not candidates:
+                raise StockDomainError(f"No available serial found for inventory item {inventory_item.id}.")
+            stock_serial = candidates.pop(0)
+            stock_location = stock_serial.stock_location
+            stock_lot = stock_serial.stock_lot
+
+        stock_lot_id = _as_str(item_payload.get("stock_lot_id"))
+        if stock_lot is None and stock_lot_id:
+            stock_lot = lots.get(stock_lot_id)
+            if stock_lot is None or stock_lot.inventory_item_id != inventory_item.id:
+                raise ValueError(f"Stock lot {stock_lot_id} was not found for inventory item {inventory_item.id}.")
+
+        stock_location_id = _as_str(item_payload.get("stock_location_id"))
+        if stock_location is None and stock_location_id:
+            stock_location = locations.get(stock_location_id)
+            if stock_location is None:
+                raise ValueError(f"Stock location {stock_location_id} was not found for profile {profile_id}.")
+
+        contexts.append([inventory_item, stock_location, stock_lot, stock_serial, quantity])
+
+    unplaced = [context for context in contexts if context[1] is None]
+    if unplaced:
+        candidates_by_item: dict[Any, list[dict[str, Any]]] = {}
+        for balance in (
             StockBalance.objects.select_related("stock_location", "stock_lot")
             .filter(
                 profile_id=profile_id,
-                inventory_item=inventory_item,
-                quantity_available__gte=quantity,
+                inventory_item_id__in={context[0].id for context in unplaced},
+                quantity_available__gt=0,
             )
             .order_by("stock_lot__expiry_date", "created_at")
-            .first()
-        )
-        if balance is None:
-            raise StockDomainError(f"No stock balance can satisfy quantity {quantity} for inventory item {inventory_item.id}.")
-        stock_location = balance.stock_location
-        if stock_lot is None:
-            stock_lot = balance.stock_lot
+        ):
+            candidates_by_item.setdefault(balance.inventory_item_id, []).append(
+                {"balance": balance, "available": _to_decimal(balance.quantity_available)}
+            )
+        for context in unplaced:
+            inventory_item, _, stock_lot, _, quantity = context
+            for candidate in candidates_by_item.get(inventory_item.id, []):
+                if candidate["available"] >= quantity:
+                    candidate["available"] -= quantity
+                    context[1] = candidate["balance"].stock_location
+                    if stock_lot is None:
+                        context[2] = candidate["balance"].stock_lot
+                    break
+            else:
+                raise StockDomainError(
+                    f"No stock balance can satisfy quantity {quantity} for inventory item {inventory_item.id}."
+                )
 
-    return inventory_item, stock_location, stock_lot, stock_serial
+    return [tuple(context[:4]) for context in contexts]
 
 
 def _active_reservations(*, profile_id: int, order_id: str, item_id: str):
@@ -146,6 +196,15 @@ def _handle_reservation_requested(payload: dict[str, Any]) -> bool:
     order_number = _as_str(payload.get("order_number"))
 
     with transaction.atomic():
+        reserved_item_ids = set(
+            StockReservation.objects.filter(
+                profile_id=profile_id,
+                external_order_type="pos_order_item",
+                external_order_id=order_id,
+                status__in=[StockReservationStatus.ACTIVE, StockReservationStatus.PARTIALLY_FULFILLED],
+            ).values_list("external_order_line_id", flat=True)
+        )
+        requests = []
         for item_payload in _iter_inventory_items(payload):
             item_id = _as_str(item_payload.get("item_id"))
             if not item_id:
@@ -153,26 +212,35 @@ def _handle_reservation_requested(payload: dict[str, Any]) -> bool:
             requested_quantity = _to_decimal(item_payload.get("requested_quantity") or item_payload.get("ordered_quantity"))
             if requested_quantity <= 0:
                 continue
-            if _active_reservations(profile_id=profile_id, order_id=order_id, item_id=item_id).exists():
+            if item_id in reserved_item_ids:
                 continue
-
-            inventory_item, stock_location, stock_lot, stock_serial = _resolve_item_context(
-                profile_id,
-                item_payload,
-                quantity=requested_quantity,
-            )
-            StockDomainService.reserve_stock(
-                inventory_item=inventory_item,
-                stock_location=stock_location,
-                quantity=requested_quantity,
-                external_order_type="pos_order_item",
-                external_order_id=order_id,
-                external_order_line_id=item_id,
-                actor_user_id=actor_user_id,
-                stock_lot=stock_lot,
-                stock_serial=stock_serial,
-                notes=notes or f"Reserved for POS order {order_number or order_id}",
+            reserved_item_ids.add(item_id)
+            requests.append((item_payload, requested_quantity))
+
+        if not requests:
+            return True
+
+        lines = []
+        contexts = _resolve_item_contexts(profile_id, requests)
+        for (item_payload, requested_quantity), context in zip(requests, contexts):
+            inventory_item, stock_location, stock_lot, stock_serial = context
+            lines.append(
+                {
+                    "inventory_item": inventory_item,
+                    "stock_location": stock_location,
+                    "quantity": requested_quantity,
+                    "external_order_type": "pos_order_item",
+                    "external_order_id": order_id,
+                    "external_order_line_id": _as_str(item_payload.get("item_id")),
+                    "stock_lot": stock_lot,
+                    "stock_serial": stock_serial,
+                }
             )
+        StockDomainService.reserve_stock_batch(
+            lines=lines,
+            actor_user_id=actor_user_id,
+            notes=notes or f"Reserved for POS order {order_number or order_id}",
+        )
     return True
 
 
@@ -1,13 +1,21 @@
 from subapps.kafka.producers.inventory import (
+    publish_inventory_availabilities_upserted,
     publish_inventory_availability_upserted,
     publish_inventory_fulfillment_completed,
+    publish_inventory_fulfillments_completed,
     publish_inventory_reservation_released,
     publish_inventory_reservation_upserted,
+    publish_inventory_reservations_released,
+    publish_inventory_reservations_upserted,
 )
 
 __all__ = [
     "publish_inventory_availability_upserted",
+    "publish_inventory_availabilities_upserted",
     "publish_inventory_reservation_upserted",
+    "publish_inventory_reservations_upserted",
     "publish_inventory_reservation_released",
+    "publish_inventory_reservations_released",
     "publish_inventory_fulfillment_completed",
+    "publish_inventory_fulfillments_completed",
 ]
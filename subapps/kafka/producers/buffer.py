@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Any
+
+from subapps.kafka.producers.inventory import (
+    publish_inventory_availabilities_upserted,
+    publish_inventory_fulfillments_completed,
+    publish_inventory_reservations_released,
+    publish_inventory_reservations_upserted,
+)
+from subapps.services.transaction_buffer import get_transaction_buffer
+
+AVAILABILITY_UPSERTED = "availability_upserted"
+RESERVATION_UPSERTED = "reservation_upserted"
+RESERVATION_RELEASED = "reservation_released"
+FULFILLMENT_COMPLETED = "fulfillment_completed"
+
+# Flushed in this order so availability lands before the reservation events that reference it.
+_PUBLISHERS = {
+    AVAILABILITY_UPSERTED: lambda ids: publish_inventory_availabilities_upserted(inventory_item_ids=ids),
+    RESERVATION_UPSERTED: lambda ids: publish_inventory_reservations_upserted(reservation_ids=ids),
+    RESERVATION_RELEASED: lambda ids: publish_inventory_reservations_released(reservation_ids=ids),
+    FULFILLMENT_COMPLETED: lambda ids: publish_inventory_fulfillments_completed(reservation_ids=ids),
+}
+
+
+def _new_buffer() -> dict[str, dict[Any, None]]:
+    return {event_type: {} for event_type in _PUBLISHERS}
+
+
+def _flush(pending: dict[str, dict[Any, None]]) -> None:
+    for event_type, publish in _PUBLISHERS.items():
+        record_ids = list(pending[event_type])
+        if record_ids:
+            publish(record_ids)
+
+
+def publish_inventory_events_on_commit(event_type: str, record_ids, *, using: str | None = None) -> None:
+    """
+    Queue inventory events for the current transaction.
+
+    Events are deduplicated by type and record id and published in one batched
+    pass when the outermost transaction commits. Outside a transaction they are
+    published immediately.
+    """
+    if event_type not in _PUBLISHERS:
+        raise ValueError(f"Unknown inventory event type: {event_type}")
+    record_ids = list(dict.fromkeys(record_ids))
+    if not record_ids:
+        return
+
+    pending = get_transaction_buffer("inventory_events", _new_buffer, _flush, using=using)
+    if pending is None:
+        _PUBLISHERS[event_type](record_ids)
+        return
+    pending[event_type].update(dict.fromkeys(record_ids))
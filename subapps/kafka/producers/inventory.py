@@ -6,17 +6,20 @@ import uuid
 from decimal import Decimal
 from typing import Any
 
-from django.db.models import Sum
+from django.db.models import Q
+from django.utils import timezone
 
 from mainapps.inventory.models import Inventory, InventoryItem, InventoryItemStatus
 from mainapps.projections.models import CatalogVariantProjection
-from mainapps.stock.models import StockBalance, StockReservation
+from mainapps.stock.models import StockReservation
 from subapps.kafka.client import publish_event
+from subapps.kafka.config import get_kafka_settings
 from subapps.kafka.topics import (
     INVENTORY_AVAILABILITY_TOPIC,
     INVENTORY_FULFILLMENT_TOPIC,
     INVENTORY_RESERVATION_TOPIC,
 )
+from subapps.services.inventory_availability import get_inventory_item_availability_map
 
 logger = logging.getLogger(__name__)
 
@@ -27,10 +30,6 @@ def _to_decimal(value: Any) -> Decimal:
     return Decimal(str(value or 0))
 
 
-def _decimal_aggregate(queryset, field_name: str) -> Decimal:
-    return _to_decimal(queryset.aggregate(total=Sum(field_name))["total"] or 0)
-
-
 def _coerce_threshold(value: Any) -> int | None:
     threshold = _to_decimal(value)
     if threshold <= 0:
@@ -38,27 +37,23 @@ def _coerce_threshold(value: Any) -> int | None:
     return int(math.ceil(float(threshold)))
 
 
-def _resolve_legacy_inventory_external_id(inventory_item: InventoryItem) -> str:
-    metadata = inventory_item.metadata or {}
-    legacy_inventory_id = metadata.get("legacy_inventory_id")
-    if not legacy_inventory_id:
-        return ""
-    return (
-        Inventory.objects.filter(id=legacy_inventory_id)
-        .values_list("external_system_id", flat=True)
-        .first()
-        or ""
-    )
-
-
-def _resolve_catalog_variant(inventory_item: InventoryItem) -> CatalogVariantProjection | None:
-    queryset = CatalogVariantProjection.objects.select_related("product").filter(profile_id=inventory_item.profile_id)
+def _derive_stock_status(inventory_item: InventoryItem, total_quantity: Decimal) -> str:
+    if inventory_item.status == InventoryItemStatus.ARCHIVED:
+        return "ARCHIVED"
+    if inventory_item.status == InventoryItemStatus.DISCONTINUED:
+        return "DISCONTINUED"
+    if inventory_item.status == InventoryItemStatus.DRAFT:
+        return "DRAFT"
+    if total_quantity <= 0:
+        return "OUT_OF_STOCK"
+    if total_quantity <= _to_decimal(inventory_item.minimum_stock_level):
+        return "LOW_STOCK"
+    if total_quantity <= _to_decimal(inventory_item.reorder_point):
+        return "REORDER_NEEDED"
+    return "IN_STOCK"
 
-    if inventory_item.product_variant_id:
-        variant = queryset.filter(variant_id=inventory_item.product_variant_id).first()
-        if variant is not None:
-            return variant
 
+def _variant_lookup_values(inventory_item: InventoryItem) -> list[str]:
     candidate_values: list[str] = []
     for raw_value in [
         inventory_item.barcode_snapshot,
@@ -68,35 +63,64 @@ def _resolve_catalog_variant(inventory_item: InventoryItem) -> CatalogVariantPro
         normalized = str(raw_value or "").strip()
         if normalized and normalized not in candidate_values:
             candidate_values.append(normalized)
-
-    for lookup in candidate_values:
-        variant = queryset.filter(variant_barcode=lookup).first()
-        if variant is not None:
-            return variant
-
-        try:
-            variant_uuid = uuid.UUID(lookup)
-        except (AttributeError, TypeError, ValueError):
-            variant_uuid = None
-        if variant_uuid is not None:
-            variant = queryset.filter(variant_id=variant_uuid).first()
+    return candidate_values
+
+
+def _resolve_catalog_variants(inventory_items: list[InventoryItem]) -> dict[Any, CatalogVariantProjection]:
+    """
+    Map ``inventory_item.id`` to its catalog variant, loaded in one query.
+
+    A variant matches on ``product_variant_id`` first, then on each lookup value as a
+    barcode, a variant ID and a SKU, in that order.
+    """
+    variant_ids = set()
+    lookup_values = set()
+    for inventory_item in inventory_items:
+        if inventory_item.product_variant_id:
+            variant_ids.add(inventory_item.product_variant_id)
+        for lookup in _variant_lookup_values(inventory_item):
+            lookup_values.add(lookup)
+            try:
+                variant_ids.add(uuid.UUID(lookup))
+            except (AttributeError, TypeError, ValueError):
+                pass
+    if not variant_ids and not lookup_values:
+        return {}
+
+    by_id: dict[tuple, CatalogVariantProjection] = {}
+    by_barcode: dict[tuple, CatalogVariantProjection] = {}
+    by_sku: dict[tuple, CatalogVariantProjection] = {}
+    for variant in CatalogVariantProjection.objects.select_related("product").filter(
+        Q(variant_id__in=variant_ids) | Q(variant_barcode__in=lookup_values) | Q(variant_sku__in=lookup_values),
+        profile_id__in={inventory_item.profile_id for inventory_item in inventory_items},
+    ):
+        by_id.setdefault((variant.profile_id, variant.variant_id), variant)
+        if variant.variant_barcode:
+            by_barcode.setdefault((variant.profile_id, variant.variant_barcode), variant)
+        if variant.variant_sku:
+            by_sku.setdefault((variant.profile_id, variant.variant_sku), variant)
+
+    variants = {}
+    for inventory_item in inventory_items:
+        profile_id = inventory_item.profile_id
+        variant = by_id.get((profile_id, inventory_item.product_variant_id)) if inventory_item.product_variant_id else None
+        for lookup in _variant_lookup_values(inventory_item) if variant is None else []:
+            variant = by_barcode.get((profile_id, lookup))
+            if variant is None:
+                try:
+                    variant = by_id.get((profile_id, uuid.UUID(lookup)))
+                except (AttributeError, TypeError, ValueError):
+                    variant = None
+            if variant is None:
+                variant = by_sku.get((profile_id, lookup))
             if variant is not None:
-                return variant
-
-        variant = queryset.filter(variant_sku=lookup).first()
+                break
         if variant is not None:
-            return variant
+            variants[inventory_item.id] = variant
+    return variants
 
-    return None
-
-
-def _sync_inventory_item_variant_fields(
-    inventory_item: InventoryItem,
-    variant: CatalogVariantProjection | None,
-) -> None:
-    if variant is None:
-        return
 
+def _apply_variant_fields(inventory_item: InventoryItem, variant: CatalogVariantProjection) -> bool:
     changed = False
     metadata = dict(inventory_item.metadata or {})
     if inventory_item.product_template_id != variant.product_id:
@@ -114,80 +138,98 @@ def _sync_inventory_item_variant_fields(
         changed = True
     if changed:
         inventory_item.metadata = metadata
-        inventory_item.save(update_fields=[
-            "product_template_id",
-            "product_variant_id",
-            "barcode_snapshot",
-            "sku_snapshot",
-            "metadata",
-            "updated_at",
-        ])
-
-
-def _derive_stock_status(inventory_item: InventoryItem, total_quantity: Decimal) -> str:
-    if inventory_item.status == InventoryItemStatus.ARCHIVED:
-        return "ARCHIVED"
-    if inventory_item.status == InventoryItemStatus.DISCONTINUED:
-        return "DISCONTINUED"
-    if inventory_item.status == InventoryItemStatus.DRAFT:
-        return "DRAFT"
-    if total_quantity <= 0:
-        return "OUT_OF_STOCK"
-    if total_quantity <= _to_decimal(inventory_item.minimum_stock_level):
-        return "LOW_STOCK"
-    if total_quantity <= _to_decimal(inventory_item.reorder_point):
-        return "REORDER_NEEDED"
-    return "IN_STOCK"
+    return changed
+
+
+def _build_availability_snapshots_for_items(inventory_items: list[InventoryItem]) -> dict[Any, dict[str, Any] | None]:
+    if not inventory_items:
+        return {}
+
+    variants = _resolve_catalog_variants(inventory_items)
+    changed_items = [
+        inventory_item
+        for inventory_item in inventory_items
+        if inventory_item.id in variants and _apply_variant_fields(inventory_item, variants[inventory_item.id])
+    ]
+    if changed_items:
+        now = timezone.now()
+        for inventory_item in changed_items:
+            inventory_item.updated_at = now
+        InventoryItem.objects.bulk_update(
+            changed_items,
+            ["product_template_id", "product_variant_id", "barcode_snapshot", "sku_snapshot", "metadata", "updated_at"],
+        )
 
+    availability = get_inventory_item_availability_map([inventory_item.id for inventory_item in inventory_items])
 
-def _build_availability_snapshot(inventory_item: InventoryItem) -> dict[str, Any] | None:
-    variant = _resolve_catalog_variant(inventory_item)
-    if variant is not None:
-        _sync_inventory_item_variant_fields(inventory_item, variant)
+    legacy_inventory_ids = {
+        inventory_item.id: (inventory_item.metadata or {}).get("legacy_inventory_id")
+        for inventory_item in inventory_items
+    }
+    external_ids = {
+        str(inventory_id): external_system_id or ""
+        for inventory_id, external_system_id in Inventory.objects.filter(
+            id__in=[legacy_id for legacy_id in legacy_inventory_ids.values() if legacy_id]
+        ).values_list("id", "external_system_id")
+    }
 
-    variant_id = variant.variant_id if variant is not None else inventory_item.product_variant_id
-    if variant_id is None:
-        logger.warning(
-            "Skipping inventory event for inventory_item=%s because no catalog variant mapping was found.",
-            inventory_item.id,
+    snapshots: dict[Any, dict[str, Any] | None] = {}
+    for inventory_item in inventory_items:
+        variant = variants.get(inventory_item.id)
+        variant_id = variant.variant_id if variant is not None else inventory_item.product_variant_id
+        if variant_id is None:
+            logger.warning(
+                "Skipping inventory event for inventory_item=%s because no catalog variant mapping was found.",
+                inventory_item.id,
+            )
+            snapshots[inventory_item.id] = None
+            continue
+
+        row = availability.get(inventory_item.id) or {}
+        total_quantity = _to_decimal(row.get("quantity_on_hand"))
+        legacy_inventory_id = legacy_inventory_ids[inventory_item.id]
+        low_stock_threshold = _coerce_threshold(
+            inventory_item.minimum_stock_level if inventory_item.minimum_stock_level else inventory_item.reorder_point
         )
-        return None
-
-    balances = StockBalance.objects.filter(
-        profile_id=inventory_item.profile_id,
-        inventory_item=inventory_item,
-    )
-    total_quantity = _decimal_aggregate(balances, "quantity_on_hand")
-    reserved_quantity = _decimal_aggregate(balances, "quantity_reserved")
-    available_quantity = _decimal_aggregate(balances, "quantity_available")
-    low_stock_threshold = _coerce_threshold(
-        inventory_item.minimum_stock_level if inventory_item.minimum_stock_level else inventory_item.reorder_point
-    )
-
+        snapshots[inventory_item.id] = {
+            "variant_id": str(variant_id),
+            "product_id": str(variant.product_id) if variant is not None else (
+                str(inventory_item.product_template_id) if inventory_item.product_template_id else ""
+            ),
+            "profile_id": inventory_item.profile_id,
+            "inventory_item_id": str(inventory_item.id),
+            "inventory_external_id": external_ids.get(str(legacy_inventory_id), "") if legacy_inventory_id else "",
+            "variant_barcode": (
+                variant.variant_barcode if variant is not None else inventory_item.barcode_snapshot or None
+            ),
+            "variant_sku": (
+                variant.variant_sku if variant is not None else inventory_item.sku_snapshot or ""
+            ),
+            "inventory_name": inventory_item.name_snapshot,
+            "total_quantity": total_quantity,
+            "reserved_quantity": _to_decimal(row.get("quantity_reserved")),
+            "available_quantity": _to_decimal(row.get("quantity_available")),
+            "low_stock_threshold": low_stock_threshold,
+            "stock_status": _derive_stock_status(inventory_item, total_quantity),
+            "track_stock": inventory_item.track_stock,
+            "track_lot": inventory_item.track_lot,
+            "track_serial": inventory_item.track_serial,
+            "inventory_item_status": inventory_item.status,
+        }
+    return snapshots
+
+
+def build_availability_snapshots(inventory_item_ids) -> dict[str, dict[str, Any] | None]:
+    """
+    Build availability payloads for many inventory items with a fixed number of queries.
+
+    Returns a mapping of ``str(inventory_item_id)`` to the snapshot, or ``None`` for
+    items without a catalog variant mapping. Unknown ids are omitted.
+    """
+    inventory_items = list(InventoryItem.objects.filter(id__in=list(inventory_item_ids)))
     return {
-        "variant_id": str(variant_id),
-        "product_id": str(variant.product_id) if variant is not None else (
-            str(inventory_item.product_template_id) if inventory_item.product_template_id else ""
-        ),
-        "profile_id": inventory_item.profile_id,
-        "inventory_item_id": str(inventory_item.id),
-        "inventory_external_id": _resolve_legacy_inventory_external_id(inventory_item),
-        "variant_barcode": (
-            variant.variant_barcode if variant is not None else inventory_item.barcode_snapshot or None
-        ),
-        "variant_sku": (
-            variant.variant_sku if variant is not None else inventory_item.sku_snapshot or ""
-        ),
-        "inventory_name": inventory_item.name_snapshot,
-        "total_quantity": total_quantity,
-        "reserved_quantity": reserved_quantity,
-        "available_quantity": available_quantity,
-        "low_stock_threshold": low_stock_threshold,
-        "stock_status": _derive_stock_status(inventory_item, total_quantity),
-        "track_stock": inventory_item.track_stock,
-        "track_lot": inventory_item.track_lot,
-        "track_serial": inventory_item.track_serial,
-        "inventory_item_status": inventory_item.status,
+        str(inventory_item_id): snapshot
+        for inventory_item_id, snapshot in _build_availability_snapshots_for_items(inventory_items).items()
     }
 
 
@@ -209,76 +251,96 @@ def _serialize_reservation(reservation: StockReservation) -> dict[str, Any]:
     }
 
 
-def publish_inventory_availability_upserted(*, inventory_item_id) -> dict[str, Any] | None:
-    inventory_item = InventoryItem.objects.filter(id=inventory_item_id).first()
-    if inventory_item is None:
-        logger.warning("Skipping inventory availability event because inventory_item=%s was not found.", inventory_item_id)
-        return None
+def _publish_reservation_events(reservation_ids, *, topic: str, event_name: str) -> list[dict[str, Any]]:
+    reservation_ids = list(reservation_ids)
+    reservations = list(
+        StockReservation.objects.select_related("inventory_item", "stock_serial")
+        .filter(id__in=reservation_ids)
+        .order_by("created_at")
+    )
+    found_ids = {str(reservation.id) for reservation in reservations}
+    for reservation_id in reservation_ids:
+        if str(reservation_id) not in found_ids:
+            logger.warning("Skipping %s event because reservation=%s was not found.", event_name, reservation_id)
+    inventory_items = {reservation.inventory_item_id: reservation.inventory_item for reservation in reservations}
+    snapshots = _build_availability_snapshots_for_items(list(inventory_items.values()))
+    results = []
+    for reservation in reservations:
+        snapshot = snapshots.get(reservation.inventory_item_id)
+        if snapshot is None:
+            continue
+        payload = dict(snapshot)
+        payload["reservation"] = _serialize_reservation(reservation)
+        results.append(publish_event(topic, event_name, payload, key=payload["variant_id"]))
+    return results
+
+
+def publish_inventory_availabilities_upserted(*, inventory_item_ids) -> list[dict[str, Any]]:
+    inventory_item_ids = list(inventory_item_ids)
+    snapshots = build_availability_snapshots(inventory_item_ids)
+    debounce_seconds = get_kafka_settings().outbox_debounce_seconds
+    results = []
+    for inventory_item_id in inventory_item_ids:
+        if str(inventory_item_id) not in snapshots:
+            logger.warning(
+                "Skipping inventory availability event because inventory_item=%s was not found.",
+                inventory_item_id,
+            )
+            continue
+        payload = snapshots[str(inventory_item_id)]
+        if payload is None:
+            continue
+        results.append(
+            publish_event(
+                INVENTORY_AVAILABILITY_TOPIC,
+                "inventory.availability.upserted",
+                payload,
+                key=payload["variant_id"],
+                debounce_seconds=debounce_seconds,
+            )
+        )
+    return results
 
-    payload = _build_availability_snapshot(inventory_item)
-    if payload is None:
-        return None
 
-    return publish_event(
-        INVENTORY_AVAILABILITY_TOPIC,
-        "inventory.availability.upserted",
-        payload,
-        key=payload["variant_id"],
+def publish_inventory_reservations_upserted(*, reservation_ids) -> list[dict[str, Any]]:
+    return _publish_reservation_events(
+        reservation_ids,
+        topic=INVENTORY_RESERVATION_TOPIC,
+        event_name="inventory.reservation.upserted",
     )
 
 
-def publish_inventory_reservation_upserted(*, reservation_id) -> dict[str, Any] | None:
-    reservation = StockReservation.objects.select_related("inventory_item", "stock_serial").filter(id=reservation_id).first()
-    if reservation is None:
-        logger.warning("Skipping inventory reservation event because reservation=%s was not found.", reservation_id)
-        return None
+def publish_inventory_reservations_released(*, reservation_ids) -> list[dict[str, Any]]:
+    return _publish_reservation_events(
+        reservation_ids,
+        topic=INVENTORY_RESERVATION_TOPIC,
+        event_name="inventory.reservation.released",
+    )
 
-    payload = _build_availability_snapshot(reservation.inventory_item)
-    if payload is None:
-        return None
-    payload["reservation"] = _serialize_reservation(reservation)
 
-    return publish_event(
-        INVENTORY_RESERVATION_TOPIC,
-        "inventory.reservation.upserted",
-        payload,
-        key=payload["variant_id"],
+def publish_inventory_fulfillments_completed(*, reservation_ids) -> list[dict[str, Any]]:
+    return _publish_reservation_events(
+        reservation_ids,
+        topic=INVENTORY_FULFILLMENT_TOPIC,
+        event_name="inventory.fulfillment.completed",
     )
 
 
-def publish_inventory_reservation_released(*, reservation_id) -> dict[str, Any] | None:
-    reservation = StockReservation.objects.select_related("inventory_item", "stock_serial").filter(id=reservation_id).first()
-    if reservation is None:
-        logger.warning("Skipping inventory reservation release event because reservation=%s was not found.", reservation_id)
-        return None
+def _first_result(results: list[dict[str, Any]]) -> dict[str, Any] | None:
+    return results[0] if results else None
 
-    payload = _build_availability_snapshot(reservation.inventory_item)
-    if payload is None:
-        return None
-    payload["reservation"] = _serialize_reservation(reservation)
 
-    return publish_event(
-        INVENTORY_RESERVATION_TOPIC,
-        "inventory.reservation.released",
-        payload,
-        key=payload["variant_id"],
-    )
+def publish_inventory_availability_upserted(*, inventory_item_id) -> dict[str, Any] | None:
+    return _first_result(publish_inventory_availabilities_upserted(inventory_item_ids=[inventory_item_id]))
 
 
-def publish_inventory_fulfillment_completed(*, reservation_id) -> dict[str, Any] | None:
-    reservation = StockReservation.objects.select_related("inventory_item", "stock_serial").filter(id=reservation_id).first()
-    if reservation is None:
-        logger.warning("Skipping inventory fulfillment event because reservation=%s was not found.", reservation_id)
-        return None
+def publish_inventory_reservation_upserted(*, reservation_id) -> dict[str, Any] | None:
+    return _first_result(publish_inventory_reservations_upserted(reservation_ids=[reservation_id]))
 
-    payload = _build_availability_snapshot(reservation.inventory_item)
-    if payload is None:
-        return None
-    payload["reservation"] = _serialize_reservation(reservation)
 
-    return publish_event(
-        INVENTORY_FULFILLMENT_TOPIC,
-        "inventory.fulfillment.completed",
-        payload,
-        key=payload["variant_id"],
-    )
+def publish_inventory_reservation_released(*, reservation_id) -> dict[str, Any] | None:
+    return _first_result(publish_inventory_reservations_released(reservation_ids=[reservation_id]))
+
+
+def publish_inventory_fulfillment_completed(*, reservation_id) -> dict[str, Any] | None:
+    return _first_result(publish_inventory_fulfillments_completed(reservation_ids=[reservation_id]))
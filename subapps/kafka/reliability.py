@@ -52,13 +52,36 @@ def enqueue_outbox_event(
     envelope: dict[str, Any],
     key: str | None = None,
     headers: Iterable[tuple[str, str]] | None = None,
+    debounce_seconds: float = 0,
 ) -> bool:
     models = _load_models()
     KafkaOutboxEvent = models["KafkaOutboxEvent"]
     KafkaOutboxStatus = models["KafkaOutboxStatus"]
     event_id = str(envelope.get("event_id") or uuid.uuid4())
+    next_attempt_at = timezone.now()
 
     try:
+        if debounce_seconds and key:
+            # Replace the payload of a still-waiting event for the same key instead of queuing another one.
+            pending = KafkaOutboxEvent.objects.filter(
+                topic=topic,
+                event_name=event_name,
+                event_key=key,
+                status=KafkaOutboxStatus.PENDING,
+                next_attempt_at__gt=next_attempt_at,
+            )
+            pending_event_id = pending.order_by("created_at").values_list("event_id", flat=True).first()
+            if pending_event_id is not None:
+                updated = pending.filter(event_id=pending_event_id).update(
+                    message_json={**envelope, "event_id": pending_event_id},
+                    headers_json=_normalize_headers_for_storage(headers),
+                    updated_at=next_attempt_at,
+                )
+                if updated:
+                    envelope["event_id"] = pending_event_id
+                    return True
+            next_attempt_at += timedelta(seconds=debounce_seconds)
+
         KafkaOutboxEvent.objects.update_or_create(
             event_id=event_id,
             defaults={
@@ -70,7 +93,7 @@ def enqueue_outbox_event(
                 "message_json": envelope,
                 "headers_json": _normalize_headers_for_storage(headers),
                 "status": KafkaOutboxStatus.PENDING,
-                "next_attempt_at": timezone.now(),
+                "next_attempt_at": next_attempt_at,
                 "last_error": "",
             },
         )
@@ -122,6 +122,12 @@ STOCK_LOCATION_PERMISSIONS = {
     'transfer_stock': CombinedPermissions.TRANSFER_STOCK_ITEM,
 }
 
+STOCK_MOVEMENT_PERMISSIONS = {
+    'list': CombinedPermissions.VIEW_STOCK_ITEM_HISTORY,
+    'retrieve': CombinedPermissions.VIEW_STOCK_ITEM_HISTORY,
+    'export': CombinedPermissions.VIEW_STOCK_ITEM_HISTORY,
+}
+
 STOCK_RESERVATION_PERMISSIONS = {
     'list': CombinedPermissions.READ_STOCK_ITEM,
     'retrieve': CombinedPermissions.READ_STOCK_ITEM,
@@ -178,6 +184,7 @@ UNIFIED_PERMISSION_DICT= {
     'stock_item':STOCK_ITEM_PERMISSIONS,
     'stock_location':STOCK_LOCATION_PERMISSIONS,
     'stock_reservation':STOCK_RESERVATION_PERMISSIONS,
+    'stock_movement':STOCK_MOVEMENT_PERMISSIONS,
     'purchase_order':PURCHASE_ORDER_PERMISSIONS,
     'return_order':RETURN_ORDER_PERMISSIONS,
     'sales_order':SALES_ORDER_PERMISSIONS,
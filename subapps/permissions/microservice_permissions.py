@@ -8,10 +8,16 @@ from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+from subapps.services.response_cache import (
+    get_cache_versions,
+    invalidate_cached_responses_on_commit,
+    record_cache_lookup,
+)
 from subapps.utils.request_context import (
     get_identity_cache_key,
     get_request_owner_id,
     get_request_permissions,
+    get_request_profile_id,
     get_request_user_id,
 )
 
@@ -52,54 +58,64 @@ class PermissionRequiredMixin:
 class CachingMixin:
     """
     Reusable caching mixin for DRF ViewSets
+
+    List responses are keyed on a per-tenant version of the view's cache scope and retrieve
+    responses on the version of the object, so a successful write through the viewset only
+    evicts the caller's tenant and, for detail routes, the object written. Writes made
+    elsewhere invalidate through ``subapps.services.response_cache``.
     """
     # Default cache configuration
     CACHE_ENABLED = True
     CACHE_TTL = 300
-    CACHE_VERSION_KEY = "{model_name}_cache_version"
-    CACHE_KEY_PREFIX = "{model_name}_cache"
+    CACHE_SCOPE = None
     INCLUDE_QUERY_PARAMS = True
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._init_cache_config()
+    def get_cache_scope(self):
+        """Cache scope shared by the views of one model; defaults to the model label"""
+        if self.CACHE_SCOPE:
+            return self.CACHE_SCOPE
+        if getattr(self, 'queryset', None) is not None:
+            return self.queryset.model._meta.label_lower
+        return 'default'
+
+    def _get_cache_profile_id(self, request):
+        return get_request_profile_id(request, as_str=False)
 
-    def _init_cache_config(self):
-        """Initialize cache configuration based on model"""
-        if hasattr(self, 'queryset') and self.queryset is not None:
-            model_name = self.queryset.model.__name__.lower()
-        else:
-            model_name = 'default'
-        self.CACHE_VERSION_KEY = self.CACHE_VERSION_KEY.format(model_name=model_name)
-        self.CACHE_KEY_PREFIX = self.CACHE_KEY_PREFIX.format(model_name=model_name)
+    def _get_cache_object_id(self, kwargs):
+        lookup_url_kwarg = getattr(self, 'lookup_url_kwarg', None) or getattr(self, 'lookup_field', 'pk')
+        object_id = kwargs.get(lookup_url_kwarg)
+        return str(object_id) if object_id is not None else None
 
-    def _generate_cache_key(self, request, *args, **kwargs):
+    def _generate_cache_key(self, request, *args, object_id=None, **kwargs):
         """
         Generate unique cache key based on request and view specifics
         """
-        path = request.path
-        version = cache.get(self.CACHE_VERSION_KEY, 1)
-        
+        scope = self.get_cache_scope()
+        tenant_version, object_version = get_cache_versions(
+            scope, self._get_cache_profile_id(request), object_id
+        )
+
         # Get query params if enabled
         params = {}
         if self.INCLUDE_QUERY_PARAMS and hasattr(request, 'query_params'):
             params = request.query_params.dict()
-        
+
         # Include view-specific args if needed
         view_specific = self._get_view_specific_cache_components(request, *args, **kwargs)
-        
+
         # Stable key components
         components = {
-            'path': path,
-            'version': version,
+            'path': request.path,
+            # Retrieve responses only depend on their object's version.
+            'version': object_version if object_id is not None else tenant_version,
             'identity': get_identity_cache_key(request),
             'params': '_'.join(f"{k}={v}" for k, v in sorted(params.items())),
             'view_specific': view_specific
         }
-        
+
         # Hash to avoid long keys
         key_str = '|'.join(f"{k}:{v}" for k, v in components.items() if v)
-        return f"{self.CACHE_KEY_PREFIX}_{hashlib.md5(key_str.encode()).hexdigest()}"
+        return f"response_cache:{scope}:{hashlib.md5(key_str.encode()).hexdigest()}"
 
     def _get_view_specific_cache_components(self, request, *args, **kwargs):
         """
@@ -107,90 +123,88 @@ class CachingMixin:
         """
         return ""
 
-    def _invalidate_cache(self):
-        """Invalidate all caches for this model by bumping version"""
-        try:
-            cache.incr(self.CACHE_VERSION_KEY)
-        except ValueError:  # Key doesn't exist
-            cache.set(self.CACHE_VERSION_KEY, 2, timeout=None)
+    def _invalidate_cache(self, object_ids=()):
+        """Invalidate the current tenant's cached responses for this scope"""
+        invalidate_cached_responses_on_commit(
+            self.get_cache_scope(), self._get_cache_profile_id(self.request), object_ids
+        )
 
-    def cache_response(self, func=None, *, ttl=None):
-        """
-        Decorator to cache view responses
-        """
-        def decorator(view_method):
-            @wraps(view_method)
-            def wrapper(self, request, *args, **kwargs):
-                if not getattr(self, 'CACHE_ENABLED', True):
-                    return view_method(self, request, *args, **kwargs)
-                    
-                cache_ttl = ttl if ttl is not None else getattr(self, 'CACHE_TTL', 300)
-                cache_key = self._generate_cache_key(request, *args, **kwargs)
-                cached_data = cache.get(cache_key)
-                
-                if cached_data is not None:
-                    return cached_data
-                    
-                response = view_method(self, request, *args, **kwargs)
-                
-                if response.status_code == 200:  # Only cache successful responses
-                    cache.set(cache_key, response.data, cache_ttl)
-                    
-                return response
-            return wrapper
-        
-        if func is None:
-            return decorator
-        return decorator(func)
-
-    def perform_create(self, serializer):
-        instance = super().perform_create(serializer)
-        self._invalidate_cache()
-        return instance
-
-    def perform_update(self, serializer):
-        instance = super().perform_update(serializer)
-        self._invalidate_cache()
-        return instance
-
-    def perform_destroy(self, instance):
-        result = super().perform_destroy(instance)
-        self._invalidate_cache()
-        return result
-    def list(self, request, *args, **kwargs):
+    def _cached_response(self, request, render, *, object_id=None, ttl=None, args=(), kwargs=None):
+        kwargs = kwargs or {}
         if not getattr(self, 'CACHE_ENABLED', True):
-            return super().list(request, *args, **kwargs)
-            
-        cache_key = self._generate_cache_key(request, *args, **kwargs)
-        cached_data = cache.get(cache_key)
-        
+            return render()
+
+        scope = self.get_cache_scope()
+        try:
+            cache_key = self._generate_cache_key(request, *args, object_id=object_id, **kwargs)
+            cached_data = cache.get(cache_key)
+        except Exception:
+            logger.warning("Response cache unavailable for %s.", scope, exc_info=True)
+            return render()
+
+        record_cache_lookup(scope, hit=cached_data is not None)
         if cached_data is not None:
-            return Response(cached_data)
-            
-        response = super().list(request, *args, **kwargs)
-        
-        if response.status_code == 200:
-            cache.set(cache_key, response.data, getattr(self, 'CACHE_TTL', 300))
-            
+            response = Response(cached_data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = render()
+        if response.status_code == 200:  # Only cache successful responses
+            try:
+                cache.set(cache_key, response.data, ttl if ttl is not None else getattr(self, 'CACHE_TTL', 300))
+            except Exception:
+                logger.warning("Failed to store cached %s response.", scope, exc_info=True)
+        response['X-Cache'] = 'MISS'
         return response
 
-    def retrieve(self, request, *args, **kwargs):
-        if not getattr(self, 'CACHE_ENABLED', True):
-            return super().retrieve(request, *args, **kwargs)
-            
-        cache_key = self._generate_cache_key(request, *args, **kwargs)
-        cached_data = cache.get(cache_key)
-        
-        if cached_data is not None:
-            return Response(cached_data)
-            
-        response = super().retrieve(request, *args, **kwargs)
-        
-        if response.status_code == 200:
-            cache.set(cache_key, response.data, getattr(self, 'CACHE_TTL', 300))
-            
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (
+            getattr(self, 'CACHE_ENABLED', True)
+            and request.method not in permissions.SAFE_METHODS
+            and response.status_code < 400
+        ):
+            object_id = self._get_cache_object_id(kwargs)
+            self._invalidate_cache([object_id] if object_id is not None else ())
         return response
-    
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, lambda: super(CachingMixin, self).list(request, *args, **kwargs), args=args, kwargs=kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            request,
+            lambda: super(CachingMixin, self).retrieve(request, *args, **kwargs),
+            object_id=self._get_cache_object_id(kwargs),
+            args=args,
+            kwargs=kwargs,
+        )
+
+
+def cache_response(func=None, *, ttl=None):
+    """
+    Decorator to cache a ``CachingMixin`` view action under the tenant version of its scope
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            return self._cached_response(
+                request,
+                lambda: view_method(self, request, *args, **kwargs),
+                ttl=ttl,
+                args=args,
+                kwargs=kwargs,
+            )
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
 from rest_framework import viewsets
-class BaseCachePermissionViewset(PermissionRequiredMixin,viewsets.ModelViewSet):
-    pass
+class BaseCachePermissionViewset(CachingMixin, PermissionRequiredMixin,viewsets.ModelViewSet):
+    """Tenant viewset base; response caching is opt-in with ``CACHE_ENABLED = True``."""
+    CACHE_ENABLED = False
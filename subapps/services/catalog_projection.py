@@ -1,56 +1,86 @@
 import uuid
 
-from django.core.cache import cache
-from typing import Optional, Dict, Any
+from django.db.models import Q
+from typing import Optional, Dict, Any, Iterable
 
 from mainapps.projections.models import CatalogVariantProjection
+from subapps.services.projection_cache import ProjectionCache
+
+# Variant details are read on every stock list page, so a small in-process layer
+# keeps repeated pages off the shared cache too.
+VARIANT_PROJECTION_CACHE = ProjectionCache("product_variant_projection_", local_size=2048, local_timeout=30)
+
+
+def _variant_data(variant: CatalogVariantProjection) -> Dict[str, Any]:
+    return {
+        "id": str(variant.variant_id),
+        "display_name": variant.display_name,
+        "display_image": variant.image_url,
+        "image": variant.image_url,
+        "selling_price": str(variant.sales_price),
+        "variant_barcode": variant.variant_barcode,
+        "variant_sku": variant.variant_sku,
+        "product_details": {
+            "id": str(variant.product_id),
+            "name": variant.product.name,
+            "category": variant.product.category_name,
+            "tax_rate": str(variant.product.tax_rate),
+            "track_stock": variant.product.track_stock,
+        },
+    }
+
+
+def _as_uuid(value: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
 
 
 class CatalogProjectionLookup:
     """Access local catalog projections hydrated by Kafka consumers."""
 
-    CACHE_TIMEOUT = 300
-
     @classmethod
     def get_variant_details_by_barcode(cls, barcode: str, request=None) -> Optional[Dict[str, Any]]:
         if not barcode:
             return None
+        return cls.get_many([barcode]).get(str(barcode))
 
-        cache_key = f"product_variant_projection_{barcode}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+    @classmethod
+    def get_many(cls, lookups: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Resolve barcodes or variant IDs to variant details, ``None`` for unknown lookups.
 
-        queryset = CatalogVariantProjection.objects.select_related("product")
-        variant = queryset.filter(variant_barcode=barcode).first()
+        Uncached lookups are loaded with one projection query. A barcode match wins over a
+        variant ID match, as in ``get_variant_details_by_barcode``.
+        """
+        return VARIANT_PROJECTION_CACHE.get_many(lookups, cls._load)
 
-        if variant is None:
-            try:
-                variant_uuid = uuid.UUID(str(barcode))
-            except (TypeError, ValueError, AttributeError):
-                variant_uuid = None
+    @classmethod
+    def invalidate(cls, *lookups: Optional[str]) -> None:
+        VARIANT_PROJECTION_CACHE.invalidate(lookups)
 
-            if variant_uuid is not None:
-                variant = queryset.filter(variant_id=variant_uuid).first()
+    @classmethod
+    def clear_local_cache(cls) -> None:
+        VARIANT_PROJECTION_CACHE.clear_local()
 
-        if variant is None:
-            return None
+    @staticmethod
+    def _load(lookups: list) -> Dict[str, Dict[str, Any]]:
+        variant_ids = {lookup: _as_uuid(lookup) for lookup in lookups}
+        variants = CatalogVariantProjection.objects.select_related("product").filter(
+            Q(variant_barcode__in=lookups)
+            | Q(variant_id__in=[variant_id for variant_id in variant_ids.values() if variant_id])
+        )
+        by_barcode = {}
+        by_id = {}
+        for variant in variants:
+            if variant.variant_barcode:
+                by_barcode.setdefault(variant.variant_barcode, variant)
+            by_id[variant.variant_id] = variant
 
-        data = {
-            "id": str(variant.variant_id),
-            "display_name": variant.display_name,
-            "display_image": variant.image_url,
-            "image": variant.image_url,
-            "selling_price": str(variant.sales_price),
-            "variant_barcode": variant.variant_barcode,
-            "variant_sku": variant.variant_sku,
-            "product_details": {
-                "id": str(variant.product_id),
-                "name": variant.product.name,
-                "category": variant.product.category_name,
-                "tax_rate": str(variant.product.tax_rate),
-                "track_stock": variant.product.track_stock,
-            },
-        }
-        cache.set(cache_key, data, cls.CACHE_TIMEOUT)
-        return data
+        loaded = {}
+        for lookup in lookups:
+            variant = by_barcode.get(lookup) or by_id.get(variant_ids[lookup])
+            if variant is not None:
+                loaded[lookup] = _variant_data(variant)
+        return loaded
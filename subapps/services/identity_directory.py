@@ -1,7 +1,8 @@
-from django.core.cache import cache
-from typing import Optional, Dict, Any
+from collections import defaultdict
+from typing import Optional, Dict, Any, Iterable
 
 from mainapps.identity.models import IdentityUser
+from subapps.services.projection_cache import ProjectionCache
 from subapps.utils.request_context import (
     get_request_auth_headers,
     get_request_company_code,
@@ -14,31 +15,47 @@ from subapps.utils.request_context import (
     get_request_user_id,
 )
 
+USER_PROJECTION_CACHE = ProjectionCache("user_details_")
+
 
 class IdentityDirectory:
     """Access local identity projections and token-derived request context."""
 
-    CACHE_TIMEOUT = 300
-
     @classmethod
     def get_user_details(cls, user_id: str) -> Optional[Dict[str, Any]]:
         if not user_id:
             return None
+        return cls.get_many_user_details([user_id]).get(str(user_id))
 
-        cache_key = f"user_details_{user_id}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+    @classmethod
+    def get_many_user_details(cls, user_ids: Iterable[Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Return ``{str(user_id): details or None}`` from one cache ``get_many`` and one projection query."""
+        return USER_PROJECTION_CACHE.get_many(user_ids, cls._load_users)
 
-        try:
-            identity_user = IdentityUser.objects.filter(user_id=int(user_id)).first()
-        except (TypeError, ValueError):
-            return None
+    @classmethod
+    def invalidate_users(cls, *user_ids: Any) -> None:
+        USER_PROJECTION_CACHE.invalidate(user_ids)
 
-        if not identity_user:
-            return None
+    @classmethod
+    def _load_users(cls, user_ids: list) -> Dict[str, Dict[str, Any]]:
+        requested = defaultdict(list)
+        for user_id in user_ids:
+            try:
+                requested[int(user_id)].append(user_id)
+            except (TypeError, ValueError):
+                continue
+        if not requested:
+            return {}
+
+        loaded = {}
+        for identity_user in IdentityUser.objects.filter(user_id__in=list(requested)):
+            user_data = cls._user_data(identity_user)
+            loaded.update((user_id, user_data) for user_id in requested[identity_user.user_id])
+        return loaded
 
-        user_data = {
+    @staticmethod
+    def _user_data(identity_user: IdentityUser) -> Dict[str, Any]:
+        return {
             "id": identity_user.user_id,
             "email": identity_user.email,
             "full_name": identity_user.full_name,
@@ -47,8 +64,6 @@ class IdentityDirectory:
             "profile_image": None,
             "is_active": identity_user.is_active,
         }
-        cache.set(cache_key, user_data, cls.CACHE_TIMEOUT)
-        return user_data
 
     @classmethod
     def get_current_user(cls, request) -> Optional[Dict[str, Any]]:
@@ -73,7 +88,20 @@ class IdentityDirectory:
 
     @classmethod
     def get_minimal_user_data(cls, user_id: str) -> Dict[str, Any]:
-        user_data = cls.get_user_details(user_id)
+        return cls._minimal_user_data(user_id, cls.get_user_details(user_id))
+
+    @classmethod
+    def get_many_minimal(cls, user_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Bulk ``get_minimal_user_data``, keyed by ``str(user_id)``."""
+        requested = {}
+        for user_id in user_ids:
+            if user_id:
+                requested.setdefault(str(user_id), user_id)
+        details = cls.get_many_user_details(requested.values())
+        return {key: cls._minimal_user_data(user_id, details.get(key)) for key, user_id in requested.items()}
+
+    @staticmethod
+    def _minimal_user_data(user_id, user_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         if user_data:
             return {
                 "id": user_data.get("id"),
@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from mainapps.inventory.models import InventoryItem
+from mainapps.stock.models import InventoryItemAvailability, InventoryItemValuation, StockBalance, StockMovement
+from subapps.services.transaction_buffer import get_transaction_buffer
+
+logger = logging.getLogger(__name__)
+
+_STOCK_VALUE_FIELD = DecimalField(max_digits=30, decimal_places=10)
+
+ROLLUP_FIELDS = [
+    "quantity_on_hand",
+    "quantity_reserved",
+    "quantity_available",
+    "total_stock_value",
+    "lot_count",
+    "location_count",
+    "earliest_expiry_date",
+    "last_movement_at",
+]
+
+
+# Recomputed from balances when an item's in-stock balances change; the rest is applied as deltas.
+_REAGGREGATED_FIELDS = [
+    "quantity_on_hand",
+    "quantity_reserved",
+    "quantity_available",
+    "lot_count",
+    "location_count",
+    "earliest_expiry_date",
+]
+
+
+def _to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value or 0))
+
+
+def _aggregate_balances(inventory_item_ids) -> dict:
+    """
+    Aggregate ``StockBalance`` rows into the balance-derived rollup fields, in one grouped query.
+
+    ``total_stock_value`` is the lot-cost value; callers prefer the persisted valuation.
+    Items without balances are left out.
+    """
+    in_stock = Q(quantity_on_hand__gt=0)
+    balance_rows = (
+        StockBalance.objects.filter(inventory_item_id__in=list(inventory_item_ids))
+        .values("inventory_item_id")
+        .annotate(
+            on_hand=Sum("quantity_on_hand"),
+            reserved=Sum("quantity_reserved"),
+            available=Sum("quantity_available"),
+            stock_value=Sum(
+                ExpressionWrapper(F("quantity_on_hand") * F("stock_lot__unit_cost"), output_field=_STOCK_VALUE_FIELD)
+            ),
+            lots=Count("stock_lot", filter=in_stock & Q(stock_lot__isnull=False), distinct=True),
+            locations=Count("stock_location", filter=in_stock, distinct=True),
+            earliest_expiry=Min("stock_lot__expiry_date", filter=in_stock),
+        )
+        .order_by()
+    )
+    return {
+        row["inventory_item_id"]: {
+            "quantity_on_hand": _to_decimal(row["on_hand"]),
+            "quantity_reserved": _to_decimal(row["reserved"]),
+            "quantity_available": _to_decimal(row["available"]),
+            "total_stock_value": _to_decimal(row["stock_value"]).quantize(Decimal("0.00001")),
+            "lot_count": row["lots"],
+            "location_count": row["locations"],
+            "earliest_expiry_date": row["earliest_expiry"],
+        }
+        for row in balance_rows
+    }
+
+
+def compute_inventory_item_availability(inventory_items: dict) -> dict:
+    """
+    Aggregate balances and movements into rollup values for ``{inventory_item_id: profile_id}``.
+
+    Runs one grouped query over ``StockBalance`` and one over ``StockMovement`` for all items.
+    Stock value comes from the persisted cost-layer valuation, falling back to lot costs for
+    items that have not been valued yet.
+    """
+    inventory_item_ids = list(inventory_items)
+    rollups = {inventory_item_id: _empty_rollup() for inventory_item_id in inventory_item_ids}
+    balanced = _aggregate_balances(inventory_item_ids)
+    for inventory_item_id, values in balanced.items():
+        rollups[inventory_item_id].update(values)
+
+    if balanced:
+        valuations = InventoryItemValuation.objects.filter(inventory_item_id__in=list(balanced)).values_list(
+            "inventory_item_id", "total_value"
+        )
+        for inventory_item_id, total_value in valuations:
+            rollups[inventory_item_id]["total_stock_value"] = _to_decimal(total_value).quantize(Decimal("0.00001"))
+
+    movement_rows = (
+        StockMovement.objects.filter(
+            profile_id__in=set(inventory_items.values()),
+            inventory_item_id__in=inventory_item_ids,
+        )
+        .values("inventory_item_id")
+        .annotate(last_movement_at=Max("occurred_at"))
+        .order_by()
+    )
+    for row in movement_rows:
+        rollups[row["inventory_item_id"]]["last_movement_at"] = row["last_movement_at"]
+    return rollups
+
+
+def _empty_rollup() -> dict:
+    return {
+        "quantity_on_hand": Decimal("0"),
+        "quantity_reserved": Decimal("0"),
+        "quantity_available": Decimal("0"),
+        "total_stock_value": Decimal("0"),
+        "lot_count": 0,
+        "location_count": 0,
+        "earliest_expiry_date": None,
+        "last_movement_at": None,
+    }
+
+
+def _upsert_rollups(inventory_items: dict, rollups: dict) -> None:
+    now = timezone.now()
+    InventoryItemAvailability.objects.bulk_create(
+        [
+            InventoryItemAvailability(
+                inventory_item_id=inventory_item_id,
+                profile_id=inventory_items[inventory_item_id],
+                updated_at=now,
+                **rollup,
+            )
+            for inventory_item_id, rollup in rollups.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["inventory_item"],
+        update_fields=ROLLUP_FIELDS + ["updated_at"],
+    )
+
+
+def _resolve_profiles(inventory_item_ids) -> dict:
+    return dict(
+        InventoryItem.objects.filter(id__in=list(inventory_item_ids)).values_list("id", "profile_id")
+    )
+
+
+def _lock_rollups(inventory_items: dict) -> None:
+    # Two transactions changing different balances of one item would each aggregate without
+    # the other's uncommitted change. Holding the rollup row until commit makes the second
+    # one aggregate after the first has committed.
+    InventoryItemAvailability.objects.bulk_create(
+        [
+            InventoryItemAvailability(inventory_item_id=inventory_item_id, profile_id=profile_id, **_empty_rollup())
+            for inventory_item_id, profile_id in inventory_items.items()
+        ],
+        ignore_conflicts=True,
+    )
+    list(
+        InventoryItemAvailability.objects.select_for_update()
+        .filter(inventory_item_id__in=list(inventory_items))
+        .order_by("inventory_item_id")
+        .values_list("inventory_item_id", flat=True)
+    )
+
+
+@transaction.atomic
+def refresh_inventory_item_availability(inventory_item_ids) -> None:
+    """
+    Recompute and upsert the rollup rows for the given items from balances and movements.
+
+    This is the backfill and repair path. Stock mutations go through
+    ``record_balance_delta`` and ``apply_inventory_item_availability_changes`` instead,
+    which only fall back to it for items that have no rollup row yet.
+    """
+    inventory_items = _resolve_profiles(dict.fromkeys(inventory_item_ids))
+    if inventory_items:
+        _lock_rollups(inventory_items)
+        _upsert_rollups(inventory_items, compute_inventory_item_availability(inventory_items))
+
+
+def _pending_changes() -> dict | None:
+    return get_transaction_buffer("inventory_item_availability_changes", dict, _warn_unapplied_changes)
+
+
+def _warn_unapplied_changes(pending: dict) -> None:
+    if pending:
+        logger.warning(
+            "Balance changes for inventory items %s committed without updating their availability rollups.",
+            sorted(str(inventory_item_id) for inventory_item_id in pending),
+        )
+
+
+def record_balance_delta(balance: StockBalance, *, on_hand_delta, reserved_delta, exact: bool = True) -> None:
+    """
+    Queue a change ``_apply_balance_delta`` made to ``balance`` for its item's rollup.
+
+    ``balance`` holds the quantities after the change. A balance that moved into or
+    out of stock changes the lot, location and expiry figures, so its item is
+    re-aggregated from balances when the changes are applied; so is an item whose
+    change is not ``exact``, such as a clamped reserved quantity.
+    """
+    on_hand_delta = _to_decimal(on_hand_delta)
+    previous_on_hand = _to_decimal(balance.quantity_on_hand) - on_hand_delta
+    change = {
+        "on_hand": on_hand_delta,
+        "reserved": _to_decimal(reserved_delta),
+        "reaggregate": not exact or (previous_on_hand > 0) != (_to_decimal(balance.quantity_on_hand) > 0),
+    }
+    pending = _pending_changes()
+    if pending is None:
+        _apply_changes({balance.inventory_item_id: change}, {})
+        return
+    queued = pending.setdefault(
+        balance.inventory_item_id,
+        {"on_hand": Decimal("0"), "reserved": Decimal("0"), "reaggregate": False},
+    )
+    queued["on_hand"] += change["on_hand"]
+    queued["reserved"] += change["reserved"]
+    queued["reaggregate"] = queued["reaggregate"] or change["reaggregate"]
+
+
+def apply_inventory_item_availability_changes(last_movement_at: dict) -> None:
+    """
+    Apply the queued balance changes of ``{inventory_item_id: occurred_at}`` items to their rollups.
+
+    The rollups are locked in item order and the deltas applied to all of them in one
+    ``UPDATE ... SET quantity_on_hand = quantity_on_hand + CASE ...``, so the row locks
+    are held only from the end of the stock operation to commit. Only items flagged by
+    ``record_balance_delta`` are re-aggregated from their balances, in one ``bulk_update``.
+    """
+    pending = _pending_changes() or {}
+    changes = {
+        inventory_item_id: pending.pop(inventory_item_id, None)
+        or {"on_hand": Decimal("0"), "reserved": Decimal("0"), "reaggregate": False}
+        for inventory_item_id in last_movement_at
+    }
+    _apply_changes(changes, last_movement_at)
+
+
+def _apply_changes(changes: dict, last_movement_at: dict) -> None:
+    now = timezone.now()
+    valuation_total = InventoryItemValuation.objects.filter(inventory_item_id=OuterRef("inventory_item_id")).values(
+        "total_value"
+    )
+    lot_value = (
+        StockBalance.objects.filter(inventory_item_id=OuterRef("inventory_item_id"))
+        .order_by()
+        .values("inventory_item_id")
+        .annotate(
+            value=Sum(
+                ExpressionWrapper(F("quantity_on_hand") * F("stock_lot__unit_cost"), output_field=_STOCK_VALUE_FIELD)
+            )
+        )
+        .values("value")
+    )
+    # Lock the rollups in item order first: a single multi-row UPDATE takes its row locks in
+    # scan order, which two overlapping batches could see differently.
+    rollups = {
+        rollup.inventory_item_id: rollup
+        for rollup in InventoryItemAvailability.objects.select_for_update()
+        .filter(inventory_item_id__in=list(changes))
+        .order_by("inventory_item_id")
+    }
+    missing = [inventory_item_id for inventory_item_id in sorted(changes) if inventory_item_id not in rollups]
+    if rollups:
+        quantity_field = InventoryItemAvailability._meta.get_field("quantity_on_hand")
+
+        def per_item_delta(delta):
+            return Case(
+                *[
+                    When(inventory_item_id=inventory_item_id, then=Value(delta(changes[inventory_item_id])))
+                    for inventory_item_id in rollups
+                    if delta(changes[inventory_item_id])
+                ],
+                default=Value(Decimal("0")),
+                output_field=quantity_field,
+            )
+
+        values = {
+            "quantity_on_hand": F("quantity_on_hand") + per_item_delta(lambda change: change["on_hand"]),
+            "quantity_reserved": F("quantity_reserved") + per_item_delta(lambda change: change["reserved"]),
+            "quantity_available": F("quantity_available")
+            + per_item_delta(lambda change: change["on_hand"] - change["reserved"]),
+            "total_stock_value": Coalesce(
+                Subquery(valuation_total),
+                Subquery(lot_value),
+                Value(Decimal("0")),
+                output_field=InventoryItemAvailability._meta.get_field("total_stock_value"),
+            ),
+            "updated_at": now,
+        }
+        movement_times = [
+            When(
+                inventory_item_id=inventory_item_id,
+                then=Greatest(Coalesce(F("last_movement_at"), Value(occurred_at)), Value(occurred_at)),
+            )
+            for inventory_item_id, occurred_at in last_movement_at.items()
+            if inventory_item_id in rollups and occurred_at is not None
+        ]
+        if movement_times:
+            values["last_movement_at"] = Case(
+                *movement_times,
+                default=F("last_movement_at"),
+                output_field=InventoryItemAvailability._meta.get_field("last_movement_at"),
+            )
+        InventoryItemAvailability.objects.filter(inventory_item_id__in=list(rollups)).update(**values)
+
+    reaggregate = [
+        inventory_item_id for inventory_item_id in rollups if changes[inventory_item_id]["reaggregate"]
+    ]
+    if reaggregate:
+        aggregated = _aggregate_balances(reaggregate)
+        for inventory_item_id in reaggregate:
+            values = aggregated.get(inventory_item_id) or _empty_rollup()
+            for field in _REAGGREGATED_FIELDS:
+                setattr(rollups[inventory_item_id], field, values[field])
+        InventoryItemAvailability.objects.bulk_update(
+            [rollups[inventory_item_id] for inventory_item_id in reaggregate], _REAGGREGATED_FIELDS
+        )
+    if missing:
+        refresh_inventory_item_availability(missing)
+
+
+@transaction.atomic
+def rebuild_inventory_item_availability(inventory_item_ids, *, verify_only: bool = False) -> list:
+    """
+    Rebuild rollups from balances and movements, returning the ids whose stored row had drifted.
+
+    With ``verify_only`` the stored rows are compared but not rewritten.
+    """
+    inventory_items = _resolve_profiles(inventory_item_ids)
+    if inventory_items and not verify_only:
+        _lock_rollups(inventory_items)
+    computed = compute_inventory_item_availability(inventory_items)
+    stored = InventoryItemAvailability.objects.in_bulk(list(inventory_items))
+
+    drifted = {}
+    for inventory_item_id, expected in computed.items():
+        row = stored.get(inventory_item_id)
+        if row is None or any(getattr(row, field) != value for field, value in expected.items()):
+            drifted[inventory_item_id] = expected
+
+    if drifted and not verify_only:
+        _upsert_rollups(inventory_items, drifted)
+    return list(drifted)
+
+
+def get_inventory_item_availability_map(inventory_item_ids) -> dict:
+    """
+    Return ``{inventory_item_id: rollup}`` read from the stored rows.
+
+    Items without a stored row yet (before the first rebuild) are aggregated on the fly.
+    """
+    inventory_item_ids = list(dict.fromkeys(inventory_item_ids))
+    availability = {
+        row["inventory_item_id"]: row
+        for row in InventoryItemAvailability.objects.filter(inventory_item_id__in=inventory_item_ids).values(
+            "inventory_item_id", *ROLLUP_FIELDS
+        )
+    }
+    missing = [inventory_item_id for inventory_item_id in inventory_item_ids if inventory_item_id not in availability]
+    if missing:
+        availability.update(compute_inventory_item_availability(_resolve_profiles(missing)))
+    return availability
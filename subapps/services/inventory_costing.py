@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from mainapps.inventory.models import CostingMethod, InventoryItem
+from mainapps.stock.models import (
+    InventoryItemValuation,
+    StockBalance,
+    StockCostLayer,
+)
+from subapps.services.stock_balance_history import NON_STOCK_MOVEMENT_TYPES
+
+_ZERO = Decimal("0")
+_COST_QUANTUM = Decimal("0.00001")
+
+
+def _to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value or 0))
+
+
+def _lock_valuations(inventory_items, *, resolve_unit_cost=None, movements=(), layers=None) -> dict:
+    """
+    Lock the valuations of ``inventory_items`` in inventory item id order, creating missing ones.
+
+    Every row is locked in one ordered query before any layer is touched, so batches that
+    share items always lock them in the same order. With ``resolve_unit_cost``, a valuation
+    created for an item that has never been valued opens with layers for the stock it already
+    holds, apart from ``movements``, which the caller is about to cost. Those layers are
+    appended to ``layers`` for the caller to insert.
+    """
+    items_by_id = {inventory_item.id: inventory_item for inventory_item in inventory_items}
+    existing = set(
+        InventoryItemValuation.objects.filter(inventory_item_id__in=list(items_by_id)).values_list(
+            "inventory_item_id", flat=True
+        )
+    )
+    InventoryItemValuation.objects.bulk_create(
+        [
+            InventoryItemValuation(
+                inventory_item_id=inventory_item.id,
+                profile_id=inventory_item.profile_id,
+                costing_method=inventory_item.costing_method,
+            )
+            for inventory_item_id, inventory_item in items_by_id.items()
+            if inventory_item_id not in existing
+        ],
+        ignore_conflicts=True,
+    )
+    valuations = {
+        valuation.inventory_item_id: valuation
+        for valuation in InventoryItemValuation.objects.select_for_update()
+        .filter(inventory_item_id__in=list(items_by_id))
+        .order_by("inventory_item_id")
+    }
+    if resolve_unit_cost is not None:
+        created = [inventory_item_id for inventory_item_id in valuations if inventory_item_id not in existing]
+        layered = set(
+            StockCostLayer.objects.filter(inventory_item_id__in=created)
+            .values_list("inventory_item_id", flat=True)
+            .distinct()
+        )
+        opening = [inventory_item_id for inventory_item_id in created if inventory_item_id not in layered]
+        balances = _opening_balances(opening)
+        for inventory_item_id in opening:
+            _push_opening_layers(
+                valuations[inventory_item_id],
+                items_by_id[inventory_item_id],
+                resolve_unit_cost,
+                layers,
+                balances=balances[inventory_item_id],
+                movements=[movement for movement in movements if movement.inventory_item_id == inventory_item_id],
+            )
+    return valuations
+
+
+def _opening_balances(inventory_item_ids) -> dict:
+    """Return ``{inventory_item_id: [balance, ...]}`` of stocked balances, oldest lot first, in one query."""
+    balances = defaultdict(list)
+    if not inventory_item_ids:
+        return balances
+    for balance in (
+        StockBalance.objects.filter(inventory_item_id__in=list(inventory_item_ids), quantity_on_hand__gt=0)
+        .select_related("stock_lot", "stock_location")
+        .order_by("inventory_item_id", "stock_lot__created_at", "created_at")
+    ):
+        balances[balance.inventory_item_id].append(balance)
+    return balances
+
+
+def _push_opening_layers(valuation, inventory_item, resolve_unit_cost, layers, *, balances, movements=()) -> None:
+    """Push one layer per stocked lot and location in ``balances``, leaving out what ``movements`` already moved."""
+    pending = defaultdict(Decimal)
+    for movement in movements:
+        if movement.movement_type in NON_STOCK_MOVEMENT_TYPES:
+            continue
+        quantity = abs(_to_decimal(movement.quantity))
+        if movement.to_location_id:
+            pending[(movement.to_location_id, movement.stock_lot_id)] += quantity
+        if movement.from_location_id:
+            pending[(movement.from_location_id, movement.stock_lot_id)] -= quantity
+
+    for balance in balances:
+        quantity = balance.quantity_on_hand - pending[(balance.stock_location_id, balance.stock_lot_id)]
+        if quantity <= 0:
+            continue
+        unit_cost = resolve_unit_cost(inventory_item, balance.stock_lot, balance.stock_location)
+        _push_layer(
+            valuation,
+            inventory_item,
+            layers,
+            quantity=quantity,
+            unit_cost=_to_decimal(unit_cost),
+            received_at=balance.stock_lot.created_at if balance.stock_lot_id else balance.created_at,
+        )
+
+
+def _save_valuations(valuations) -> None:
+    """Settle and write ``(valuation, costing_method)`` pairs with one statement."""
+    # bulk_update() bypasses auto_now.
+    now = timezone.now()
+    settled = []
+    for valuation, costing_method in valuations:
+        valuation.costing_method = costing_method
+        if valuation.quantity == 0:
+            # Rounding residue from averaged issues must not outlive the stock it belonged to.
+            valuation.total_value = _ZERO
+        elif valuation.quantity > 0:
+            valuation.average_unit_cost = (valuation.total_value / valuation.quantity).quantize(_COST_QUANTUM)
+        valuation.updated_at = now
+        settled.append(valuation)
+    InventoryItemValuation.objects.bulk_update(
+        settled, ["costing_method", "quantity", "total_value", "average_unit_cost", "updated_at"]
+    )
+
+
+def _push_layer(valuation, inventory_item, layers, *, quantity, unit_cost, source_movement=None, received_at=None):
+    """Append a layer to ``layers`` for ``_insert_layers`` and add it to the valuation."""
+    layer = StockCostLayer(
+        profile_id=inventory_item.profile_id,
+        inventory_item_id=inventory_item.id,
+        source_movement=source_movement,
+        original_quantity=quantity,
+        remaining_quantity=quantity,
+        unit_cost=unit_cost,
+    )
+    if received_at is not None:
+        layer.received_at = received_at
+    layers.append(layer)
+    valuation.quantity += quantity
+    valuation.total_value += quantity * unit_cost
+
+
+def _insert_layers(layers) -> None:
+    StockCostLayer.objects.bulk_create(layers)
+    layers.clear()
+
+
+def _consume_layers(valuation, inventory_item, *, quantity) -> Decimal:
+    """Draw ``quantity`` from the open layers oldest first and return the value removed from stock."""
+    remaining = quantity
+    layer_value = _ZERO
+    consumed = []
+    # bulk_update() bypasses auto_now.
+    now = timezone.now()
+    open_layers = (
+        StockCostLayer.objects.select_for_update()
+        .filter(inventory_item_id=inventory_item.id, remaining_quantity__gt=0)
+        .order_by("received_at", "created_at")
+    )
+    for layer in open_layers:
+        taken = min(layer.remaining_quantity, remaining)
+        layer.remaining_quantity -= taken
+        layer_value += taken * layer.unit_cost
+        remaining -= taken
+        layer.updated_at = now
+        consumed.append(layer)
+        if remaining == 0:
+            break
+    StockCostLayer.objects.bulk_update(consumed, ["remaining_quantity", "updated_at"])
+
+    # Stock issued beyond the open layers (negative stock) goes out at the last average cost.
+    layer_value += remaining * valuation.average_unit_cost
+    if inventory_item.costing_method == CostingMethod.MOVING_AVERAGE:
+        issued_value = (quantity * valuation.average_unit_cost).quantize(_COST_QUANTUM)
+    else:
+        issued_value = layer_value
+    valuation.quantity -= quantity
+    valuation.total_value -= issued_value
+    return issued_value
+
+
+def _movement_direction(movement) -> int:
+    if movement.movement_type in NON_STOCK_MOVEMENT_TYPES:
+        return 0
+    if movement.to_location_id and not movement.from_location_id:
+        return 1
+    if movement.from_location_id and not movement.to_location_id:
+        return -1
+    return 0
+
+
+@transaction.atomic
+def apply_movement_costs(movements, resolve_unit_cost=None) -> None:
+    """
+    Push cost layers for stock entering the business and consume them for stock leaving it.
+
+    Transfers, reservations and releases leave the valuation untouched. Receipts without a
+    unit cost, such as positive adjustments, come in at the item's current average cost.
+    ``resolve_unit_cost`` prices the opening layers of items valued for the first time, as
+    in ``rebuild_inventory_valuation``.
+    """
+    movements_by_item = defaultdict(list)
+    for movement in movements:
+        if _movement_direction(movement):
+            movements_by_item[movement.inventory_item_id].append(movement)
+
+    layers = []
+    valuations = _lock_valuations(
+        [movements_for_item[0].inventory_item for movements_for_item in movements_by_item.values()],
+        resolve_unit_cost=resolve_unit_cost,
+        movements=movements,
+        layers=layers,
+    )
+    # Items are costed in the order their valuations were locked.
+    for inventory_item_id, valuation in valuations.items():
+        movements_for_item = movements_by_item[inventory_item_id]
+        inventory_item = movements_for_item[0].inventory_item
+        for movement in movements_for_item:
+            quantity = abs(_to_decimal(movement.quantity))
+            if _movement_direction(movement) > 0:
+                unit_cost = movement.unit_cost if movement.unit_cost is not None else valuation.average_unit_cost
+                _push_layer(
+                    valuation,
+                    inventory_item,
+                    layers,
+                    quantity=quantity,
+                    unit_cost=_to_decimal(unit_cost),
+                    source_movement=movement,
+                    received_at=movement.occurred_at,
+                )
+            else:
+                # Issues draw on the open layers in the table, so pending ones go in first.
+                _insert_layers(layers)
+                _consume_layers(valuation, inventory_item, quantity=quantity)
+    _insert_layers(layers)
+    _save_valuations(
+        (valuation, movements_by_item[inventory_item_id][0].inventory_item.costing_method)
+        for inventory_item_id, valuation in valuations.items()
+    )
+
+
+@transaction.atomic
+def rebuild_inventory_valuation(inventory_item: InventoryItem, resolve_unit_cost) -> InventoryItemValuation:
+    """
+    Replace an item's cost layers with one opening layer per stocked lot and location.
+
+    ``resolve_unit_cost(inventory_item, stock_lot, stock_location)`` prices each opening layer;
+    balances without a resolvable cost open at zero.
+    """
+    valuation = _lock_valuations([inventory_item])[inventory_item.id]
+    StockCostLayer.objects.filter(inventory_item_id=inventory_item.id).delete()
+    valuation.quantity = _ZERO
+    valuation.total_value = _ZERO
+    valuation.average_unit_cost = _ZERO
+    layers = []
+    _push_opening_layers(
+        valuation,
+        inventory_item,
+        resolve_unit_cost,
+        layers,
+        balances=_opening_balances([inventory_item.id])[inventory_item.id],
+    )
+    _insert_layers(layers)
+    _save_valuations([(valuation, inventory_item.costing_method)])
+    return valuation
+
+
+def get_inventory_valuation_map(inventory_item_ids) -> dict:
+    """Return ``{inventory_item_id: {"total_value", "average_unit_cost", "quantity"}}`` for valued items."""
+    inventory_item_ids = list(inventory_item_ids)
+    if not inventory_item_ids:
+        return {}
+    return {
+        row["inventory_item_id"]: row
+        for row in InventoryItemValuation.objects.filter(inventory_item_id__in=inventory_item_ids).values(
+            "inventory_item_id", "quantity", "total_value", "average_unit_cost"
+        )
+    }
+
@@ -4,11 +4,33 @@ from collections import defaultdict
 from datetime import timedelta
 from decimal import Decimal
 
-from django.db.models import Count, Max
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from mainapps.inventory.models import Inventory, InventoryItem
-from mainapps.stock.models import StockBalance, StockMovement, StockSerial
+from mainapps.stock.models import (
+    InventoryItemAvailability,
+    InventoryItemValuation,
+    StockBalance,
+    StockMovement,
+    StockSerial,
+)
+from subapps.services.inventory_costing import get_inventory_valuation_map
+from subapps.services.response_cache import STOCK_LOCATION_CACHE_SCOPE, get_cache_versions
 
 
 def _to_decimal(value) -> Decimal:
@@ -17,6 +39,16 @@ def _to_decimal(value) -> Decimal:
     return Decimal(str(value or 0))
 
 
+def _balance_value(balance, quantity_on_hand: Decimal, valuations: dict) -> Decimal:
+    """Value a balance at its item's persisted average cost, else at its lot cost (items not yet valued)."""
+    valuation = valuations.get(balance.inventory_item_id)
+    if valuation is not None:
+        return quantity_on_hand * _to_decimal(valuation["average_unit_cost"])
+    if balance.stock_lot_id:
+        return quantity_on_hand * _to_decimal(balance.stock_lot.unit_cost)
+    return Decimal("0")
+
+
 def _empty_inventory_summary(inventory: Inventory):
     return {
         "inventory_id": inventory.id,
@@ -88,20 +120,15 @@ def _derive_inventory_item_status(*, inventory_item: InventoryItem, current_stoc
 
 
 def _map_inventory_item_ids_to_legacy_inventory_ids(inventory_list):
-    legacy_inventory_ids = [str(inventory.id) for inventory in inventory_list]
-    inventory_id_map = {str(inventory.id): inventory.id for inventory in inventory_list}
     inventory_item_map = {}
-
-    if not legacy_inventory_ids:
+    lookup = Q()
+    for inventory in inventory_list:
+        lookup |= Q(profile_id=inventory.profile_id, legacy_inventory_id=inventory.id)
+    if not lookup:
         return inventory_item_map
 
-    for inventory_item in InventoryItem.objects.filter(
-        metadata__legacy_inventory_id__in=legacy_inventory_ids
-    ):
-        legacy_inventory_id = str((inventory_item.metadata or {}).get("legacy_inventory_id") or "")
-        inventory_id = inventory_id_map.get(legacy_inventory_id)
-        if inventory_id is not None:
-            inventory_item_map[inventory_item.id] = inventory_id
+    for inventory_item in InventoryItem.objects.filter(lookup):
+        inventory_item_map[inventory_item.id] = inventory_item.legacy_inventory_id
 
     return inventory_item_map
 
@@ -122,6 +149,7 @@ def get_inventory_summary_map(inventories, *, expiring_days: int = 30):
     balances = StockBalance.objects.filter(
         inventory_item_id__in=inventory_item_map.keys()
     ).select_related("stock_location", "stock_lot")
+    lot_values = {}
 
     for balance in balances:
         inventory_id = inventory_item_map.get(balance.inventory_item_id)
@@ -143,9 +171,10 @@ def get_inventory_summary_map(inventories, *, expiring_days: int = 30):
             location_name = getattr(balance.stock_location, "name", "Unknown Location")
             summary["_location_quantities"][location_name] += quantity_on_hand
 
+        lot_values.setdefault(balance.inventory_item_id, Decimal("0"))
         if balance.stock_lot_id:
             unit_cost = _to_decimal(balance.stock_lot.unit_cost)
-            summary["total_stock_value"] += quantity_on_hand * unit_cost
+            lot_values[balance.inventory_item_id] += quantity_on_hand * unit_cost
             if quantity_on_hand > 0:
                 summary["_unit_costs"].append(unit_cost)
 
@@ -164,6 +193,13 @@ def get_inventory_summary_map(inventories, *, expiring_days: int = 30):
                     }
                 )
 
+    valuations = get_inventory_valuation_map(lot_values)
+    for inventory_item_id, lot_value in lot_values.items():
+        valuation = valuations.get(inventory_item_id)
+        summaries[inventory_item_map[inventory_item_id]]["total_stock_value"] += (
+            _to_decimal(valuation["total_value"]) if valuation is not None else lot_value
+        )
+
     for inventory in inventory_list:
         summary = summaries[inventory.id]
         _finalize_inventory_summary(inventory, summary)
@@ -309,28 +345,84 @@ def get_inventory_item_summary_map(inventory_items, *, stock_location=None, expi
         )
     }
 
+    valuations = get_inventory_valuation_map(
+        inventory_item_id for inventory_item_id, summary in summaries.items() if summary["has_balances"]
+    )
     for inventory_item in inventory_item_list:
         summary = summaries[inventory_item.id]
         if not summary["serial_count"]:
             summary["serial_count"] = serial_counts.get(inventory_item.id, 0)
         _finalize_inventory_item_summary(inventory_item, summary)
+        valuation = valuations.get(inventory_item.id)
+        if valuation is not None:
+            average_cost = _to_decimal(valuation["average_unit_cost"])
+            summary["avg_purchase_price"] = average_cost
+            summary["purchase_price"] = average_cost
+            if stock_location is None:
+                summary["total_stock_value"] = _to_decimal(valuation["total_value"])
+            else:
+                summary["total_stock_value"] = summary["quantity"] * average_cost
 
     return summaries
 
 
+STOCK_LEVEL_FIELD = DecimalField(max_digits=20, decimal_places=5)
+STOCK_VALUE_FIELD = DecimalField(max_digits=30, decimal_places=10)
+
+
+def annotate_inventory_item_stock_quantity(queryset, *, field_name: str = "stock_quantity"):
+    """Annotate ``InventoryItem`` rows with their summed on-hand quantity as a correlated subquery."""
+    total = (
+        StockBalance.objects.filter(inventory_item=OuterRef("pk"))
+        .order_by()
+        .values("inventory_item")
+        .annotate(total=Sum("quantity_on_hand"))
+        .values("total")
+    )
+    return queryset.annotate(
+        **{field_name: Coalesce(Subquery(total, output_field=STOCK_LEVEL_FIELD), Value(Decimal("0")), output_field=STOCK_LEVEL_FIELD)}
+    )
+
+
+def annotate_inventory_stock_level(queryset, *, field_name: str = "stock_level"):
+    """
+    Annotate legacy ``Inventory`` rows with the on-hand quantity of their mapped inventory items.
+
+    Items link back through their indexed ``legacy_inventory_id`` within the same tenant.
+    """
+    total = (
+        StockBalance.objects.filter(
+            profile_id=OuterRef("profile_id"),
+            inventory_item__legacy_inventory_id=OuterRef("pk"),
+        )
+        .order_by()
+        .values("inventory_item__legacy_inventory_id")
+        .annotate(total=Sum("quantity_on_hand"))
+        .values("total")
+    )
+    return queryset.annotate(
+        **{field_name: Coalesce(Subquery(total, output_field=STOCK_LEVEL_FIELD), Value(Decimal("0")), output_field=STOCK_LEVEL_FIELD)}
+    )
+
+
+def filter_inventories_by_stock_status(queryset, *, filter_name: str):
+    queryset = annotate_inventory_stock_level(queryset)
+    if filter_name == "low_stock":
+        return queryset.filter(stock_level__lte=F("minimum_stock_level"))
+    if filter_name == "needs_reorder":
+        return queryset.filter(stock_level__lte=F("re_order_point"))
+    if filter_name == "out_of_stock":
+        return queryset.filter(stock_level__lte=0)
+    return queryset.none()
+
+
 def get_inventory_ids_for_stock_filter(inventories, *, filter_name: str):
-    summary_map = get_inventory_summary_map(inventories)
-    inventory_ids = []
-    for inventory in inventories:
-        summary = summary_map.get(inventory.id, {})
-        current_stock = _to_decimal(summary.get("current_stock_level"))
-        if filter_name == "low_stock" and current_stock <= _to_decimal(inventory.minimum_stock_level):
-            inventory_ids.append(inventory.id)
-        elif filter_name == "needs_reorder" and current_stock <= _to_decimal(inventory.re_order_point):
-            inventory_ids.append(inventory.id)
-        elif filter_name == "out_of_stock" and current_stock <= 0:
-            inventory_ids.append(inventory.id)
-    return inventory_ids
+    if isinstance(inventories, QuerySet):
+        queryset = inventories
+    else:
+        queryset = Inventory.objects.filter(id__in=[inventory.id for inventory in inventories])
+    matching_ids = set(filter_inventories_by_stock_status(queryset, filter_name=filter_name).values_list("id", flat=True))
+    return [inventory.id for inventory in inventories if inventory.id in matching_ids]
 
 
 def get_location_stock_summary(location, *, expiring_days: int = 30):
@@ -346,12 +438,13 @@ def get_location_stock_summary(location, *, expiring_days: int = 30):
     total_value = Decimal("0")
     inventory_type_counts = defaultdict(int)
 
-    for balance in balances:
+    balance_rows = list(balances)
+    valuations = get_inventory_valuation_map({balance.inventory_item_id for balance in balance_rows})
+    for balance in balance_rows:
         total_items += 1
         quantity_on_hand = _to_decimal(balance.quantity_on_hand)
         total_quantity += quantity_on_hand
-        if balance.stock_lot_id:
-            total_value += quantity_on_hand * _to_decimal(balance.stock_lot.unit_cost)
+        total_value += _balance_value(balance, quantity_on_hand, valuations)
         inventory_type_counts[balance.inventory_item.inventory_type] += 1
 
     return {
@@ -373,74 +466,121 @@ def get_location_stock_summary(location, *, expiring_days: int = 30):
     }
 
 
-def get_profile_stock_analytics(*, profile_id: int):
-    today = timezone.now().date()
-    balances = StockBalance.objects.filter(profile_id=profile_id).select_related(
-        "stock_location",
-        "stock_lot",
-        "inventory_item",
-    )
+# (bucket, minimum age in days, maximum age in days); ages count from the lot, else the balance, creation date.
+AGING_BUCKETS = (
+    ("0-30_days", None, 30),
+    ("31-90_days", 31, 90),
+    ("91-365_days", 91, 365),
+    ("over_1_year", 366, None),
+)
 
-    total_stock_items = set()
-    total_locations = set()
-    total_stock_value = Decimal("0")
-    location_distribution = defaultdict(lambda: {"item_count": 0, "total_quantity": Decimal("0"), "total_value": Decimal("0")})
-    aging_analysis = {
-        "0-30_days": 0,
-        "31-90_days": 0,
-        "91-365_days": 0,
-        "over_1_year": 0,
-    }
 
-    for balance in balances:
-        quantity_on_hand = _to_decimal(balance.quantity_on_hand)
-        if quantity_on_hand <= 0:
-            continue
+def _aging_filter(today, min_days, max_days) -> Q:
+    condition = Q()
+    if min_days is not None:
+        condition &= Q(stocked_on__date__lte=today - timedelta(days=min_days))
+    if max_days is not None:
+        condition &= Q(stocked_on__date__gte=today - timedelta(days=max_days))
+    return condition
 
-        total_stock_items.add(balance.inventory_item_id)
-        if balance.stock_location_id:
-            total_locations.add(balance.stock_location_id)
-            location_name = getattr(balance.stock_location, "name", "Unknown Location")
-            location_distribution[location_name]["item_count"] += 1
-            location_distribution[location_name]["total_quantity"] += quantity_on_hand
-            if balance.stock_lot_id:
-                location_distribution[location_name]["total_value"] += quantity_on_hand * _to_decimal(balance.stock_lot.unit_cost)
 
-        if balance.stock_lot_id:
-            total_stock_value += quantity_on_hand * _to_decimal(balance.stock_lot.unit_cost)
-
-        reference_date = balance.stock_lot.created_at.date() if balance.stock_lot_id else balance.created_at.date()
-        age_days = (today - reference_date).days
-        if age_days <= 30:
-            aging_analysis["0-30_days"] += 1
-        elif age_days <= 90:
-            aging_analysis["31-90_days"] += 1
-        elif age_days <= 365:
-            aging_analysis["91-365_days"] += 1
-        else:
-            aging_analysis["over_1_year"] += 1
+def get_profile_stock_analytics(*, profile_id: int):
+    """Summarise a tenant's stocked balances with grouped aggregates instead of loading every row."""
+    today = timezone.now().date()
+    stocked = StockBalance.objects.filter(profile_id=profile_id, quantity_on_hand__gt=0).order_by()
+    balance_value = ExpressionWrapper(
+        F("quantity_on_hand")
+        * Coalesce(
+            "inventory_item__valuation__average_unit_cost",
+            "stock_lot__unit_cost",
+            Value(Decimal("0")),
+            output_field=STOCK_LEVEL_FIELD,
+        ),
+        output_field=STOCK_VALUE_FIELD,
+    )
+    stocked_on = Coalesce("stock_lot__created_at", "created_at")
+
+    totals = stocked.annotate(stocked_on=stocked_on).aggregate(
+        total_stock_items=Count("inventory_item", distinct=True),
+        total_locations=Count("stock_location", distinct=True),
+        unvalued_stock_value=Sum(
+            ExpressionWrapper(
+                F("quantity_on_hand") * Coalesce("stock_lot__unit_cost", Value(Decimal("0"))),
+                output_field=STOCK_VALUE_FIELD,
+            ),
+            filter=Q(inventory_item__valuation__isnull=True),
+        ),
+        **{
+            bucket: Count("id", filter=_aging_filter(today, min_days, max_days))
+            for bucket, min_days, max_days in AGING_BUCKETS
+        },
+    )
+    valued_stock_value = InventoryItemValuation.objects.filter(
+        inventory_item_id__in=stocked.values("inventory_item_id")
+    ).aggregate(total=Sum("total_value"))["total"]
+
+    location_rows = (
+        stocked.filter(stock_location__isnull=False)
+        .values("stock_location__name")
+        .annotate(
+            item_count=Count("id"),
+            total_quantity=Sum("quantity_on_hand"),
+            total_value=Sum(balance_value),
+        )
+        .order_by("-total_quantity", "stock_location__name")
+    )
 
     return {
-        "total_stock_items": len(total_stock_items),
-        "total_locations": len(total_locations),
-        "total_stock_value": total_stock_value,
+        "total_stock_items": totals["total_stock_items"],
+        "total_locations": totals["total_locations"],
+        "total_stock_value": _to_decimal(valued_stock_value) + _to_decimal(totals["unvalued_stock_value"]),
         "location_distribution": [
             {
-                "location_name": location_name,
-                "item_count": values["item_count"],
-                "total_quantity": values["total_quantity"],
-                "total_value": values["total_value"],
+                "location_name": row["stock_location__name"],
+                "item_count": row["item_count"],
+                "total_quantity": _to_decimal(row["total_quantity"]),
+                "total_value": _to_decimal(row["total_value"]),
             }
-            for location_name, values in sorted(
-                location_distribution.items(),
-                key=lambda item: item[1]["total_quantity"],
-                reverse=True,
-            )
+            for row in location_rows
         ],
-        "aging_analysis": aging_analysis,
+        "aging_analysis": {
+            bucket: totals[bucket] for bucket, _, _ in AGING_BUCKETS
+        },
     }
 
 
+PROFILE_STOCK_ANALYTICS_CACHE_TTL = 60 * 60
+
+
+def _profile_stock_stamp(profile_id: int) -> str:
+    # Every stock mutation rewrites the touched items' rollup rows, so their latest write marks the tenant's stock version.
+    stamp = InventoryItemAvailability.objects.filter(profile_id=profile_id).aggregate(
+        items=Count("inventory_item"),
+        updated_at=Max("updated_at"),
+    )
+    # Valuation rebuilds change stock value without touching the rollups.
+    valued_at = InventoryItemValuation.objects.filter(profile_id=profile_id).aggregate(
+        updated_at=Max("updated_at")
+    )["updated_at"]
+    # Location writes, such as renames, bump the location views' cache version.
+    location_version, _ = get_cache_versions(STOCK_LOCATION_CACHE_SCOPE, profile_id)
+    updated_at = stamp["updated_at"].isoformat() if stamp["updated_at"] else ""
+    valued_at = valued_at.isoformat() if valued_at else ""
+    return f"{stamp['items']}:{updated_at}:{valued_at}:{location_version}"
+
+
+def get_cached_profile_stock_analytics(*, profile_id: int):
+    """Return ``get_profile_stock_analytics`` from the cache until the tenant's stock, valuations, locations or the day change."""
+    cache_key = (
+        f"profile_stock_analytics:{profile_id}:{timezone.now().date().isoformat()}:{_profile_stock_stamp(profile_id)}"
+    )
+    analytics = cache.get(cache_key)
+    if analytics is None:
+        analytics = get_profile_stock_analytics(profile_id=profile_id)
+        cache.set(cache_key, analytics, PROFILE_STOCK_ANALYTICS_CACHE_TTL)
+    return analytics
+
+
 def get_low_stock_rows(inventories):
     summary_map = get_inventory_summary_map(inventories)
     rows = []
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Stored in place of a value for lookups the projection has no row for.
+_MISS = "__projection_miss__"
+
+
+class ProjectionCache:
+    """
+    Read-through cache over a projection hydrated by Kafka consumers, keyed by lookup value.
+
+    The consumers that write a projection evict the exact keys they change through
+    ``invalidate``, so entries can live for ``timeout`` rather than a short polling TTL.
+    Values are stored under a per-lookup version token that eviction replaces, so a reader
+    that loaded the projection before the change can only write to a key nobody reads again.
+    Lookups without a row are remembered for ``miss_timeout`` only, so repeated misses stay
+    off the database without hiding a row that arrives later for long. An optional
+    in-process LRU sits in front of the shared cache; evictions only reach it in the
+    consumer's own process, so it keeps entries for ``local_timeout`` seconds at most.
+    """
+
+    DEFAULT_TIMEOUT = getattr(settings, "PROJECTION_CACHE_TIMEOUT", 6 * 60 * 60)
+    DEFAULT_MISS_TIMEOUT = getattr(settings, "PROJECTION_CACHE_MISS_TIMEOUT", 30)
+
+    def __init__(
+        self,
+        key_prefix: str,
+        *,
+        timeout: int | None = None,
+        miss_timeout: int | None = None,
+        local_size: int = 0,
+        local_timeout: int = 0,
+    ):
+        self.key_prefix = key_prefix
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self.miss_timeout = miss_timeout or self.DEFAULT_MISS_TIMEOUT
+        self.local_size = local_size
+        self.local_timeout = local_timeout
+        self._local: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._local_lock = threading.Lock()
+
+    def key(self, lookup, version: str) -> str:
+        return f"{self.key_prefix}{version}:{lookup}"
+
+    def version_key(self, lookup) -> str:
+        return f"{self.key_prefix}version:{lookup}"
+
+    def get_many(self, lookups: Iterable[Any], load: Callable[[list[str]], dict]) -> dict[str, Any]:
+        """
+        Return ``{str(lookup): value or None}``.
+
+        Lookups not held locally have their versions and then their values read with one
+        ``cache.get_many`` each; the rest are passed to ``load`` in one call, which returns
+        values for the lookups it found. Versions are resolved before ``load`` runs, so an
+        eviction that commits in between moves the lookup to a version this call never writes.
+        """
+        lookups = list(dict.fromkeys(str(lookup) for lookup in lookups if lookup))
+        if not lookups:
+            return {}
+
+        found = self._get_local(lookups)
+        missing = [lookup for lookup in lookups if lookup not in found]
+        if missing:
+            keys = {lookup: self.key(lookup, version) for lookup, version in self._get_versions(missing).items()}
+            cached = cache.get_many(list(keys.values()))
+            fetched = {lookup: cached[keys[lookup]] for lookup in missing if cached.get(keys[lookup])}
+            missing = [lookup for lookup in missing if lookup not in fetched]
+            if missing:
+                loaded = load(missing)
+                misses = dict.fromkeys((lookup for lookup in missing if lookup not in loaded), _MISS)
+                cache.set_many({keys[lookup]: value for lookup, value in loaded.items()}, self.timeout)
+                cache.set_many({keys[lookup]: value for lookup, value in misses.items()}, self.miss_timeout)
+                fetched.update(loaded)
+                fetched.update(misses)
+            self._set_local(fetched)
+            found.update(fetched)
+
+        return {lookup: None if found[lookup] == _MISS else found[lookup] for lookup in lookups}
+
+    def invalidate(self, lookups: Iterable[Any], *, using: str | None = None) -> None:
+        """Evict ``lookups`` once the current transaction commits, or now outside one."""
+        lookups = [str(lookup) for lookup in lookups if lookup]
+        if lookups:
+            transaction.on_commit(lambda: self._evict(lookups), using=using)
+
+    def clear_local(self) -> None:
+        with self._local_lock:
+            self._local.clear()
+
+    def _get_versions(self, lookups: list[str]) -> dict[str, str]:
+        version_keys = {lookup: self.version_key(lookup) for lookup in lookups}
+        cached = cache.get_many(list(version_keys.values()))
+        versions = {}
+        for lookup, version_key in version_keys.items():
+            version = cached.get(version_key)
+            if version is None:
+                token = uuid.uuid4().hex
+                version = token if cache.add(version_key, token, self.timeout) else cache.get(version_key, token)
+            versions[lookup] = version
+        return versions
+
+    def _evict(self, lookups: list[str]) -> None:
+        with self._local_lock:
+            for lookup in lookups:
+                self._local.pop(lookup, None)
+        try:
+            # Entries stored under the old versions are left to expire.
+            cache.set_many({self.version_key(lookup): uuid.uuid4().hex for lookup in lookups}, self.timeout)
+        except Exception:
+            logger.warning("Failed to evict projection cache keys %s.", lookups, exc_info=True)
+
+    def _get_local(self, lookups: list[str]) -> dict[str, Any]:
+        if not self.local_size:
+            return {}
+        now = time.monotonic()
+        found = {}
+        with self._local_lock:
+            for lookup in lookups:
+                entry = self._local.get(lookup)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._local[lookup]
+                    continue
+                self._local.move_to_end(lookup)
+                found[lookup] = value
+        return found
+
+    def _set_local(self, values: dict[str, Any]) -> None:
+        if not self.local_size:
+            return
+        now = time.monotonic()
+        with self._local_lock:
+            for lookup, value in values.items():
+                timeout = min(self.local_timeout, self.miss_timeout) if value == _MISS else self.local_timeout
+                self._local[lookup] = (now + timeout, value)
+                self._local.move_to_end(lookup)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import (
+    Avg,
+    Count,
+    DurationField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    Sum,
+)
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from mainapps.orders.models import PurchaseOrder, PurchaseOrderLineItem, PurchaseOrderStatus
+
+PURCHASE_ORDER_ANALYTICS_CACHE_TTL = 60 * 60
+MONTHLY_TREND_MONTHS = 12
+WEEKLY_TREND_WEEKS = 8
+REPORTED_STATUSES = (
+    PurchaseOrderStatus.PENDING,
+    PurchaseOrderStatus.APPROVED,
+    PurchaseOrderStatus.ISSUED,
+    PurchaseOrderStatus.RECEIVED,
+    PurchaseOrderStatus.COMPLETED,
+    PurchaseOrderStatus.CANCELLED,
+)
+_ZERO = Decimal("0")
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _shift_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _as_datetime(value: date) -> datetime:
+    return datetime.combine(value, time.min, tzinfo=dt_timezone.utc)
+
+
+def _bucket_key(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _trend_buckets(purchase_orders, trunc, since: date) -> tuple[dict, dict]:
+    rows = (
+        purchase_orders.filter(created_at__gte=_as_datetime(since))
+        .order_by()
+        .annotate(bucket=trunc("created_at"))
+        .values("bucket")
+        .annotate(count=Count("id"), total_value=Sum("grand_total"))
+    )
+    counts = {}
+    values = {}
+    for row in rows:
+        counts[_bucket_key(row["bucket"])] = row["count"]
+        values[_bucket_key(row["bucket"])] = row["total_value"]
+    return counts, values
+
+
+def get_monthly_trends(purchase_orders, *, today: date | None = None) -> list[dict]:
+    """Order count and value per calendar month for the last twelve months, newest first."""
+    current = _month_start(today or timezone.now().date())
+    months = [_shift_months(current, -offset) for offset in range(MONTHLY_TREND_MONTHS)]
+    counts, values = _trend_buckets(purchase_orders, TruncMonth, months[-1])
+    return [
+        {
+            "month": month.strftime("%Y-%m"),
+            "count": counts.get(month, 0),
+            "total_value": values.get(month) or _ZERO,
+        }
+        for month in months
+    ]
+
+
+def get_weekly_trends(purchase_orders, *, today: date | None = None) -> list[dict]:
+    """Order count and value per week (starting Monday) for the last eight weeks, newest first."""
+    today = today or timezone.now().date()
+    current = today - timedelta(days=today.weekday())
+    weeks = [current - timedelta(weeks=offset) for offset in range(WEEKLY_TREND_WEEKS)]
+    counts, values = _trend_buckets(purchase_orders, TruncWeek, weeks[-1])
+    return [
+        {
+            "week": week.strftime("%Y-W%U"),
+            "count": counts.get(week, 0),
+            "total_value": values.get(week) or _ZERO,
+        }
+        for week in weeks
+    ]
+
+
+def get_supplier_metrics(purchase_orders) -> list[dict]:
+    """Per-supplier order count, value and delivery performance, highest value first."""
+    rows = (
+        purchase_orders.order_by()
+        .values("supplier_id", "supplier__name")
+        .annotate(
+            order_count=Count("id"),
+            avg_delivery_time=Avg(
+                ExpressionWrapper(F("delivery_date") - TruncDate("issue_date"), output_field=DurationField())
+            ),
+            on_time_deliveries=Count("id", filter=Q(received_date__lte=F("delivery_date"))),
+            total_value=Sum("grand_total"),
+        )
+    )
+    suppliers = [
+        {
+            "supplier__id": row["supplier_id"],
+            "supplier__name": row["supplier__name"],
+            "order_count": row["order_count"],
+            "total_value": row["total_value"] or _ZERO,
+            "avg_delivery_time": row["avg_delivery_time"] or timedelta(0),
+            "on_time_deliveries": row["on_time_deliveries"],
+        }
+        for row in rows
+    ]
+    return sorted(suppliers, key=lambda supplier: supplier["total_value"], reverse=True)
+
+
+def get_performance_metrics(purchase_orders, *, total_value: Decimal, order_count: int) -> dict:
+    completed = purchase_orders.filter(status=PurchaseOrderStatus.COMPLETED).order_by().aggregate(
+        processing_time=Avg(
+            ExpressionWrapper(F("complete_date") - F("created_at"), output_field=DurationField())
+        ),
+        delivery_time=Avg(
+            ExpressionWrapper(F("received_date") - TruncDate("issue_date"), output_field=DurationField())
+        ),
+        delivered=Count("id", filter=Q(received_date__isnull=False, delivery_date__isnull=False)),
+        on_time=Count("id", filter=Q(received_date__lte=F("delivery_date"))),
+    )
+    delivered = completed["delivered"]
+    return {
+        "average_processing_time": completed["processing_time"].days if completed["processing_time"] else 0,
+        "average_delivery_time": completed["delivery_time"].days if completed["delivery_time"] else 0,
+        "on_time_delivery_rate": round(completed["on_time"] / delivered * 100, 2) if delivered else 0,
+        "total_savings": Decimal("0.00"),
+        "cost_per_order": total_value / order_count if order_count else Decimal("0.00"),
+    }
+
+
+def get_purchase_order_value(purchase_orders) -> Decimal:
+    return purchase_orders.order_by().aggregate(total=Sum("grand_total"))["total"] or _ZERO
+
+
+def build_purchase_order_analytics(purchase_orders) -> dict:
+    """Compute the purchase order analytics payload from grouped aggregates over the stored order totals."""
+    has_lines = Exists(PurchaseOrderLineItem.objects.filter(purchase_order=OuterRef("pk")))
+    status_counts = purchase_orders.order_by().aggregate(
+        total=Count("id"),
+        total_value=Sum("grand_total"),
+        priced_orders=Count("id", filter=Q(has_lines)),
+        **{status.value: Count("id", filter=Q(status=status)) for status in REPORTED_STATUSES},
+    )
+    total_orders = status_counts.pop("total")
+    total_value = status_counts.pop("total_value") or _ZERO
+    priced_orders = status_counts.pop("priced_orders")
+    suppliers = get_supplier_metrics(purchase_orders)
+
+    return {
+        "total_purchase_orders": total_orders,
+        "pending_orders": status_counts["pending"],
+        "approved_orders": status_counts["approved"],
+        "issued_orders": status_counts["issued"],
+        "received_orders": status_counts["received"],
+        "completed_orders": status_counts["completed"],
+        "cancelled_orders": status_counts["cancelled"],
+        "total_order_value": total_value,
+        "average_order_value": total_value / priced_orders if priced_orders else _ZERO,
+        "monthly_trends": get_monthly_trends(purchase_orders),
+        "weekly_trends": get_weekly_trends(purchase_orders),
+        "supplier_performance": suppliers[:10],
+        "top_suppliers_by_value": [
+            {key: supplier[key] for key in ("supplier__id", "supplier__name", "order_count", "total_value")}
+            for supplier in suppliers[:5]
+        ],
+        "status_distribution": status_counts,
+        **get_performance_metrics(purchase_orders, total_value=total_value, order_count=total_orders),
+    }
+
+
+def _purchase_order_stamp(profile_id: int) -> str:
+    # Order and line writes bump updated_at; deletions change the counts.
+    orders = PurchaseOrder.objects.filter(profile_id=profile_id).aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    lines = PurchaseOrderLineItem.objects.filter(purchase_order__profile_id=profile_id).aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    return ":".join(
+        f"{stamp['count']}:{stamp['updated_at'].isoformat() if stamp['updated_at'] else ''}"
+        for stamp in (orders, lines)
+    )
+
+
+def get_cached_purchase_order_analytics(purchase_orders, *, profile_id: int, filters: dict) -> dict:
+    """
+    Return ``build_purchase_order_analytics`` cached per tenant and request filters.
+
+    The key carries a stamp of the tenant's orders and lines, so any change to a purchase
+    order or its lines is picked up by the next request.
+    """
+    scope = hashlib.md5(repr(sorted(filters.items())).encode()).hexdigest()
+    cache_key = (
+        f"purchase_order_analytics:{profile_id}:{scope}:"
+        f"{timezone.now().date().isoformat()}:{_purchase_order_stamp(profile_id)}"
+    )
+    analytics = cache.get(cache_key)
+    if analytics is None:
+        analytics = build_purchase_order_analytics(purchase_orders)
+        cache.set(cache_key, analytics, PURCHASE_ORDER_ANALYTICS_CACHE_TTL)
+    return analytics
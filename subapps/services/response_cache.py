@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from subapps.services.transaction_buffer import get_transaction_buffer
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_ITEM_CACHE_SCOPE = "inventory.inventoryitem"
+STOCK_LOCATION_CACHE_SCOPE = "stock.stocklocation"
+PURCHASE_ORDER_CACHE_SCOPE = "orders.purchaseorder"
+
+# Hit rates are logged every this many lookups of a scope.
+METRICS_LOG_INTERVAL = getattr(settings, "RESPONSE_CACHE_METRICS_LOG_INTERVAL", 1000)
+
+_metrics = defaultdict(lambda: {"hits": 0, "misses": 0})
+_metrics_lock = threading.Lock()
+
+
+def _tenant_version_key(scope: str, profile_id) -> str:
+    return f"response_cache:version:{scope}:{profile_id}"
+
+
+def _object_version_key(scope: str, profile_id, object_id) -> str:
+    return f"response_cache:version:{scope}:{profile_id}:{object_id}"
+
+
+def get_cache_versions(scope: str, profile_id, object_id=None) -> tuple[str, str]:
+    """
+    Return the current ``(tenant_version, object_version)`` tokens, creating missing ones.
+
+    Versions are random tokens rather than counters, so a version evicted from the cache can
+    never come back with a value that matches responses stored before the eviction.
+    """
+    keys = [_tenant_version_key(scope, profile_id)]
+    if object_id is not None:
+        keys.append(_object_version_key(scope, profile_id, object_id))
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = uuid.uuid4().hex
+            versions[key] = token if cache.add(key, token, timeout=None) else cache.get(key, token)
+    tenant_version = versions[keys[0]]
+    object_version = versions[keys[1]] if object_id is not None else ""
+    return tenant_version, object_version
+
+
+def _bump_versions(pending: dict) -> None:
+    keys = []
+    for (scope, profile_id), object_ids in pending.items():
+        keys.append(_tenant_version_key(scope, profile_id))
+        keys.extend(_object_version_key(scope, profile_id, object_id) for object_id in object_ids)
+    try:
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+    except Exception:
+        logger.warning("Failed to invalidate cached responses for %s.", sorted(pending), exc_info=True)
+
+
+def invalidate_cached_responses(scope: str, profile_id, object_ids=()) -> None:
+    """Evict a tenant's cached list responses for ``scope`` and the retrieve responses of ``object_ids``."""
+    _bump_versions({(scope, profile_id): dict.fromkeys(str(object_id) for object_id in object_ids)})
+
+
+def invalidate_cached_responses_on_commit(scope: str, profile_id, object_ids=(), *, using: str | None = None) -> None:
+    """
+    Queue an invalidation for the current transaction.
+
+    Invalidations are merged and applied in one cache write when the outermost transaction
+    commits, so readers never cache state the transaction has not committed yet. Outside a
+    transaction they are applied immediately.
+    """
+    object_ids = [str(object_id) for object_id in object_ids if object_id is not None]
+    pending = get_transaction_buffer("response_cache_invalidations", dict, _bump_versions, using=using)
+    if pending is None:
+        invalidate_cached_responses(scope, profile_id, object_ids)
+        return
+    pending.setdefault((scope, profile_id), {}).update(dict.fromkeys(object_ids))
+
+
+def record_cache_lookup(scope: str, *, hit: bool) -> None:
+    with _metrics_lock:
+        counts = _metrics[scope]
+        counts["hits" if hit else "misses"] += 1
+        lookups = counts["hits"] + counts["misses"]
+    if METRICS_LOG_INTERVAL and lookups % METRICS_LOG_INTERVAL == 0:
+        counts = get_response_cache_metrics()[scope]
+        logger.info(
+            "Response cache %s: %s hits, %s misses, hit rate %s.",
+            scope,
+            counts["hits"],
+            counts["misses"],
+            counts["hit_rate"],
+        )
+
+
+def get_response_cache_metrics() -> dict:
+    """Return ``{scope: {"hits", "misses", "hit_rate"}}`` counted by this process."""
+    with _metrics_lock:
+        snapshot = {scope: dict(counts) for scope, counts in _metrics.items()}
+    for counts in snapshot.values():
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = round(counts["hits"] / lookups, 4) if lookups else 0.0
+    return snapshot
+
+
+def reset_response_cache_metrics() -> None:
+    with _metrics_lock:
+        _metrics.clear()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable, Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mainapps.content_type_linking_models.models import SequenceCounter
+
+
+def highest_suffix(values: Iterable[str | None], separator: str = "-") -> int:
+    """Return the largest integer found after the last ``separator`` of ``values``, or 0."""
+    highest = 0
+    for value in values:
+        try:
+            highest = max(highest, int(str(value).rsplit(separator, 1)[-1]))
+        except (TypeError, ValueError):
+            continue
+    return highest
+
+
+class SequenceAllocator:
+    """
+    Hand out numbers from per-(tenant, prefix, period) counters.
+
+    Each allocation is a single ``UPDATE ... RETURNING`` on the counter row, so concurrent
+    callers never read the same value. With a ``block_size`` above one, the spare numbers
+    of a reservation are kept in-process and handed out without touching the database.
+    Numbers lost when a process exits leave gaps, never duplicates.
+    """
+
+    DEFAULT_BLOCK_SIZE = getattr(settings, "SEQUENCE_ALLOCATOR_BLOCK_SIZE", 1)
+
+    _blocks: dict[tuple, tuple[int, int]] = {}
+    _blocks_lock = threading.Lock()
+
+    @staticmethod
+    def daily_period() -> str:
+        return timezone.now().strftime("%Y%m%d")
+
+    @classmethod
+    def next_value(
+        cls,
+        tenant,
+        prefix: str,
+        *,
+        period: str = "",
+        seed: Callable[[], int] | None = None,
+        block_size: int | None = None,
+    ) -> int:
+        """
+        Return the next number of a sequence.
+
+        ``seed`` is only called when the counter row does not exist yet and returns the last
+        number already in use, so sequences started by older code carry on where they left off.
+        """
+        key = (connection.alias, str(tenant), prefix, period)
+        block_size = block_size or cls.DEFAULT_BLOCK_SIZE
+        if block_size > 1:
+            with cls._blocks_lock:
+                next_value, last_value = cls._blocks.pop(key, (1, 0))
+                if next_value <= last_value:
+                    if next_value < last_value:
+                        cls._blocks[key] = (next_value + 1, last_value)
+                    return next_value
+
+        first, last = cls._advance(key, block_size, seed)
+        if last > first:
+            # A rolled-back reservation returns its numbers to the counter, so the spares are
+            # only shared once the counter update has committed.
+            transaction.on_commit(lambda: cls._store_block(key, first + 1, last))
+        return first
+
+    @classmethod
+    def allocate(
+        cls,
+        tenant,
+        prefix: str,
+        count: int,
+        *,
+        period: str = "",
+        seed: Callable[[], int] | None = None,
+    ) -> range:
+        """Reserve ``count`` consecutive numbers in one statement, for bulk creation."""
+        if count < 1:
+            return range(0)
+        first, last = cls._advance((connection.alias, str(tenant), prefix, period), count, seed)
+        return range(first, last + 1)
+
+    @classmethod
+    def clear_cached_blocks(cls) -> None:
+        with cls._blocks_lock:
+            cls._blocks.clear()
+
+    @classmethod
+    def _store_block(cls, key: tuple, next_value: int, last_value: int) -> None:
+        scope, period = key[:3], key[3]
+        with cls._blocks_lock:
+            # Only the newest period of a scope is kept, so daily periods do not pile up in long-lived workers.
+            for cached_key in [cached_key for cached_key in cls._blocks if cached_key[:3] == scope]:
+                if cached_key[3] > period:
+                    return
+                if cached_key[3] < period:
+                    del cls._blocks[cached_key]
+            cls._blocks[key] = (next_value, last_value)
+
+    @classmethod
+    def _advance(cls, key: tuple, count: int, seed) -> tuple[int, int]:
+        _, tenant, prefix, period = key
+        last_value = cls._increment(tenant, prefix, period, count)
+        if last_value is None:
+            SequenceCounter.objects.bulk_create(
+                [
+                    SequenceCounter(
+                        tenant=tenant,
+                        prefix=prefix,
+                        period=period,
+                        last_value=seed() if seed else 0,
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+            last_value = cls._increment(tenant, prefix, period, count)
+        return last_value - count + 1, last_value
+
+    @staticmethod
+    def _increment(tenant: str, prefix: str, period: str, count: int) -> int | None:
+        quote = connection.ops.quote_name
+        sql = (
+            f"UPDATE {quote(SequenceCounter._meta.db_table)} "
+            f"SET {quote('last_value')} = {quote('last_value')} + %s "
+            f"WHERE {quote('tenant')} = %s AND {quote('prefix')} = %s AND {quote('period')} = %s "
+            f"RETURNING {quote('last_value')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [count, tenant, prefix, period])
+            row = cursor.fetchone()
+        return row[0] if row else None
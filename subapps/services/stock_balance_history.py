@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, Q, Sum, Value, When
+
+from mainapps.stock.models import StockBalance, StockBalanceSnapshot, StockMovement, StockMovementType
+
+# Reservations and releases move availability, not stock on hand.
+NON_STOCK_MOVEMENT_TYPES = (StockMovementType.RESERVATION, StockMovementType.RELEASE)
+_QUANTITY_FIELD = DecimalField(max_digits=20, decimal_places=5)
+_ALL_LOTS = object()
+
+
+def snapshot_boundary(snapshot_date: date) -> datetime:
+    """Return the instant a snapshot for ``snapshot_date`` is taken at: the following UTC midnight."""
+    return datetime.combine(snapshot_date + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+
+
+def ledger_on_hand_deltas(movements) -> dict:
+    """
+    Return ``{(inventory_item_id, stock_location_id, stock_lot_id): on_hand_delta}`` for a movement queryset.
+
+    Adjustments carry a signed quantity; every other movement type stores a positive quantity
+    and is signed by the side of the transfer the location is on.
+    """
+    movements = movements.exclude(movement_type__in=NON_STOCK_MOVEMENT_TYPES).order_by()
+    deltas = defaultdict(Decimal)
+    incoming = (
+        movements.filter(to_location__isnull=False)
+        .values("inventory_item_id", "to_location_id", "stock_lot_id")
+        .annotate(total=Sum("quantity"))
+    )
+    for row in incoming:
+        deltas[(row["inventory_item_id"], row["to_location_id"], row["stock_lot_id"])] += row["total"]
+
+    outgoing = (
+        movements.filter(from_location__isnull=False)
+        .values("inventory_item_id", "from_location_id", "stock_lot_id")
+        .annotate(
+            total=Sum(
+                Case(
+                    When(movement_type=StockMovementType.ADJUSTMENT, then=F("quantity")),
+                    default=F("quantity") * Value(-1),
+                    output_field=_QUANTITY_FIELD,
+                )
+            )
+        )
+    )
+    for row in outgoing:
+        deltas[(row["inventory_item_id"], row["from_location_id"], row["stock_lot_id"])] += row["total"]
+    return deltas
+
+
+def _latest_snapshot_date(profile_id: int, *, before: date) -> date | None:
+    return (
+        StockBalanceSnapshot.objects.filter(profile_id=profile_id, snapshot_date__lt=before)
+        .aggregate(latest=Max("snapshot_date"))["latest"]
+    )
+
+
+def _snapshot_quantities(snapshots) -> dict:
+    return {
+        (row["inventory_item_id"], row["stock_location_id"], row["stock_lot_id"]): row["quantity_on_hand"]
+        for row in snapshots.values("inventory_item_id", "stock_location_id", "stock_lot_id", "quantity_on_hand")
+    }
+
+
+def compute_balance_snapshot(profile_id: int, snapshot_date: date) -> dict:
+    """
+    Reconstruct the on-hand quantities for every item/location/lot at the end of ``snapshot_date``.
+
+    Starts from the latest earlier snapshot and replays the movements since; without one it
+    starts from the live balances and rewinds the movements recorded after the boundary.
+    """
+    boundary = snapshot_boundary(snapshot_date)
+    movements = StockMovement.objects.filter(profile_id=profile_id)
+    previous_date = _latest_snapshot_date(profile_id, before=snapshot_date)
+
+    if previous_date is not None:
+        previous = StockBalanceSnapshot.objects.filter(profile_id=profile_id, snapshot_date=previous_date)
+        quantities = defaultdict(Decimal, _snapshot_quantities(previous))
+        window = movements.filter(occurred_at__gte=snapshot_boundary(previous_date), occurred_at__lt=boundary)
+        for key, delta in ledger_on_hand_deltas(window).items():
+            quantities[key] += delta
+        return dict(quantities)
+
+    quantities = defaultdict(Decimal)
+    for row in StockBalance.objects.filter(profile_id=profile_id).values(
+        "inventory_item_id", "stock_location_id", "stock_lot_id", "quantity_on_hand"
+    ):
+        quantities[(row["inventory_item_id"], row["stock_location_id"], row["stock_lot_id"])] += row["quantity_on_hand"]
+    for key, delta in ledger_on_hand_deltas(movements.filter(occurred_at__gte=boundary)).items():
+        quantities[key] -= delta
+    return dict(quantities)
+
+
+@transaction.atomic
+def take_stock_balance_snapshot(profile_id: int, snapshot_date: date) -> int:
+    """
+    Write (or rewrite) the snapshot rows for one tenant and day, returning the number of rows stored.
+
+    Zero quantities are only stored when the item was stocked in the previous snapshot, so every
+    row of the latest snapshot date is a complete picture of what was on hand.
+    """
+    quantities = compute_balance_snapshot(profile_id, snapshot_date)
+    previous_date = _latest_snapshot_date(profile_id, before=snapshot_date)
+    previously_stocked = set()
+    if previous_date is not None:
+        previously_stocked = set(
+            _snapshot_quantities(
+                StockBalanceSnapshot.objects.filter(
+                    profile_id=profile_id, snapshot_date=previous_date
+                ).exclude(quantity_on_hand=0)
+            )
+        )
+
+    StockBalanceSnapshot.objects.filter(profile_id=profile_id, snapshot_date=snapshot_date).delete()
+    rows = [
+        StockBalanceSnapshot(
+            profile_id=profile_id,
+            snapshot_date=snapshot_date,
+            inventory_item_id=inventory_item_id,
+            stock_location_id=stock_location_id,
+            stock_lot_id=stock_lot_id,
+            quantity_on_hand=quantity,
+        )
+        for (inventory_item_id, stock_location_id, stock_lot_id), quantity in quantities.items()
+        if quantity != 0 or (inventory_item_id, stock_location_id, stock_lot_id) in previously_stocked
+    ]
+    StockBalanceSnapshot.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def get_balance_as_of(inventory_item, stock_location, at: datetime, *, stock_lot=_ALL_LOTS) -> Decimal:
+    """
+    Return the quantity on hand at ``stock_location`` once every movement up to ``at`` had been applied.
+
+    All lots are summed unless ``stock_lot`` is given (``None`` selects the lot-less balance).
+    """
+    profile_id = inventory_item.profile_id
+    scope = Q(inventory_item=inventory_item)
+    movement_scope = scope & (Q(to_location=stock_location) | Q(from_location=stock_location))
+    if stock_lot is not _ALL_LOTS:
+        scope &= Q(stock_lot=stock_lot)
+        movement_scope &= Q(stock_lot=stock_lot)
+    movements = StockMovement.objects.filter(movement_scope, profile_id=profile_id)
+
+    def location_delta(queryset):
+        return sum(
+            (delta for key, delta in ledger_on_hand_deltas(queryset).items() if key[1] == stock_location.id),
+            Decimal("0"),
+        )
+
+    at_date = at.astimezone(dt_timezone.utc).date()
+    snapshot_date = _latest_snapshot_date(profile_id, before=at_date)
+    if snapshot_date is not None:
+        base = StockBalanceSnapshot.objects.filter(
+            scope, stock_location=stock_location, snapshot_date=snapshot_date
+        ).aggregate(total=Sum("quantity_on_hand"))["total"] or Decimal("0")
+        window = movements.filter(occurred_at__gte=snapshot_boundary(snapshot_date), occurred_at__lte=at)
+        return base + location_delta(window)
+
+    live = StockBalance.objects.filter(scope, stock_location=stock_location).aggregate(
+        total=Sum("quantity_on_hand")
+    )["total"] or Decimal("0")
+    return live - location_delta(movements.filter(occurred_at__gt=at))
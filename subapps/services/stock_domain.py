@@ -3,7 +3,8 @@ from __future__ import annotations
 import uuid
 from decimal import Decimal
 
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 from mainapps.inventory.models import Inventory, InventoryItem
@@ -13,14 +14,23 @@ from mainapps.stock.models import (
     StockItem,
     StockLocation,
     StockLot,
+    StockLotStatus,
     StockSerial,
     StockSerialStatus,
     StockMovement,
     StockMovementType,
     StockReservation,
     StockReservationStatus,
+    StockUnitCost,
     TrackingType,
 )
+from subapps.services.inventory_availability import apply_inventory_item_availability_changes, record_balance_delta
+from subapps.services.inventory_costing import apply_movement_costs
+from subapps.services.response_cache import (
+    INVENTORY_ITEM_CACHE_SCOPE,
+    STOCK_LOCATION_CACHE_SCOPE,
+    invalidate_cached_responses_on_commit,
+)
 
 
 class StockDomainError(ValueError):
@@ -104,20 +114,113 @@ class StockDomainService:
         serial_numbers=None,
         notes: str = "",
     ):
-        quantity_received = _to_decimal(quantity_received)
-        if quantity_received <= 0:
-            raise StockDomainError("Received quantity must be greater than zero.")
+        result = cls.receive_purchase_lines_bulk(
+            purchase_order=purchase_order,
+            lines=[
+                {
+                    "line_item": line_item,
+                    "stock_location": stock_location,
+                    "quantity_received": quantity_received,
+                    "lot_number": lot_number,
+                    "manufactured_date": manufactured_date,
+                    "expiry_date": expiry_date,
+                    "serial_numbers": serial_numbers,
+                    "notes": notes,
+                }
+            ],
+            actor_user_id=actor_user_id,
+            goods_receipt=goods_receipt,
+            notes=notes,
+        )
+        return {
+            "goods_receipt_line": result["goods_receipt_lines"][0],
+            "stock_lot": result["stock_lots"][0] if result["stock_lots"] else None,
+            "stock_serials": result["stock_serials"],
+            "balance": result["balances"][0],
+        }
 
-        if line_item.quantity_received + quantity_received > line_item.quantity:
-            raise StockDomainError(
-                f"Cannot receive {quantity_received}; only {line_item.remaining_quantity} remains open."
-            )
+    @classmethod
+    @transaction.atomic
+    def receive_purchase_lines_bulk(
+        cls,
+        *,
+        purchase_order: PurchaseOrder,
+        lines: list[dict],
+        actor_user_id=None,
+        goods_receipt: GoodsReceipt | None = None,
+        notes: str = "",
+    ):
+        """
+        Receive many purchase order lines in one set-based pass.
+
+        Each entry in ``lines`` carries ``line_item``, ``stock_location`` and
+        ``quantity_received`` plus the optional ``lot_number``,
+        ``manufactured_date``, ``expiry_date``, ``serial_numbers`` and ``notes``.
+        Every line is validated before anything is written;
+        ``receive_purchase_line`` is the single-line form of this call.
+        """
+        if not lines:
+            raise StockDomainError("At least one line is required to receive stock.")
 
         profile_id = cls._resolve_profile_id(purchase_order)
-        inventory_item = cls.ensure_inventory_item(
-            purchase_order_line=line_item,
-            actor_user_id=actor_user_id,
-        )
+        now = timezone.now()
+
+        prepared_lines = []
+        requested_by_line: dict = {}
+        all_serial_numbers: set[str] = set()
+        for line in lines:
+            line_item = line["line_item"]
+            quantity_received = _to_decimal(line["quantity_received"])
+            if quantity_received <= 0:
+                raise StockDomainError("Received quantity must be greater than zero.")
+
+            requested_by_line[line_item.id] = requested_by_line.get(line_item.id, Decimal("0")) + quantity_received
+            if line_item.quantity_received + requested_by_line[line_item.id] > line_item.quantity:
+                raise StockDomainError(
+                    f"Cannot receive {requested_by_line[line_item.id]}; only {line_item.remaining_quantity} remains open."
+                )
+
+            inventory_item = cls.ensure_inventory_item(
+                purchase_order_line=line_item,
+                actor_user_id=actor_user_id,
+            )
+            received_serial_numbers = _normalize_serial_numbers(line.get("serial_numbers"))
+            if inventory_item.track_serial:
+                serial_count = _to_whole_number(quantity_received, label="Received quantity")
+                if len(received_serial_numbers) != serial_count:
+                    raise StockDomainError(
+                        "Serial-tracked inventory requires exactly one serial number for each received unit."
+                    )
+            elif received_serial_numbers:
+                raise StockDomainError("Serial numbers were provided for an inventory item that is not serial-tracked.")
+
+            for serial_number in received_serial_numbers:
+                if serial_number in all_serial_numbers:
+                    raise StockDomainError(f"Duplicate serial number '{serial_number}' provided.")
+                all_serial_numbers.add(serial_number)
+
+            prepared_lines.append(
+                {
+                    "line_item": line_item,
+                    "inventory_item": inventory_item,
+                    "stock_location": line["stock_location"],
+                    "quantity_received": quantity_received,
+                    "lot_number": line.get("lot_number") or line_item.batch_number or "",
+                    "manufactured_date": line.get("manufactured_date") or line_item.manufactured_date,
+                    "expiry_date": line.get("expiry_date") or line_item.expiry_date,
+                    "serial_numbers": received_serial_numbers,
+                    "notes": line.get("notes") or notes,
+                }
+            )
+
+        if all_serial_numbers:
+            existing_serial = (
+                StockSerial.objects.filter(profile_id=profile_id, serial_number__in=all_serial_numbers)
+                .values_list("serial_number", flat=True)
+                .first()
+            )
+            if existing_serial is not None:
+                raise StockDomainError(f"Serial number '{existing_serial}' already exists.")
 
         if goods_receipt is None:
             goods_receipt = cls.create_goods_receipt(
@@ -126,122 +229,160 @@ class StockDomainService:
                 notes=notes,
             )
 
-        line_lot_number = lot_number or line_item.batch_number or ""
-        line_manufactured_date = manufactured_date or line_item.manufactured_date
-        line_expiry_date = expiry_date or line_item.expiry_date
-        received_serial_numbers = _normalize_serial_numbers(serial_numbers)
-
-        if inventory_item.track_serial:
-            serial_count = _to_whole_number(quantity_received, label="Received quantity")
-            if len(received_serial_numbers) != serial_count:
-                raise StockDomainError(
-                    "Serial-tracked inventory requires exactly one serial number for each received unit."
-                )
-        elif received_serial_numbers:
-            raise StockDomainError("Serial numbers were provided for an inventory item that is not serial-tracked.")
-
-        goods_receipt_line = GoodsReceiptLine.objects.create(
-            goods_receipt=goods_receipt,
-            purchase_order_line=line_item,
-            inventory_item=inventory_item,
-            stock_location=stock_location,
-            received_quantity=quantity_received,
-            unit_cost=line_item.unit_price,
-            lot_number=line_lot_number,
-            manufactured_date=line_manufactured_date,
-            expiry_date=line_expiry_date,
-            created_by_user_id=actor_user_id,
-            updated_by_user_id=actor_user_id,
-        )
-
-        stock_lot = None
-        if inventory_item.track_lot or line_lot_number or line_expiry_date or line_manufactured_date:
-            stock_lot = StockLot.objects.create(
-                profile_id=profile_id,
-                inventory_item=inventory_item,
-                supplier=purchase_order.supplier,
+        actor_label = str(actor_user_id) if actor_user_id is not None else None
+        receipt_lines: list[GoodsReceiptLine] = []
+        stock_lots: list[StockLot] = []
+        for prepared in prepared_lines:
+            line_item = prepared["line_item"]
+            goods_receipt_line = GoodsReceiptLine(
+                goods_receipt=goods_receipt,
                 purchase_order_line=line_item,
-                goods_receipt_line=goods_receipt_line,
-                lot_number=line_lot_number,
-                manufactured_date=line_manufactured_date,
-                expiry_date=line_expiry_date,
+                inventory_item=prepared["inventory_item"],
+                stock_location=prepared["stock_location"],
+                received_quantity=prepared["quantity_received"],
                 unit_cost=line_item.unit_price,
-                currency_code=purchase_order.order_currency or "",
-                received_quantity=quantity_received,
-                remaining_quantity=quantity_received,
+                lot_number=prepared["lot_number"],
+                manufactured_date=prepared["manufactured_date"],
+                expiry_date=prepared["expiry_date"],
+                created_by=actor_label,
                 created_by_user_id=actor_user_id,
+                modified_by=actor_label,
                 updated_by_user_id=actor_user_id,
             )
-            if not goods_receipt_line.lot_number and stock_lot.lot_number:
-                goods_receipt_line.lot_number = stock_lot.lot_number
-                goods_receipt_line.updated_by_user_id = actor_user_id
-                goods_receipt_line.save()
-
-        balance = cls._get_locked_balance(
-            profile_id=profile_id,
-            inventory_item=inventory_item,
-            stock_location=stock_location,
-            stock_lot=stock_lot,
-            actor_user_id=actor_user_id,
-        )
-        balance.quantity_on_hand = _to_decimal(balance.quantity_on_hand) + quantity_received
-        balance.updated_by_user_id = actor_user_id
-        balance.save()
-
-        stock_serials = cls._create_receipt_serials(
-            profile_id=profile_id,
-            inventory_item=inventory_item,
-            stock_location=stock_location,
-            stock_lot=stock_lot,
-            serial_numbers=received_serial_numbers,
-            actor_user_id=actor_user_id,
-        )
-
-        line_item.quantity_received = _to_decimal(line_item.quantity_received) + quantity_received
-        line_item.updated_by_user_id = actor_user_id
-        line_item.save()
-
-        if stock_serials:
-            for stock_serial in stock_serials:
-                StockMovement.objects.create(
+            stock_lot = None
+            if (
+                prepared["inventory_item"].track_lot
+                or prepared["lot_number"]
+                or prepared["expiry_date"]
+                or prepared["manufactured_date"]
+            ):
+                if not goods_receipt_line.lot_number:
+                    goods_receipt_line.lot_number = StockLot.receipt_lot_number(goods_receipt_line.id)
+                stock_lot = StockLot(
                     profile_id=profile_id,
-                    inventory_item=inventory_item,
-                    stock_lot=stock_lot,
-                    stock_serial=stock_serial,
-                    to_location=stock_location,
-                    movement_type=StockMovementType.RECEIPT,
-                    quantity=Decimal("1"),
+                    inventory_item=prepared["inventory_item"],
+                    supplier=purchase_order.supplier,
+                    purchase_order_line=line_item,
+                    goods_receipt_line=goods_receipt_line,
+                    lot_number=goods_receipt_line.lot_number,
+                    manufactured_date=prepared["manufactured_date"],
+                    expiry_date=prepared["expiry_date"],
                     unit_cost=line_item.unit_price,
-                    reference_type="goods_receipt_line",
-                    reference_id=str(goods_receipt_line.id),
-                    actor_user_id=actor_user_id,
-                    notes=notes or f"Received serial {stock_serial.serial_number} against PO {purchase_order.reference}",
+                    currency_code=purchase_order.order_currency or "",
+                    received_quantity=prepared["quantity_received"],
+                    remaining_quantity=prepared["quantity_received"],
+                    status=StockLotStatus.OPEN,
                     created_by_user_id=actor_user_id,
                     updated_by_user_id=actor_user_id,
                 )
-        else:
-            StockMovement.objects.create(
-                profile_id=profile_id,
-                inventory_item=inventory_item,
-                stock_lot=stock_lot,
-                to_location=stock_location,
-                movement_type=StockMovementType.RECEIPT,
-                quantity=quantity_received,
-                unit_cost=line_item.unit_price,
-                reference_type="goods_receipt_line",
-                reference_id=str(goods_receipt_line.id),
+                stock_lots.append(stock_lot)
+            prepared["goods_receipt_line"] = goods_receipt_line
+            prepared["stock_lot"] = stock_lot
+            receipt_lines.append(goods_receipt_line)
+
+        GoodsReceiptLine.objects.bulk_create(receipt_lines)
+        if stock_lots:
+            StockLot.objects.bulk_create(stock_lots)
+
+        received_by_key: dict[tuple, Decimal] = {}
+        for prepared in prepared_lines:
+            balance_key = (
+                prepared["inventory_item"].id,
+                prepared["stock_location"].id,
+                prepared["stock_lot"].id if prepared["stock_lot"] is not None else None,
+            )
+            received_by_key[balance_key] = received_by_key.get(balance_key, Decimal("0")) + prepared["quantity_received"]
+        balances = cls._get_balances(
+            profile_id=profile_id,
+            keys=list(received_by_key),
+            actor_user_id=actor_user_id,
+        )
+        # Balances come back in id order; applying the deltas in that order keeps concurrent receipts deadlock-free.
+        for balance_key, balance in balances.items():
+            cls._apply_balance_delta(
+                balance,
+                on_hand_delta=received_by_key[balance_key],
                 actor_user_id=actor_user_id,
-                notes=notes or f"Received against PO {purchase_order.reference}",
-                created_by_user_id=actor_user_id,
-                updated_by_user_id=actor_user_id,
             )
 
-        cls._publish_inventory_availability_on_commit(inventory_item.id)
+        stock_serials: list[StockSerial] = []
+        movements: list[StockMovement] = []
+        for prepared in prepared_lines:
+            line_item = prepared["line_item"]
+            movement_defaults = {
+                "profile_id": profile_id,
+                "inventory_item": prepared["inventory_item"],
+                "stock_lot": prepared["stock_lot"],
+                "to_location": prepared["stock_location"],
+                "movement_type": StockMovementType.RECEIPT,
+                "unit_cost": line_item.unit_price,
+                "reference_type": "goods_receipt_line",
+                "reference_id": str(prepared["goods_receipt_line"].id),
+                "actor_user_id": actor_user_id,
+                "occurred_at": now,
+                "created_by_user_id": actor_user_id,
+                "updated_by_user_id": actor_user_id,
+            }
+            if prepared["serial_numbers"]:
+                for serial_number in prepared["serial_numbers"]:
+                    stock_serial = StockSerial(
+                        profile_id=profile_id,
+                        inventory_item=prepared["inventory_item"],
+                        stock_lot=prepared["stock_lot"],
+                        stock_location=prepared["stock_location"],
+                        serial_number=serial_number,
+                        status=StockSerialStatus.AVAILABLE,
+                        created_by_user_id=actor_user_id,
+                        updated_by_user_id=actor_user_id,
+                    )
+                    stock_serials.append(stock_serial)
+                    movements.append(
+                        StockMovement(
+                            stock_serial=stock_serial,
+                            quantity=Decimal("1"),
+                            notes=prepared["notes"]
+                            or f"Received serial {serial_number} against PO {purchase_order.reference}",
+                            **movement_defaults,
+                        )
+                    )
+            else:
+                movements.append(
+                    StockMovement(
+                        quantity=prepared["quantity_received"],
+                        notes=prepared["notes"] or f"Received against PO {purchase_order.reference}",
+                        **movement_defaults,
+                    )
+                )
+
+        if stock_serials:
+            StockSerial.objects.bulk_create(stock_serials)
+        StockMovement.objects.bulk_create(movements)
+        apply_movement_costs(movements, cls._opening_unit_cost)
+        cls._record_unit_costs(movements)
+
+        line_items = {}
+        for prepared in prepared_lines:
+            line_items[prepared["line_item"].id] = prepared["line_item"]
+        for line_item_id, line_item in line_items.items():
+            line_item.quantity_received = _to_decimal(line_item.quantity_received) + requested_by_line[line_item_id]
+            line_item.fully_received = line_item.quantity_received >= _to_decimal(line_item.quantity)
+            line_item.updated_by_user_id = actor_user_id
+            line_item.updated_at = now
+        PurchaseOrderLineItem.objects.bulk_update(
+            list(line_items.values()),
+            ["quantity_received", "fully_received", "updated_by_user_id", "updated_at"],
+        )
+
+        cls._sync_inventory_item_availability(movements)
+        cls._invalidate_cached_stock_responses(
+            (profile_id, prepared["inventory_item"].id, prepared["stock_location"].id) for prepared in prepared_lines
+        )
         return {
-            "goods_receipt_line": goods_receipt_line,
-            "stock_lot": stock_lot,
+            "goods_receipt": goods_receipt,
+            "goods_receipt_lines": receipt_lines,
+            "stock_lots": stock_lots,
             "stock_serials": stock_serials,
-            "balance": balance,
+            "balances": list(balances.values()),
         }
 
     @classmethod
@@ -298,8 +439,7 @@ class StockDomainService:
 
         if stock_lot is None and inventory_item.track_lot:
             candidate_balance = (
-                StockBalance.objects.select_for_update()
-                .filter(
+                StockBalance.objects.filter(
                     profile_id=profile_id,
                     inventory_item=inventory_item,
                     stock_location=from_location,
@@ -319,44 +459,47 @@ class StockDomainService:
         if stock_lot and stock_lot.inventory_item_id != inventory_item.id:
             raise StockDomainError("Stock lot does not belong to the selected inventory item.")
 
-        source_balance = cls._get_locked_balance(
+        stock_lot_id = stock_lot.id if stock_lot is not None else None
+        source_key = (inventory_item.id, from_location.id, stock_lot_id)
+        destination_key = (inventory_item.id, to_location.id, stock_lot_id)
+        balances = cls._get_balances(
             profile_id=profile_id,
-            inventory_item=inventory_item,
-            stock_location=from_location,
-            stock_lot=stock_lot,
-            legacy_inventory=legacy_inventory,
+            keys=[source_key, destination_key],
             actor_user_id=actor_user_id,
         )
-        source_available = _to_decimal(source_balance.quantity_available)
-        source_on_hand = _to_decimal(source_balance.quantity_on_hand)
-
-        if source_available < quantity and not inventory_item.allow_negative_stock:
-            raise StockDomainError("Insufficient stock quantity.")
-        if source_on_hand - quantity < 0 and not inventory_item.allow_negative_stock:
-            raise StockDomainError("Insufficient stock quantity.")
-
-        source_balance.quantity_on_hand = source_on_hand - quantity
-        source_balance.updated_by_user_id = actor_user_id
-        source_balance.save()
-
-        destination_balance = cls._get_locked_balance(
-            profile_id=profile_id,
-            inventory_item=inventory_item,
-            stock_location=to_location,
-            stock_lot=stock_lot,
-            legacy_inventory=legacy_inventory,
-            actor_user_id=actor_user_id,
-        )
-        destination_balance.quantity_on_hand = _to_decimal(destination_balance.quantity_on_hand) + quantity
-        destination_balance.updated_by_user_id = actor_user_id
-        destination_balance.save()
+        source_guards = []
+        if not inventory_item.allow_negative_stock:
+            source_guards = [
+                ("quantity_available", quantity, "Insufficient stock quantity."),
+                ("quantity_on_hand", quantity, "Insufficient stock quantity."),
+            ]
+        # Both balances are locked in id order without a separate SELECT ... FOR UPDATE:
+        # _get_balances returns them sorted by id and each guarded UPDATE takes its
+        # row lock, so A -> B and B -> A transfers lock the same row first and
+        # cannot deadlock, whichever direction the stock moves.
+        for balance_key, balance in balances.items():
+            if balance_key == source_key:
+                cls._apply_balance_delta(
+                    balance,
+                    on_hand_delta=-quantity,
+                    guards=source_guards,
+                    actor_user_id=actor_user_id,
+                )
+            else:
+                cls._apply_balance_delta(
+                    balance,
+                    on_hand_delta=quantity,
+                    actor_user_id=actor_user_id,
+                )
+        source_balance = balances[source_key]
+        destination_balance = balances[destination_key]
 
         if stock_serial is not None:
             stock_serial.stock_location = to_location
             stock_serial.updated_by_user_id = actor_user_id
             stock_serial.save()
 
-        StockMovement.objects.create(
+        movement = StockMovement.objects.create(
             profile_id=profile_id,
             inventory_item=inventory_item,
             stock_lot=stock_lot,
@@ -377,6 +520,11 @@ class StockDomainService:
             created_by_user_id=actor_user_id,
             updated_by_user_id=actor_user_id,
         )
+        cls._record_unit_costs([movement])
+        cls._sync_inventory_item_availability([movement])
+        cls._invalidate_cached_stock_responses(
+            [(profile_id, inventory_item.id, from_location.id), (profile_id, inventory_item.id, to_location.id)]
+        )
 
         return {
             "inventory_item": inventory_item,
@@ -406,23 +554,25 @@ class StockDomainService:
             actor_user_id=actor_user_id,
         )
 
-        balance = cls._get_locked_balance(
+        balance = cls._get_balance(
             profile_id=profile_id,
             inventory_item=inventory_item,
             stock_location=stock_location,
-            legacy_inventory=legacy_inventory,
             actor_user_id=actor_user_id,
         )
-        previous_quantity = _to_decimal(balance.quantity_on_hand)
-        next_quantity = previous_quantity + quantity_change
-        if next_quantity < 0 and not inventory_item.allow_negative_stock:
-            raise StockDomainError("Insufficient stock quantity.")
-
-        balance.quantity_on_hand = next_quantity
-        balance.updated_by_user_id = actor_user_id
-        balance.save()
+        guards = []
+        if quantity_change < 0 and not inventory_item.allow_negative_stock:
+            guards = [("quantity_on_hand", -quantity_change, "Insufficient stock quantity.")]
+        cls._apply_balance_delta(
+            balance,
+            on_hand_delta=quantity_change,
+            guards=guards,
+            actor_user_id=actor_user_id,
+        )
+        next_quantity = balance.quantity_on_hand
+        previous_quantity = next_quantity - quantity_change
 
-        StockMovement.objects.create(
+        movement = StockMovement.objects.create(
             profile_id=profile_id,
             inventory_item=inventory_item,
             from_location=stock_location if quantity_change < 0 else None,
@@ -436,8 +586,11 @@ class StockDomainService:
             created_by_user_id=actor_user_id,
             updated_by_user_id=actor_user_id,
         )
+        apply_movement_costs([movement], cls._opening_unit_cost)
+        cls._record_unit_costs([movement])
 
-        cls._publish_inventory_availability_on_commit(inventory_item.id)
+        cls._sync_inventory_item_availability([movement])
+        cls._invalidate_cached_stock_responses([(profile_id, inventory_item.id, stock_location.id)])
         return {
             "balance": balance,
             "old_quantity": previous_quantity,
@@ -496,9 +649,7 @@ class StockDomainService:
 
         profile_id = cls._resolve_profile_id(inventory)
         inventory_item = (
-            InventoryItem.objects.filter(
-                metadata__legacy_inventory_id=str(inventory.id)
-            )
+            InventoryItem.objects.filter(profile_id=profile_id, legacy_inventory_id=inventory.id)
             .order_by("created_at")
             .first()
         )
@@ -652,7 +803,7 @@ class StockDomainService:
         if quantity <= 0:
             raise StockDomainError("Reservation quantity must be greater than zero.")
 
-        inventory_item, legacy_inventory, profile_id = cls._resolve_inventory_context(
+        inventory_item, _, profile_id = cls._resolve_inventory_context(
             inventory=inventory,
             inventory_item=inventory_item,
             actor_user_id=actor_user_id,
@@ -677,8 +828,7 @@ class StockDomainService:
 
         if stock_lot is None and inventory_item.track_lot:
             candidate_balance = (
-                StockBalance.objects.select_for_update()
-                .filter(
+                StockBalance.objects.filter(
                     profile_id=profile_id,
                     inventory_item=inventory_item,
                     stock_location=stock_location,
@@ -698,20 +848,22 @@ class StockDomainService:
         if stock_lot and stock_lot.inventory_item_id != inventory_item.id:
             raise StockDomainError("Stock lot does not belong to the selected inventory item.")
 
-        balance = cls._get_locked_balance(
+        balance = cls._get_balance(
             profile_id=profile_id,
             inventory_item=inventory_item,
             stock_location=stock_location,
             stock_lot=stock_lot,
-            legacy_inventory=legacy_inventory,
             actor_user_id=actor_user_id,
         )
-        if _to_decimal(balance.quantity_available) < quantity and not inventory_item.allow_negative_stock:
-            raise StockDomainError("Insufficient available stock to reserve.")
-
-        balance.quantity_reserved = _to_decimal(balance.quantity_reserved) + quantity
-        balance.updated_by_user_id = actor_user_id
-        balance.save()
+        guards = []
+        if not inventory_item.allow_negative_stock:
+            guards = [("quantity_available", quantity, "Insufficient available stock to reserve.")]
+        cls._apply_balance_delta(
+            balance,
+            reserved_delta=quantity,
+            guards=guards,
+            actor_user_id=actor_user_id,
+        )
 
         reservation = StockReservation.objects.create(
             profile_id=profile_id,
@@ -735,7 +887,7 @@ class StockDomainService:
             stock_serial.updated_by_user_id = actor_user_id
             stock_serial.save()
 
-        StockMovement.objects.create(
+        movement = StockMovement.objects.create(
             profile_id=profile_id,
             inventory_item=inventory_item,
             stock_lot=stock_lot,
@@ -751,13 +903,264 @@ class StockDomainService:
             updated_by_user_id=actor_user_id,
         )
 
-        cls._publish_inventory_availability_on_commit(inventory_item.id)
+        cls._sync_inventory_item_availability([movement])
+        cls._invalidate_cached_stock_responses([(profile_id, inventory_item.id, stock_location.id)])
         cls._publish_inventory_reservation_on_commit(reservation.id)
         return {
             "reservation": reservation,
             "balance": balance,
         }
 
+    @classmethod
+    @transaction.atomic
+    def reserve_stock_batch(
+        cls,
+        *,
+        lines: list[dict],
+        actor_user_id=None,
+        expires_at=None,
+        notes: str = "",
+    ):
+        """
+        Reserve many lines in one set-based pass.
+
+        Each entry in ``lines`` accepts the keyword arguments of ``reserve_stock``
+        (``inventory`` or ``inventory_item``, ``stock_location``, ``quantity``,
+        ``external_order_type``, ``external_order_id`` and the optional line,
+        lot, serial, expiry and notes values). Items, serials and FEFO lots are
+        resolved in bulk, balances are updated once per key and availability is
+        published once per inventory item.
+        """
+        if not lines:
+            raise StockDomainError("At least one line is required to reserve stock.")
+
+        inventory_items_by_inventory: dict = {}
+        prepared_lines = []
+        for line in lines:
+            quantity = _to_decimal(line["quantity"])
+            if quantity <= 0:
+                raise StockDomainError("Reservation quantity must be greater than zero.")
+
+            inventory_item = line.get("inventory_item")
+            if inventory_item is None:
+                inventory = line.get("inventory")
+                if inventory is None:
+                    raise StockDomainError("Unable to resolve inventory item for stock operation.")
+                if inventory.id not in inventory_items_by_inventory:
+                    inventory_items_by_inventory[inventory.id] = cls.ensure_inventory_item(
+                        inventory=inventory,
+                        actor_user_id=actor_user_id,
+                    )
+                inventory_item = inventory_items_by_inventory[inventory.id]
+
+            stock_lot = line.get("stock_lot")
+            stock_serial = line.get("stock_serial")
+            serial_number = str(line.get("serial_number") or "").strip()
+            if inventory_item.track_serial:
+                reservation_count = _to_whole_number(quantity, label="Reservation quantity")
+                if reservation_count != 1:
+                    raise StockDomainError("Serial-tracked inventory can only reserve one serial per reservation.")
+                if stock_serial is None and not serial_number:
+                    raise StockDomainError(
+                        "Serial-tracked inventory requires a stock_serial or serial_number for this operation."
+                    )
+            elif stock_serial is not None or serial_number:
+                raise StockDomainError("Serial selection is only valid for serial-tracked inventory.")
+            if stock_lot is not None and stock_lot.inventory_item_id != inventory_item.id:
+                raise StockDomainError("Stock lot does not belong to the selected inventory item.")
+
+            prepared_lines.append(
+                {
+                    "profile_id": cls._resolve_profile_id(inventory_item),
+                    "inventory_item": inventory_item,
+                    "stock_location": line["stock_location"],
+                    "quantity": quantity,
+                    "stock_lot_id": stock_lot.id if stock_lot is not None else None,
+                    "stock_serial": stock_serial,
+                    "serial_number": serial_number,
+                    "external_order_type": line["external_order_type"],
+                    "external_order_id": line["external_order_id"],
+                    "external_order_line_id": line.get("external_order_line_id") or "",
+                    "expires_at": line.get("expires_at") or expires_at,
+                    "notes": line.get("notes") or notes,
+                }
+            )
+
+        serial_lines = [prepared for prepared in prepared_lines if prepared["inventory_item"].track_serial]
+        if serial_lines:
+            serial_filter = models.Q()
+            for prepared in serial_lines:
+                if prepared["stock_serial"] is not None:
+                    serial_filter |= models.Q(id=prepared["stock_serial"].id)
+                else:
+                    serial_filter |= models.Q(
+                        inventory_item_id=prepared["inventory_item"].id,
+                        serial_number=prepared["serial_number"],
+                    )
+            locked_serials = list(
+                StockSerial.objects.select_for_update()
+                .filter(serial_filter, status=StockSerialStatus.AVAILABLE)
+                .order_by("id")
+            )
+            serials_by_id = {stock_serial.id: stock_serial for stock_serial in locked_serials}
+            serials_by_number = {
+                (stock_serial.profile_id, stock_serial.inventory_item_id, stock_serial.serial_number): stock_serial
+                for stock_serial in locked_serials
+            }
+            claimed_serial_ids = set()
+            for prepared in serial_lines:
+                if prepared["stock_serial"] is not None:
+                    stock_serial = serials_by_id.get(prepared["stock_serial"].id)
+                else:
+                    stock_serial = serials_by_number.get(
+                        (prepared["profile_id"], prepared["inventory_item"].id, prepared["serial_number"])
+                    )
+                if (
+                    stock_serial is None
+                    or stock_serial.id in claimed_serial_ids
+                    or stock_serial.profile_id != prepared["profile_id"]
+                    or stock_serial.inventory_item_id != prepared["inventory_item"].id
+                    or stock_serial.stock_location_id != prepared["stock_location"].id
+                    or (prepared["stock_lot_id"] is not None and stock_serial.stock_lot_id != prepared["stock_lot_id"])
+                ):
+                    raise StockDomainError("The requested stock serial could not be found for this operation.")
+                claimed_serial_ids.add(stock_serial.id)
+                prepared["stock_serial"] = stock_serial
+                if prepared["stock_lot_id"] is None:
+                    prepared["stock_lot_id"] = stock_serial.stock_lot_id
+
+        lot_pick_lines = [
+            prepared
+            for prepared in prepared_lines
+            if prepared["stock_lot_id"] is None and prepared["inventory_item"].track_lot
+        ]
+        if lot_pick_lines:
+            pair_filter = models.Q()
+            for prepared in lot_pick_lines:
+                pair_filter |= models.Q(
+                    profile_id=prepared["profile_id"],
+                    inventory_item_id=prepared["inventory_item"].id,
+                    stock_location_id=prepared["stock_location"].id,
+                )
+            candidates_by_pair: dict[tuple, list] = {}
+            for candidate in (
+                StockBalance.objects.filter(pair_filter, stock_lot__isnull=False, quantity_available__gt=0)
+                .order_by("stock_lot__expiry_date", "created_at")
+                .values("inventory_item_id", "stock_location_id", "stock_lot_id", "quantity_available")
+            ):
+                candidates_by_pair.setdefault(
+                    (candidate["inventory_item_id"], candidate["stock_location_id"]),
+                    [],
+                ).append(candidate)
+            for prepared in lot_pick_lines:
+                pair = (prepared["inventory_item"].id, prepared["stock_location"].id)
+                for candidate in candidates_by_pair.get(pair, []):
+                    if _to_decimal(candidate["quantity_available"]) >= prepared["quantity"]:
+                        candidate["quantity_available"] = _to_decimal(candidate["quantity_available"]) - prepared["quantity"]
+                        prepared["stock_lot_id"] = candidate["stock_lot_id"]
+                        break
+                else:
+                    raise StockDomainError(
+                        "Lot-tracked inventory requires a stock lot with enough available quantity for reservation."
+                    )
+
+        keys_by_profile: dict[int, dict[tuple, dict]] = {}
+        for prepared in prepared_lines:
+            prepared["balance_key"] = (
+                prepared["inventory_item"].id,
+                prepared["stock_location"].id,
+                prepared["stock_lot_id"],
+            )
+            requested = keys_by_profile.setdefault(prepared["profile_id"], {}).setdefault(
+                prepared["balance_key"],
+                {"quantity": Decimal("0"), "allow_negative_stock": prepared["inventory_item"].allow_negative_stock},
+            )
+            requested["quantity"] += prepared["quantity"]
+
+        balances: dict[tuple, StockBalance] = {}
+        for profile_id, requested_by_key in keys_by_profile.items():
+            profile_balances = cls._get_balances(
+                profile_id=profile_id,
+                keys=list(requested_by_key),
+                actor_user_id=actor_user_id,
+            )
+            for balance_key, balance in profile_balances.items():
+                requested = requested_by_key[balance_key]
+                guards = []
+                if not requested["allow_negative_stock"]:
+                    guards = [("quantity_available", requested["quantity"], "Insufficient available stock to reserve.")]
+                cls._apply_balance_delta(
+                    balance,
+                    reserved_delta=requested["quantity"],
+                    guards=guards,
+                    actor_user_id=actor_user_id,
+                )
+            balances.update(profile_balances)
+
+        reservations: list[StockReservation] = []
+        movements: list[StockMovement] = []
+        for prepared in prepared_lines:
+            reservation = StockReservation(
+                profile_id=prepared["profile_id"],
+                inventory_item=prepared["inventory_item"],
+                stock_lot_id=prepared["stock_lot_id"],
+                stock_serial=prepared["stock_serial"],
+                stock_location=prepared["stock_location"],
+                external_order_type=prepared["external_order_type"],
+                external_order_id=prepared["external_order_id"],
+                external_order_line_id=prepared["external_order_line_id"],
+                reserved_quantity=prepared["quantity"],
+                fulfilled_quantity=Decimal("0"),
+                status=StockReservationStatus.ACTIVE,
+                expires_at=prepared["expires_at"],
+                created_by_user_id=actor_user_id,
+                updated_by_user_id=actor_user_id,
+            )
+            reservations.append(reservation)
+            movements.append(
+                StockMovement(
+                    profile_id=prepared["profile_id"],
+                    inventory_item=prepared["inventory_item"],
+                    stock_lot_id=prepared["stock_lot_id"],
+                    stock_serial=prepared["stock_serial"],
+                    from_location=prepared["stock_location"],
+                    movement_type=StockMovementType.RESERVATION,
+                    quantity=prepared["quantity"],
+                    reference_type=prepared["external_order_type"],
+                    reference_id=prepared["external_order_line_id"] or prepared["external_order_id"],
+                    actor_user_id=actor_user_id,
+                    notes=prepared["notes"]
+                    or f"Reserved for {prepared['external_order_type']}:{prepared['external_order_id']}",
+                    created_by_user_id=actor_user_id,
+                    updated_by_user_id=actor_user_id,
+                )
+            )
+
+        StockReservation.objects.bulk_create(reservations)
+        StockMovement.objects.bulk_create(movements)
+
+        reserved_serials = [prepared["stock_serial"] for prepared in serial_lines]
+        if reserved_serials:
+            StockSerial.objects.filter(id__in=[stock_serial.id for stock_serial in reserved_serials]).update(
+                status=StockSerialStatus.RESERVED,
+                updated_by_user_id=actor_user_id,
+                updated_at=timezone.now(),
+            )
+            for stock_serial in reserved_serials:
+                stock_serial.status = StockSerialStatus.RESERVED
+                stock_serial.updated_by_user_id = actor_user_id
+
+        cls._sync_inventory_item_availability(movements)
+        cls._invalidate_cached_stock_responses(
+            (prepared["profile_id"], prepared["inventory_item"].id, prepared["stock_location"].id)
+            for prepared in prepared_lines
+        )
+        cls._publish_inventory_reservations_on_commit([reservation.id for reservation in reservations])
+        return {
+            "reservations": reservations,
+            "balances": balances,
+        }
+
     @classmethod
     @transaction.atomic
     def issue_stock(
@@ -782,7 +1185,7 @@ class StockDomainService:
         if quantity <= 0:
             raise StockDomainError("Issue quantity must be greater than zero.")
 
-        inventory_item, legacy_inventory, profile_id = cls._resolve_inventory_context(
+        inventory_item, _, profile_id = cls._resolve_inventory_context(
             inventory=inventory,
             inventory_item=inventory_item,
             purchase_order_line=purchase_order_line,
@@ -808,8 +1211,7 @@ class StockDomainService:
 
         if stock_lot is None and inventory_item.track_lot:
             candidate_balance = (
-                StockBalance.objects.select_for_update()
-                .filter(
+                StockBalance.objects.filter(
                     profile_id=profile_id,
                     inventory_item=inventory_item,
                     stock_location=stock_location,
@@ -829,33 +1231,28 @@ class StockDomainService:
         if stock_lot and stock_lot.inventory_item_id != inventory_item.id:
             raise StockDomainError("Stock lot does not belong to the selected inventory item.")
 
-        balance = cls._get_locked_balance(
+        balance = cls._get_balance(
             profile_id=profile_id,
             inventory_item=inventory_item,
             stock_location=stock_location,
             stock_lot=stock_lot,
-            legacy_inventory=legacy_inventory,
             actor_user_id=actor_user_id,
         )
-
-        quantity_on_hand = _to_decimal(balance.quantity_on_hand)
-        quantity_available = _to_decimal(balance.quantity_available)
-        if quantity_available < quantity and not inventory_item.allow_negative_stock:
-            raise StockDomainError("Insufficient available stock to issue.")
-        if quantity_on_hand < quantity and not inventory_item.allow_negative_stock:
-            raise StockDomainError("Insufficient stock on hand to issue.")
-
-        balance.quantity_on_hand = quantity_on_hand - quantity
-        balance.updated_by_user_id = actor_user_id
-        balance.save()
+        guards = []
+        if not inventory_item.allow_negative_stock:
+            guards = [
+                ("quantity_available", quantity, "Insufficient available stock to issue."),
+                ("quantity_on_hand", quantity, "Insufficient stock on hand to issue."),
+            ]
+        cls._apply_balance_delta(
+            balance,
+            on_hand_delta=-quantity,
+            guards=guards,
+            actor_user_id=actor_user_id,
+        )
 
         if stock_lot is not None:
-            stock_lot.remaining_quantity = max(
-                _to_decimal(stock_lot.remaining_quantity) - quantity,
-                Decimal("0"),
-            )
-            stock_lot.updated_by_user_id = actor_user_id
-            stock_lot.save()
+            cls._consume_lot_quantity(stock_lot, quantity, actor_user_id=actor_user_id)
 
         if stock_serial is not None:
             stock_serial.status = StockSerialStatus.ISSUED
@@ -863,7 +1260,7 @@ class StockDomainService:
             stock_serial.updated_by_user_id = actor_user_id
             stock_serial.save()
 
-        StockMovement.objects.create(
+        movement = StockMovement.objects.create(
             profile_id=profile_id,
             inventory_item=inventory_item,
             stock_lot=stock_lot,
@@ -883,8 +1280,11 @@ class StockDomainService:
             created_by_user_id=actor_user_id,
             updated_by_user_id=actor_user_id,
         )
+        apply_movement_costs([movement], cls._opening_unit_cost)
+        cls._record_unit_costs([movement])
 
-        cls._publish_inventory_availability_on_commit(inventory_item.id)
+        cls._sync_inventory_item_availability([movement])
+        cls._invalidate_cached_stock_responses([(profile_id, inventory_item.id, stock_location.id)])
         return {
             "inventory_item": inventory_item,
             "balance": balance,
@@ -911,20 +1311,19 @@ class StockDomainService:
             if release_count != 1:
                 raise StockDomainError("Serial-tracked reservations can only release one serial at a time.")
 
-        balance = cls._get_locked_balance(
+        balance = cls._get_balance(
             profile_id=reservation.profile_id,
             inventory_item=reservation.inventory_item,
             stock_location=reservation.stock_location,
             stock_lot=reservation.stock_lot,
-            legacy_inventory=cls.resolve_legacy_inventory(reservation.inventory_item),
             actor_user_id=actor_user_id,
         )
-        balance.quantity_reserved = max(
-            _to_decimal(balance.quantity_reserved) - release_quantity,
-            Decimal("0"),
+        cls._apply_balance_delta(
+            balance,
+            reserved_delta=-release_quantity,
+            clamp_reserved=True,
+            actor_user_id=actor_user_id,
         )
-        balance.updated_by_user_id = actor_user_id
-        balance.save()
 
         if release_quantity == reservation.remaining_quantity and reservation.fulfilled_quantity <= 0:
             reservation.status = StockReservationStatus.RELEASED
@@ -939,7 +1338,7 @@ class StockDomainService:
             reservation.stock_serial.updated_by_user_id = actor_user_id
             reservation.stock_serial.save()
 
-        StockMovement.objects.create(
+        movement = StockMovement.objects.create(
             profile_id=reservation.profile_id,
             inventory_item=reservation.inventory_item,
             stock_lot=reservation.stock_lot,
@@ -955,7 +1354,10 @@ class StockDomainService:
             updated_by_user_id=actor_user_id,
         )
 
-        cls._publish_inventory_availability_on_commit(reservation.inventory_item_id)
+        cls._sync_inventory_item_availability([movement])
+        cls._invalidate_cached_stock_responses(
+            [(reservation.profile_id, reservation.inventory_item_id, reservation.stock_location_id)]
+        )
         cls._publish_inventory_reservation_release_on_commit(reservation.id)
         return {
             "reservation": reservation,
@@ -983,34 +1385,32 @@ class StockDomainService:
                 raise StockDomainError("Serial-tracked reservations can only fulfill one serial at a time.")
 
         inventory_item = reservation.inventory_item
-        balance = cls._get_locked_balance(
+        balance = cls._get_balance(
             profile_id=reservation.profile_id,
             inventory_item=inventory_item,
             stock_location=reservation.stock_location,
             stock_lot=reservation.stock_lot,
-            legacy_inventory=cls.resolve_legacy_inventory(inventory_item),
             actor_user_id=actor_user_id,
         )
-        if _to_decimal(balance.quantity_reserved) < fulfill_quantity:
-            raise StockDomainError("Balance reserved quantity is lower than the requested fulfillment quantity.")
-        if (
-            _to_decimal(balance.quantity_on_hand) < fulfill_quantity
-            and not inventory_item.allow_negative_stock
-        ):
-            raise StockDomainError("Insufficient stock on hand to fulfill reservation.")
-
-        balance.quantity_reserved = _to_decimal(balance.quantity_reserved) - fulfill_quantity
-        balance.quantity_on_hand = _to_decimal(balance.quantity_on_hand) - fulfill_quantity
-        balance.updated_by_user_id = actor_user_id
-        balance.save()
+        guards = [
+            (
+                "quantity_reserved",
+                fulfill_quantity,
+                "Balance reserved quantity is lower than the requested fulfillment quantity.",
+            )
+        ]
+        if not inventory_item.allow_negative_stock:
+            guards.append(("quantity_on_hand", fulfill_quantity, "Insufficient stock on hand to fulfill reservation."))
+        cls._apply_balance_delta(
+            balance,
+            on_hand_delta=-fulfill_quantity,
+            reserved_delta=-fulfill_quantity,
+            guards=guards,
+            actor_user_id=actor_user_id,
+        )
 
         if reservation.stock_lot_id:
-            reservation.stock_lot.remaining_quantity = max(
-                _to_decimal(reservation.stock_lot.remaining_quantity) - fulfill_quantity,
-                Decimal("0"),
-            )
-            reservation.stock_lot.updated_by_user_id = actor_user_id
-            reservation.stock_lot.save()
+            cls._consume_lot_quantity(reservation.stock_lot, fulfill_quantity, actor_user_id=actor_user_id)
 
         reservation.fulfilled_quantity = _to_decimal(reservation.fulfilled_quantity) + fulfill_quantity
         reservation.status = (
@@ -1027,7 +1427,7 @@ class StockDomainService:
             reservation.stock_serial.updated_by_user_id = actor_user_id
             reservation.stock_serial.save()
 
-        StockMovement.objects.create(
+        movement = StockMovement.objects.create(
             profile_id=reservation.profile_id,
             inventory_item=inventory_item,
             stock_lot=reservation.stock_lot,
@@ -1047,8 +1447,13 @@ class StockDomainService:
             created_by_user_id=actor_user_id,
             updated_by_user_id=actor_user_id,
         )
+        apply_movement_costs([movement], cls._opening_unit_cost)
+        cls._record_unit_costs([movement])
 
-        cls._publish_inventory_availability_on_commit(inventory_item.id)
+        cls._sync_inventory_item_availability([movement])
+        cls._invalidate_cached_stock_responses(
+            [(reservation.profile_id, inventory_item.id, reservation.stock_location_id)]
+        )
         cls._publish_inventory_fulfillment_on_commit(reservation.id)
         return {
             "reservation": reservation,
@@ -1088,26 +1493,119 @@ class StockDomainService:
         stock_lot: StockLot | None = None,
         stock_location: StockLocation | None = None,
     ):
+        """
+        Resolve a unit cost from the lot, else the last known cost at the location, the item, then its lots.
+
+        Last known costs are kept by ``_record_unit_costs`` and were seeded from the ledger
+        when ``StockUnitCost`` was added, so the ledger itself is never scanned here.
+        """
         if stock_lot is not None and stock_lot.unit_cost is not None:
             return stock_lot.unit_cost
 
-        movement_queryset = StockMovement.objects.filter(
-            inventory_item=inventory_item,
-            unit_cost__isnull=False,
-        )
-        if stock_location is not None:
-            movement_queryset = movement_queryset.filter(
-                models.Q(to_location=stock_location) | models.Q(from_location=stock_location)
-            )
-        latest_movement = movement_queryset.order_by("-occurred_at", "-created_at").first()
-        if latest_movement is not None:
-            return latest_movement.unit_cost
+        location_id = stock_location.id if stock_location is not None else None
+        known_costs = {
+            stock_location_id: unit_cost
+            for stock_location_id, unit_cost in StockUnitCost.objects.filter(
+                models.Q(stock_location_id=location_id) | models.Q(stock_location__isnull=True),
+                inventory_item=inventory_item,
+            ).values_list("stock_location_id", "unit_cost")
+        }
+        for unit_cost in (known_costs.get(location_id), known_costs.get(None)):
+            if unit_cost is not None:
+                return unit_cost
 
         latest_lot = inventory_item.stock_lots.exclude(unit_cost__isnull=True).order_by("-created_at").first()
         if latest_lot is not None:
             return latest_lot.unit_cost
         return None
 
+    @classmethod
+    def _opening_unit_cost(cls, inventory_item: InventoryItem, stock_lot: StockLot | None, stock_location: StockLocation | None):
+        """Price stock held before an item was valued; runs before ``_record_unit_costs`` stores the new costs."""
+        return cls._resolve_inventory_unit_cost(
+            inventory_item=inventory_item,
+            stock_lot=stock_lot,
+            stock_location=stock_location,
+        )
+
+    @classmethod
+    def _record_unit_costs(cls, movements) -> None:
+        """Remember the cost of each costed movement for its locations and for the item as a whole."""
+        costs_by_profile: dict[int, dict] = {}
+        for movement in movements:
+            if movement.unit_cost is None:
+                continue
+            costs = costs_by_profile.setdefault(movement.profile_id, {})
+            for stock_location_id in {movement.from_location_id, movement.to_location_id, None}:
+                costs[(movement.inventory_item_id, stock_location_id)] = movement.unit_cost
+        for profile_id, costs in costs_by_profile.items():
+            cls._store_unit_costs(profile_id, costs)
+
+    @classmethod
+    def _store_unit_costs(cls, profile_id: int, costs: dict) -> None:
+        """Upsert ``{(inventory_item_id, stock_location_id): unit_cost}`` with one statement per key kind."""
+        updated_at = timezone.now()
+        rows = [
+            StockUnitCost(
+                profile_id=profile_id,
+                inventory_item_id=inventory_item_id,
+                stock_location_id=stock_location_id,
+                unit_cost=unit_cost,
+                updated_at=updated_at,
+            )
+            for (inventory_item_id, stock_location_id), unit_cost in costs.items()
+        ]
+        located_rows = [row for row in rows if row.stock_location_id is not None]
+        if located_rows:
+            StockUnitCost.objects.bulk_create(
+                located_rows,
+                update_conflicts=True,
+                unique_fields=["inventory_item", "stock_location"],
+                update_fields=["unit_cost", "updated_at"],
+            )
+        item_rows = [row for row in rows if row.stock_location_id is None]
+        if item_rows:
+            cls._upsert_item_unit_costs(item_rows, updated_at)
+
+    @staticmethod
+    def _upsert_item_unit_costs(rows: list[StockUnitCost], updated_at) -> None:
+        """
+        Upsert item-wide costs against ``unique_stock_unit_cost_item_no_location``.
+
+        ``bulk_create`` cannot name the partial index as its conflict target, so the
+        statement is written out here.
+        """
+        opts = StockUnitCost._meta
+        quote_name = connection.ops.quote_name
+
+        def column(field_name):
+            return quote_name(opts.get_field(field_name).column)
+
+        item = column("inventory_item")
+        location = column("stock_location")
+        unit_cost = column("unit_cost")
+        updated = column("updated_at")
+        sql = (
+            f"INSERT INTO {quote_name(opts.db_table)} "
+            f"({column('profile_id')}, {item}, {location}, {unit_cost}, {updated}) "
+            f"VALUES {', '.join(['(%s, %s, NULL, %s, %s)'] * len(rows))} "
+            f"ON CONFLICT ({item}) WHERE {location} IS NULL "
+            f"DO UPDATE SET {unit_cost} = EXCLUDED.{unit_cost}, {updated} = EXCLUDED.{updated}"
+        )
+        item_field = opts.get_field("inventory_item")
+        unit_cost_field = opts.get_field("unit_cost")
+        db_updated_at = opts.get_field("updated_at").get_db_prep_value(updated_at, connection)
+        params = []
+        for row in rows:
+            params.extend([
+                row.profile_id,
+                item_field.get_db_prep_value(row.inventory_item_id, connection),
+                unit_cost_field.get_db_prep_save(row.unit_cost, connection),
+                db_updated_at,
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
     @classmethod
     def _resolve_profile_id(cls, source) -> int:
         profile_id = _coerce_profile_id(getattr(source, "profile_id", None))
@@ -1172,97 +1670,217 @@ class StockDomainService:
         return None
 
     @classmethod
-    def _publish_inventory_availability_on_commit(cls, inventory_item_id) -> None:
-        from subapps.kafka.producers.inventory import publish_inventory_availability_upserted
+    def _sync_inventory_item_availability(cls, movements) -> None:
+        """Apply the operation's balance deltas to the rollups of the items ``movements`` touched."""
+        last_movement_at = {}
+        for movement in movements:
+            occurred_at = last_movement_at.get(movement.inventory_item_id)
+            if occurred_at is None or movement.occurred_at > occurred_at:
+                last_movement_at[movement.inventory_item_id] = movement.occurred_at
+        apply_inventory_item_availability_changes(last_movement_at)
+        cls._publish_inventory_availability_on_commit(list(last_movement_at))
 
-        transaction.on_commit(
-            lambda item_id=inventory_item_id: publish_inventory_availability_upserted(inventory_item_id=item_id)
-        )
+    @classmethod
+    def _invalidate_cached_stock_responses(cls, touched) -> None:
+        """Evict cached item and location responses for ``(profile_id, inventory_item_id, stock_location_id)`` keys."""
+        touched_by_profile = {}
+        for profile_id, inventory_item_id, stock_location_id in touched:
+            item_ids, location_ids = touched_by_profile.setdefault(profile_id, (set(), set()))
+            item_ids.add(inventory_item_id)
+            location_ids.add(stock_location_id)
+        for profile_id, (item_ids, location_ids) in touched_by_profile.items():
+            invalidate_cached_responses_on_commit(INVENTORY_ITEM_CACHE_SCOPE, profile_id, item_ids)
+            invalidate_cached_responses_on_commit(STOCK_LOCATION_CACHE_SCOPE, profile_id, location_ids)
+
+    @classmethod
+    def _publish_inventory_availability_on_commit(cls, inventory_item_ids) -> None:
+        from subapps.kafka.producers.buffer import AVAILABILITY_UPSERTED, publish_inventory_events_on_commit
+
+        publish_inventory_events_on_commit(AVAILABILITY_UPSERTED, inventory_item_ids)
 
     @classmethod
     def _publish_inventory_reservation_on_commit(cls, reservation_id) -> None:
-        from subapps.kafka.producers.inventory import publish_inventory_reservation_upserted
+        cls._publish_inventory_reservations_on_commit([reservation_id])
 
-        transaction.on_commit(
-            lambda record_id=reservation_id: publish_inventory_reservation_upserted(reservation_id=record_id)
-        )
+    @classmethod
+    def _publish_inventory_reservations_on_commit(cls, reservation_ids) -> None:
+        from subapps.kafka.producers.buffer import RESERVATION_UPSERTED, publish_inventory_events_on_commit
+
+        publish_inventory_events_on_commit(RESERVATION_UPSERTED, reservation_ids)
 
     @classmethod
     def _publish_inventory_reservation_release_on_commit(cls, reservation_id) -> None:
-        from subapps.kafka.producers.inventory import publish_inventory_reservation_released
+        from subapps.kafka.producers.buffer import RESERVATION_RELEASED, publish_inventory_events_on_commit
 
-        transaction.on_commit(
-            lambda record_id=reservation_id: publish_inventory_reservation_released(reservation_id=record_id)
-        )
+        publish_inventory_events_on_commit(RESERVATION_RELEASED, [reservation_id])
 
     @classmethod
     def _publish_inventory_fulfillment_on_commit(cls, reservation_id) -> None:
-        from subapps.kafka.producers.inventory import publish_inventory_fulfillment_completed
+        from subapps.kafka.producers.buffer import FULFILLMENT_COMPLETED, publish_inventory_events_on_commit
 
-        transaction.on_commit(
-            lambda record_id=reservation_id: publish_inventory_fulfillment_completed(reservation_id=record_id)
-        )
+        publish_inventory_events_on_commit(FULFILLMENT_COMPLETED, [reservation_id])
 
     @classmethod
-    def _get_locked_balance(
+    def _get_balance(
         cls,
         *,
         profile_id: int,
         inventory_item: InventoryItem,
         stock_location: StockLocation,
         stock_lot: StockLot | None = None,
-        legacy_inventory: Inventory | None = None,
         actor_user_id=None,
     ) -> StockBalance:
-        balance = StockBalance.objects.select_for_update().filter(
-            profile_id=profile_id,
-            inventory_item=inventory_item,
-            stock_location=stock_location,
-            stock_lot=stock_lot,
-        ).first()
-        if balance is not None:
-            return balance
-
-        return StockBalance.objects.create(
-            profile_id=profile_id,
-            inventory_item=inventory_item,
-            stock_location=stock_location,
-            stock_lot=stock_lot,
-            quantity_on_hand=Decimal("0"),
-            quantity_reserved=Decimal("0"),
-            created_by_user_id=actor_user_id,
-            updated_by_user_id=actor_user_id,
-        )
+        key = (inventory_item.id, stock_location.id, stock_lot.id if stock_lot is not None else None)
+        return cls._get_balances(profile_id=profile_id, keys=[key], actor_user_id=actor_user_id)[key]
 
     @classmethod
-    def _create_receipt_serials(
+    def _get_balances(
         cls,
         *,
         profile_id: int,
-        inventory_item: InventoryItem,
-        stock_location: StockLocation,
-        stock_lot: StockLot | None = None,
-        serial_numbers: list[str] | None = None,
+        keys,
         actor_user_id=None,
-    ) -> list[StockSerial]:
-        serial_numbers = _normalize_serial_numbers(serial_numbers)
-        if not serial_numbers:
-            return []
+    ) -> dict[tuple, StockBalance]:
+        """
+        Return the balances for ``(inventory_item_id, stock_location_id, stock_lot_id)`` keys in id order.
+
+        Missing rows are inserted first with ``ON CONFLICT DO NOTHING``. Callers
+        mutate the rows through ``_apply_balance_delta`` in the returned order,
+        so every caller takes the row locks in the same order. Lot-less balances rely on
+        ``unique_stock_balance_item_location_no_lot`` for the conflict, so two
+        first receipts never both insert a row.
+        """
+        # Concurrent first receipts wait on each other's uncommitted unique-index entries, so the
+        # rows are inserted in one fixed order whatever order the caller's lines came in.
+        keys = sorted(
+            dict.fromkeys(keys),
+            key=lambda key: (str(key[0]), str(key[1]), key[2] is not None, str(key[2] or "")),
+        )
+        if not keys:
+            return {}
 
-        stock_serials: list[StockSerial] = []
-        for serial_number in serial_numbers:
-            if StockSerial.objects.filter(profile_id=profile_id, serial_number=serial_number).exists():
-                raise StockDomainError(f"Serial number '{serial_number}' already exists.")
-            stock_serials.append(
-                StockSerial.objects.create(
+        StockBalance.objects.bulk_create(
+            [
+                StockBalance(
                     profile_id=profile_id,
-                    inventory_item=inventory_item,
-                    stock_lot=stock_lot,
-                    stock_location=stock_location,
-                    serial_number=serial_number,
-                    status=StockSerialStatus.AVAILABLE,
+                    inventory_item_id=inventory_item_id,
+                    stock_location_id=stock_location_id,
+                    stock_lot_id=stock_lot_id,
+                    quantity_on_hand=Decimal("0"),
+                    quantity_reserved=Decimal("0"),
+                    quantity_available=Decimal("0"),
                     created_by_user_id=actor_user_id,
                     updated_by_user_id=actor_user_id,
                 )
+                for inventory_item_id, stock_location_id, stock_lot_id in keys
+            ],
+            ignore_conflicts=True,
+        )
+
+        key_filter = models.Q()
+        for inventory_item_id, stock_location_id, stock_lot_id in keys:
+            key_filter |= models.Q(
+                inventory_item_id=inventory_item_id,
+                stock_location_id=stock_location_id,
+                stock_lot_id=stock_lot_id,
             )
-        return stock_serials
+        balances = {
+            (balance.inventory_item_id, balance.stock_location_id, balance.stock_lot_id): balance
+            for balance in StockBalance.objects.filter(key_filter, profile_id=profile_id).order_by("id")
+        }
+        if any(key not in balances for key in keys):
+            raise StockDomainError("Unable to lock stock balance for this operation.")
+        return balances
+
+    @staticmethod
+    def _consume_lot_quantity(stock_lot: StockLot, quantity: Decimal, *, actor_user_id=None) -> None:
+        """Draw ``quantity`` from the lot in one ``UPDATE``, so concurrent issues never overwrite each other."""
+        StockLot.objects.filter(pk=stock_lot.pk).update(
+            remaining_quantity=Greatest(models.F("remaining_quantity") - quantity, models.Value(Decimal("0"))),
+            updated_by_user_id=actor_user_id,
+            updated_at=timezone.now(),
+        )
+        stock_lot.refresh_from_db(fields=["remaining_quantity", "updated_by_user_id", "updated_at"])
+
+    @classmethod
+    def _apply_balance_delta(
+        cls,
+        balance: StockBalance,
+        *,
+        on_hand_delta=Decimal("0"),
+        reserved_delta=Decimal("0"),
+        clamp_reserved: bool = False,
+        guards=(),
+        actor_user_id=None,
+    ) -> StockBalance:
+        """
+        Apply quantity deltas to ``balance`` in one guarded ``UPDATE ... RETURNING``.
+
+        ``guards`` holds ``(field_name, minimum, message)`` tuples that must all
+        satisfy ``field_name >= minimum`` on the current row; otherwise nothing is
+        written and the message of the first failing guard is raised. With
+        ``clamp_reserved`` the reserved quantity never drops below zero.
+        """
+        on_hand_delta = _to_decimal(on_hand_delta)
+        reserved_delta = _to_decimal(reserved_delta)
+        opts = StockBalance._meta
+        quote_name = connection.ops.quote_name
+
+        def column(field_name):
+            return quote_name(opts.get_field(field_name).column)
+
+        on_hand = column("quantity_on_hand")
+        reserved = column("quantity_reserved")
+        available = column("quantity_available")
+        if clamp_reserved:
+            reserved_sql = f"CASE WHEN {reserved} + %s < 0 THEN 0 ELSE {reserved} + %s END"
+            reserved_params = [reserved_delta, reserved_delta]
+        else:
+            reserved_sql = f"{reserved} + %s"
+            reserved_params = [reserved_delta]
+
+        guard_sql = "".join(f" AND {column(field_name)} >= %s" for field_name, _, _ in guards)
+        sql = (
+            f"UPDATE {quote_name(opts.db_table)} SET "
+            f"{on_hand} = {on_hand} + %s, "
+            f"{reserved} = {reserved_sql}, "
+            f"{available} = ({on_hand} + %s) - ({reserved_sql}), "
+            f"{column('updated_by_user_id')} = %s, "
+            f"{column('updated_at')} = %s "
+            f"WHERE {column('id')} = %s{guard_sql} "
+            f"RETURNING {on_hand}, {reserved}, {available}"
+        )
+        updated_at = timezone.now()
+        params = [
+            on_hand_delta,
+            *reserved_params,
+            on_hand_delta,
+            *reserved_params,
+            actor_user_id,
+            opts.get_field("updated_at").get_db_prep_value(updated_at, connection),
+            opts.pk.get_db_prep_value(balance.pk, connection),
+            *[_to_decimal(minimum) for _, minimum, _ in guards],
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            current = StockBalance.objects.filter(pk=balance.pk).values(*[name for name, _, _ in guards]).first() or {}
+            for field_name, minimum, message in guards:
+                if _to_decimal(current.get(field_name) or 0) < _to_decimal(minimum):
+                    raise StockDomainError(message)
+            raise StockDomainError(guards[0][2] if guards else "Unable to update stock balance.")
+
+        for field_name, value in zip(("quantity_on_hand", "quantity_reserved", "quantity_available"), row):
+            setattr(balance, field_name, opts.get_field(field_name).to_python(value))
+        balance.updated_by_user_id = actor_user_id
+        balance.updated_at = updated_at
+        clamped = clamp_reserved and reserved_delta < 0 and balance.quantity_reserved == 0
+        record_balance_delta(
+            balance,
+            on_hand_delta=on_hand_delta,
+            reserved_delta=reserved_delta,
+            exact=not clamped,
+        )
+        return balance
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import gzip
+import os
+import re
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mainapps.stock.models import StockMovement
+
+PARENT_TABLE = StockMovement._meta.db_table
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+_PARTITION_PATTERN = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+class StockMovementPartitionError(RuntimeError):
+    pass
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def _bound(month: date) -> str:
+    # Partition bounds are whole UTC months.
+    return datetime.combine(month, time.min, tzinfo=dt_timezone.utc).isoformat()
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [PARENT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def _require_partitioned():
+    if not is_partitioned():
+        raise StockMovementPartitionError(
+            f"{PARENT_TABLE} is not a partitioned PostgreSQL table; run the stock migrations first."
+        )
+
+
+def list_partitions() -> list[tuple[str, date]]:
+    """Return ``(table_name, month)`` for every attached monthly partition, oldest first."""
+    _require_partitioned()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = _PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def retained_ledger_start() -> datetime | None:
+    """
+    Return the start of the oldest attached monthly partition, or ``None`` when the ledger is not partitioned.
+
+    Movements before that instant may have been archived, so replays must not assume they are present.
+    """
+    if not is_partitioned():
+        return None
+    partitions = list_partitions()
+    if not partitions:
+        return None
+    return datetime.combine(partitions[0][1], time.min, tzinfo=dt_timezone.utc)
+
+
+def create_month_partition(month: date) -> bool:
+    """
+    Create and attach the partition for ``month`` if it does not exist yet.
+
+    Rows for that month that landed in the default partition are moved into it first,
+    otherwise PostgreSQL would refuse to attach the new range. A validated ``CHECK`` on
+    the default partition excluding the month lets the attach skip re-scanning the
+    default under its exclusive lock; the check is validated in between, without
+    blocking writes. Until the attach, inserts dated inside the month are rejected.
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    excluded = f"{DEFAULT_PARTITION}_excludes_{name[len(PARENT_TABLE) + 1:]}"
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+    with transaction.atomic():
+        # The table's own bound check lets the attach skip scanning it too.
+        _execute(
+            f'CREATE TABLE "{name}" (LIKE "{PARENT_TABLE}" INCLUDING DEFAULTS, '
+            f'CONSTRAINT "{name}_bounds" CHECK (occurred_at >= %s AND occurred_at < %s))',
+            [lower, upper],
+        )
+        _execute(
+            f'ALTER TABLE "{DEFAULT_PARTITION}" ADD CONSTRAINT "{excluded}" '
+            f"CHECK (occurred_at < %s OR occurred_at >= %s) NOT VALID",
+            [lower, upper],
+        )
+        _execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+            f"WHERE occurred_at >= %s AND occurred_at < %s RETURNING *) "
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [lower, upper],
+        )
+    _execute(f'ALTER TABLE "{DEFAULT_PARTITION}" VALIDATE CONSTRAINT "{excluded}"')
+    with transaction.atomic():
+        _execute(
+            f'ALTER TABLE "{PARENT_TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper],
+        )
+        _execute(f'ALTER TABLE "{DEFAULT_PARTITION}" DROP CONSTRAINT "{excluded}"')
+        _execute(f'ALTER TABLE "{name}" DROP CONSTRAINT "{name}_bounds"')
+    return True
+
+
+def backfill_default_partition(*, max_months: int | None = None, today: date | None = None) -> list[str]:
+    """
+    Move rows out of the default partition into monthly partitions, oldest month first.
+
+    The partitioning migration leaves the existing history in the default partition;
+    each month is moved and attached on its own so no lock is held for the whole ledger.
+    The current month is left until it has ended, since inserts into a month are
+    rejected while it is being attached.
+    """
+    _require_partitioned()
+    current = _bound(month_start(today or timezone.now().date()))
+    created = []
+    while max_months is None or len(created) < max_months:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT MIN(occurred_at) FROM "{DEFAULT_PARTITION}" WHERE occurred_at < %s', [current])
+            oldest = cursor.fetchone()[0]
+        if oldest is None:
+            break
+        month = month_start(oldest.astimezone(dt_timezone.utc))
+        if not create_month_partition(month):
+            raise StockMovementPartitionError(
+                f"{DEFAULT_PARTITION} holds rows for {month:%Y-%m} but {partition_name(month)} already exists."
+            )
+        created.append(partition_name(month))
+    return created
+
+
+def ensure_future_partitions(*, months_ahead: int = 3, today: date | None = None) -> list[str]:
+    _require_partitioned()
+    current = month_start(today or timezone.now().date())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_month_partition(month):
+            created.append(partition_name(month))
+    return created
+
+
+def partitions_older_than(*, retain_months: int, today: date | None = None) -> list[tuple[str, date]]:
+    cutoff = add_months(month_start(today or timezone.now().date()), -retain_months)
+    return [partition for partition in list_partitions() if partition[1] < cutoff]
+
+
+def detach_partition(name: str) -> None:
+    _execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"')
+
+
+def archive_partition(name: str, directory: str) -> str:
+    """Detach ``name``, write it to ``<directory>/<name>.csv.gz`` and drop the table."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.csv.gz")
+    temporary_path = f"{path}.tmp"
+    with transaction.atomic():
+        detach_partition(name)
+        with connection.cursor() as cursor, gzip.open(temporary_path, "wb") as handle:
+            with cursor.copy(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER true)') as copy:
+                for block in copy:
+                    handle.write(block)
+        os.replace(temporary_path, path)
+        _execute(f'DROP TABLE "{name}"')
+    return path
+
+
+def _execute(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
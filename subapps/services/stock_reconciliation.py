@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from mainapps.stock.models import (
+    StockBalance,
+    StockBalanceSnapshot,
+    StockMovement,
+    StockMovementType,
+    StockReconciliationCheckpoint,
+    StockReservation,
+)
+from subapps.services.inventory_availability import refresh_inventory_item_availability
+from subapps.services.stock_balance_history import ledger_on_hand_deltas, snapshot_boundary
+from subapps.services.stock_movement_partitions import retained_ledger_start
+
+# Movements are stamped before their transaction commits, so each run re-reads a little before the watermark.
+WATERMARK_OVERLAP = timedelta(minutes=15)
+_ZERO = Decimal("0")
+
+
+class StockReconciliationError(RuntimeError):
+    pass
+
+
+def _grouped_sum(queryset, location_field, quantity_field="quantity") -> dict:
+    rows = (
+        queryset.order_by()
+        .values("inventory_item_id", location_field, "stock_lot_id")
+        .annotate(total=Sum(quantity_field))
+    )
+    return {(row["inventory_item_id"], row[location_field], row["stock_lot_id"]): row["total"] for row in rows}
+
+
+def _replay_base(profile_id: int) -> tuple:
+    """
+    Return ``(since, on_hand, covered)``: where the ledger replay starts and the on-hand quantities it starts from.
+
+    While every movement of the tenant is still attached the replay starts from zero. Once
+    older partitions have been archived it starts from the latest balance snapshot taken
+    before the oldest attached partition; ``covered`` is false when no snapshot reaches that
+    partition, because movements between the snapshot and the retained ledger are gone.
+    """
+    retained_from = retained_ledger_start()
+    if retained_from is None:
+        return None, {}, True
+    first_balance = StockBalance.objects.filter(profile_id=profile_id).aggregate(first=Min("created_at"))["first"]
+    if first_balance is None or first_balance >= retained_from:
+        return None, {}, True
+
+    snapshots = StockBalanceSnapshot.objects.filter(profile_id=profile_id)
+    snapshot_date = snapshots.filter(snapshot_date__lt=retained_from.date()).aggregate(
+        latest=Max("snapshot_date")
+    )["latest"]
+    if snapshot_date is None:
+        return None, {}, False
+    on_hand = {
+        (row["inventory_item_id"], row["stock_location_id"], row["stock_lot_id"]): row["quantity_on_hand"]
+        for row in snapshots.filter(snapshot_date=snapshot_date).values(
+            "inventory_item_id", "stock_location_id", "stock_lot_id", "quantity_on_hand"
+        )
+    }
+    since = snapshot_boundary(snapshot_date)
+    return since, on_hand, since >= retained_from
+
+
+def compute_expected_balances(profile_id: int, inventory_item_ids=None, *, replay_base=None) -> dict:
+    """
+    Return ``{(inventory_item_id, stock_location_id, stock_lot_id): (on_hand, reserved)}`` derived from the ledger.
+
+    On hand is the replay base plus the movements recorded since it. Reserved is the sum of
+    reservation movements less releases and the quantities already fulfilled against those
+    reservations; it is ``None`` when the replay starts from a snapshot, since snapshots do
+    not carry reservations and their movements may straddle the archived months.
+    """
+    since, base_on_hand, _ = replay_base or _replay_base(profile_id)
+    movements = StockMovement.objects.filter(profile_id=profile_id)
+    reservations = StockReservation.objects.filter(profile_id=profile_id)
+    if inventory_item_ids is not None:
+        inventory_item_ids = set(inventory_item_ids)
+        movements = movements.filter(inventory_item_id__in=list(inventory_item_ids))
+        reservations = reservations.filter(inventory_item_id__in=list(inventory_item_ids))
+        base_on_hand = {key: quantity for key, quantity in base_on_hand.items() if key[0] in inventory_item_ids}
+
+    if since is not None:
+        on_hand = defaultdict(Decimal, base_on_hand)
+        for key, delta in ledger_on_hand_deltas(movements.filter(occurred_at__gte=since)).items():
+            on_hand[key] += delta
+        return {key: (quantity, None) for key, quantity in on_hand.items()}
+
+    on_hand = ledger_on_hand_deltas(movements)
+    reserved = defaultdict(Decimal)
+    for key, total in _grouped_sum(
+        movements.filter(movement_type=StockMovementType.RESERVATION), "from_location_id"
+    ).items():
+        reserved[key] += total
+    for key, total in _grouped_sum(
+        movements.filter(movement_type=StockMovementType.RELEASE), "to_location_id"
+    ).items():
+        reserved[key] -= total
+    for key, total in _grouped_sum(reservations, "stock_location_id", "fulfilled_quantity").items():
+        reserved[key] -= total
+
+    return {key: (on_hand.get(key, _ZERO), reserved.get(key, _ZERO)) for key in set(on_hand) | set(reserved)}
+
+
+def _unknown_key(replay_base) -> tuple:
+    # A key the replay never saw has no stock; its reservations are only known from a full ledger.
+    return (_ZERO, _ZERO if replay_base[0] is None else None)
+
+
+def _changed_keys(profile_id: int, since) -> set:
+    movements = StockMovement.objects.filter(profile_id=profile_id, occurred_at__gte=since)
+    keys = set()
+    for location_field in ("to_location_id", "from_location_id"):
+        keys.update(
+            movements.exclude(**{location_field: None})
+            .order_by()
+            .values_list("inventory_item_id", location_field, "stock_lot_id")
+            .distinct()
+        )
+    keys.update(
+        StockBalance.objects.filter(profile_id=profile_id, updated_at__gte=since)
+        .order_by()
+        .values_list("inventory_item_id", "stock_location_id", "stock_lot_id")
+    )
+    return keys
+
+
+def _find_drift(profile_id: int, keys=None) -> tuple[int, list]:
+    inventory_item_ids = None if keys is None else {key[0] for key in keys}
+    replay_base = _replay_base(profile_id)
+    expected = compute_expected_balances(profile_id, inventory_item_ids, replay_base=replay_base)
+    unknown = _unknown_key(replay_base)
+    balances = StockBalance.objects.filter(profile_id=profile_id)
+    if inventory_item_ids is not None:
+        balances = balances.filter(inventory_item_id__in=list(inventory_item_ids))
+    actual = {
+        (row["inventory_item_id"], row["stock_location_id"], row["stock_lot_id"]): row
+        for row in balances.values(
+            "id", "inventory_item_id", "stock_location_id", "stock_lot_id", "quantity_on_hand", "quantity_reserved"
+        )
+    }
+
+    candidates = set(expected) | set(actual) if keys is None else set(keys)
+    drift = []
+    for key in candidates:
+        expected_on_hand, expected_reserved = expected.get(key, unknown)
+        row = actual.get(key)
+        actual_on_hand = row["quantity_on_hand"] if row else _ZERO
+        actual_reserved = row["quantity_reserved"] if row else _ZERO
+        if expected_reserved is None:
+            expected_reserved = actual_reserved
+        if expected_on_hand != actual_on_hand or expected_reserved != actual_reserved:
+            drift.append(
+                {
+                    "inventory_item_id": key[0],
+                    "stock_location_id": key[1],
+                    "stock_lot_id": key[2],
+                    "balance_id": row["id"] if row else None,
+                    "expected_on_hand": expected_on_hand,
+                    "actual_on_hand": actual_on_hand,
+                    "expected_reserved": expected_reserved,
+                    "actual_reserved": actual_reserved,
+                }
+            )
+    return len(candidates), drift
+
+
+def require_covered_ledger(profile_id: int) -> tuple:
+    """Return the replay base for ``profile_id``, raising ``StockReconciliationError`` if it cannot be trusted for repairs."""
+    replay_base = _replay_base(profile_id)
+    if not replay_base[2]:
+        raise StockReconciliationError(
+            f"Profile {profile_id}: no balance snapshot covers the movements archived before the oldest "
+            "stock movement partition; snapshot the day before it prior to repairing."
+        )
+    return replay_base
+
+
+@transaction.atomic
+def repair_drift(profile_id: int, drift: list) -> int:
+    """
+    Rewrite drifted balances to the ledger's figures, returning the number of rows written.
+
+    The balances are locked before the ledger is re-read, so a mutation racing the repair is
+    either already visible in the recomputed figures or waits for it.
+    """
+    from subapps.kafka.producers.buffer import AVAILABILITY_UPSERTED, publish_inventory_events_on_commit
+
+    if not drift:
+        return 0
+    replay_base = require_covered_ledger(profile_id)
+    balances = {
+        (balance.inventory_item_id, balance.stock_location_id, balance.stock_lot_id): balance
+        for balance in StockBalance.objects.select_for_update().filter(
+            id__in=[entry["balance_id"] for entry in drift if entry["balance_id"]]
+        ).order_by("id")
+    }
+    inventory_item_ids = {entry["inventory_item_id"] for entry in drift}
+    expected = compute_expected_balances(profile_id, inventory_item_ids, replay_base=replay_base)
+
+    now = timezone.now()
+    updated, created = [], []
+    for entry in drift:
+        key = (entry["inventory_item_id"], entry["stock_location_id"], entry["stock_lot_id"])
+        on_hand, reserved = expected.get(key, _unknown_key(replay_base))
+        balance = balances.get(key)
+        if reserved is None:
+            reserved = balance.quantity_reserved if balance is not None else _ZERO
+        if balance is None:
+            if entry["balance_id"] is None:
+                created.append(
+                    StockBalance(
+                        profile_id=profile_id,
+                        inventory_item_id=key[0],
+                        stock_location_id=key[1],
+                        stock_lot_id=key[2],
+                        quantity_on_hand=on_hand,
+                        quantity_reserved=reserved,
+                        quantity_available=on_hand - reserved,
+                    )
+                )
+            continue
+        balance.quantity_on_hand = on_hand
+        balance.quantity_reserved = reserved
+        balance.quantity_available = on_hand - reserved
+        balance.updated_at = now
+        updated.append(balance)
+
+    StockBalance.objects.bulk_update(
+        updated, ["quantity_on_hand", "quantity_reserved", "quantity_available", "updated_at"]
+    )
+    StockBalance.objects.bulk_create(created, ignore_conflicts=True)
+    refresh_inventory_item_availability(inventory_item_ids)
+    publish_inventory_events_on_commit(AVAILABILITY_UPSERTED, list(inventory_item_ids))
+    return len(updated) + len(created)
+
+
+def reconcile_profile(profile_id: int, *, full: bool = False, repair: bool = False) -> dict:
+    """
+    Compare one tenant's balances with its ledger and record the run's watermark.
+
+    Incremental runs only re-check keys with movements or balance writes since the previous
+    run; the first run for a tenant, or ``full=True``, checks every key.
+    """
+    if repair:
+        require_covered_ledger(profile_id)
+    started_at = timezone.now()
+    checkpoint = StockReconciliationCheckpoint.objects.filter(profile_id=profile_id).first()
+    keys = None
+    if checkpoint is not None and not full:
+        keys = _changed_keys(profile_id, checkpoint.checked_through - WATERMARK_OVERLAP)
+
+    checked, drift = _find_drift(profile_id, keys)
+    repaired = repair_drift(profile_id, drift) if repair else 0
+    # Unrepaired drift keeps the old watermark so the next run reports it again.
+    if checkpoint is None or not drift or repair:
+        checked_through = started_at
+    else:
+        checked_through = checkpoint.checked_through
+    if checkpoint is not None or not drift or repair:
+        StockReconciliationCheckpoint.objects.update_or_create(
+            profile_id=profile_id,
+            defaults={
+                "checked_through": checked_through,
+                "checked_keys": checked,
+                "drift_count": len(drift),
+                "repaired_count": repaired,
+            },
+        )
+    return {"profile_id": profile_id, "checked": checked, "drift": drift, "repaired": repaired}
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import copy
+import threading
+import weakref
+from collections.abc import Callable
+from typing import TypeVar
+
+from django.db import transaction
+
+BufferT = TypeVar("BufferT")
+
+_local = threading.local()
+
+
+def get_transaction_buffer(
+    name: str,
+    factory: Callable[[], BufferT],
+    flush: Callable[[BufferT], None],
+    *,
+    using: str | None = None,
+) -> BufferT | None:
+    """
+    Return the ``name`` buffer of the current transaction on ``using``, or ``None`` outside one.
+
+    The first call in a transaction creates the buffer with ``factory`` and schedules
+    ``flush(buffer)`` for when the outermost transaction commits. Only that on_commit
+    callback holds the buffer strongly, so a rollback, which drops the callback, drops
+    the buffer with it and the next transaction starts a fresh one.
+
+    Savepoints opened after the buffer was created are tracked the same way: the first
+    call inside one snapshots the buffer and registers a marker callback in it. When the
+    savepoint rolls back, Django drops the marker, and the buffer is restored to the
+    snapshot before it is handed out or flushed again.
+    """
+    using = using or transaction.DEFAULT_DB_ALIAS
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+
+    if not hasattr(_local, "buffers"):
+        _local.buffers = {}
+    key = (name, using)
+    ref = _local.buffers.get(key)
+    holder = ref() if ref is not None else None
+    if holder is None:
+        holder = _Holder(factory(), connection.savepoint_ids)
+        ref = weakref.ref(holder)
+        _local.buffers[key] = ref
+
+        def on_commit():
+            if _local.buffers.get(key) is ref:
+                del _local.buffers[key]
+            holder.rewind()
+            flush(holder.value)
+
+        transaction.on_commit(on_commit, using=using)
+        return holder.value
+
+    holder.rewind()
+    holder.track_savepoints(connection.savepoint_ids, using=using)
+    return holder.value
+
+
+class _Holder:
+    """Weak-referenceable wrapper, so plain dicts and sets can be buffered."""
+
+    __slots__ = ("value", "base_savepoint_ids", "savepoints", "__weakref__")
+
+    def __init__(self, value, savepoint_ids):
+        self.value = value
+        # The flush callback already dies with these savepoints, taking the buffer along.
+        self.base_savepoint_ids = set(savepoint_ids)
+        self.savepoints: list[tuple[str, weakref.ref, object]] = []
+
+    def rewind(self) -> None:
+        """Restore the snapshot taken on entry to the earliest savepoint that has rolled back."""
+        for index, (_, marker_ref, snapshot) in enumerate(self.savepoints):
+            if marker_ref() is None:
+                self.value = snapshot
+                del self.savepoints[index:]
+                return
+
+    def track_savepoints(self, savepoint_ids, *, using: str) -> None:
+        open_ids = [sid for sid in savepoint_ids if sid is not None and sid not in self.base_savepoint_ids]
+        # Released savepoints are part of their parent now; the parent's snapshot covers them.
+        self.savepoints = [entry for entry in self.savepoints if entry[0] in open_ids]
+        tracked = {sid for sid, _, _ in self.savepoints}
+        for sid in open_ids:
+            if sid in tracked:
+                continue
+            marker = _SavepointMarker()
+            transaction.on_commit(marker, using=using)
+            self.savepoints.append((sid, weakref.ref(marker), copy.deepcopy(self.value)))
+
+
+class _SavepointMarker:
+    """No-op on_commit callback whose lifetime tells whether its savepoint rolled back."""
+
+    __slots__ = ("__weakref__",)
+
+    def __call__(self):
+        pass